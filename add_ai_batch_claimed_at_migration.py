@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Migration: Add claimed_at field to ai_batches table
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+def run_migration(db_path: str):
+    """Add claimed_at field to ai_batches table"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check existing columns (the table is created with the column on fresh databases)
+        cursor.execute("PRAGMA table_info(ai_batches)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        if not columns:
+            print("✓ ai_batches table doesn't exist yet (created on startup)")
+        elif 'claimed_at' not in columns:
+            print("Adding claimed_at column to ai_batches table...")
+            cursor.execute("""
+                ALTER TABLE ai_batches
+                ADD COLUMN claimed_at DATETIME
+            """)
+            conn.commit()
+            print("✓ Added claimed_at column")
+        else:
+            print("✓ claimed_at column already exists")
+
+    except Exception as e:
+        print(f"Error running migration: {e}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = "data/support_agent.db"
+
+    if not Path(db_path).exists():
+        print(f"Error: Database file '{db_path}' not found")
+        sys.exit(1)
+
+    print(f"Running migration on {db_path}...")
+    run_migration(db_path)
+    print("Migration completed successfully!")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Migration: Add batch_mode field to bulk_reanalysis_jobs table
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+def run_migration(db_path: str):
+    """Add batch_mode field to bulk_reanalysis_jobs table"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check existing columns (the table is created with the column on fresh databases)
+        cursor.execute("PRAGMA table_info(bulk_reanalysis_jobs)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        if not columns:
+            print("✓ bulk_reanalysis_jobs table doesn't exist yet (created on startup)")
+        elif 'batch_mode' not in columns:
+            print("Adding batch_mode column to bulk_reanalysis_jobs table...")
+            cursor.execute("""
+                ALTER TABLE bulk_reanalysis_jobs
+                ADD COLUMN batch_mode BOOLEAN DEFAULT 0
+            """)
+            conn.commit()
+            print("✓ Added batch_mode column")
+        else:
+            print("✓ batch_mode column already exists")
+
+    except Exception as e:
+        print(f"Error running migration: {e}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = "data/support_agent.db"
+
+    if not Path(db_path).exists():
+        print(f"Error: Database file '{db_path}' not found")
+        sys.exit(1)
+
+    print(f"Running migration on {db_path}...")
+    run_migration(db_path)
+    print("Migration completed successfully!")
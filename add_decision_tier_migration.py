@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Migration: Add tier field to ai_decision_logs table
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+def run_migration(db_path: str):
+    """Add tier field to ai_decision_logs table"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check existing columns
+        cursor.execute("PRAGMA table_info(ai_decision_logs)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        if 'tier' not in columns:
+            print("Adding tier column to ai_decision_logs table...")
+            cursor.execute("""
+                ALTER TABLE ai_decision_logs
+                ADD COLUMN tier VARCHAR(20)
+            """)
+            conn.commit()
+            print("✓ Added tier column")
+        else:
+            print("✓ tier column already exists")
+
+    except Exception as e:
+        print(f"Error running migration: {e}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = "data/support_agent.db"
+
+    if not Path(db_path).exists():
+        print(f"Error: Database file '{db_path}' not found")
+        sys.exit(1)
+
+    print(f"Running migration on {db_path}...")
+    run_migration(db_path)
+    print("Migration completed successfully!")
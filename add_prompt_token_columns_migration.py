@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Migration: Add prompt token count fields to ai_decision_logs table
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+def run_migration(db_path: str):
+    """Add prompt token count fields to ai_decision_logs table"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Check existing columns
+        cursor.execute("PRAGMA table_info(ai_decision_logs)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        fields_to_add = [
+            ('prompt_tokens', 'INTEGER'),
+            ('prompt_token_stats', 'JSON'),
+            ('prompt_truncated', 'BOOLEAN DEFAULT 0')
+        ]
+
+        for field_name, field_type in fields_to_add:
+            if field_name not in columns:
+                print(f"Adding {field_name} column to ai_decision_logs table...")
+                cursor.execute(f"""
+                    ALTER TABLE ai_decision_logs
+                    ADD COLUMN {field_name} {field_type}
+                """)
+                conn.commit()
+                print(f"✓ Added {field_name} column")
+            else:
+                print(f"✓ {field_name} column already exists")
+
+    except Exception as e:
+        print(f"Error running migration: {e}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_path = "data/support_agent.db"
+
+    if not Path(db_path).exists():
+        print(f"Error: Database file '{db_path}' not found")
+        sys.exit(1)
+
+    print(f"Running migration on {db_path}...")
+    run_migration(db_path)
+    print("Migration completed successfully!")
@@ -60,6 +60,15 @@ class Settings(BaseSettings):
         le=500,
         description="Max messages to fetch per poll"
     )
+    # Email Source Configuration
+    email_source: Literal["gmail", "local", "memory"] = Field(
+        default="gmail",
+        description="Where emails are read from: live Gmail, a local mailbox export, or in-memory (tests/benchmarks)"
+    )
+    local_mail_path: str = Field(
+        default="data/mailbox",
+        description="Maildir directory, mbox file, .eml file or directory of .eml files for the local email source"
+    )
     preparation_mode: bool = Field(
         default=False,
         description="Preparation mode: only label emails; skip AI and ticketing"
@@ -210,6 +219,15 @@ class Settings(BaseSettings):
         ge=1,
         description="How many minutes back to search for emails"
     )
+    email_priority_scheduling_enabled: bool = Field(
+        default=True,
+        description="Process each polled batch in SLA-aware priority order instead of source order"
+    )
+    customer_sla_hours: float = Field(
+        default=24.0,
+        gt=0,
+        description="Customer response SLA in hours (Amazon requires replies within 24 hours)"
+    )
 
     # Prompt Configuration
     prompt_path: str = Field(
@@ -220,6 +238,11 @@ class Settings(BaseSettings):
         default="config/prompt/few_shots.json",
         description="Optional path to few-shot examples (JSON)"
     )
+    prompt_registry_check_seconds: float = Field(
+        default=5.0,
+        ge=0,
+        description="How often each process checks whether the active system prompt changed (0 = every call)"
+    )
 
     # Phase 1 Internal Note Formatting
     phase1_customer_prefix: str = Field(
@@ -262,6 +285,449 @@ class Settings(BaseSettings):
         description="Minimum minutes between alerts of same type"
     )
 
+    # AI Client Pooling / Concurrency
+    ai_max_concurrent_requests: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum concurrent in-flight requests per AI provider (per process)"
+    )
+    ai_http_max_connections: int = Field(
+        default=20,
+        ge=1,
+        description="Keep-alive connection pool size of the shared AI provider HTTP clients"
+    )
+    ai_http_keepalive_seconds: float = Field(
+        default=60.0,
+        gt=0,
+        description="How long idle AI provider connections are kept alive"
+    )
+    ai_request_timeout_seconds: float = Field(
+        default=120.0,
+        gt=0,
+        description="Timeout for a single AI provider request"
+    )
+
+    ai_prompt_max_tokens: int = Field(
+        default=12000,
+        ge=1000,
+        description="Token budget for the per-email part of the analysis prompt (body, history, attachments, ticket data)"
+    )
+    ai_prompt_body_tokens: int = Field(
+        default=4000,
+        ge=100,
+        description="Token cap for the email body before lower priority sections get budget"
+    )
+    ai_prompt_history_tokens: int = Field(
+        default=3000,
+        ge=0,
+        description="Token cap for the conversation history (oldest messages are dropped first)"
+    )
+    ai_prompt_attachment_tokens: int = Field(
+        default=4000,
+        ge=0,
+        description="Token cap for extracted attachment text (shared between attachments)"
+    )
+    ai_fallback_providers: str = Field(
+        default="",
+        description="Failover/hedge providers after the primary, as 'provider:model,provider:model'"
+    )
+    ai_hedging_enabled: bool = Field(
+        default=True,
+        description="Send a second request when the first is slower than the provider's usual latency"
+    )
+    ai_hedge_latency_percentile: float = Field(
+        default=0.9,
+        gt=0.0,
+        lt=1.0,
+        description="Latency percentile of recent calls after which a hedged request is sent"
+    )
+    ai_hedge_min_delay_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        description="Never hedge before this many seconds"
+    )
+    ai_hedge_min_samples: int = Field(
+        default=20,
+        ge=1,
+        description="Latency samples needed before the percentile is used instead of the minimum delay"
+    )
+    ai_triage_enabled: bool = Field(
+        default=True,
+        description="Triage emails with a cheap model first; call the full model only when a draft is needed"
+    )
+    ai_triage_provider: Literal["openai", "anthropic", "gemini"] = Field(
+        default="openai",
+        description="AI provider of the triage model"
+    )
+    ai_triage_model: str = Field(
+        default="gpt-4o-mini",
+        description="Cheap, fast model used for triage"
+    )
+    ai_triage_confidence_threshold: float = Field(
+        default=0.85,
+        ge=0.0,
+        le=1.0,
+        description="Minimum triage confidence to skip the full model for emails that need no draft"
+    )
+    ai_triage_max_body_tokens: int = Field(
+        default=1000,
+        ge=100,
+        description="Token cap for the email body sent to the triage model"
+    )
+    ai_intent_classifier_enabled: bool = Field(
+        default=True,
+        description="Pre-classify emails with the active local intent classifier (no-op until one is trained and activated)"
+    )
+    ai_intent_classifier_threshold: float = Field(
+        default=0.9,
+        ge=0.0,
+        le=1.0,
+        description="Local classifier confidence required to skip or shortcut LLM calls"
+    )
+    ai_intent_classifier_min_precision: float = Field(
+        default=0.97,
+        ge=0.0,
+        le=1.0,
+        description="Held-out precision an intent needs at the threshold before the local classifier may act on it"
+    )
+    ai_intent_classifier_skip_intents: str = Field(
+        default="notification",
+        description="Comma-separated formulaic intents (no draft needed) for which a confident local classification skips the LLM"
+    )
+    ai_intent_classifier_direct_intents: str = Field(
+        default="tracking_inquiry,return_request,transport_damage,complaint",
+        description="Comma-separated intents that always need a draft; a confident local classification skips triage"
+    )
+    ai_intent_classifier_refresh_seconds: int = Field(
+        default=300,
+        ge=10,
+        description="How often workers check for a newly activated classifier version"
+    )
+    ai_response_cache_enabled: bool = Field(
+        default=True,
+        description="Reuse stored AI responses for identical analysis prompts"
+    )
+    ai_response_cache_ttl_hours: float = Field(
+        default=24.0,
+        gt=0,
+        description="How long cached AI responses stay valid"
+    )
+    ai_response_cache_max_entries: int = Field(
+        default=5000,
+        ge=1,
+        description="Maximum cached AI responses (least recently used are evicted)"
+    )
+    ai_prompt_cache_enabled: bool = Field(
+        default=True,
+        description="Mark the static analysis prompt prefix for provider-side caching (Anthropic cache_control)"
+    )
+    ai_image_max_edge_px: int = Field(
+        default=1568,
+        ge=256,
+        description="Long edge (px) vision images are downsized to before upload"
+    )
+    ai_image_max_pixels: int = Field(
+        default=1_150_000,
+        ge=65_536,
+        description="Pixel count cap for vision images (beyond it providers only scale down and bill more)"
+    )
+    ai_image_jpeg_quality: int = Field(
+        default=85,
+        ge=30,
+        le=95,
+        description="JPEG quality used when re-encoding vision images"
+    )
+    ai_image_duplicate_distance: int = Field(
+        default=6,
+        ge=0,
+        le=64,
+        description="Max perceptual hash distance (bits) for an image to count as a near-duplicate of one already attached"
+    )
+    ai_image_cache_max_mb: int = Field(
+        default=64,
+        ge=1,
+        description="In-memory cache size for preprocessed vision images (MB)"
+    )
+    ai_structured_output_enabled: bool = Field(
+        default=True,
+        description="Request analysis results in the provider's native structured-output/JSON mode"
+    )
+    ai_response_repair_enabled: bool = Field(
+        default=True,
+        description="Re-ask only for missing/invalid analysis fields instead of failing the analysis"
+    )
+
+    # Language Detection
+    language_detection_window_chars: int = Field(
+        default=1000,
+        ge=100,
+        description="Characters of cleaned text (newest content first) used for language detection"
+    )
+    language_detection_short_text_chars: int = Field(
+        default=200,
+        ge=0,
+        description="Texts shorter than this on a ticket with a known customer language reuse that language"
+    )
+    language_detection_candidates: str = Field(
+        default="de,en,fr,es,it,nl,pl,pt,sv,da,no,fi,cs,sk,hu,ro",
+        description="Comma-separated language codes the detector chooses from (unsupported ones map to en-US)"
+    )
+
+    # Live Tracking (shared carrier tracking status cache)
+    tracking_cache_default_ttl_minutes: int = Field(
+        default=60,
+        ge=1,
+        description="How long a tracking status is reused for carriers without their own TTL"
+    )
+    tracking_cache_carrier_ttls: str = Field(
+        default="dhl:30,dpd:30,gls:30,hermes:60,ups:60,fedex:60,trans-o-flex:120",
+        description="Per-carrier TTLs in minutes as 'carrier:minutes,...' (matched against the carrier name)"
+    )
+    tracking_cache_final_ttl_hours: int = Field(
+        default=24,
+        ge=1,
+        description="TTL for parcels in a final state (delivered, returned)"
+    )
+    tracking_cache_error_ttl_minutes: int = Field(
+        default=5,
+        ge=1,
+        description="TTL for failed lookups, so an unreachable carrier is not asked on every email"
+    )
+    tracking_lookup_workers: int = Field(
+        default=8,
+        ge=1,
+        description="Carrier lookups run concurrently per process"
+    )
+    live_tracking_budget_seconds: float = Field(
+        default=2.0,
+        ge=0,
+        description="Longest an analysis waits for carrier lookups; slower lookups finish in the background "
+                    "and fill the cache (stale statuses are used meanwhile)"
+    )
+    tracking_lookup_timeout_seconds: float = Field(
+        default=15.0,
+        ge=1,
+        description="Longest the tracking check endpoint waits for a carrier lookup"
+    )
+    tracking_refresh_enabled: bool = Field(
+        default=True,
+        description="Refresh tracking of open tickets in the background (web API process)"
+    )
+    tracking_refresh_interval_minutes: int = Field(
+        default=30,
+        ge=1,
+        description="How often tracking of open tickets is refreshed; statuses expiring before the next "
+                    "run are looked up again so analyses find a warm cache"
+    )
+    tracking_refresh_carrier_rates: str = Field(
+        default="dhl:60,dpd:30,gls:30,hermes:30,ups:30,fedex:30,trans-o-flex:10",
+        description="Background lookups per minute per carrier as 'carrier:per_minute,...' "
+                    "(matched against the carrier name)"
+    )
+    tracking_refresh_default_rate_per_minute: int = Field(
+        default=20,
+        ge=1,
+        description="Background lookups per minute for carriers without their own rate"
+    )
+    tracking_stuck_days: int = Field(
+        default=5,
+        ge=1,
+        description="Flag a parcel as stuck when its status has not changed for this many days"
+    )
+
+    # Phrase Guard (blocked promise phrases in drafts)
+    phrase_guard_refresh_seconds: int = Field(
+        default=60,
+        ge=1,
+        description="How often workers check the blocked phrase table for changes"
+    )
+
+    # Few-shot Message Examples (AIMessageExample retrieval)
+    ai_examples_enabled: bool = Field(
+        default=True,
+        description="Add the most relevant good/bad message examples to analysis prompts"
+    )
+    ai_examples_top_k: int = Field(
+        default=4,
+        ge=0,
+        description="Maximum message examples per analysis"
+    )
+    ai_examples_max_tokens: int = Field(
+        default=800,
+        ge=0,
+        description="Token budget for the message examples of one analysis"
+    )
+    ai_examples_min_score: float = Field(
+        default=0.1,
+        ge=0.0,
+        description="Minimum relevance score (lexical similarity plus scenario boost) for an example to be used"
+    )
+    ai_examples_scenario_boost: float = Field(
+        default=0.3,
+        ge=0.0,
+        description="Score added to examples whose scenario matches the intent predicted by triage/local classifier"
+    )
+    ai_examples_query_chars: int = Field(
+        default=3000,
+        ge=100,
+        description="Characters of the email used to rank examples"
+    )
+    ai_examples_refresh_seconds: int = Field(
+        default=60,
+        ge=1,
+        description="How often workers check the example table for changes"
+    )
+
+    # Conversation Summary (rolling per-ticket history summary)
+    conversation_summary_enabled: bool = Field(
+        default=True,
+        description="Send long ticket conversations as a stored rolling summary plus the newest messages"
+    )
+    conversation_summary_keep_recent: int = Field(
+        default=4,
+        ge=0,
+        description="Newest messages always sent verbatim after the summary"
+    )
+    conversation_summary_fold_min: int = Field(
+        default=4,
+        ge=1,
+        description="Messages beyond the verbatim ones that must pile up before they are folded into the summary"
+    )
+    conversation_summary_message_chars: int = Field(
+        default=1000,
+        ge=100,
+        description="Characters kept of each message sent verbatim or to the summarizer"
+    )
+    conversation_summary_fold_max_tokens: int = Field(
+        default=4000,
+        ge=500,
+        description="Token cap for the messages of one summarization call (larger backlogs take several calls)"
+    )
+
+    # Batch API (non-urgent AI work)
+    ai_batch_backend: Literal["provider", "local"] = Field(
+        default="provider",
+        description="'provider' submits batches to the OpenAI/Anthropic batch APIs (others use the local stand-in); "
+                    "'local' runs batches through the regular low-priority path"
+    )
+    ai_batch_max_requests: int = Field(
+        default=5000,
+        ge=1,
+        description="Maximum requests per submitted batch (larger submissions are split)"
+    )
+    ai_batch_poll_seconds: int = Field(
+        default=300,
+        ge=10,
+        description="How often open batches are polled for completion"
+    )
+    ai_batch_collect_timeout_minutes: int = Field(
+        default=30,
+        ge=1,
+        description="A batch still being collected after this long is assumed abandoned (process died) "
+                    "and returned to 'submitted' so the next poll collects it again"
+    )
+
+    # AI Call Telemetry (per-call latency, tokens and cost)
+    ai_telemetry_enabled: bool = Field(
+        default=True,
+        description="Store one AICallTelemetry row per AI call (analysis calls are linked to their AIDecisionLog)"
+    )
+    ai_telemetry_flush_size: int = Field(
+        default=20,
+        ge=1,
+        description="Write buffered calls that belong to no decision once this many are pending"
+    )
+    ai_telemetry_flush_seconds: float = Field(
+        default=30.0,
+        ge=0,
+        description="Also write buffered calls once this many seconds passed since the last write (checked when calls are recorded)"
+    )
+
+    # Bulk Re-analysis
+    bulk_reanalysis_concurrency: int = Field(
+        default=8,
+        ge=1,
+        description="Tickets analyzed concurrently by a bulk re-analysis job (provider rate limits still apply)"
+    )
+    bulk_reanalysis_ticket_cache_hours: float = Field(
+        default=24.0,
+        ge=0,
+        description="Reuse ticket data fetched from the ticketing API for this long across bulk jobs (0 disables)"
+    )
+    bulk_reanalysis_progress_every: int = Field(
+        default=25,
+        ge=1,
+        description="Publish bulk job progress and check for cancellation every N tickets"
+    )
+
+    # Rate Limiting / Backpressure Configuration
+    rate_limit_enabled: bool = Field(
+        default=True,
+        description="Enable shared per-dependency rate limiting (Gmail, ticketing API, AI providers)"
+    )
+    rate_limit_gmail_per_second: float = Field(
+        default=10.0,
+        gt=0,
+        description="Gmail API requests per second shared across all processes"
+    )
+    rate_limit_ticketing_per_second: float = Field(
+        default=5.0,
+        gt=0,
+        description="Ticketing API requests per second shared across all processes"
+    )
+    rate_limit_ai_per_second: float = Field(
+        default=1.0,
+        gt=0,
+        description="AI provider requests per second (per provider) shared across all processes"
+    )
+    rate_limit_burst_seconds: float = Field(
+        default=5.0,
+        gt=0,
+        description="Bucket capacity expressed in seconds of configured rate (allowed burst)"
+    )
+    rate_limit_max_concurrency: int = Field(
+        default=8,
+        ge=1,
+        description="Upper bound of the adaptive per-process concurrency limit per dependency"
+    )
+    rate_limit_max_wait_seconds: float = Field(
+        default=30.0,
+        ge=0,
+        description="Maximum time a call waits for rate limit capacity before failing"
+    )
+    rate_limit_low_priority_reserve: float = Field(
+        default=0.5,
+        ge=0,
+        lt=1,
+        description="Fraction of each bucket that low-priority (UI-triggered) calls cannot use"
+    )
+
+    # Circuit Breaker Configuration
+    circuit_breaker_enabled: bool = Field(
+        default=True,
+        description="Enable circuit breakers around the ticketing API and AI providers"
+    )
+    circuit_breaker_failure_threshold: int = Field(
+        default=5,
+        ge=1,
+        description="Consecutive failures before a circuit opens"
+    )
+    circuit_breaker_recovery_seconds: float = Field(
+        default=60.0,
+        gt=0,
+        description="Seconds a circuit stays open before a half-open probe"
+    )
+    circuit_breaker_max_recovery_seconds: float = Field(
+        default=900.0,
+        gt=0,
+        description="Upper bound for the exponentially backed-off open duration"
+    )
+    circuit_breaker_half_open_max_calls: int = Field(
+        default=1,
+        ge=1,
+        description="Concurrent probe calls allowed while a circuit is half-open"
+    )
+
     @field_validator('default_owner_id', 'supplier_reminder_hours', 'ai_max_tokens', 'email_poll_interval_seconds', 'gmail_max_results', 'gmail_lookback_minutes', mode='before')
     @classmethod
     def validate_integers(cls, v: Union[str, int]) -> int:
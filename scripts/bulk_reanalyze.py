@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Re-analyze a selection of tickets offline, e.g. to evaluate a new prompt version
+Creates a bulk re-analysis job (or resumes one) and prints its progress/cost report;
+results are stored per job, no messages are created and tickets are not updated
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.database.models import init_database, BulkReanalysisJob, PromptVersion
+from src.ai.bulk_reanalysis import BulkReanalysisRunner, cancel_job, create_job, job_report, select_tickets
+
+
+def print_report(report: dict) -> None:
+    progress, cost, outcome = report['progress'], report['cost'], report['outcome']
+    print(f"Job {report['job_id']}{' (' + report['name'] + ')' if report['name'] else ''}: {report['status']}"
+          f"{' - ' + report['error_message'] if report['error_message'] else ''}")
+    print(f"  Prompt version ID: {report['prompt_version_id'] or 'current'}{', batch mode' if report['batch_mode'] else ''}")
+    print(f"  Progress: {progress['analyzed']}/{progress['total']} analyzed, {progress['failed']} failed, "
+          f"{progress['remaining']} remaining ({progress['percent']}%)")
+    print(f"  Throughput: {progress['tickets_per_minute']} tickets/min"
+          f"{', ETA ' + str(progress['eta_seconds']) + 's' if progress['eta_seconds'] else ''}")
+    print(f"  Tokens: {cost['input_tokens']} in ({cost['cached_input_tokens']} cached), {cost['output_tokens']} out")
+    print(f"  Cost: ${cost['cost_usd']} (${cost['cost_per_ticket_usd']}/ticket, projected ${cost['projected_total_usd']})")
+    print(f"  Intents: {outcome['intents']}")
+    print(f"  Tiers: {outcome['tiers']}, escalation rate: {outcome['escalation_rate']}")
+    print(f"  Intent changed: {outcome['intent_changed']}/{outcome['compared_with_previous']}")
+    print(f"  Agreement with confirmed decisions: {outcome['agreement_with_confirmed']} "
+          f"({outcome['confirmed_decisions']}), changed on rejected: {outcome['changed_on_rejected']} "
+          f"({outcome['rejected_decisions']})")
+
+
+def show(report: dict, as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk re-analysis of tickets (prompt evaluation, backlogs)")
+    parser.add_argument('--status', action='append', default=[], help="Ticket current_state (repeatable)")
+    parser.add_argument('--created-from', help="Tickets created on/after this ISO date")
+    parser.add_argument('--created-to', help="Tickets created before this ISO date")
+    parser.add_argument('--intent', action='append', default=[], help="Intent of the latest decision (repeatable)")
+    parser.add_argument('--feedback', action='append', default=[],
+                        help="Feedback of the latest decision: correct, incorrect, partially_correct, none (repeatable)")
+    parser.add_argument('--ticket', action='append', default=[], help="Ticket number (repeatable)")
+    parser.add_argument('--limit', type=int, default=None, help="Only the N most recent matching tickets")
+    parser.add_argument('--prompt-version', type=int, default=None, metavar='VERSION',
+                        help="Prompt version number to evaluate (default: current prompt)")
+    parser.add_argument('--name', help="Job name")
+    parser.add_argument('--concurrency', type=int, default=None, help="Tickets analyzed at once")
+    parser.add_argument('--batch', action='store_true',
+                        help="Submit through the provider batch API (results are stored by the API's batch poller)")
+    parser.add_argument('--dry-run', action='store_true', help="Only count the matching tickets")
+    parser.add_argument('--resume', type=int, default=None, metavar='JOB_ID', help="Resume a job")
+    parser.add_argument('--cancel', type=int, default=None, metavar='JOB_ID', help="Cancel a running job")
+    parser.add_argument('--report', type=int, default=None, metavar='JOB_ID', help="Print a job report and exit")
+    parser.add_argument('--list', action='store_true', help="List jobs and exit")
+    parser.add_argument('--json', action='store_true', help="Print reports as JSON")
+    args = parser.parse_args()
+
+    SessionMaker = init_database()
+    db = SessionMaker()
+    try:
+        if args.list:
+            for job in db.query(BulkReanalysisJob).order_by(BulkReanalysisJob.created_at).all():
+                print_report(job_report(db, job.id))
+            return 0
+
+        if args.report is not None or args.cancel is not None:
+            if args.cancel is not None and not cancel_job(db, args.cancel):
+                print(f"Job {args.cancel} is not pending or running")
+                return 1
+            report = job_report(db, args.report if args.report is not None else args.cancel)
+            show(report, args.json)
+            return 0
+
+        job_id = args.resume
+        if job_id is None:
+            filters = {
+                'statuses': args.status,
+                'created_from': args.created_from,
+                'created_to': args.created_to,
+                'intents': args.intent,
+                'feedback': args.feedback,
+                'ticket_numbers': args.ticket,
+                'limit': args.limit,
+            }
+            filters = {key: value for key, value in filters.items() if value}
+            if args.dry_run:
+                print(f"{len(select_tickets(db, filters))} tickets match")
+                return 0
+
+            prompt_version_id = None
+            if args.prompt_version is not None:
+                version = db.query(PromptVersion).filter(PromptVersion.version_number == args.prompt_version).first()
+                if not version:
+                    print(f"Prompt version {args.prompt_version} not found")
+                    return 1
+                prompt_version_id = version.id
+
+            job = create_job(db, filters, prompt_version_id, args.name, created_by='cli', batch_mode=args.batch)
+            job_id = job.id
+            print(f"Created job {job_id} over {job.total_tickets} tickets")
+    finally:
+        db.close()
+
+    runner = BulkReanalysisRunner(SessionMaker, concurrency=args.concurrency)
+    try:
+        report = asyncio.run(runner.run(job_id))
+    except ValueError as e:
+        print(str(e))
+        return 1
+    show(report, args.json)
+    if report['batch_mode'] and report['status'] == 'running':
+        print(f"Batch submitted; check progress with --report {job_id}")
+        return 0
+    return 0 if report['status'] == 'completed' else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
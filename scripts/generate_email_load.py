@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic support email load
+Writes a reproducible corpus (.eml directory, mbox or JSON lines) or delivers it
+to the orchestrator's polling loop at a configurable rate for backpressure testing
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.email.load_generator import EmailLoadGenerator, DEFAULT_MIX
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic multilingual support email load")
+    parser.add_argument('--count', type=int, default=100, help="Number of emails to generate")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible corpora")
+    parser.add_argument('--mix', type=str, default=None,
+                        help=f"Traffic mix as kind=weight pairs (kinds: {', '.join(DEFAULT_MIX)})")
+    parser.add_argument('--format', choices=['eml', 'mbox', 'jsonl', 'orchestrator'], default='eml',
+                        help="Output format, or 'orchestrator' to poll the emails through the orchestrator")
+    parser.add_argument('--output', type=str, default='data/loadgen', help="Output directory or file")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="Emails per second when feeding the orchestrator (default: unthrottled)")
+    parser.add_argument('--attachment-rate', type=float, default=0.2, help="Probability of attachments")
+    parser.add_argument('--quoted-thread-rate', type=float, default=0.4, help="Probability of quoted threads")
+    args = parser.parse_args()
+
+    # Directory outputs keep attachments inside; file outputs keep them next to the file
+    if args.format == 'mbox':
+        attachments_dir = 'attachments/loadgen'
+    elif args.format == 'jsonl':
+        attachments_dir = str(Path(args.output).parent / 'attachments')
+    else:
+        attachments_dir = str(Path(args.output) / 'attachments')
+
+    generator = EmailLoadGenerator(
+        mix=EmailLoadGenerator.parse_mix(args.mix) if args.mix else None,
+        seed=args.seed,
+        attachments_dir=attachments_dir,
+        attachment_rate=args.attachment_rate,
+        quoted_thread_rate=args.quoted_thread_rate
+    )
+
+    print(f"Seed: {generator.seed}")
+
+    if args.format == 'eml':
+        paths = generator.write_eml_directory(args.output, args.count)
+        print(f"✅ Wrote {len(paths)} .eml files to {args.output}")
+    elif args.format == 'mbox':
+        generator.write_mbox(args.output, args.count)
+        print(f"✅ Wrote {args.count} messages to {args.output}")
+    elif args.format == 'jsonl':
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            for email_data in generator.generate_batch(args.count):
+                f.write(json.dumps(email_data, default=str, ensure_ascii=False) + '\n')
+        print(f"✅ Wrote {args.count} emails to {output}")
+    else:
+        from src.orchestrator import SupportAgentOrchestrator
+        from src.email.email_source import InMemoryEmailSource
+        # In-memory source so no Gmail authentication is needed
+        orchestrator = SupportAgentOrchestrator(email_source=InMemoryEmailSource())
+        stats = generator.feed_orchestrator(orchestrator, args.count, args.rate)
+        print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
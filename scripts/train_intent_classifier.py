@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Train the local intent classifier from the AI decision log
+Stores a new classifier version with its held-out accuracy; optionally
+activates it (or an earlier version) for AIEngine pre-classification
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.database.models import init_database, IntentClassifierVersion
+from src.ai.intent_classifier import DEFAULT_NUM_FEATURES, train_and_store
+
+
+def print_version(version: IntentClassifierVersion) -> None:
+    metrics = version.metrics or {}
+    print(f"Version {version.version_number}{' (active)' if version.is_active else ''}")
+    print(f"  Trained on: {version.trained_on} decisions, held out: {version.holdout_size}")
+    print(f"  Held-out accuracy: {version.holdout_accuracy}")
+    print(f"  Coverage at threshold {metrics.get('threshold')}: {metrics.get('coverage_at_threshold')} "
+          f"(accuracy {metrics.get('accuracy_at_threshold')})")
+    for intent, stats in sorted((metrics.get('per_intent') or {}).items()):
+        print(f"    {intent:<20} support={stats['support']:<5} recall={stats['recall']} "
+              f"precision@threshold={stats['precision_at_threshold']} ({stats['confident_predictions']} confident)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from AIDecisionLog")
+    parser.add_argument('--holdout', type=float, default=0.3,
+                        help="Share of decisions with 'correct' feedback held out for evaluation")
+    parser.add_argument('--epochs', type=int, default=10, help="Training epochs")
+    parser.add_argument('--features', type=int, default=DEFAULT_NUM_FEATURES, help="Hashing space size")
+    parser.add_argument('--activate-min-accuracy', type=float, default=None,
+                        help="Activate the new version if its held-out accuracy reaches this")
+    parser.add_argument('--activate', type=int, default=None, metavar='VERSION',
+                        help="Only activate an existing version (0 deactivates the classifier)")
+    parser.add_argument('--list', action='store_true', help="List stored versions and exit")
+    parser.add_argument('--json', action='store_true', help="Print metrics as JSON")
+    args = parser.parse_args()
+
+    SessionMaker = init_database()
+    db = SessionMaker()
+    try:
+        if args.list:
+            for version in db.query(IntentClassifierVersion).order_by(IntentClassifierVersion.version_number).all():
+                print_version(version)
+            return 0
+
+        if args.activate is not None:
+            db.query(IntentClassifierVersion).update({'is_active': False})
+            if args.activate:
+                version = db.query(IntentClassifierVersion).filter(
+                    IntentClassifierVersion.version_number == args.activate
+                ).first()
+                if not version:
+                    print(f"Version {args.activate} not found")
+                    return 1
+                version.is_active = True
+            db.commit()
+            print(f"Active version: {args.activate or 'none'}")
+            return 0
+
+        try:
+            version = train_and_store(
+                db,
+                holdout_fraction=args.holdout,
+                num_features=args.features,
+                epochs=args.epochs,
+                activate_min_accuracy=args.activate_min_accuracy,
+                created_by='train_intent_classifier'
+            )
+        except ValueError as e:
+            print(f"Training failed: {e}")
+            return 1
+
+        if args.json:
+            print(json.dumps({'version': version.version_number, 'active': version.is_active, **version.metrics}, indent=2))
+        else:
+            print_version(version)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,22 +3,201 @@ AI Decision Engine
 Core AI logic for analyzing support tickets and generating responses
 Supports multiple AI providers (OpenAI, Anthropic, Gemini)
 """
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from abc import ABC, abstractmethod
+import asyncio
 import json
+import threading
+import time
 import structlog
 
 from config.settings import settings
+from .image_preprocessor import prepare_images
 from .language_detector import LanguageDetector
+from .prompt_budget import PromptBudget, count_tokens, format_attachment_texts, serialize_history
+from .response_cache import AIResponseCache, fingerprint
+from .example_index import example_index, format_examples
+from .prompt_registry import prompt_registry
+from .provider_router import ProviderRouter, parse_fallback_providers
+from .analysis_schema import (
+    ANALYSIS_SCHEMA, REQUIRED_FIELDS, SCHEMA_NAME, build_repair_prompt, extract_json_object, merge_repair,
+    repair_schema, validate_analysis
+)
+from .triage import (
+    TRIAGE, FULL, LOCAL, TRIAGE_INSTRUCTIONS, build_triage_prompt, parse_triage_response, triage_is_final, cascade_stats
+)
+from src.utils.circuit_breaker import CircuitOpenError, get_breaker
+from .provider_clients import (
+    get_openai_client, get_anthropic_client, provider_slot, async_provider_slot, record_usage, pop_last_usage,
+    set_last_usage, combine_usage, peek_last_usage
+)
+from .telemetry import collect_calls, record_analysis_calls, record_cache_hit, record_call
 
 logger = structlog.get_logger(__name__)
 
 
+# Static analysis instructions. Sent after the system prompt as one stable prefix
+# (identical on every call), so it must not contain per-email values.
+ANALYSIS_INSTRUCTIONS = """You are an expert customer support AI assistant for a dropshipping company. You analyze customer emails together with their ticket context and provide a structured response.
+
+Task: Analyze this ticket conversation step by step and provide your response.
+
+UNDERSTANDING THE CONVERSATION HISTORY:
+The conversation history in the ticket context shows the complete ticket history with clear labels:
+- [MESSAGE FROM CUSTOMER]: What the customer sent to us
+- [OUR RESPONSE TO CUSTOMER]: What we already told the customer
+- [OUR MESSAGE TO SUPPLIER]: What we asked the supplier
+- [SUPPLIER'S RESPONSE]: What the supplier told us
+- [INTERNAL NOTE]: Our internal notes
+
+Each message includes a timestamp. Read the entire conversation chronologically to understand the context.
+On long tickets the history starts with "conversation_summary" (the earlier messages, up to "covers_until");
+the threads then only hold the messages after it. Treat the summary's facts and open_items as part of the conversation.
+
+STEP 1: SITUATION ANALYSIS
+Before deciding on an action, answer these questions:
+
+1. What is the customer's main concern or request?
+2. What have we already communicated to the customer? (Look for [OUR RESPONSE TO CUSTOMER])
+3. What information have we received from the supplier? (Look for [SUPPLIER'S RESPONSE])
+4. What are we currently waiting for? (Check pending requests/promises)
+5. Are we about to contradict something we already told the customer?
+6. Are we about to ask the supplier for information they already provided?
+
+STEP 2: DETERMINE NEXT ACTION
+Based on your analysis:
+- What is the logical next step?
+- Do we have enough information to help the customer, or do we need more from the supplier?
+- Should this be escalated to a human?
+
+STEP 3: PROVIDE STRUCTURED RESPONSE
+Now provide your response in the following JSON format:
+
+{
+  "intent": "one of: tracking_inquiry, return_request, price_question, general_info, tech_support, complaint, transport_damage, other",
+  "ticket_type_id": integer (1=Return, 2=Tracking, 3=Price, 4=GeneralInfo, 5=TechSupport, 6=SupportEnquiry, 7=TransportDamage, 0=Unknown),
+  "confidence": float between 0.0 and 1.0,
+  "requires_escalation": boolean (true if complex, legal issue, very angry customer, or uncertain),
+  "escalation_reason": "string explaining why escalation is needed, or null",
+  "summary": "brief summary of the issue and action taken",
+  "reasoning": {
+    "customer_main_concern": "brief description",
+    "what_we_told_customer": "summary or null if first contact",
+    "what_supplier_told_us": "summary or null if no supplier communication",
+    "pending_items": "what we're waiting for or null",
+    "contradiction_check": "any contradictions detected? true/false",
+    "logical_next_step": "description of next action"
+  },
+  "customer_response": "the email response to send to the customer in their language (almost always generate this - see rules below), or null only if truly not appropriate",
+  "supplier_action": {
+    "action": "request_tracking / request_return / notify_issue / null",
+    "message": "email to send to supplier in their language"
+  } or null (only generate when supplier contact is actually needed - see rules below),
+  "conversation_updates": {
+    "customer_summary": "updated summary of customer conversation state",
+    "supplier_summary": "updated summary of supplier conversation state",
+    "customer_promises": "what we promised the customer (if any)",
+    "supplier_requests": "what we're waiting for from supplier (if any)"
+  }
+}
+
+CRITICAL: WHEN TO GENERATE EACH MESSAGE TYPE
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+CUSTOMER RESPONSE ("customer_response"):
+Generate in these cases:
+✅ Customer asks a question → Answer it
+✅ Customer reports an issue → Acknowledge and explain next steps
+✅ Customer says "thank you" or similar → Respond politely:
+   German: "Gerne! Wir stehen Ihnen jederzeit zur Verfügung."
+   French: "Avec plaisir ! Nous restons à votre disposition."
+   English: "You're welcome! We're always at your service."
+✅ Customer provides information we requested → Acknowledge receipt
+✅ We have new information to share (e.g., supplier responded) → Update customer
+✅ First contact from customer → Acknowledge and explain what we're doing
+
+IMPORTANT: Amazon requires responses within 24 hours, so respond to almost every customer message.
+
+Set to null ONLY in these rare cases:
+❌ We're escalating to human AND no immediate acknowledgment is appropriate
+❌ Message is spam or completely unrelated to the ticket
+
+SUPPLIER ACTION ("supplier_action"):
+Generate ONLY when we need something from the supplier:
+✅ Need tracking information → Request tracking
+✅ Need return authorization → Request RMA
+✅ Need to report customer complaint/damage → Notify supplier
+✅ Need order status update → Request status
+✅ Need to cancel/modify order → Request change
+
+Set to null in these cases:
+❌ Just acknowledging customer's thank you → No supplier action needed
+❌ Already waiting for supplier response → Don't send duplicate requests
+❌ Supplier already provided the information → No new request needed
+❌ Customer inquiry can be answered without supplier → No supplier contact needed
+❌ Just forwarding supplier's response to customer → No new supplier action
+
+INTERNAL NOTE:
+Always generated automatically for logging purposes.
+
+CRITICAL LANGUAGE RULES:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+RULE 1: STRICT LANGUAGE CONSISTENCY
+- Customer messages: MUST be in the customer communication language ONLY
+- Supplier messages: MUST be in the supplier communication language ONLY
+- NEVER MIX LANGUAGES within the same message
+- NEVER use English for German/French customers
+- NEVER use German/French for English suppliers
+
+RULE 2: MANDATORY SIGNATURES (Copy these EXACTLY)
+For German messages: "Mit freundlichen Grüßen,\\nIhr Papersmart Team"
+For French messages: "Cordialement,\\nVotre équipe Papersmart"
+For English messages: "Best regards,\\nThe Papersmart Team"
+
+RULE 3: NEVER MAKE PROMISES
+DO NOT write phrases like:
+❌ "sobald wir eine Sendungsbestätigung haben, werden wir Sie informieren"
+❌ "we will update you as soon as we hear back"
+❌ "nous vous informerons dès que possible"
+❌ "wir werden uns bald bei Ihnen melden"
+
+Instead, state facts:
+✅ "Wir haben den Lieferanten kontaktiert"
+✅ "We have contacted the supplier"
+✅ "Nous avons contacté le fournisseur"
+
+RULE 4: LANGUAGE DECLARATION
+Your JSON response MUST include "customer_response_language" and "supplier_message_language"
+set to the languages given in the LANGUAGE REQUIREMENTS section.
+
+Guidelines:
+1. Respond in the SAME language as the customer email (customer communication language)
+2. Be polite, professional, and helpful
+3. NEVER contradict what we already told the customer
+4. NEVER ask supplier for information they already provided
+5. For tracking inquiries: Request tracking from supplier or provide tracking if available in ticket data
+6. For returns: Provide return instructions and request return authorization from supplier if needed
+7. For complaints or damage: Apologize, gather details, escalate if needed
+8. If uncertain or complex issue: Set requires_escalation to true
+9. Reference order numbers and ticket numbers in responses
+10. Keep customer responses concise but complete
+11. CRITICAL: When a Purchase Order Number (PO#) is provided in "Existing Ticket Information", you MUST use it exactly as shown
+12. NEVER make up, guess, or hallucinate PO numbers - only use the PO number provided in "Existing Ticket Information"
+13. If you need to reference a PO number but none is provided, set requires_escalation to true
+
+Provide ONLY the JSON response, no additional text.
+"""
+
+
 class AIProvider(ABC):
     """Abstract base class for AI providers"""
 
+    # Provider name used for shared clients and concurrency limits
+    name = 'base'
+
     @abstractmethod
-    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None) -> str:
+    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate a response from the AI model
 
@@ -33,194 +212,467 @@ class AIProvider(ABC):
         """
         pass
 
+    async def agenerate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Async variant of generate_response
+
+        Providers with a native async client override this; the default runs
+        the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.generate_response, prompt, temperature=temperature, system_text=system_text, images=images,
+            response_schema=response_schema
+        )
+
+    async def astream_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Stream the response text in chunks as it is generated
+
+        Providers without streaming support yield the complete response once.
+        """
+        yield await self.agenerate_response(prompt, temperature=temperature, system_text=system_text, images=images,
+                                            response_schema=response_schema)
+
 
 class OpenAIProvider(AIProvider):
     """OpenAI API provider (GPT-4, etc.)"""
 
+    name = 'openai'
+
     def __init__(self, api_key: str, model: str):
-        import openai
-        self.client = openai.OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.client = get_openai_client(api_key)
         self.model = model
 
-    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None) -> str:
-        try:
-            import base64
-
-            # Determine which token parameter to use based on model
-            model_lower = self.model.lower()
-            is_reasoning_model = 'o1' in model_lower or 'gpt-5' in model_lower
-            # GPT-4o models also use max_completion_tokens
-            uses_completion_tokens = is_reasoning_model or 'gpt-4o' in model_lower or 'chatgpt-4o' in model_lower
-
-            messages = []
-
-            # O1 and gpt-5 reasoning models don't support system messages
-            # Prepend system instructions to user message instead
-            if is_reasoning_model and system_text:
-                combined_prompt = f"{system_text}\n\n{prompt}"
-                messages.append({"role": "user", "content": combined_prompt})
-                logger.info("Combining system and user prompts for reasoning model", model=self.model)
-            else:
-                if system_text:
-                    messages.append({"role": "system", "content": system_text})
-
-                # Build user message content - text + images if provided
-                if images and len(images) > 0:
-                    # Multi-modal message with text and images
-                    content_parts = [{"type": "text", "text": prompt}]
-
-                    for image_path in images:
-                        try:
-                            with open(image_path, 'rb') as img_file:
-                                image_data = base64.b64encode(img_file.read()).decode('utf-8')
-                                # Determine image format from extension
-                                ext = image_path.lower().split('.')[-1]
-                                mime_type = f"image/{ext}" if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp'] else "image/jpeg"
-
-                                content_parts.append({
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:{mime_type};base64,{image_data}"
-                                    }
-                                })
-                                logger.info("Added image to prompt", image_path=image_path)
-                        except Exception as e:
-                            logger.warning("Failed to load image", image_path=image_path, error=str(e))
-
-                    messages.append({"role": "user", "content": content_parts})
-                    logger.info("Using vision-enabled prompt", image_count=len(images))
-                else:
-                    # Text-only message
-                    messages.append({"role": "user", "content": prompt})
-
-            kwargs = {
-                "model": self.model,
-                "messages": messages,
-            }
+    def _build_request(self, prompt: str, temperature: float, system_text: Optional[str], images: Optional[list],
+                       response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build chat completion kwargs (shared by sync and async calls)"""
+        # Determine which token parameter to use based on model
+        model_lower = self.model.lower()
+        is_reasoning_model = 'o1' in model_lower or 'gpt-5' in model_lower
+        # GPT-4o models also use max_completion_tokens
+        uses_completion_tokens = is_reasoning_model or 'gpt-4o' in model_lower or 'chatgpt-4o' in model_lower
+
+        messages = []
+
+        # O1 and gpt-5 reasoning models don't support system messages
+        # Prepend system instructions to user message instead
+        if is_reasoning_model and system_text:
+            combined_prompt = f"{system_text}\n\n{prompt}"
+            messages.append({"role": "user", "content": combined_prompt})
+            logger.info("Combining system and user prompts for reasoning model", model=self.model)
+        else:
+            if system_text:
+                messages.append({"role": "system", "content": system_text})
+
+            # Build user message content - text + images if provided
+            prepared_images = prepare_images(images)
+            if prepared_images:
+                # Multi-modal message with text and images
+                content_parts = [{"type": "text", "text": prompt}]
 
-            # O1 and gpt-5 reasoning models only support temperature=1
-            if is_reasoning_model:
-                # Don't set temperature for reasoning models (defaults to 1)
-                kwargs["max_completion_tokens"] = settings.ai_max_tokens
-                logger.info("Using reasoning model parameters", model=self.model, max_completion_tokens=settings.ai_max_tokens, note="temperature defaults to 1, no system role")
-            elif uses_completion_tokens:
-                # GPT-4o models use max_completion_tokens but support temperature and system messages
-                kwargs["temperature"] = temperature
-                kwargs["max_completion_tokens"] = settings.ai_max_tokens
-                logger.info("Using GPT-4o model parameters", model=self.model, temperature=temperature, max_completion_tokens=settings.ai_max_tokens)
+                for image in prepared_images:
+                    content_parts.append({
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{image['mime_type']};base64,{image['base64']}"
+                        }
+                    })
+
+                messages.append({"role": "user", "content": content_parts})
+                logger.info("Using vision-enabled prompt", image_count=len(prepared_images))
             else:
-                kwargs["temperature"] = temperature
-                kwargs["max_tokens"] = settings.ai_max_tokens
-                logger.info("Using standard model parameters", model=self.model, temperature=temperature, max_tokens=settings.ai_max_tokens)
+                # Text-only message
+                messages.append({"role": "user", "content": prompt})
+
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+        }
+
+        # O1 and gpt-5 reasoning models only support temperature=1
+        if is_reasoning_model:
+            # Don't set temperature for reasoning models (defaults to 1)
+            kwargs["max_completion_tokens"] = settings.ai_max_tokens
+            logger.info("Using reasoning model parameters", model=self.model, max_completion_tokens=settings.ai_max_tokens, note="temperature defaults to 1, no system role")
+        elif uses_completion_tokens:
+            # GPT-4o models use max_completion_tokens but support temperature and system messages
+            kwargs["temperature"] = temperature
+            kwargs["max_completion_tokens"] = settings.ai_max_tokens
+            logger.info("Using GPT-4o model parameters", model=self.model, temperature=temperature, max_completion_tokens=settings.ai_max_tokens)
+        else:
+            kwargs["temperature"] = temperature
+            kwargs["max_tokens"] = settings.ai_max_tokens
+            logger.info("Using standard model parameters", model=self.model, temperature=temperature, max_tokens=settings.ai_max_tokens)
+
+        if response_schema and settings.ai_structured_output_enabled:
+            response_format = self._response_format(response_schema)
+            if response_format:
+                kwargs["response_format"] = response_format
+
+        return kwargs
+
+    def _response_format(self, response_schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Native structured output for the model (json_schema where supported, else JSON mode)"""
+        model_lower = self.model.lower()
+        if 'o1-mini' in model_lower or 'o1-preview' in model_lower:
+            return None
+        if any(family in model_lower for family in ('gpt-4o', 'gpt-4.1', 'gpt-5', 'o1', 'o3', 'o4')):
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": SCHEMA_NAME, "schema": response_schema, "strict": True}
+            }
+        return {"type": "json_object"}
+
+    def _extract_content(self, response: Any) -> str:
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            record_usage(
+                self.name, self.model,
+                input_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+                output_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+                cached_input_tokens=(getattr(details, 'cached_tokens', 0) or 0) if details else 0
+            )
+        content = response.choices[0].message.content
+        logger.info("Received OpenAI response", model=self.model, response_length=len(content) if content else 0, response_preview=content[:200] if content else "EMPTY")
+        return content
 
+    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            kwargs = self._build_request(prompt, temperature, system_text, images, response_schema)
             logger.debug("Calling OpenAI API", model=self.model, kwargs=kwargs)
-            response = self.client.chat.completions.create(**kwargs)
-            content = response.choices[0].message.content
-            logger.info("Received OpenAI response", model=self.model, response_length=len(content) if content else 0, response_preview=content[:200] if content else "EMPTY")
-            return content
+            with provider_slot(self.name):
+                response = self.client.chat.completions.create(**kwargs)
+            return self._extract_content(response)
         except Exception as e:
             logger.error("OpenAI API error", error=str(e))
             raise
 
+    async def agenerate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            kwargs = self._build_request(prompt, temperature, system_text, images, response_schema)
+            logger.debug("Calling OpenAI API (async)", model=self.model, kwargs=kwargs)
+            client = get_openai_client(self.api_key, async_client=True)
+            async with async_provider_slot(self.name):
+                response = await client.chat.completions.create(**kwargs)
+            return self._extract_content(response)
+        except Exception as e:
+            logger.error("OpenAI API error", error=str(e))
+            raise
+
+    async def astream_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        kwargs = self._build_request(prompt, temperature, system_text, images, response_schema)
+        kwargs["stream"] = True
+        kwargs["stream_options"] = {"include_usage": True}
+        client = get_openai_client(self.api_key, async_client=True)
+        try:
+            async with async_provider_slot(self.name):
+                stream = await client.chat.completions.create(**kwargs)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    usage = getattr(chunk, 'usage', None)
+                    if usage is not None:
+                        details = getattr(usage, 'prompt_tokens_details', None)
+                        record_usage(
+                            self.name, self.model,
+                            input_tokens=usage.prompt_tokens or 0,
+                            output_tokens=usage.completion_tokens or 0,
+                            cached_input_tokens=(getattr(details, 'cached_tokens', 0) or 0) if details else 0
+                        )
+        except Exception as e:
+            logger.error("OpenAI streaming error", error=str(e))
+            raise
+
 
 class AnthropicProvider(AIProvider):
     """Anthropic API provider (Claude)"""
 
+    name = 'anthropic'
+
     def __init__(self, api_key: str, model: str):
-        import anthropic
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.api_key = api_key
+        self.client = get_anthropic_client(api_key)
         self.model = model
 
-    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None) -> str:
-        try:
-            import base64
-
-            # Build message content - text + images if provided
-            if images and len(images) > 0:
-                content_parts = [{"type": "text", "text": prompt}]
-
-                for image_path in images:
-                    try:
-                        with open(image_path, 'rb') as img_file:
-                            image_data = base64.standard_b64encode(img_file.read()).decode('utf-8')
-                            # Determine media type from extension
-                            ext = image_path.lower().split('.')[-1]
-                            media_type = f"image/{ext}" if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp'] else "image/jpeg"
-
-                            content_parts.append({
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": media_type,
-                                    "data": image_data
-                                }
-                            })
-                            logger.info("Added image to Claude prompt", image_path=image_path)
-                    except Exception as e:
-                        logger.warning("Failed to load image for Claude", image_path=image_path, error=str(e))
-
-                message_content = content_parts
-                logger.info("Using vision-enabled Claude prompt", image_count=len(images))
+    def _build_request(self, prompt: str, temperature: float, system_text: Optional[str], images: Optional[list],
+                       response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build messages.create kwargs (shared by sync and async calls)"""
+        # Build message content - text + images if provided
+        prepared_images = prepare_images(images)
+        if prepared_images:
+            content_parts = [{"type": "text", "text": prompt}]
+
+            for image in prepared_images:
+                content_parts.append({
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": image['mime_type'],
+                        "data": image['base64']
+                    }
+                })
+
+            message_content = content_parts
+            logger.info("Using vision-enabled Claude prompt", image_count=len(prepared_images))
+        else:
+            message_content = prompt
+
+        kwargs = {
+            "model": self.model,
+            "max_tokens": settings.ai_max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": message_content}],
+        }
+        if system_text:
+            if settings.ai_prompt_cache_enabled:
+                # Mark the system text as a cache breakpoint; the prefix up to it is reused across calls
+                kwargs["system"] = [{"type": "text", "text": system_text, "cache_control": {"type": "ephemeral"}}]
             else:
-                message_content = prompt
-
-            kwargs = {
-                "model": self.model,
-                "max_tokens": settings.ai_max_tokens,
-                "temperature": temperature,
-                "messages": [{"role": "user", "content": message_content}],
-            }
-            if system_text:
                 kwargs["system"] = system_text
-            response = self.client.messages.create(**kwargs)
-            return response.content[0].text
+        if response_schema and settings.ai_structured_output_enabled:
+            # Structured output via a forced tool call; its input is the JSON result
+            kwargs["tools"] = [{
+                "name": SCHEMA_NAME,
+                "description": "Record the structured result",
+                "input_schema": response_schema
+            }]
+            kwargs["tool_choice"] = {"type": "tool", "name": SCHEMA_NAME}
+        return kwargs
+
+    def _extract_content(self, response: Any) -> str:
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+            cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+            record_usage(
+                self.name, self.model,
+                # input_tokens excludes cached tokens for Anthropic; report the full prompt size
+                input_tokens=(getattr(usage, 'input_tokens', 0) or 0) + cache_read + cache_write,
+                output_tokens=getattr(usage, 'output_tokens', 0) or 0,
+                cached_input_tokens=cache_read,
+                cache_write_tokens=cache_write
+            )
+        for block in response.content:
+            if getattr(block, 'type', None) == 'tool_use':
+                return json.dumps(block.input, ensure_ascii=False)
+        return ''.join(block.text for block in response.content if getattr(block, 'type', None) == 'text')
+
+    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            kwargs = self._build_request(prompt, temperature, system_text, images, response_schema)
+            with provider_slot(self.name):
+                response = self.client.messages.create(**kwargs)
+            return self._extract_content(response)
+        except Exception as e:
+            logger.error("Anthropic API error", error=str(e))
+            raise
+
+    async def agenerate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            kwargs = self._build_request(prompt, temperature, system_text, images, response_schema)
+            client = get_anthropic_client(self.api_key, async_client=True)
+            async with async_provider_slot(self.name):
+                response = await client.messages.create(**kwargs)
+            return self._extract_content(response)
         except Exception as e:
             logger.error("Anthropic API error", error=str(e))
             raise
 
+    async def astream_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        kwargs = self._build_request(prompt, temperature, system_text, images, response_schema)
+        client = get_anthropic_client(self.api_key, async_client=True)
+        try:
+            async with async_provider_slot(self.name):
+                async with client.messages.stream(**kwargs) as stream:
+                    async for event in stream:
+                        if event.type == 'text':
+                            yield event.text
+                        elif event.type == 'input_json':
+                            # Forced tool call: the tool input is the JSON result
+                            yield event.partial_json
+                    # Records usage
+                    self._extract_content(await stream.get_final_message())
+        except Exception as e:
+            logger.error("Anthropic streaming error", error=str(e))
+            raise
+
 
 class GeminiProvider(AIProvider):
     """Google Gemini API provider"""
 
+    name = 'gemini'
+
     def __init__(self, api_key: str, model: str):
         import google.generativeai as genai
         genai.configure(api_key=api_key)
+        self.model_name = model
         self.model = genai.GenerativeModel(model)
 
-    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None) -> str:
-        try:
-            from PIL import Image as PILImage
+    def _build_content(self, prompt: str, system_text: Optional[str], images: Optional[list]) -> Any:
+        """Build generate_content input (shared by sync and async calls)"""
+        # Build content - text + images if provided
+        text_content = prompt if not system_text else f"SYSTEM:\n{system_text}\n\n{prompt}"
 
-            # Build content - text + images if provided
-            text_content = prompt if not system_text else f"SYSTEM:\n{system_text}\n\n{prompt}"
+        prepared_images = prepare_images(images)
+        if prepared_images:
+            content_parts = [text_content]
 
-            if images and len(images) > 0:
-                content_parts = [text_content]
+            for image in prepared_images:
+                content_parts.append({'mime_type': image['mime_type'], 'data': image['data']})
 
-                for image_path in images:
-                    try:
-                        img = PILImage.open(image_path)
-                        content_parts.append(img)
-                        logger.info("Added image to Gemini prompt", image_path=image_path)
-                    except Exception as e:
-                        logger.warning("Failed to load image for Gemini", image_path=image_path, error=str(e))
+            logger.info("Using vision-enabled Gemini prompt", image_count=len(prepared_images))
+            return content_parts
 
-                logger.info("Using vision-enabled Gemini prompt", image_count=len(images))
-            else:
-                content_parts = text_content
-
-            response = self.model.generate_content(
-                content_parts,
-                generation_config={
-                    'temperature': temperature,
-                    'max_output_tokens': settings.ai_max_tokens
-                }
+        return text_content
+
+    def _extract_content(self, response: Any) -> str:
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            record_usage(
+                self.name, self.model_name,
+                input_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+                output_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+                cached_input_tokens=getattr(usage, 'cached_content_token_count', 0) or 0
             )
-            return response.text
+        return response.text
+
+    def _generation_config(self, temperature: float, response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        config = {
+            'temperature': temperature,
+            'max_output_tokens': settings.ai_max_tokens
+        }
+        if response_schema and settings.ai_structured_output_enabled:
+            # JSON mode; Gemini's schema dialect lacks nullable unions, the validator covers the rest
+            config['response_mime_type'] = 'application/json'
+        return config
+
+    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            content_parts = self._build_content(prompt, system_text, images)
+            with provider_slot(self.name):
+                response = self.model.generate_content(
+                    content_parts,
+                    generation_config=self._generation_config(temperature, response_schema)
+                )
+            return self._extract_content(response)
         except Exception as e:
             logger.error("Gemini API error", error=str(e))
             raise
 
+    async def agenerate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            content_parts = self._build_content(prompt, system_text, images)
+            async with async_provider_slot(self.name):
+                response = await self.model.generate_content_async(
+                    content_parts,
+                    generation_config=self._generation_config(temperature, response_schema)
+                )
+            return self._extract_content(response)
+        except Exception as e:
+            logger.error("Gemini API error", error=str(e))
+            raise
+
+    async def astream_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        content_parts = self._build_content(prompt, system_text, images)
+        try:
+            async with async_provider_slot(self.name):
+                response = await self.model.generate_content_async(
+                    content_parts,
+                    generation_config=self._generation_config(temperature, response_schema),
+                    stream=True
+                )
+                usage = None
+                async for chunk in response:
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    if chunk.text:
+                        yield chunk.text
+                if usage is not None:
+                    record_usage(
+                        self.name, self.model_name,
+                        input_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+                        output_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+                        cached_input_tokens=getattr(usage, 'cached_content_token_count', 0) or 0
+                    )
+        except Exception as e:
+            logger.error("Gemini streaming error", error=str(e))
+            raise
+
+
+class GuardedProvider(AIProvider):
+    """
+    Wraps a provider with its circuit breaker and the shared per-provider rate limiter
+
+    Attribute access falls through to the wrapped provider (model, client, ...).
+    Providers used on their own (not behind a ProviderRouter) get a label and
+    report their calls to the call telemetry themselves.
+    """
+
+    def __init__(self, provider: AIProvider, name: str, label: Optional[str] = None):
+        """
+        Args:
+            provider: Provider to wrap
+            name: Provider name (circuit breaker and rate limiter key)
+            label: 'provider:model' to report calls under (None when a ProviderRouter reports them)
+        """
+        self.provider = provider
+        self.name = name
+        self.dependency = f"ai_{name}"
+        self.label = label
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.provider, item)
+
+    def _record(self, purpose: str, started: float, error: Optional[BaseException] = None) -> None:
+        if self.label is not None:
+            record_call(purpose, self.label, time.monotonic() - started, None if error else peek_last_usage(),
+                        error=error)
+
+    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None, purpose: str = 'other') -> str:
+        from src.utils.rate_limiter import limited_call
+
+        def call():
+            with limited_call(self.dependency):
+                return self.provider.generate_response(prompt, temperature=temperature, system_text=system_text, images=images,
+                                                       response_schema=response_schema)
+
+        # Breaker first, so an open circuit doesn't consume rate limit tokens
+        started = time.monotonic()
+        try:
+            response = get_breaker(self.dependency).call(call)
+        except Exception as e:
+            self._record(purpose, started, e)
+            raise
+        self._record(purpose, started)
+        return response
+
+    async def agenerate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None, purpose: str = 'other') -> str:
+        from src.utils.rate_limiter import alimited_call
+
+        async def call():
+            async with alimited_call(self.dependency):
+                return await self.provider.agenerate_response(prompt, temperature=temperature, system_text=system_text, images=images,
+                                                              response_schema=response_schema)
+
+        started = time.monotonic()
+        try:
+            response = await get_breaker(self.dependency).acall(call)
+        except Exception as e:
+            self._record(purpose, started, e)
+            raise
+        self._record(purpose, started)
+        return response
+
+    async def astream_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None, images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        from src.utils.rate_limiter import alimited_call
+
+        async with get_breaker(self.dependency).aguard():
+            async with alimited_call(self.dependency):
+                async for chunk in self.provider.astream_response(prompt, temperature=temperature, system_text=system_text, images=images,
+                                                                  response_schema=response_schema):
+                    yield chunk
+
 
 class AIEngine:
     """
@@ -240,15 +692,53 @@ class AIEngine:
         'unknown': 0
     }
 
-    def __init__(self):
+    def __init__(self, system_prompt: Optional[str] = None):
+        """
+        Args:
+            system_prompt: Use this system prompt instead of the configured one
+                (e.g. a PromptVersion under evaluation); without it the engine
+                follows the active prompt of the prompt registry
+        """
         self.provider = self._initialize_provider()
-        self.system_prompt = self._load_system_prompt()
+        self._system_prompt_override = system_prompt
         self.language_detector = LanguageDetector()
+        self.response_cache = AIResponseCache() if settings.ai_response_cache_enabled else None
+        self.triage_provider = self._initialize_triage_provider()
 
-    def _initialize_provider(self) -> AIProvider:
-        """Initialize the configured AI provider"""
-        provider_name = settings.ai_provider
-        model = settings.ai_model
+    def _initialize_provider(self) -> ProviderRouter:
+        """
+        Initialize the configured AI providers behind the shared rate limiter
+
+        The primary (settings.ai_provider/ai_model) is followed by the fallbacks in
+        settings.ai_fallback_providers; fallbacks without an API key are skipped.
+        """
+        providers = [(
+            f"{settings.ai_provider}:{settings.ai_model}",
+            GuardedProvider(self._create_provider(settings.ai_provider, settings.ai_model), settings.ai_provider)
+        )]
+        for provider_name, model in parse_fallback_providers(settings.ai_fallback_providers):
+            try:
+                provider = self._create_provider(provider_name, model)
+            except ValueError as e:
+                logger.warning("Skipping fallback AI provider", provider=provider_name, model=model, error=str(e))
+                continue
+            providers.append((f"{provider_name}:{model}", GuardedProvider(provider, provider_name)))
+        return ProviderRouter(providers)
+
+    def _initialize_triage_provider(self) -> Optional[AIProvider]:
+        """Initialize the cheap first-tier model (None when the cascade is disabled or unavailable)"""
+        if not settings.ai_triage_enabled:
+            return None
+        try:
+            provider = self._create_provider(settings.ai_triage_provider, settings.ai_triage_model)
+        except Exception as e:
+            logger.warning("Triage model unavailable, using the full model only", error=str(e))
+            return None
+        return GuardedProvider(provider, settings.ai_triage_provider,
+                               label=f"{settings.ai_triage_provider}:{settings.ai_triage_model}")
+
+    def _create_provider(self, provider_name: str, model: str) -> AIProvider:
+        """Create a raw provider client for the given provider name and model"""
 
         if provider_name == 'openai':
             if not settings.openai_api_key:
@@ -271,67 +761,442 @@ class AIEngine:
         else:
             raise ValueError(f"Unsupported AI provider: {provider_name}")
 
-    def _load_system_prompt(self) -> Optional[str]:
-        """Load system prompt from database or settings file."""
-        # Try database first
-        try:
-            from src.database.db import SessionLocal
-            session = SessionLocal()
+    def _build_analysis_system_text(self) -> str:
+        """
+        Static prefix of every analysis call: system prompt followed by the task instructions
+
+        Kept byte-identical across calls so OpenAI/Gemini automatic prefix caching
+        and Anthropic cache_control breakpoints can reuse it.
+        """
+        if self.system_prompt:
+            return f"{self.system_prompt}\n\n{ANALYSIS_INSTRUCTIONS}"
+        return ANALYSIS_INSTRUCTIONS
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        """System prompt of the next call (hot-reloaded unless overridden)"""
+        if self._system_prompt_override is not None:
+            return self._system_prompt_override
+        return prompt_registry.text()
+
+    @property
+    def prompt_version_id(self) -> Optional[int]:
+        """PromptVersion ID of the active system prompt (None when overridden or unversioned)"""
+        if self._system_prompt_override is not None:
+            return None
+        return prompt_registry.current()['version_id']
+
+    def analyze_email(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]] = None,
+        ticket_history: Optional[Dict[str, Any]] = None,
+        supplier_language: Optional[str] = None,
+        customer_language: Optional[str] = None,
+        bypass_cache: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Analyze an email and determine the appropriate action
+
+        Args:
+            email_data: Email details (subject, body, from, etc.)
+            ticket_data: Existing ticket data from API (if available)
+            ticket_history: Structured conversation history (dict with customer_thread, supplier_thread, internal_notes
+                and, on long tickets, conversation_summary)
+            supplier_language: Language code for supplier communication (e.g., 'de-DE')
+            customer_language: Customer language already known for the ticket (short follow-ups skip detection)
+            bypass_cache: Skip the response cache lookup (forced re-analysis); the fresh result is still stored
+
+        Returns:
+            Dictionary with analysis results:
+            {
+                'language': 'de-DE',
+                'intent': 'tracking_inquiry',
+                'ticket_type_id': 2,
+                'confidence': 0.85,
+                'requires_escalation': False,
+                'escalation_reason': None,
+                'customer_response': 'email text...',
+                'supplier_action': None or {'action': 'request_tracking', 'message': '...'},
+                'summary': 'Customer asking about tracking...',
+                'tier': 'full',  # or 'triage' / 'local' when the cheap model / local classifier settled it
+                'ai_calls': [...],  # Call telemetry records (see telemetry.py)
+                'prompt_version_id': 3  # Active PromptVersion (full-model analyses)
+            }
+        """
+        with collect_calls() as calls:
+            try:
+                analysis = self._analyze_email(email_data, ticket_data, ticket_history, supplier_language,
+                                               customer_language, bypass_cache)
+            except Exception:
+                record_analysis_calls({'ai_calls': calls})
+                raise
+        return self._attach_calls(analysis, calls)
+
+    def _analyze_email(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]],
+        ticket_history: Optional[Dict[str, Any]],
+        supplier_language: Optional[str],
+        customer_language: Optional[str],
+        bypass_cache: bool
+    ) -> Dict[str, Any]:
+        """analyze_email() without the call collection"""
+        local = self._preclassify(email_data)
+        if local and local['route'] == 'skip_llm':
+            return self._local_analysis(local, email_data, customer_language)
+
+        triage = None
+        if self._should_triage(email_data, local):
+            started = time.monotonic()
             try:
-                from src.database.models import SystemSetting
-                setting = session.query(SystemSetting).filter_by(key='ai_system_prompt').first()
-                if setting and setting.value:
-                    logger.info("Loaded system prompt from database")
-                    return setting.value
-            finally:
-                session.close()
+                response = self.triage_provider.generate_response(**self._triage_request(email_data, ticket_history))
+                triage = self._record_triage(response, started)
+            except Exception as e:
+                self._record_triage(None, started, error=e)
+            if triage and triage_is_final(triage):
+                return self._triage_analysis(triage, email_data, customer_language)
+
+        prompt, images, language, prompt_stats = self._prepare_analysis(
+            email_data, ticket_data, ticket_history, supplier_language,
+            customer_language=customer_language,
+            live_tracking_lookup=self._check_live_tracking,
+            intent_hint=(triage or local or {}).get('intent')
+        )
+
+        system_text = self._build_analysis_system_text()
+        cache_key = self._response_cache_key(system_text, prompt, images)
+        if cache_key and not bypass_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return self._finish_analysis(cached, language, prompt_stats, cached=True, triage=triage)
+
+        # Get AI analysis
+        started = time.monotonic()
+        try:
+            ai_response = self.provider.generate_response(
+                prompt,
+                temperature=settings.ai_temperature,
+                system_text=system_text,
+                images=images if images else None,
+                response_schema=ANALYSIS_SCHEMA,
+                validator=extract_json_object,
+                purpose='analysis'
+            )
+            ai_response = self._complete_response(ai_response, prompt, system_text)
+            analysis = self._finish_analysis(ai_response, language, prompt_stats, triage=triage)
+            self._record_full(analysis, started)
+            if cache_key and self._answered_by_primary(analysis):
+                self.response_cache.put(cache_key, self._model_id(), ai_response)
+            return analysis
+
+        except CircuitOpenError:
+            # Provider known to be down: let the caller park the email instead of escalating it
+            raise
+
         except Exception as e:
-            logger.warning("Failed to load system prompt from database", error=str(e))
+            logger.error("Failed to analyze email", error=str(e))
+            self._record_full(None, started)
+            return self._failed_analysis(language, e)
+
+    async def aanalyze_email(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]] = None,
+        ticket_history: Optional[Dict[str, Any]] = None,
+        supplier_language: Optional[str] = None,
+        customer_language: Optional[str] = None,
+        bypass_cache: bool = False,
+        live_tracking: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Async variant of analyze_email() for use inside the event loop
+
+        The provider call is awaited natively; the blocking live tracking
+        lookup runs in a worker thread.
+
+        Args:
+            email_data: Email details (subject, body, from, etc.)
+            ticket_data: Existing ticket data from API (if available)
+            ticket_history: Structured conversation history
+            supplier_language: Language code for supplier communication (e.g., 'de-DE')
+            customer_language: Customer language already known for the ticket (short follow-ups skip detection)
+            bypass_cache: Skip the response cache lookup (forced re-analysis)
+            live_tracking: Look up live carrier tracking (off for offline re-analysis)
+
+        Returns:
+            Dictionary with analysis results (see analyze_email)
+        """
+        with collect_calls() as calls:
+            try:
+                analysis = await self._aanalyze_email(email_data, ticket_data, ticket_history, supplier_language,
+                                                      customer_language, bypass_cache, live_tracking)
+            except Exception:
+                record_analysis_calls({'ai_calls': calls})
+                raise
+        return self._attach_calls(analysis, calls)
+
+    async def _aanalyze_email(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]],
+        ticket_history: Optional[Dict[str, Any]],
+        supplier_language: Optional[str],
+        customer_language: Optional[str],
+        bypass_cache: bool,
+        live_tracking: bool
+    ) -> Dict[str, Any]:
+        """aanalyze_email() without the call collection"""
+        local = self._preclassify(email_data)
+        if local and local['route'] == 'skip_llm':
+            return self._local_analysis(local, email_data, customer_language)
+
+        triage = None
+        if self._should_triage(email_data, local):
+            started = time.monotonic()
+            try:
+                response = await self.triage_provider.agenerate_response(**self._triage_request(email_data, ticket_history))
+                triage = self._record_triage(response, started)
+            except Exception as e:
+                self._record_triage(None, started, error=e)
+            if triage and triage_is_final(triage):
+                return self._triage_analysis(triage, email_data, customer_language)
 
-        # Fallback to file if configured
+        live_tracking_status = None
+        if ticket_data and live_tracking:
+            live_tracking_status = await asyncio.to_thread(
+                self._check_live_tracking, ticket_data, email_data.get('body', '')
+            )
+
+        prompt, images, language, prompt_stats = self._prepare_analysis(
+            email_data, ticket_data, ticket_history, supplier_language,
+            customer_language=customer_language,
+            live_tracking_lookup=lambda *_: live_tracking_status,
+            intent_hint=(triage or local or {}).get('intent')
+        )
+
+        system_text = self._build_analysis_system_text()
+        cache_key = self._response_cache_key(system_text, prompt, images)
+        if cache_key and not bypass_cache:
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                return self._finish_analysis(cached, language, prompt_stats, cached=True, triage=triage)
+
+        started = time.monotonic()
         try:
-            from pathlib import Path
-            p = Path(settings.prompt_path)
-            if p.exists():
-                text = p.read_text(encoding="utf-8").strip()
-                if text:
-                    logger.info("Loaded system prompt from file", path=str(p))
-                    return text
+            ai_response = await self.provider.agenerate_response(
+                prompt,
+                temperature=settings.ai_temperature,
+                system_text=system_text,
+                images=images if images else None,
+                response_schema=ANALYSIS_SCHEMA,
+                validator=extract_json_object,
+                purpose='analysis'
+            )
+            ai_response = await self._acomplete_response(ai_response, prompt, system_text)
+            analysis = self._finish_analysis(ai_response, language, prompt_stats, triage=triage)
+            self._record_full(analysis, started)
+            if cache_key and self._answered_by_primary(analysis):
+                await asyncio.to_thread(self.response_cache.put, cache_key, self._model_id(), ai_response)
+            return analysis
+
+        except CircuitOpenError:
+            raise
+
         except Exception as e:
-            logger.warning("Failed to load system prompt from file", error=str(e))
+            logger.error("Failed to analyze email", error=str(e))
+            self._record_full(None, started)
+            return self._failed_analysis(language, e)
 
-        return None
+    async def aanalyze_many(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Analyze several emails concurrently
 
-    def analyze_email(
+        Concurrency is bounded by the per-provider slot and rate limiter, so
+        this can be handed a whole batch.
+
+        Args:
+            requests: List of analyze_email keyword argument dicts
+
+        Returns:
+            Analyses in request order (CircuitOpenError is re-raised)
+        """
+        return list(await asyncio.gather(*(self.aanalyze_email(**request) for request in requests)))
+
+    async def astream_analysis(
         self,
         email_data: Dict[str, Any],
         ticket_data: Optional[Dict[str, Any]] = None,
         ticket_history: Optional[Dict[str, Any]] = None,
-        supplier_language: Optional[str] = None
-    ) -> Dict[str, Any]:
+        supplier_language: Optional[str] = None,
+        customer_language: Optional[str] = None,
+        bypass_cache: bool = False,
+        cancel_on_escalation: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Analyze an email and determine the appropriate action
+        Stream an analysis, surfacing each top-level field as soon as the model completes it
+
+        The schema puts the classification fields (intent, confidence,
+        requires_escalation, ...) before the drafts, so callers can act on them
+        while the drafts are still being written.
 
         Args:
             email_data: Email details (subject, body, from, etc.)
             ticket_data: Existing ticket data from API (if available)
-            ticket_history: Structured conversation history (dict with customer_thread, supplier_thread, internal_notes)
+            ticket_history: Structured conversation history
             supplier_language: Language code for supplier communication (e.g., 'de-DE')
+            customer_language: Customer language already known for the ticket (short follow-ups skip detection)
+            bypass_cache: Skip the response cache lookup (forced re-analysis)
+            cancel_on_escalation: Stop generating once the model has decided to
+                escalate with a reason (no drafts are produced then)
+
+        Yields:
+            Event dicts:
+                {'event': 'meta', 'language', 'prompt_stats', 'cached'}
+                {'event': 'field', 'name', 'value'}  (one per top-level field)
+                {'event': 'analysis', 'analysis'}    (final, same shape as analyze_email)
+                {'event': 'error', 'error', 'analysis'}  (failed; analysis is the escalation default)
+        """
+        with collect_calls() as calls:
+            async for event in self._astream_analysis(email_data, ticket_data, ticket_history, supplier_language,
+                                                      customer_language, bypass_cache, cancel_on_escalation):
+                if event['event'] in ('analysis', 'error'):
+                    self._attach_calls(event['analysis'], calls)
+                yield event
+
+    async def _astream_analysis(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]],
+        ticket_history: Optional[Dict[str, Any]],
+        supplier_language: Optional[str],
+        customer_language: Optional[str],
+        bypass_cache: bool,
+        cancel_on_escalation: bool
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """astream_analysis() without the call collection"""
+        from .incremental_json import IncrementalJSONParser
+
+        local = self._preclassify(email_data)
+        if local and local['route'] == 'skip_llm':
+            yield {'event': 'analysis', 'analysis': self._local_analysis(local, email_data, customer_language)}
+            return
+
+        triage = None
+        if self._should_triage(email_data, local):
+            started = time.monotonic()
+            try:
+                response = await self.triage_provider.agenerate_response(**self._triage_request(email_data, ticket_history))
+                triage = self._record_triage(response, started)
+            except Exception as e:
+                self._record_triage(None, started, error=e)
+            if triage and triage_is_final(triage):
+                yield {'event': 'analysis', 'analysis': self._triage_analysis(triage, email_data, customer_language)}
+                return
+
+        live_tracking_status = None
+        if ticket_data:
+            live_tracking_status = await asyncio.to_thread(
+                self._check_live_tracking, ticket_data, email_data.get('body', '')
+            )
+
+        prompt, images, language, prompt_stats = self._prepare_analysis(
+            email_data, ticket_data, ticket_history, supplier_language,
+            customer_language=customer_language,
+            live_tracking_lookup=lambda *_: live_tracking_status,
+            intent_hint=(triage or local or {}).get('intent')
+        )
+
+        system_text = self._build_analysis_system_text()
+        cache_key = self._response_cache_key(system_text, prompt, images)
+        if cache_key and not bypass_cache:
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                analysis = self._finish_analysis(cached, language, prompt_stats, cached=True, triage=triage)
+                yield {'event': 'meta', 'language': language, 'prompt_stats': prompt_stats, 'cached': True}
+                parser = IncrementalJSONParser()
+                for name, value in parser.feed(cached):
+                    yield {'event': 'field', 'name': name, 'value': value}
+                yield {'event': 'analysis', 'analysis': analysis}
+                return
+
+        yield {'event': 'meta', 'language': language, 'prompt_stats': prompt_stats, 'cached': False}
+
+        parser = IncrementalJSONParser()
+        cancelled = False
+        started = time.monotonic()
+        stream = self.provider.astream_response(
+            prompt,
+            temperature=settings.ai_temperature,
+            system_text=system_text,
+            images=images if images else None,
+            response_schema=ANALYSIS_SCHEMA,
+            purpose='analysis'
+        )
+        try:
+            async for chunk in stream:
+                for name, value in parser.feed(chunk):
+                    yield {'event': 'field', 'name': name, 'value': value}
+                fields = parser.fields
+                if cancel_on_escalation and fields.get('requires_escalation') is True and fields.get('escalation_reason'):
+                    cancelled = True
+                    break
+            await stream.aclose()
+
+            if cancelled:
+                # Escalated before the drafts: keep the classification, drop any partial drafts
+                analysis = self._finish_analysis(json.dumps(parser.fields), language, prompt_stats, triage=triage)
+                analysis['customer_response'] = None
+                analysis['supplier_action'] = None
+                analysis['cancelled'] = True
+                logger.info("Streaming analysis stopped on escalation", escalation_reason=analysis.get('escalation_reason'))
+            else:
+                ai_response = await self._acomplete_response(parser.text(), prompt, system_text)
+                analysis = self._finish_analysis(ai_response, language, prompt_stats, triage=triage)
+                if cache_key and self._answered_by_primary(analysis):
+                    await asyncio.to_thread(self.response_cache.put, cache_key, self._model_id(), ai_response)
+            self._record_full(analysis, started)
+            yield {'event': 'analysis', 'analysis': analysis}
+
+        except CircuitOpenError:
+            raise
+
+        except Exception as e:
+            logger.error("Failed to stream email analysis", error=str(e))
+            self._record_full(None, started)
+            yield {'event': 'error', 'error': str(e), 'analysis': self._failed_analysis(language, e)}
+
+    def _attach_calls(self, analysis: Dict[str, Any], calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add the analysis' call telemetry and, unless triage or the local classifier settled it, the prompt version"""
+        analysis['ai_calls'] = list(calls)
+        analysis['prompt_version_id'] = self.prompt_version_id if analysis.get('tier') not in (TRIAGE, LOCAL) else None
+        return analysis
+
+    def _prepare_analysis(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]],
+        ticket_history: Optional[Dict[str, Any]],
+        supplier_language: Optional[str],
+        live_tracking_lookup,
+        customer_language: Optional[str] = None,
+        intent_hint: Optional[str] = None
+    ) -> tuple:
+        """
+        Build the analysis prompt for an email
+
+        Body, history and attachment texts are fitted into the token budget
+        (see PromptBudget) before the prompt is assembled. The most relevant
+        message examples (see example_index.py) are added within their own budget;
+        intent_hint (triage/local classifier intent) favours examples of that scenario.
 
         Returns:
-            Dictionary with analysis results:
-            {
-                'language': 'de-DE',
-                'intent': 'tracking_inquiry',
-                'ticket_type_id': 2,
-                'confidence': 0.85,
-                'requires_escalation': False,
-                'escalation_reason': None,
-                'customer_response': 'email text...',
-                'supplier_action': None or {'action': 'request_tracking', 'message': '...'},
-                'summary': 'Customer asking about tracking...'
-            }
+            Tuple of (prompt, image paths, detected language code, prompt token stats)
         """
+        # Drop usage left over from an earlier call in this thread/task
+        pop_last_usage()
+
         subject = email_data.get('subject') or ''
         body = email_data.get('body', '')
         from_address = email_data.get('from', '')
@@ -340,12 +1205,7 @@ class AIEngine:
         attachments = email_data.get('attachments', [])
         images = [att for att in attachments if att.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'))]
 
-        # Include extracted text from attachments in the body
         attachment_texts = email_data.get('attachment_texts', [])
-        if attachment_texts:
-            body += "\n\n--- ATTACHMENT CONTENT ---\n"
-            for att_text in attachment_texts:
-                body += f"\n[{att_text['filename']}]:\n{att_text['text']}\n"
 
         logger.info("Analyzing email",
                    subject=subject[:100] if subject else '(no subject)',
@@ -355,79 +1215,277 @@ class AIEngine:
 
         # Detect language
         combined_text = f"{subject} {body}"
-        language = self.language_detector.detect_language(combined_text)
+        language = self.language_detector.detect_language(combined_text, known_language=customer_language)
         language_name = self.language_detector.get_language_name(language)
 
         # Check live tracking status if tracking info is available
         live_tracking_status = None
         if ticket_data:
-            live_tracking_status = self._check_live_tracking(ticket_data, body)
+            live_tracking_status = live_tracking_lookup(ticket_data, body + format_attachment_texts(attachment_texts))
 
-        # Build analysis prompt
-        prompt = self._build_analysis_prompt(
+        examples = self._select_examples(f"{subject}\n{body}", language, supplier_language, intent_hint)
+
+        prompt_kwargs = dict(
             subject=subject,
-            body=body,
             from_address=from_address,
             language=language_name,
             ticket_data=ticket_data,
-            ticket_history=ticket_history,
             supplier_language=supplier_language,
-            live_tracking_status=live_tracking_status
-            )
+            live_tracking_status=live_tracking_status,
+            message_examples=format_examples(examples)
+        )
+
+        # Fit the unbounded sections into what's left after the fixed ones
+        system_tokens = count_tokens(self._build_analysis_system_text())
+        fixed_tokens = count_tokens(self._build_analysis_prompt(body='', ticket_history=None, **prompt_kwargs))
+        body, ticket_history, attachment_texts, prompt_stats = PromptBudget().fit(
+            body, ticket_history=ticket_history, attachment_texts=attachment_texts, reserved_tokens=fixed_tokens
+        )
+
+        # Build analysis prompt
+        prompt = self._build_analysis_prompt(
+            body=body + format_attachment_texts(attachment_texts),
+            ticket_history=ticket_history,
+            **prompt_kwargs
+        )
 
         # Add note about images if present
         if images:
             prompt += f"\n\n**IMPORTANT: Customer has attached {len(images)} image(s). Please analyze the images for any visible damage, defects, or issues mentioned in the text.**"
 
-        # Get AI analysis
-        try:
-            ai_response = self.provider.generate_response(
-                prompt,
-                temperature=settings.ai_temperature,
-                system_text=self.system_prompt,
-                images=images if images else None
-            )
+        prompt_stats['system_tokens'] = system_tokens
+        prompt_stats['prompt_tokens'] = system_tokens + count_tokens(prompt)
+        prompt_stats['sections']['examples'] = count_tokens(prompt_kwargs['message_examples'])
+        prompt_stats['examples'] = [example['id'] for example in examples]
 
-            # Parse AI response (expecting JSON format)
-            analysis = self._parse_ai_response(ai_response)
+        return prompt, images, language, prompt_stats
 
-            # Add language to analysis
-            analysis['language'] = language
+    @staticmethod
+    def _select_examples(text: str, language: str, supplier_language: Optional[str],
+                         intent_hint: Optional[str]) -> List[Dict[str, Any]]:
+        """Relevant message examples for the prompt ([] when disabled or unavailable)"""
+        if not settings.ai_examples_enabled:
+            return []
+        try:
+            return example_index.select(text, language, supplier_language, scenario=intent_hint)
+        except Exception as e:
+            logger.warning("Message example retrieval failed", error=str(e))
+            return []
 
-            logger.info(
-                "Email analysis complete",
-                intent=analysis.get('intent'),
-                confidence=analysis.get('confidence'),
-                language=language
-            )
+    # ------------------------------------------------------------------
+    # Model cascade
+    # ------------------------------------------------------------------
 
-            return analysis
+    @staticmethod
+    def _has_images(email_data: Dict[str, Any]) -> bool:
+        attachments = email_data.get('attachments', [])
+        return any(att.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')) for att in attachments)
+
+    def _should_triage(self, email_data: Dict[str, Any], local: Optional[Dict[str, Any]] = None) -> bool:
+        """Triage text-only emails; image attachments always need the vision-capable full model"""
+        if self.triage_provider is None:
+            return False
+        if local and local['route'] == 'direct':
+            # Confidently an intent that always needs a draft: triage would only pass it on
+            return False
+        return not self._has_images(email_data)
+
+    def _preclassify(self, email_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Local intent classification (None when disabled, untrained or failing)"""
+        if not settings.ai_intent_classifier_enabled:
+            return None
+        from .intent_classifier import active_classifier
 
+        try:
+            local = active_classifier.classify(email_data)
         except Exception as e:
-            logger.error("Failed to analyze email", error=str(e))
-            # Return safe default for escalation
-            return {
-                'language': language,
-                'intent': 'unknown',
-                'ticket_type_id': 0,
-                'confidence': 0.0,
-                'requires_escalation': True,
-                'escalation_reason': f'AI analysis failed: {str(e)}',
-                'customer_response': None,
-                'supplier_action': None,
-                'summary': 'Analysis failed'
-            }
+            logger.warning("Local intent classification failed", error=str(e))
+            return None
+        if local is None:
+            return None
+        if local['route'] == 'skip_llm' and self._has_images(email_data):
+            local['route'] = 'default'
+        if local['route'] != 'default':
+            logger.info("Email pre-classified locally", **local)
+        return local
+
+    def _local_analysis(self, local: Dict[str, Any], email_data: Dict[str, Any],
+                        customer_language: Optional[str] = None) -> Dict[str, Any]:
+        """Analysis result for an email the local classifier settled (no LLM call, no drafts)"""
+        cascade_stats.record(LOCAL, f"intent-classifier-v{local['version']}", local['latency_ms'], resolved=True)
+        analysis = self._triage_analysis({
+            'intent': local['intent'],
+            'ticket_type_id': local['ticket_type_id'],
+            'confidence': local['confidence'],
+            'summary': f"No reply needed ({local['intent']}, local classifier v{local['version']})",
+        }, email_data, customer_language)
+        analysis['tier'] = LOCAL
+        analysis['triage'] = None
+        analysis['local_classification'] = local
+        return analysis
+
+    def _triage_request(self, email_data: Dict[str, Any], ticket_history: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Clear usage from earlier calls so the triage usage is read back correctly
+        pop_last_usage()
+        return {
+            'prompt': build_triage_prompt(email_data, ticket_history),
+            'temperature': 0.0,
+            'system_text': TRIAGE_INSTRUCTIONS,
+            'purpose': 'triage',
+        }
+
+    def _record_triage(self, response: Optional[str], started: float, error: Optional[Exception] = None) -> Optional[Dict[str, Any]]:
+        """Parse a triage response and record tier stats (None if triage failed)"""
+        latency_ms = (time.monotonic() - started) * 1000
+        usage = pop_last_usage()
+        triage = None
+        if error is None:
+            try:
+                triage = parse_triage_response(response)
+            except ValueError as e:
+                error = e
+
+        if triage is None:
+            logger.warning("Triage failed, falling back to the full model", error=str(error))
+            cascade_stats.record(TRIAGE, settings.ai_triage_model, latency_ms, usage, failed=True)
+            return None
+
+        final = triage_is_final(triage)
+        cascade_stats.record(
+            TRIAGE, settings.ai_triage_model, latency_ms, usage,
+            escalated=bool(triage.get('requires_escalation')), resolved=final
+        )
+        triage['usage'] = usage
+        triage['latency_ms'] = round(latency_ms, 1)
+        logger.info(
+            "Email triaged",
+            intent=triage.get('intent'),
+            confidence=triage.get('confidence'),
+            needs_customer_response=triage.get('needs_customer_response'),
+            needs_supplier_action=triage.get('needs_supplier_action'),
+            final=final,
+            latency_ms=triage['latency_ms']
+        )
+        return triage
+
+    def _record_full(self, analysis: Optional[Dict[str, Any]], started: float) -> None:
+        latency_ms = (time.monotonic() - started) * 1000
+        if analysis is None:
+            cascade_stats.record(FULL, settings.ai_model, latency_ms, pop_last_usage(), failed=True)
+            return
+        cascade_stats.record(
+            FULL, settings.ai_model, latency_ms, analysis.get('usage'),
+            escalated=bool(analysis.get('requires_escalation')), resolved=True
+        )
+
+    def _triage_analysis(self, triage: Dict[str, Any], email_data: Dict[str, Any],
+                         customer_language: Optional[str] = None) -> Dict[str, Any]:
+        """Analysis result for an email the triage model settled (no drafts)"""
+        language = self.language_detector.detect_language(
+            f"{email_data.get('subject') or ''} {email_data.get('body', '')}",
+            known_language=customer_language
+        )
+        try:
+            ticket_type_id = int(triage.get('ticket_type_id') or 0)
+        except (TypeError, ValueError):
+            ticket_type_id = 0
+        return {
+            'language': language,
+            'intent': triage.get('intent', 'other'),
+            'ticket_type_id': ticket_type_id,
+            'confidence': triage['confidence'],
+            'requires_escalation': False,
+            'escalation_reason': None,
+            'customer_response': None,
+            'supplier_action': None,
+            'summary': triage.get('summary') or 'No reply needed (triage)',
+            'usage': triage.get('usage'),
+            'prompt_stats': None,
+            'cached': False,
+            'tier': TRIAGE,
+            'triage': {k: v for k, v in triage.items() if k != 'usage'},
+        }
+
+    def _model_id(self) -> str:
+        return f"{settings.ai_provider}:{settings.ai_model}"
+
+    def _answered_by_primary(self, analysis: Dict[str, Any]) -> bool:
+        """
+        Whether the primary model produced an analysis
+
+        Cache keys are built from the primary model before the call, so answers
+        from a fallback provider (or of unknown origin) are not cached under them.
+        """
+        usage = analysis.get('usage') or {}
+        return f"{usage.get('provider')}:{usage.get('model')}" == self._model_id()
+
+    def _response_cache_key(self, system_text: str, prompt: str, images: List[str]) -> Optional[str]:
+        """Fingerprint of an analysis call (None when the response cache is disabled)"""
+        if self.response_cache is None:
+            return None
+        return fingerprint(self._model_id(), system_text, prompt, settings.ai_temperature, images)
+
+    def _finish_analysis(
+        self,
+        ai_response: str,
+        language: str,
+        prompt_stats: Dict[str, Any],
+        cached: bool = False,
+        triage: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Parse the provider (or cached) response into an analysis dict"""
+        # Parse AI response (expecting JSON format)
+        analysis = self._parse_ai_response(ai_response)
+
+        # Add language and token usage (incl. prefix cache hits) to analysis
+        analysis['language'] = language
+        analysis['usage'] = None if cached else pop_last_usage()
+        if cached:
+            record_cache_hit('analysis', self._model_id())
+        analysis['prompt_stats'] = prompt_stats
+        analysis['cached'] = cached
+        analysis['tier'] = FULL
+        analysis['triage'] = {k: v for k, v in triage.items() if k != 'usage'} if triage else None
+
+        logger.info(
+            "Email analysis complete",
+            intent=analysis.get('intent'),
+            confidence=analysis.get('confidence'),
+            language=language
+        )
+
+        return analysis
+
+    @staticmethod
+    def _failed_analysis(language: str, error: Exception) -> Dict[str, Any]:
+        """Safe default (escalation) for a failed analysis"""
+        return {
+            'language': language,
+            'intent': 'unknown',
+            'ticket_type_id': 0,
+            'confidence': 0.0,
+            'requires_escalation': True,
+            'escalation_reason': f'AI analysis failed: {str(error)}',
+            'customer_response': None,
+            'supplier_action': None,
+            'summary': 'Analysis failed',
+            'error': str(error)
+        }
 
     def _check_live_tracking(self, ticket_data: Dict[str, Any], email_body: str) -> Optional[Dict[str, Any]]:
         """
         Check live tracking status if customer is asking about delivery
 
+        All parcels of the ticket are looked up concurrently through the shared
+        tracking cache; the analysis waits at most settings.live_tracking_budget_seconds.
+
         Args:
             ticket_data: Ticket data from API
             email_body: Customer's email text
 
         Returns:
-            Live tracking status dict or None
+            Live tracking status dict of the first parcel with all parcels under
+            'parcels', or None
         """
         # Only check if email body suggests tracking inquiry
         body_lower = email_body.lower()
@@ -436,66 +1494,30 @@ class AIEngine:
         if not any(keyword in body_lower for keyword in tracking_keywords):
             return None
 
-        # Extract tracking info from ticket
-        sales_order = ticket_data.get('salesOrder', {})
-        purchase_orders = sales_order.get('purchaseOrders', [])
+        from src.utils.tracking_cache import parcels_from_ticket, tracking_cache
 
-        if not purchase_orders:
+        parcels = parcels_from_ticket(ticket_data)
+        if not parcels:
             return None
 
-        po = purchase_orders[0]
-        deliveries = po.get('deliveries', [])
-
-        if not deliveries:
+        try:
+            results = tracking_cache.check_parcels(parcels, budget=settings.live_tracking_budget_seconds)
+        except Exception as e:
+            logger.error("Failed to check live tracking", error=str(e), parcels=len(parcels))
             return None
 
-        # Get first delivery with tracking
-        for delivery in deliveries:
-            parcels = delivery.get('deliveryParcels', [])
-            for parcel in parcels:
-                tracking_url = parcel.get('traceUrl', '').strip()
-                tracking_number = parcel.get('trackNumber', '').strip()
-
-                if not tracking_number:
-                    continue
-
-                # Extract carrier from shipment method
-                shipment_method = parcel.get('shipmentMethod', {})
-                carrier_name = shipment_method.get('name1', '')
-
-                # Get customer address for gatekeepers (Trans-o-flex)
-                postal_code = sales_order.get('customerPostalCode')
-                address = sales_order.get('customerAddress')
-
-                try:
-                    from src.utils.tracking_checker import TrackingChecker, extract_house_number
-
-                    house_number = extract_house_number(address) if address else None
-
-                    checker = TrackingChecker()
-                    result = checker.check_tracking(
-                        tracking_number=tracking_number,
-                        carrier_name=carrier_name,
-                        tracking_url=tracking_url,
-                        postal_code=postal_code,
-                        house_number=house_number
-                    )
-
-                    logger.info(
-                        "Live tracking checked",
-                        tracking_number=tracking_number,
-                        carrier=carrier_name,
-                        status=result.get('status'),
-                        cached=result.get('cached', False)
-                    )
-
-                    return result
-
-                except Exception as e:
-                    logger.error("Failed to check live tracking", error=str(e), tracking_number=tracking_number)
-                    return None
+        results = [result for result in results if result.get('status')]
+        if not results:
+            return None
 
-        return None
+        logger.info(
+            "Live tracking checked",
+            parcels=len(parcels),
+            with_status=len(results),
+            statuses=[result.get('status') for result in results],
+            cached=sum(1 for result in results if result.get('cached'))
+        )
+        return {**results[0], 'parcels': results}
 
     def _build_analysis_prompt(
         self,
@@ -506,10 +1528,16 @@ class AIEngine:
         ticket_data: Optional[Dict[str, Any]],
         ticket_history: Optional[Dict[str, Any]],
         supplier_language: Optional[str],
-        live_tracking_status: Optional[Dict[str, Any]] = None
+        live_tracking_status: Optional[Dict[str, Any]] = None,
+        message_examples: str = ''
     ) -> str:
-        """Build the analysis prompt for the AI"""
-        import json
+        """
+        Build the variable part of the analysis prompt
+
+        Static task instructions live in ANALYSIS_INSTRUCTIONS and are sent as
+        part of the system text (see _build_analysis_system_text), so every call
+        shares an identical prefix that providers can cache.
+        """
 
         # Build language header FIRST - most prominent
         language_header = f"""
@@ -531,9 +1559,7 @@ VERIFY LANGUAGE BEFORE SUBMITTING YOUR RESPONSE!
 
 """
 
-        prompt = language_header + f"""You are an expert customer support AI assistant for a dropshipping company. Analyze the following customer email and provide a structured response.
-
-Email Details:
+        prompt = language_header + f"""Email Details:
 - From: {from_address}
 - Subject: {subject}
 - Body:
@@ -558,226 +1584,196 @@ Existing Ticket Information:
 
         # Add live tracking status if available
         if live_tracking_status:
-            status = live_tracking_status.get('status', 'unknown')
-            status_text = live_tracking_status.get('status_text', 'N/A')
-            carrier = live_tracking_status.get('carrier', 'N/A')
-            location = live_tracking_status.get('location')
-            estimated_delivery = live_tracking_status.get('estimated_delivery')
-            tracking_url = live_tracking_status.get('tracking_url', 'N/A')
-            last_update = live_tracking_status.get('last_update')
-            cached = live_tracking_status.get('cached', False)
-
-            prompt += f"""
-**LIVE TRACKING STATUS** (checked just now{'  from cache' if cached else ''}):
+            parcels = live_tracking_status.get('parcels') or [live_tracking_status]
+            for parcel in parcels:
+                status = parcel.get('status', 'unknown')
+                status_text = parcel.get('status_text', 'N/A')
+                carrier = parcel.get('carrier', 'N/A')
+                location = parcel.get('location')
+                estimated_delivery = parcel.get('estimated_delivery')
+                tracking_url = parcel.get('tracking_url', 'N/A')
+                last_update = parcel.get('last_update')
+                checked_at = parcel.get('checked_at')
+
+                prompt += f"""
+**LIVE TRACKING STATUS**{f" of parcel {parcel.get('tracking_number')}" if len(parcels) > 1 else ''} (checked {f'at {checked_at} UTC' if checked_at else 'just now'}):
 - Carrier: {carrier}
 - Current Status: {status_text}
 - Status Code: {status}
 - Tracking URL: {tracking_url}
 """
-            if location:
-                prompt += f"- Current Location: {location}\n"
-            if estimated_delivery:
-                prompt += f"- Estimated Delivery: {estimated_delivery}\n"
-            if last_update:
-                prompt += f"- Last Updated: {last_update}\n"
+                if location:
+                    prompt += f"- Current Location: {location}\n"
+                if estimated_delivery:
+                    prompt += f"- Estimated Delivery: {estimated_delivery}\n"
+                if last_update:
+                    prompt += f"- Last Updated: {last_update}\n"
 
             prompt += """
 **IMPORTANT**: You have access to the LIVE tracking status above! Use this information to give the customer a specific, up-to-date answer about their parcel's current location and status. Do NOT just provide the tracking link - tell them what the current status actually is!
 
 """
 
-        if ticket_history and (ticket_history.get('customer_thread') or ticket_history.get('supplier_thread') or ticket_history.get('internal_notes')):
+        if ticket_history and (ticket_history.get('conversation_summary') or ticket_history.get('customer_thread') or ticket_history.get('supplier_thread') or ticket_history.get('internal_notes')):
             prompt += "\nPrevious Conversation History (JSON format):\n"
-            prompt += json.dumps(ticket_history, ensure_ascii=False, indent=2)
+            prompt += serialize_history(ticket_history)
             prompt += "\n"
 
-        prompt += """
-Task: Analyze this ticket conversation step by step and provide your response.
-
-UNDERSTANDING THE CONVERSATION HISTORY:
-The conversation above shows the complete ticket history with clear labels:
-- [MESSAGE FROM CUSTOMER]: What the customer sent to us
-- [OUR RESPONSE TO CUSTOMER]: What we already told the customer
-- [OUR MESSAGE TO SUPPLIER]: What we asked the supplier
-- [SUPPLIER'S RESPONSE]: What the supplier told us
-- [INTERNAL NOTE]: Our internal notes
-
-Each message includes a timestamp. Read the entire conversation chronologically to understand the context.
-
-STEP 1: SITUATION ANALYSIS
-Before deciding on an action, answer these questions:
-
-1. What is the customer's main concern or request?
-2. What have we already communicated to the customer? (Look for [OUR RESPONSE TO CUSTOMER])
-3. What information have we received from the supplier? (Look for [SUPPLIER'S RESPONSE])
-4. What are we currently waiting for? (Check pending requests/promises)
-5. Are we about to contradict something we already told the customer?
-6. Are we about to ask the supplier for information they already provided?
-
-STEP 2: DETERMINE NEXT ACTION
-Based on your analysis:
-- What is the logical next step?
-- Do we have enough information to help the customer, or do we need more from the supplier?
-- Should this be escalated to a human?
-
-STEP 3: PROVIDE STRUCTURED RESPONSE
-Now provide your response in the following JSON format:
-
-{
-  "reasoning": {
-    "customer_main_concern": "brief description",
-    "what_we_told_customer": "summary or null if first contact",
-    "what_supplier_told_us": "summary or null if no supplier communication",
-    "pending_items": "what we're waiting for or null",
-    "contradiction_check": "any contradictions detected? true/false",
-    "logical_next_step": "description of next action"
-  },
-  "intent": "one of: tracking_inquiry, return_request, price_question, general_info, tech_support, complaint, transport_damage, other",
-  "ticket_type_id": integer (1=Return, 2=Tracking, 3=Price, 4=GeneralInfo, 5=TechSupport, 6=SupportEnquiry, 7=TransportDamage, 0=Unknown),
-  "confidence": float between 0.0 and 1.0,
-  "requires_escalation": boolean (true if complex, legal issue, very angry customer, or uncertain),
-  "escalation_reason": "string explaining why escalation is needed, or null",
-  "customer_response": "the email response to send to the customer in their language (almost always generate this - see rules below), or null only if truly not appropriate",
-  "supplier_action": {
-    "action": "request_tracking / request_return / notify_issue / null",
-    "message": "email to send to supplier in their language"
-  } or null (only generate when supplier contact is actually needed - see rules below),
-  "summary": "brief summary of the issue and action taken",
-  "conversation_updates": {
-    "customer_summary": "updated summary of customer conversation state",
-    "supplier_summary": "updated summary of supplier conversation state",
-    "customer_promises": "what we promised the customer (if any)",
-    "supplier_requests": "what we're waiting for from supplier (if any)"
-  }
-}
-
-CRITICAL: WHEN TO GENERATE EACH MESSAGE TYPE
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-CUSTOMER RESPONSE ("customer_response"):
-Generate in these cases:
-✅ Customer asks a question → Answer it
-✅ Customer reports an issue → Acknowledge and explain next steps
-✅ Customer says "thank you" or similar → Respond politely:
-   German: "Gerne! Wir stehen Ihnen jederzeit zur Verfügung."
-   French: "Avec plaisir ! Nous restons à votre disposition."
-   English: "You're welcome! We're always at your service."
-✅ Customer provides information we requested → Acknowledge receipt
-✅ We have new information to share (e.g., supplier responded) → Update customer
-✅ First contact from customer → Acknowledge and explain what we're doing
-
-IMPORTANT: Amazon requires responses within 24 hours, so respond to almost every customer message.
-
-Set to null ONLY in these rare cases:
-❌ We're escalating to human AND no immediate acknowledgment is appropriate
-❌ Message is spam or completely unrelated to the ticket
-
-SUPPLIER ACTION ("supplier_action"):
-Generate ONLY when we need something from the supplier:
-✅ Need tracking information → Request tracking
-✅ Need return authorization → Request RMA
-✅ Need to report customer complaint/damage → Notify supplier
-✅ Need order status update → Request status
-✅ Need to cancel/modify order → Request change
-
-Set to null in these cases:
-❌ Just acknowledging customer's thank you → No supplier action needed
-❌ Already waiting for supplier response → Don't send duplicate requests
-❌ Supplier already provided the information → No new request needed
-❌ Customer inquiry can be answered without supplier → No supplier contact needed
-❌ Just forwarding supplier's response to customer → No new supplier action
-
-INTERNAL NOTE:
-Always generated automatically for logging purposes.
-
-CRITICAL LANGUAGE RULES:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-RULE 1: STRICT LANGUAGE CONSISTENCY
-- Customer messages: MUST be in {language} ONLY
-- Supplier messages: MUST be in {supplier_language or settings.supplier_default_language} ONLY
-- NEVER MIX LANGUAGES within the same message
-- NEVER use English for German/French customers
-- NEVER use German/French for English suppliers
-
-RULE 2: MANDATORY SIGNATURES (Copy these EXACTLY)
-For German messages: "Mit freundlichen Grüßen,\\nIhr Papersmart Team"
-For French messages: "Cordialement,\\nVotre équipe Papersmart"
-For English messages: "Best regards,\\nThe Papersmart Team"
-
-RULE 3: NEVER MAKE PROMISES
-DO NOT write phrases like:
-❌ "sobald wir eine Sendungsbestätigung haben, werden wir Sie informieren"
-❌ "we will update you as soon as we hear back"
-❌ "nous vous informerons dès que possible"
-❌ "wir werden uns bald bei Ihnen melden"
-
-Instead, state facts:
-✅ "Wir haben den Lieferanten kontaktiert"
-✅ "We have contacted the supplier"
-✅ "Nous avons contacté le fournisseur"
-
-RULE 4: LANGUAGE DECLARATION
-Your JSON response MUST include:
-"customer_response_language": "{language}"
-"supplier_message_language": "{supplier_language or settings.supplier_default_language}"
+        prompt += message_examples
 
-Guidelines:
-1. Respond in the SAME language as the customer email ({language})
-2. Be polite, professional, and helpful
-3. NEVER contradict what we already told the customer
-4. NEVER ask supplier for information they already provided
-5. For tracking inquiries: Request tracking from supplier or provide tracking if available in ticket data
-6. For returns: Provide return instructions and request return authorization from supplier if needed
-7. For complaints or damage: Apologize, gather details, escalate if needed
-8. If uncertain or complex issue: Set requires_escalation to true
-9. Reference order numbers and ticket numbers in responses
-10. Keep customer responses concise but complete
-11. CRITICAL: When a Purchase Order Number (PO#) is provided above, you MUST use it exactly as shown
-12. NEVER make up, guess, or hallucinate PO numbers - only use the PO number provided in "Existing Ticket Information"
-13. If you need to reference a PO number but none is provided above, set requires_escalation to true
+        prompt += f"""
+Customer communication language: {language}
+Supplier communication language: {supplier_language or settings.supplier_default_language}
 
-Provide ONLY the JSON response, no additional text.
+Analyze this ticket following the task instructions. Provide ONLY the JSON response, no additional text.
 """
 
         return prompt
 
     def _parse_ai_response(self, response: str) -> Dict[str, Any]:
-        """Parse AI response from JSON format"""
-        try:
-            # Try to extract JSON from response
-            # Sometimes AI includes markdown code blocks or extra text
-            response = response.strip()
+        """
+        Parse and validate an analysis response
+
+        Raises:
+            ValueError: If the response is not usable JSON or misses required fields
+        """
+        parsed = extract_json_object(response)
+        missing = validate_analysis(parsed)
+        required_missing = [field for field in missing if field in REQUIRED_FIELDS]
+        if required_missing:
+            logger.error("AI response is missing required fields", missing=required_missing, response=response[:500])
+            raise ValueError(f"Missing required field: {required_missing[0]}")
+        for field in ANALYSIS_SCHEMA['properties']:
+            parsed.setdefault(field, None)
+        return parsed
+
+    def _repair_request(self, ai_response: str, prompt: str, system_text: str) -> Optional[Tuple[Dict[str, Any], List[str], Dict[str, Any]]]:
+        """
+        Check a response and prepare the repair call for its missing fields
+
+        Returns:
+            (partial analysis, missing fields, repair call kwargs), or None when complete
+        """
+        partial = extract_json_object(ai_response)
+        missing = validate_analysis(partial)
+        if not missing or not settings.ai_response_repair_enabled:
+            return None
+        logger.warning("AI analysis incomplete, requesting missing fields", missing=missing)
+        return partial, missing, {
+            'prompt': build_repair_prompt(prompt, partial, missing),
+            'temperature': settings.ai_temperature,
+            'system_text': system_text,
+            'response_schema': repair_schema(missing),
+            'purpose': 'repair',
+        }
+
+    def _merge_repair(self, partial: Dict[str, Any], missing: List[str], repair_response: str,
+                      first_usage: Optional[Dict[str, Any]]) -> str:
+        """Merge the repair answer and account both calls' usage to the analysis"""
+        merged = merge_repair(partial, repair_response, missing)
+        still_missing = validate_analysis(merged)
+        logger.info("Repaired incomplete AI analysis", repaired=[f for f in missing if f not in still_missing],
+                    still_missing=still_missing)
+        set_last_usage(combine_usage(first_usage, pop_last_usage()))
+        return json.dumps(merged, ensure_ascii=False)
+
+    def _complete_response(self, ai_response: str, prompt: str, system_text: str) -> str:
+        """
+        Fill missing or invalid fields of a response with a follow-up call asking only for them
 
-            # Remove markdown code blocks
-            if response.startswith('```json'):
-                response = response[7:]
-            if response.startswith('```'):
-                response = response[3:]
-            if response.endswith('```'):
-                response = response[:-3]
+        Args:
+            ai_response: Provider response (must contain a JSON object)
+            prompt: The original analysis prompt
+            system_text: The analysis system text (same prefix, so it hits the prompt cache)
 
-            response = response.strip()
+        Returns:
+            Complete response JSON (unchanged when nothing was missing)
+        """
+        request = self._repair_request(ai_response, prompt, system_text)
+        if request is None:
+            return ai_response
+        partial, missing, kwargs = request
+        first_usage = pop_last_usage()
+        try:
+            repair_response = self.provider.generate_response(**kwargs)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error("AI analysis repair failed", error=str(e))
+            set_last_usage(first_usage)
+            return ai_response
+        return self._merge_repair(partial, missing, repair_response, first_usage)
+
+    async def _acomplete_response(self, ai_response: str, prompt: str, system_text: str) -> str:
+        """Async variant of _complete_response()"""
+        request = self._repair_request(ai_response, prompt, system_text)
+        if request is None:
+            return ai_response
+        partial, missing, kwargs = request
+        first_usage = pop_last_usage()
+        try:
+            repair_response = await self.provider.agenerate_response(**kwargs)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error("AI analysis repair failed", error=str(e))
+            set_last_usage(first_usage)
+            return ai_response
+        return self._merge_repair(partial, missing, repair_response, first_usage)
 
-            # Try to find JSON in the response (look for first { and last })
-            if '{' in response and '}' in response:
-                start = response.find('{')
-                end = response.rfind('}') + 1
-                response = response[start:end]
+    # ------------------------------------------------------------------
+    # Batch mode
+    # ------------------------------------------------------------------
 
-            parsed = json.loads(response)
+    def build_batch_request(
+        self,
+        email_data: Dict[str, Any],
+        ticket_data: Optional[Dict[str, Any]] = None,
+        ticket_history: Optional[Dict[str, Any]] = None,
+        supplier_language: Optional[str] = None,
+        customer_language: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Full-model analysis call for submission through BatchClient
 
-            # Validate required fields
-            required_fields = ['intent', 'ticket_type_id', 'confidence', 'requires_escalation']
-            for field in required_fields:
-                if field not in parsed:
-                    raise ValueError(f"Missing required field: {field}")
+        No triage call and no live tracking lookup are made; the provider call
+        is returned instead of executed.
 
-            return parsed
+        Returns:
+            Dict with the call (prompt, system_text, temperature, images,
+            response_schema) and 'context' (language, prompt_stats) for finish_batch_analysis()
+        """
+        prompt, images, language, prompt_stats = self._prepare_analysis(
+            email_data, ticket_data, ticket_history, supplier_language,
+            customer_language=customer_language,
+            live_tracking_lookup=lambda *_: None
+        )
+        return {
+            'prompt': prompt,
+            'system_text': self._build_analysis_system_text(),
+            'temperature': settings.ai_temperature,
+            'images': images or None,
+            'response_schema': ANALYSIS_SCHEMA,
+            'context': {'language': language, 'prompt_stats': prompt_stats},
+        }
+
+    def finish_batch_analysis(self, request: Dict[str, Any], response: str,
+                              usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Analysis dict from a batch response to a build_batch_request() call
 
-        except json.JSONDecodeError as e:
-            logger.error("Failed to parse AI response as JSON", error=str(e), response=response[:500])
-            raise ValueError(f"Invalid JSON response from AI: {e}")
+        Missing fields are repaired with a regular (non-batch) call.
+        """
+        language = request['context']['language']
+        set_last_usage(usage)
+        try:
+            ai_response = self._complete_response(response, request['prompt'], request['system_text'])
+            return self._finish_analysis(ai_response, language, request['context']['prompt_stats'])
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error("Failed to parse batch analysis", error=str(e))
+            return self._failed_analysis(language, e)
 
     def generate_custom_response(
         self,
@@ -807,8 +1803,27 @@ Provide only the generated text, no additional explanation.
 """
 
         try:
-            response = self.provider.generate_response(prompt, temperature=0.7)
+            response = self.provider.generate_response(prompt, temperature=0.7, purpose='custom')
             return response.strip()
         except Exception as e:
             logger.error("Failed to generate custom response", error=str(e))
             raise
+
+
+_shared_engine: Optional[AIEngine] = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_ai_engine() -> AIEngine:
+    """
+    Process-wide AIEngine, created on first use
+
+    Provider clients are initialized once and the system prompt follows the
+    prompt registry, so callers no longer need an engine of their own.
+    """
+    global _shared_engine
+    if _shared_engine is None:
+        with _shared_engine_lock:
+            if _shared_engine is None:
+                _shared_engine = AIEngine()
+    return _shared_engine
@@ -0,0 +1,235 @@
+"""
+Analysis Schema
+Single definition of the structured analysis result
+
+The JSON schema drives the providers' native structured-output modes (OpenAI
+json_schema, Anthropic forced tool use, Gemini JSON mode). Responses are then
+checked by a fast validator; when fields are missing or invalid (truncated
+output, a model ignoring the schema) only those fields are asked for again
+instead of re-running the whole analysis.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from .incremental_json import IncrementalJSONParser
+
+_NULLABLE_STRING = {"type": ["string", "null"]}
+
+# Property order matches ANALYSIS_INSTRUCTIONS: classification first, drafts last
+ANALYSIS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "intent": {
+            "type": "string",
+            "enum": [
+                "tracking_inquiry", "return_request", "price_question", "general_info",
+                "tech_support", "complaint", "transport_damage", "other"
+            ]
+        },
+        "ticket_type_id": {"type": "integer", "enum": [0, 1, 2, 3, 4, 5, 6, 7]},
+        "confidence": {"type": "number"},
+        "requires_escalation": {"type": "boolean"},
+        "escalation_reason": _NULLABLE_STRING,
+        "summary": {"type": "string"},
+        "reasoning": {
+            "type": "object",
+            "properties": {
+                "customer_main_concern": {"type": "string"},
+                "what_we_told_customer": _NULLABLE_STRING,
+                "what_supplier_told_us": _NULLABLE_STRING,
+                "pending_items": _NULLABLE_STRING,
+                "contradiction_check": {"type": "string"},
+                "logical_next_step": {"type": "string"}
+            },
+            "required": [
+                "customer_main_concern", "what_we_told_customer", "what_supplier_told_us",
+                "pending_items", "contradiction_check", "logical_next_step"
+            ],
+            "additionalProperties": False
+        },
+        # Languages the drafts are written in (RULE 4); nullable so they stay optional
+        "customer_response_language": _NULLABLE_STRING,
+        "supplier_message_language": _NULLABLE_STRING,
+        "customer_response": _NULLABLE_STRING,
+        "supplier_action": {
+            "anyOf": [
+                {
+                    "type": "object",
+                    "properties": {
+                        "action": _NULLABLE_STRING,
+                        "message": _NULLABLE_STRING
+                    },
+                    "required": ["action", "message"],
+                    "additionalProperties": False
+                },
+                {"type": "null"}
+            ]
+        },
+        "conversation_updates": {
+            "type": "object",
+            "properties": {
+                "customer_summary": _NULLABLE_STRING,
+                "supplier_summary": _NULLABLE_STRING,
+                "customer_promises": _NULLABLE_STRING,
+                "supplier_requests": _NULLABLE_STRING
+            },
+            "required": ["customer_summary", "supplier_summary", "customer_promises", "supplier_requests"],
+            "additionalProperties": False
+        }
+    },
+    "required": [
+        "intent", "ticket_type_id", "confidence", "requires_escalation", "escalation_reason", "summary",
+        "reasoning", "customer_response_language", "supplier_message_language", "customer_response",
+        "supplier_action", "conversation_updates"
+    ],
+    "additionalProperties": False
+}
+
+SCHEMA_NAME = "ticket_analysis"
+
+# Fields an analysis cannot be used without
+REQUIRED_FIELDS = ['intent', 'ticket_type_id', 'confidence', 'requires_escalation']
+
+# Fields worth a repair call when absent (the rest default to null)
+REPAIRABLE_FIELDS = REQUIRED_FIELDS + ['summary', 'customer_response', 'supplier_action']
+
+_INTENTS = set(ANALYSIS_SCHEMA['properties']['intent']['enum'])
+
+
+def extract_json_object(text: str) -> Dict[str, Any]:
+    """
+    Extract the analysis object from a model response
+
+    Handles markdown fences and surrounding prose. Truncated output is
+    salvaged field by field, keeping every top-level field that completed.
+
+    Args:
+        text: Raw model response
+
+    Returns:
+        Parsed (possibly partial) object
+
+    Raises:
+        ValueError: If no field could be recovered
+    """
+    text = (text or '').strip()
+    if '{' in text and '}' in text:
+        try:
+            parsed = json.loads(text[text.find('{'):text.rfind('}') + 1])
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    if not parser.fields:
+        raise ValueError(f"No JSON object in AI response: {text[:200]!r}")
+    return dict(parser.fields)
+
+
+def _as_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    return None
+
+
+def validate_analysis(parsed: Dict[str, Any]) -> List[str]:
+    """
+    Normalize an analysis in place and report the fields that need repair
+
+    Lenient coercions ('0.8' -> 0.8, 'true' -> True, unknown intent -> 'other')
+    are applied; values that cannot be coerced are removed.
+
+    Args:
+        parsed: Object from extract_json_object()
+
+    Returns:
+        Names of missing or invalid fields among REPAIRABLE_FIELDS (empty if valid)
+    """
+    if 'intent' in parsed:
+        intent = parsed['intent']
+        if not isinstance(intent, str) or not intent:
+            del parsed['intent']
+        elif intent not in _INTENTS:
+            parsed['intent'] = 'other'
+
+    if 'ticket_type_id' in parsed:
+        try:
+            parsed['ticket_type_id'] = int(parsed['ticket_type_id'])
+        except (TypeError, ValueError):
+            del parsed['ticket_type_id']
+
+    if 'confidence' in parsed:
+        try:
+            parsed['confidence'] = min(1.0, max(0.0, float(parsed['confidence'])))
+        except (TypeError, ValueError):
+            del parsed['confidence']
+
+    if 'requires_escalation' in parsed:
+        value = _as_bool(parsed['requires_escalation'])
+        if value is None:
+            del parsed['requires_escalation']
+        else:
+            parsed['requires_escalation'] = value
+
+    if 'supplier_action' in parsed and parsed['supplier_action'] is not None:
+        action = parsed['supplier_action']
+        if not isinstance(action, dict) or not action.get('action') or action.get('action') == 'null':
+            parsed['supplier_action'] = None
+
+    return [field for field in REPAIRABLE_FIELDS if field not in parsed]
+
+
+def repair_schema(fields: List[str]) -> Dict[str, Any]:
+    """JSON schema for a repair answer containing only the given fields"""
+    return {
+        "type": "object",
+        "properties": {field: ANALYSIS_SCHEMA['properties'][field] for field in fields},
+        "required": list(fields),
+        "additionalProperties": False
+    }
+
+
+def build_repair_prompt(prompt: str, partial: Dict[str, Any], missing: List[str]) -> str:
+    """
+    Build the prompt asking only for the missing fields
+
+    The original prompt comes first so the provider's prefix cache covers it.
+
+    Args:
+        prompt: The original per-email analysis prompt
+        partial: Fields already received
+        missing: Fields to ask for
+
+    Returns:
+        Prompt text
+    """
+    return f"""{prompt}
+
+Your previous answer was incomplete. Fields already provided:
+{json.dumps(partial, ensure_ascii=False)}
+
+Provide ONLY a JSON object with exactly these missing fields, consistent with the fields above: {', '.join(missing)}"""
+
+
+def merge_repair(partial: Dict[str, Any], repair_text: str, missing: List[str]) -> Dict[str, Any]:
+    """
+    Merge a repair answer into the partial analysis
+
+    Only the requested fields are taken from the repair answer.
+
+    Returns:
+        The merged analysis (validate again before use)
+    """
+    try:
+        repaired = extract_json_object(repair_text)
+    except ValueError:
+        repaired = {}
+    merged = dict(partial)
+    for field in missing:
+        if field in repaired:
+            merged[field] = repaired[field]
+    return merged
@@ -0,0 +1,630 @@
+"""
+Batch Client
+Submit collections of non-urgent AI requests to provider batch endpoints
+
+Work that doesn't need interactive latency (bulk re-analysis, prompt
+improvement runs) is submitted as a batch instead of going through the
+interactive path: it doesn't use the interactive rate-limit budget, and the
+OpenAI and Anthropic batch APIs bill at half price.
+
+- Batches and their requests are persisted (ai_batches, ai_batch_requests),
+  so results survive restarts of the submitting process.
+- run_batch_poller() (started by the web API) polls open batches every
+  settings.ai_batch_poll_seconds, stores the results and hands them to the
+  owner's handler (see BATCH_HANDLERS; owners are '<kind>:<reference>').
+  Owners without a handler read results with BatchClient.results().
+- Backends: OpenAIBatchBackend (/v1/batches), AnthropicBatchBackend (Message
+  Batches) and LocalBatchBackend, a stand-in that runs the requests through
+  the regular provider path at 'low' priority when the batch is collected.
+  It is used for providers without a batch API (Gemini), when
+  settings.ai_batch_backend is 'local', and in tests.
+
+A request is a dict with custom_id (1-64 characters: letters, digits, '-',
+'_'), prompt, and optionally system_text, temperature, images,
+response_schema and context (owner data returned with the result).
+"""
+import asyncio
+import importlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import structlog
+
+from config.settings import settings
+from src.ai.provider_clients import pop_last_usage
+
+logger = structlog.get_logger(__name__)
+
+# Batch states
+SUBMITTED = 'submitted'
+COLLECTING = 'collecting'
+COMPLETED = 'completed'
+FAILED = 'failed'
+EXPIRED = 'expired'
+CANCELLED = 'cancelled'
+FINAL_STATES = (COMPLETED, FAILED, EXPIRED, CANCELLED)
+
+# Result handlers by owner kind ('module:function', called with (reference, results))
+BATCH_HANDLERS: Dict[str, str] = {
+    'bulk_reanalysis': 'src.ai.bulk_reanalysis:handle_batch_results',
+}
+
+_registered_handlers: Dict[str, Callable[[str, Dict[str, Dict[str, Any]]], None]] = {}
+
+
+def register_batch_handler(kind: str, handler: Callable[[str, Dict[str, Dict[str, Any]]], None]) -> None:
+    """Register (or override) the result handler of an owner kind"""
+    _registered_handlers[kind] = handler
+
+
+def _resolve_handler(owner: str) -> Optional[Callable[[str, Dict[str, Dict[str, Any]]], None]]:
+    kind = owner.split(':', 1)[0]
+    if kind in _registered_handlers:
+        return _registered_handlers[kind]
+    target = BATCH_HANDLERS.get(kind)
+    if not target:
+        return None
+    module_name, function_name = target.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class BatchBackend:
+    """Provider batch endpoint"""
+
+    name = 'base'
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit requests; returns the provider batch ID"""
+        raise NotImplementedError
+
+    def status(self, external_id: str) -> str:
+        """SUBMITTED while the provider is working, else one of FINAL_STATES"""
+        raise NotImplementedError
+
+    def results(self, external_id: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Results of an ended batch by custom_id
+
+        Returns:
+            {custom_id: {'response': str, 'usage': dict} or {'error': str}}
+            (requests without a result are missing)
+        """
+        raise NotImplementedError
+
+    def cancel(self, external_id: str) -> None:
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API: JSONL of chat completion requests, 24h completion window"""
+
+    name = 'openai'
+
+    def __init__(self, model: str):
+        from src.ai.ai_engine import OpenAIProvider
+
+        if not settings.openai_api_key:
+            raise ValueError("OpenAI API key not configured")
+        self.provider = OpenAIProvider(settings.openai_api_key, model)
+        self.client = self.provider.client
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        lines = []
+        for request in requests:
+            body = self.provider._build_request(
+                request['prompt'], request.get('temperature', 0.7), request.get('system_text'),
+                request.get('images'), request.get('response_schema')
+            )
+            lines.append(json.dumps({
+                'custom_id': request['custom_id'],
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': body,
+            }, ensure_ascii=False))
+        batch_file = self.client.files.create(
+            file=('batch.jsonl', '\n'.join(lines).encode('utf-8')),
+            purpose='batch'
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        return batch.id
+
+    def status(self, external_id: str) -> str:
+        batch = self.client.batches.retrieve(external_id)
+        return {
+            'completed': COMPLETED,
+            'failed': FAILED,
+            'expired': EXPIRED,
+            'cancelled': CANCELLED,
+        }.get(batch.status, SUBMITTED)
+
+    def results(self, external_id: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        from openai.types.chat import ChatCompletion
+
+        batch = self.client.batches.retrieve(external_id)
+        results: Dict[str, Dict[str, Any]] = {}
+        # Expired and cancelled batches still return what was completed
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get('response') or {}
+                if response.get('status_code') == 200:
+                    content = self.provider._extract_content(ChatCompletion.model_validate(response['body']))
+                    results[item['custom_id']] = {'response': content, 'usage': pop_last_usage()}
+                else:
+                    error = item.get('error') or (response.get('body') or {}).get('error')
+                    results[item['custom_id']] = {
+                        'error': json.dumps(error) if error else f"HTTP {response.get('status_code')}"
+                    }
+        return results
+
+    def cancel(self, external_id: str) -> None:
+        self.client.batches.cancel(external_id)
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Anthropic Message Batches API"""
+
+    name = 'anthropic'
+
+    def __init__(self, model: str):
+        from src.ai.ai_engine import AnthropicProvider
+
+        if not settings.anthropic_api_key:
+            raise ValueError("Anthropic API key not configured")
+        self.provider = AnthropicProvider(settings.anthropic_api_key, model)
+        self.client = self.provider.client
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {
+                'custom_id': request['custom_id'],
+                'params': self.provider._build_request(
+                    request['prompt'], request.get('temperature', 0.7), request.get('system_text'),
+                    request.get('images'), request.get('response_schema')
+                ),
+            }
+            for request in requests
+        ])
+        return batch.id
+
+    def status(self, external_id: str) -> str:
+        batch = self.client.messages.batches.retrieve(external_id)
+        return COMPLETED if batch.processing_status == 'ended' else SUBMITTED
+
+    def results(self, external_id: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        for entry in self.client.messages.batches.results(external_id):
+            if entry.result.type == 'succeeded':
+                content = self.provider._extract_content(entry.result.message)
+                results[entry.custom_id] = {'response': content, 'usage': pop_last_usage()}
+            else:
+                error = getattr(entry.result, 'error', None)
+                results[entry.custom_id] = {'error': f"{entry.result.type}: {error}" if error else entry.result.type}
+        return results
+
+    def cancel(self, external_id: str) -> None:
+        self.client.messages.batches.cancel(external_id)
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Stand-in batch endpoint that runs the requests through the regular provider path
+
+    Nothing is sent on submit; the requests run (concurrently, at 'low'
+    rate-limit priority) when the batch is collected.
+    """
+
+    name = 'local'
+
+    def __init__(self, model: Optional[str] = None, responder: Optional[Callable[[Dict[str, Any]], str]] = None):
+        """
+        Args:
+            model: Unused (the configured provider router is used)
+            responder: Returns the response text for a request (default: AIEngine provider)
+        """
+        self.responder = responder
+        self._provider = None
+
+    def _respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from src.utils.rate_limiter import set_request_priority
+
+        set_request_priority('low')
+        pop_last_usage()
+        try:
+            if self.responder is not None:
+                response = self.responder(request)
+            else:
+                response = self._provider.generate_response(
+                    request['prompt'],
+                    temperature=request.get('temperature', 0.7),
+                    system_text=request.get('system_text'),
+                    images=request.get('images'),
+                    response_schema=request.get('response_schema'),
+                    purpose='batch'
+                )
+        except Exception as e:
+            return {'error': str(e)}
+        return {'response': response, 'usage': pop_last_usage()}
+
+    def submit(self, requests: List[Dict[str, Any]]) -> str:
+        return f"local-{uuid.uuid4().hex}"
+
+    def status(self, external_id: str) -> str:
+        return COMPLETED
+
+    def results(self, external_id: str, requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        if self.responder is None and self._provider is None:
+            from src.ai.ai_engine import get_ai_engine
+            self._provider = get_ai_engine().provider
+        with ThreadPoolExecutor(max_workers=settings.ai_max_concurrent_requests) as executor:
+            responses = list(executor.map(self._respond, requests))
+        return {request['custom_id']: response for request, response in zip(requests, responses)}
+
+    def cancel(self, external_id: str) -> None:
+        pass
+
+
+REMOTE_BACKENDS = {
+    'openai': OpenAIBatchBackend,
+    'anthropic': AnthropicBatchBackend,
+}
+
+
+class BatchClient:
+    """Submits batches, polls them and delivers their results to the owners"""
+
+    def __init__(self, session_maker: Any = None, backend_factory: Optional[Callable[[str, str], BatchBackend]] = None):
+        """
+        Args:
+            session_maker: SQLAlchemy sessionmaker (default: shared runtime one)
+            backend_factory: Creates the backend for (backend name, model) (default: see backend_for)
+        """
+        if session_maker is None:
+            from src.utils.runtime_status import get_session_maker
+            session_maker = get_session_maker()
+        self.session_maker = session_maker
+        self.backend_factory = backend_factory
+        self._backends: Dict[tuple, BatchBackend] = {}
+
+    @staticmethod
+    def backend_name(provider: str) -> str:
+        """Backend used for a provider under the current settings"""
+        if settings.ai_batch_backend == 'local' or provider not in REMOTE_BACKENDS:
+            return LocalBatchBackend.name
+        return provider
+
+    def backend_for(self, backend: str, model: str) -> BatchBackend:
+        key = (backend, model)
+        if key not in self._backends:
+            if self.backend_factory is not None:
+                self._backends[key] = self.backend_factory(backend, model)
+            else:
+                self._backends[key] = REMOTE_BACKENDS.get(backend, LocalBatchBackend)(model)
+        return self._backends[key]
+
+    def submit(self, owner: str, requests: List[Dict[str, Any]],
+               provider: Optional[str] = None, model: Optional[str] = None) -> List[int]:
+        """
+        Submit requests as one or more batches (split at settings.ai_batch_max_requests)
+
+        Args:
+            owner: '<kind>:<reference>' receiving the results
+            requests: Requests (see module docstring)
+            provider: Provider name (default: settings.ai_provider)
+            model: Model name (default: settings.ai_model)
+
+        Returns:
+            AIBatch IDs
+        """
+        from src.database.models import AIBatch, AIBatchRequest
+
+        provider = provider or settings.ai_provider
+        model = model or settings.ai_model
+        backend_name = self.backend_name(provider)
+        backend = self.backend_for(backend_name, model)
+
+        batch_ids = []
+        size = settings.ai_batch_max_requests
+        for start in range(0, len(requests), size):
+            chunk = requests[start:start + size]
+            calls = [{key: value for key, value in request.items() if key != 'context'} for request in chunk]
+            external_id = backend.submit(calls)
+
+            db = self.session_maker()
+            try:
+                batch = AIBatch(
+                    owner=owner,
+                    backend=backend_name,
+                    model=model,
+                    external_id=external_id,
+                    status=SUBMITTED,
+                    request_count=len(chunk)
+                )
+                db.add(batch)
+                db.flush()
+                for request, call in zip(chunk, calls):
+                    db.add(AIBatchRequest(
+                        batch_id=batch.id,
+                        custom_id=request['custom_id'],
+                        request={key: value for key, value in call.items() if key != 'custom_id'},
+                        context=request.get('context')
+                    ))
+                db.commit()
+                batch_ids.append(batch.id)
+            finally:
+                db.close()
+
+            logger.info("AI batch submitted", owner=owner, backend=backend_name, model=model,
+                        external_id=external_id, requests=len(chunk))
+        return batch_ids
+
+    def _claim(self, batch_id: int, from_status: str, to_status: str) -> bool:
+        """Move a batch between states unless another process got there first"""
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            claimed = db.query(AIBatch).filter(AIBatch.id == batch_id, AIBatch.status == from_status).update(
+                {'status': to_status, 'claimed_at': datetime.utcnow() if to_status == COLLECTING else None},
+                synchronize_session=False
+            )
+            db.commit()
+            return bool(claimed)
+        finally:
+            db.close()
+
+    def _collect(self, batch: Any, final_status: str) -> None:
+        """Fetch and store the results of an ended batch"""
+        from src.database.models import AIBatch, AIBatchRequest
+
+        if not self._claim(batch.id, SUBMITTED, COLLECTING):
+            return
+
+        db = self.session_maker()
+        try:
+            rows = db.query(AIBatchRequest).filter(AIBatchRequest.batch_id == batch.id).all()
+            requests = [{'custom_id': row.custom_id, **row.request} for row in rows]
+            # Failed batches have no results; cancelled local batches never ran
+            skip = final_status == FAILED or (batch.backend == LocalBatchBackend.name and final_status != COMPLETED)
+            try:
+                results = {} if skip else self.backend_for(batch.backend, batch.model).results(
+                    batch.external_id, requests
+                )
+            except Exception as e:
+                logger.error("Failed to fetch AI batch results", batch_id=batch.id, error=str(e))
+                db.query(AIBatch).filter(AIBatch.id == batch.id).update({'status': SUBMITTED, 'claimed_at': None})
+                db.commit()
+                return
+
+            for row in rows:
+                result = results.get(row.custom_id)
+                if result and 'response' in result:
+                    row.status = 'succeeded'
+                    row.response = result['response']
+                    usage = result.get('usage')
+                    if usage and batch.backend != LocalBatchBackend.name:
+                        usage = {**usage, 'batch': True}
+                    row.usage = usage
+                else:
+                    row.status = 'failed'
+                    row.error_message = (result or {}).get('error') or f"No result (batch {final_status})"
+
+            stored = db.get(AIBatch, batch.id)
+            stored.status = final_status
+            stored.succeeded_count = sum(1 for row in rows if row.status == 'succeeded')
+            stored.failed_count = len(rows) - stored.succeeded_count
+            stored.completed_at = datetime.utcnow()
+            stored.error_message = None if final_status == COMPLETED else f"Batch {final_status}"
+            db.commit()
+            logger.info("AI batch ended", batch_id=batch.id, owner=batch.owner, status=final_status,
+                        succeeded=stored.succeeded_count, failed=stored.failed_count)
+        finally:
+            db.close()
+
+    def results(self, batch_id: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Stored results of a batch by custom_id
+
+        Returns:
+            {custom_id: {'status', 'request', 'context', 'response', 'usage', 'error'}}
+        """
+        from src.database.models import AIBatchRequest
+
+        db = self.session_maker()
+        try:
+            return {
+                row.custom_id: {
+                    'status': row.status,
+                    'request': row.request,
+                    'context': row.context,
+                    'response': row.response,
+                    'usage': row.usage,
+                    'error': row.error_message,
+                }
+                for row in db.query(AIBatchRequest).filter(AIBatchRequest.batch_id == batch_id).all()
+            }
+        finally:
+            db.close()
+
+    def _deliver(self, batch: Any) -> None:
+        """Hand the results of an ended batch to its owner (once)"""
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            claimed = db.query(AIBatch).filter(AIBatch.id == batch.id, AIBatch.delivered_at.is_(None)).update(
+                {'delivered_at': datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        if not claimed:
+            return
+
+        try:
+            handler = _resolve_handler(batch.owner)
+            if handler is not None:
+                handler(batch.owner.split(':', 1)[1] if ':' in batch.owner else '', self.results(batch.id))
+            logger.info("AI batch delivered", batch_id=batch.id, owner=batch.owner)
+        except Exception as e:
+            # Retried on the next poll
+            logger.error("Failed to deliver AI batch results", batch_id=batch.id, owner=batch.owner, error=str(e))
+            db = self.session_maker()
+            try:
+                db.query(AIBatch).filter(AIBatch.id == batch.id).update({'delivered_at': None})
+                db.commit()
+            finally:
+                db.close()
+
+    def poll(self, batch_id: int) -> str:
+        """
+        Poll one batch; collects and delivers its results once it has ended
+
+        Returns:
+            The batch status
+        """
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            batch = db.get(AIBatch, batch_id)
+            if batch is None:
+                raise ValueError(f"AI batch {batch_id} not found")
+            db.expunge(batch)
+        finally:
+            db.close()
+
+        if batch.status == SUBMITTED:
+            try:
+                status = self.backend_for(batch.backend, batch.model).status(batch.external_id)
+            except Exception as e:
+                logger.warning("Failed to poll AI batch", batch_id=batch.id, error=str(e))
+                return batch.status
+            self._touch(batch.id)
+            if status in FINAL_STATES:
+                self._collect(batch, status)
+
+        return self._deliver_if_ended(batch.id)
+
+    def _touch(self, batch_id: int) -> None:
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            db.query(AIBatch).filter(AIBatch.id == batch_id).update({'last_polled_at': datetime.utcnow()})
+            db.commit()
+        finally:
+            db.close()
+
+    def _deliver_if_ended(self, batch_id: int) -> str:
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            batch = db.get(AIBatch, batch_id)
+            db.expunge(batch)
+        finally:
+            db.close()
+        if batch.status in FINAL_STATES and batch.delivered_at is None:
+            self._deliver(batch)
+        return batch.status
+
+    def poll_open(self) -> int:
+        """
+        Poll all undelivered batches
+
+        Returns:
+            Number of batches polled
+        """
+        from sqlalchemy import or_
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            # A collector that died mid-way leaves its claim behind; hand the batch back
+            cutoff = datetime.utcnow() - timedelta(minutes=settings.ai_batch_collect_timeout_minutes)
+            released = db.query(AIBatch).filter(
+                AIBatch.status == COLLECTING,
+                or_(AIBatch.claimed_at.is_(None), AIBatch.claimed_at < cutoff)
+            ).update({'status': SUBMITTED, 'claimed_at': None}, synchronize_session=False)
+            db.commit()
+            if released:
+                logger.warning("Released stale AI batch collection claims", batches=released)
+
+            batch_ids = [row[0] for row in db.query(AIBatch.id).filter(
+                AIBatch.delivered_at.is_(None),
+                AIBatch.status != COLLECTING
+            ).order_by(AIBatch.id).all()]
+        finally:
+            db.close()
+
+        for batch_id in batch_ids:
+            try:
+                self.poll(batch_id)
+            except Exception as e:
+                logger.error("Error polling AI batch", batch_id=batch_id, error=str(e))
+        return len(batch_ids)
+
+    def cancel(self, batch_id: int) -> bool:
+        """
+        Cancel a submitted batch (completed requests are still delivered)
+
+        Returns:
+            True if a cancel was requested
+        """
+        from src.database.models import AIBatch
+
+        db = self.session_maker()
+        try:
+            batch = db.get(AIBatch, batch_id)
+            if batch is None or batch.status != SUBMITTED:
+                return False
+            db.expunge(batch)
+        finally:
+            db.close()
+
+        self.backend_for(batch.backend, batch.model).cancel(batch.external_id)
+        if batch.backend == LocalBatchBackend.name:
+            self._collect(batch, CANCELLED)
+        logger.info("AI batch cancel requested", batch_id=batch_id, owner=batch.owner)
+        return True
+
+
+def batch_summary(batch: Any) -> Dict[str, Any]:
+    """JSON-serializable summary of an AIBatch"""
+    return {
+        'id': batch.id,
+        'owner': batch.owner,
+        'backend': batch.backend,
+        'model': batch.model,
+        'external_id': batch.external_id,
+        'status': batch.status,
+        'request_count': batch.request_count,
+        'succeeded_count': batch.succeeded_count,
+        'failed_count': batch.failed_count,
+        'error_message': batch.error_message,
+        'created_at': batch.created_at.isoformat() if batch.created_at else None,
+        'completed_at': batch.completed_at.isoformat() if batch.completed_at else None,
+        'delivered_at': batch.delivered_at.isoformat() if batch.delivered_at else None,
+    }
+
+
+async def run_batch_poller(session_maker: Any = None) -> None:
+    """Poll open batches every settings.ai_batch_poll_seconds until cancelled"""
+    client = BatchClient(session_maker)
+    while True:
+        try:
+            await asyncio.to_thread(client.poll_open)
+        except Exception as e:
+            logger.error("AI batch poller error", error=str(e))
+        await asyncio.sleep(settings.ai_batch_poll_seconds)
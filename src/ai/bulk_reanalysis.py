@@ -0,0 +1,767 @@
+"""
+Bulk Re-analysis
+Offline re-analysis of many tickets, e.g. to evaluate a new prompt version
+
+A job freezes a selection of tickets (by status, creation date, previous
+intent/feedback, ...) and analyzes each ticket's latest email with the job's
+PromptVersion. Results are stored per ticket in BulkReanalysisResult next to
+the ticket's previous decision; no AIDecisionLog entries, pending messages,
+status updates or ticketing API notes are created.
+
+- Tickets are analyzed concurrently (settings.bulk_reanalysis_concurrency) at
+  'low' rate-limit priority, so the email poller keeps its budget.
+- Ticket data is read through TicketDataCache (memory, then the
+  ticket_data_snapshots table, then the ticketing API), so evaluating a second
+  prompt on the same tickets doesn't fetch them again.
+- Jobs are resumable: a re-run skips tickets that already have a result and
+  retries the failed ones. A job whose AI provider circuit opens stops as
+  'failed' and can be resumed once the provider is back.
+- In batch mode the prompts are submitted through BatchClient (provider batch
+  APIs: half price, off the interactive rate-limit budget) and the job
+  completes when the batch poller delivers the results (handle_batch_results).
+  Batch analyses use the full model only (no triage step).
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import structlog
+
+from config.settings import settings
+from .telemetry import record_analysis_calls
+
+logger = structlog.get_logger(__name__)
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+# Feedback filter value matching decisions without feedback
+NO_FEEDBACK = 'none'
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if not value or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def select_tickets(db: Any, filters: Optional[Dict[str, Any]] = None) -> List[int]:
+    """
+    IDs of the tickets matching a job's selection filters
+
+    Args:
+        db: Database session
+        filters: Optional keys:
+            statuses: TicketState.current_state values
+            created_from / created_to: ISO dates bounding TicketState.created_at
+            intents: Intents of the ticket's latest AI decision
+            feedback: Feedback of the ticket's latest AI decision ('none' = no feedback)
+            escalated: Only escalated (True) or non-escalated (False) tickets
+            ticket_numbers: Explicit ticket numbers
+            limit: Keep only the N most recently created matches
+
+    Returns:
+        ticket_states IDs in ascending order
+    """
+    from sqlalchemy import func, or_
+    from src.database.models import AIDecisionLog, TicketState
+
+    filters = filters or {}
+    query = db.query(TicketState.id)
+
+    if filters.get('statuses'):
+        query = query.filter(TicketState.current_state.in_(filters['statuses']))
+    if filters.get('created_from'):
+        query = query.filter(TicketState.created_at >= _parse_date(filters['created_from']))
+    if filters.get('created_to'):
+        query = query.filter(TicketState.created_at < _parse_date(filters['created_to']))
+    if filters.get('escalated') is not None:
+        query = query.filter(TicketState.escalated == bool(filters['escalated']))
+    if filters.get('ticket_numbers'):
+        query = query.filter(TicketState.ticket_number.in_(filters['ticket_numbers']))
+
+    intents = filters.get('intents')
+    feedback = filters.get('feedback')
+    if intents or feedback:
+        latest = db.query(
+            AIDecisionLog.ticket_id.label('ticket_id'),
+            func.max(AIDecisionLog.id).label('decision_id')
+        ).group_by(AIDecisionLog.ticket_id).subquery()
+        query = query.join(latest, latest.c.ticket_id == TicketState.id).join(
+            AIDecisionLog, AIDecisionLog.id == latest.c.decision_id
+        )
+        if intents:
+            query = query.filter(AIDecisionLog.detected_intent.in_(intents))
+        if feedback:
+            values = [value for value in feedback if value != NO_FEEDBACK]
+            conditions = [AIDecisionLog.feedback.in_(values)] if values else []
+            if NO_FEEDBACK in feedback:
+                conditions.append(AIDecisionLog.feedback.is_(None))
+            query = query.filter(or_(*conditions))
+
+    query = query.order_by(TicketState.created_at.desc(), TicketState.id.desc())
+    if filters.get('limit'):
+        query = query.limit(int(filters['limit']))
+    return sorted(row[0] for row in query.all())
+
+
+def create_job(
+    db: Any,
+    filters: Optional[Dict[str, Any]] = None,
+    prompt_version_id: Optional[int] = None,
+    name: Optional[str] = None,
+    created_by: Optional[str] = None,
+    batch_mode: bool = False
+) -> Any:
+    """
+    Create a job over the tickets currently matching the filters
+
+    Args:
+        db: Database session
+        filters: Selection filters (see select_tickets)
+        prompt_version_id: PromptVersion to evaluate (None = current system prompt)
+        name: Optional job name
+        created_by: Username
+        batch_mode: Submit through the provider batch API instead of live calls
+
+    Returns:
+        The stored BulkReanalysisJob
+
+    Raises:
+        ValueError: If the prompt version doesn't exist
+    """
+    from src.database.models import BulkReanalysisJob, PromptVersion
+
+    if prompt_version_id is not None and db.get(PromptVersion, prompt_version_id) is None:
+        raise ValueError(f"Prompt version {prompt_version_id} not found")
+
+    ticket_ids = select_tickets(db, filters)
+    job = BulkReanalysisJob(
+        name=name,
+        prompt_version_id=prompt_version_id,
+        filters=filters or {},
+        ticket_ids=ticket_ids,
+        total_tickets=len(ticket_ids),
+        status=PENDING,
+        created_by=created_by,
+        batch_mode=batch_mode
+    )
+    db.add(job)
+    db.commit()
+    logger.info("Bulk re-analysis job created", job_id=job.id, tickets=len(ticket_ids),
+                prompt_version_id=prompt_version_id, batch_mode=batch_mode)
+    return job
+
+
+def cancel_job(db: Any, job_id: int) -> bool:
+    """
+    Ask a job to stop (a running job stops at its next progress checkpoint)
+
+    Returns:
+        True if the job was pending or running
+    """
+    from src.database.models import BulkReanalysisJob
+
+    job = db.get(BulkReanalysisJob, job_id)
+    if job is None or job.status not in (PENDING, RUNNING):
+        return False
+    job.status = CANCELLED
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    if job.batch_mode:
+        from src.ai.batch_client import BatchClient
+
+        # Requests completed before the cancel are still delivered
+        client = BatchClient()
+        for batch_id in _open_batch_ids(db, job_id):
+            try:
+                client.cancel(batch_id)
+            except Exception as e:
+                logger.warning("Failed to cancel AI batch", job_id=job_id, batch_id=batch_id, error=str(e))
+    logger.info("Bulk re-analysis job cancelled", job_id=job_id)
+    return True
+
+
+def _batch_owner(job_id: int) -> str:
+    return f'bulk_reanalysis:{job_id}'
+
+
+def _open_batch_ids(db: Any, job_id: int) -> List[int]:
+    """IDs of the job's batches whose results haven't been delivered yet"""
+    from src.database.models import AIBatch
+
+    return [row[0] for row in db.query(AIBatch.id).filter(
+        AIBatch.owner == _batch_owner(job_id),
+        AIBatch.delivered_at.is_(None)
+    ).all()]
+
+
+class TicketDataCache:
+    """Ticketing API ticket data, cached in memory and in the ticket_data_snapshots table"""
+
+    def __init__(self, session_maker: Any, ticketing_client: Any = None):
+        self.session_maker = session_maker
+        self._client = ticketing_client
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from src.api.ticketing_client import TicketingAPIClient
+            from src.utils.circuit_breaker import circuit_protected
+            from src.utils.rate_limiter import rate_limited
+
+            self._client = circuit_protected(rate_limited(TicketingAPIClient(), 'ticketing', priority='low'), 'ticketing')
+        return self._client
+
+    def get(self, ticket_number: str) -> Optional[Dict[str, Any]]:
+        """
+        Ticket data for a ticket number (blocking; call from a worker thread)
+
+        Returns:
+            Ticket data dict, or None if the ticketing API doesn't know the ticket
+        """
+        from src.database.models import TicketDataSnapshot
+
+        data = self._memory.get(ticket_number)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        max_age = settings.bulk_reanalysis_ticket_cache_hours
+        db = self.session_maker()
+        try:
+            snapshot = db.get(TicketDataSnapshot, ticket_number)
+            if max_age and snapshot and snapshot.fetched_at >= datetime.utcnow() - timedelta(hours=max_age):
+                self.hits += 1
+                self._memory[ticket_number] = snapshot.data
+                return snapshot.data
+
+            self.misses += 1
+            tickets = self.client.get_ticket_by_ticket_number(ticket_number)
+            if not tickets:
+                return None
+            data = tickets[0]
+            if max_age:
+                db.merge(TicketDataSnapshot(ticket_number=ticket_number, data=data, fetched_at=datetime.utcnow()))
+                db.commit()
+            self._memory[ticket_number] = data
+            return data
+        finally:
+            db.close()
+
+
+def build_email_data(db: Any, ticket: Any, ticket_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The email to re-analyze: the ticket's latest processed email, else its latest customer message
+
+    Attachments are not re-sent (text-only re-analysis).
+
+    Returns:
+        email_data for AIEngine.aanalyze_email(), or None if the ticket has no message
+    """
+    from src.database.models import ProcessedEmail
+
+    email = db.query(ProcessedEmail).filter(
+        ProcessedEmail.ticket_id == ticket.id,
+        ProcessedEmail.message_body.isnot(None)
+    ).order_by(ProcessedEmail.processed_at.desc()).first()
+    if email:
+        return {
+            'subject': email.subject or '',
+            'body': email.message_body,
+            'from': email.from_address or ticket.customer_email,
+            'message_id': email.gmail_message_id,
+        }
+
+    for detail in reversed(ticket_data.get('ticketDetails', [])):
+        if detail.get('sourceTicketSideTypeId') == 2 and detail.get('comment'):
+            return {
+                'subject': f'Ticket {ticket.ticket_number}',
+                'body': detail['comment'],
+                'from': ticket.customer_email,
+            }
+    for detail in ticket_data.get('ticketDetails', []):
+        if detail.get('entranceEmailBody'):
+            return {
+                'subject': detail.get('entranceEmailSubject', ''),
+                'body': detail['entranceEmailBody'],
+                'from': detail.get('entranceEmailSenderAddress', ticket.customer_email),
+            }
+    return None
+
+
+class BulkReanalysisRunner:
+    """Runs (or resumes) bulk re-analysis jobs"""
+
+    def __init__(
+        self,
+        session_maker: Any = None,
+        ticketing_client: Any = None,
+        concurrency: Optional[int] = None,
+        engine_factory: Optional[Callable[[Optional[str]], Any]] = None
+    ):
+        """
+        Args:
+            session_maker: SQLAlchemy sessionmaker (default: shared runtime one)
+            ticketing_client: Ticketing API client (default: rate limited, low priority)
+            concurrency: Tickets analyzed at once (default: settings.bulk_reanalysis_concurrency)
+            engine_factory: Creates the AIEngine for a system prompt (default: AIEngine)
+        """
+        if session_maker is None:
+            from src.utils.runtime_status import get_session_maker
+            session_maker = get_session_maker()
+        self.session_maker = session_maker
+        self.ticket_cache = TicketDataCache(session_maker, ticketing_client)
+        self.concurrency = concurrency or settings.bulk_reanalysis_concurrency
+        self.engine_factory = engine_factory
+        self._stop_reason: Optional[str] = None
+
+    def _create_engine(self, system_prompt: Optional[str]) -> Any:
+        if self.engine_factory is not None:
+            return self.engine_factory(system_prompt)
+        from src.ai.ai_engine import AIEngine
+        return AIEngine(system_prompt=system_prompt)
+
+    def _start(self, job_id: int) -> Dict[str, Any]:
+        """Mark the job running and list its remaining tickets"""
+        from src.database.models import BulkReanalysisJob, BulkReanalysisResult
+
+        db = self.session_maker()
+        try:
+            job = db.get(BulkReanalysisJob, job_id)
+            if job is None:
+                raise ValueError(f"Bulk re-analysis job {job_id} not found")
+            if job.status == COMPLETED:
+                raise ValueError(f"Bulk re-analysis job {job_id} is already completed")
+
+            open_batches = _open_batch_ids(db, job_id) if job.batch_mode else []
+            if not open_batches:
+                # Failed tickets are retried (unless a batch is still outstanding)
+                db.query(BulkReanalysisResult).filter(
+                    BulkReanalysisResult.job_id == job_id,
+                    BulkReanalysisResult.error_message.isnot(None)
+                ).delete(synchronize_session=False)
+                job.started_at = datetime.utcnow()
+            done = {row[0] for row in db.query(BulkReanalysisResult.ticket_id).filter(
+                BulkReanalysisResult.job_id == job_id
+            )}
+            job.status = RUNNING
+            job.finished_at = None
+            job.error_message = None
+            db.commit()
+            return {
+                'pending': [ticket_id for ticket_id in job.ticket_ids if ticket_id not in done],
+                'prompt_version_id': job.prompt_version_id,
+                'system_prompt': job.prompt_version.prompt_text if job.prompt_version else None,
+                'batch_mode': bool(job.batch_mode),
+                'open_batches': open_batches,
+            }
+        finally:
+            db.close()
+
+    def _prepare(self, ticket_id: int) -> Dict[str, Any]:
+        """Analysis input and previous decision of one ticket (blocking)"""
+        from src.database.models import AIDecisionLog, Supplier, TicketState
+        from src.ai.conversation_summary import ConversationSummarizer
+
+        db = self.session_maker()
+        try:
+            ticket = db.get(TicketState, ticket_id)
+            if ticket is None:
+                raise ValueError("Ticket no longer exists")
+
+            ticket_data = self.ticket_cache.get(ticket.ticket_number)
+            if not ticket_data:
+                raise ValueError("Ticket not found in ticketing system")
+
+            email_data = build_email_data(db, ticket, ticket_data)
+            if not email_data:
+                raise ValueError("No message to analyze")
+
+            supplier_language = getattr(settings, 'supplier_default_language', 'en-US')
+            purchase_orders = (ticket_data.get('salesOrder') or {}).get('purchaseOrders') or []
+            supplier_name = purchase_orders[0].get('supplierName') if purchase_orders else None
+            if supplier_name:
+                supplier = db.query(Supplier).filter(Supplier.name == supplier_name).first()
+                if supplier and supplier.language_code:
+                    supplier_language = supplier.language_code
+
+            previous = db.query(AIDecisionLog).filter(
+                AIDecisionLog.ticket_id == ticket_id
+            ).order_by(AIDecisionLog.id.desc()).first()
+
+            return {
+                'request': {
+                    'email_data': email_data,
+                    'ticket_data': ticket_data,
+                    # Stored summaries are read, not extended: snapshots may be older than the live ticket
+                    'ticket_history': ConversationSummarizer(self.session_maker, None).ticket_history(
+                        ticket_data, update=False
+                    ),
+                    'supplier_language': supplier_language,
+                    'customer_language': ticket.customer_language,
+                    'live_tracking': False,
+                },
+                'previous_decision_id': previous.id if previous else None,
+                'previous_intent': previous.detected_intent if previous else None,
+                'previous_feedback': previous.feedback if previous else None,
+            }
+        finally:
+            db.close()
+
+    def _store(self, job_id: int, ticket_id: int, prompt_version_id: Optional[int],
+               prepared: Optional[Dict[str, Any]], analysis: Optional[Dict[str, Any]],
+               error: Optional[str], latency_ms: float) -> None:
+        from src.ai.pricing import estimate_cost
+        from src.database.models import BulkReanalysisResult
+
+        prepared = prepared or {}
+        analysis = analysis or {}
+        usage = analysis.get('usage') or {}
+        result = BulkReanalysisResult(
+            job_id=job_id,
+            ticket_id=ticket_id,
+            prompt_version_id=prompt_version_id,
+            previous_decision_id=prepared.get('previous_decision_id'),
+            previous_intent=prepared.get('previous_intent'),
+            previous_feedback=prepared.get('previous_feedback'),
+            latency_ms=round(latency_ms, 1),
+            error_message=error,
+        )
+        if analysis and not error:
+            result.detected_language = analysis.get('language')
+            result.detected_intent = analysis.get('intent')
+            result.confidence_score = analysis.get('confidence')
+            result.requires_escalation = bool(analysis.get('requires_escalation'))
+            result.escalation_reason = analysis.get('escalation_reason')
+            result.summary = analysis.get('summary')
+            result.customer_response = analysis.get('customer_response')
+            result.supplier_action = analysis.get('supplier_action')
+            result.tier = analysis.get('tier')
+            result.cached = bool(analysis.get('cached'))
+            result.input_tokens = usage.get('input_tokens', 0)
+            result.output_tokens = usage.get('output_tokens', 0)
+            result.cached_input_tokens = usage.get('cached_input_tokens', 0)
+            result.cost_usd = estimate_cost(usage.get('model', ''), usage) if usage else 0.0
+
+        db = self.session_maker()
+        try:
+            db.add(result)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _process(self, job_id: int, prompt_version_id: Optional[int], engine: Any, ticket_id: int) -> None:
+        """Analyze one ticket and store its result"""
+        from src.utils.circuit_breaker import CircuitOpenError
+
+        started = time.monotonic()
+        prepared = None
+        analysis = None
+        try:
+            prepared = await asyncio.to_thread(self._prepare, ticket_id)
+            analysis = await engine.aanalyze_email(**prepared['request'])
+            # The job's engine runs with an explicit prompt: link its calls to the job's version
+            record_analysis_calls({**analysis, 'prompt_version_id': prompt_version_id or analysis.get('prompt_version_id')})
+            error = analysis.get('error')
+        except CircuitOpenError as e:
+            # Leave the ticket for a resume instead of recording a failure
+            self._stop_reason = f"Dependency unavailable: {e}"
+            return
+        except Exception as e:
+            error = str(e)
+
+        if error:
+            logger.warning("Bulk re-analysis failed for ticket", job_id=job_id, ticket_id=ticket_id, error=error)
+        await asyncio.to_thread(
+            self._store, job_id, ticket_id, prompt_version_id, prepared, analysis, error,
+            (time.monotonic() - started) * 1000
+        )
+
+    def _checkpoint(self, job_id: int) -> None:
+        """Publish progress and pick up cancellation"""
+        from src.database.models import BulkReanalysisJob
+        from src.utils.runtime_status import publish_status
+
+        db = self.session_maker()
+        try:
+            job = db.get(BulkReanalysisJob, job_id)
+            if job is not None and job.status == CANCELLED:
+                self._stop_reason = CANCELLED
+            report = job_report(db, job_id)
+        finally:
+            db.close()
+        publish_status(f'bulk_reanalysis:{job_id}', report['progress'])
+        logger.info("Bulk re-analysis progress", job_id=job_id, **report['progress'])
+
+    def _finish(self, job_id: int) -> Dict[str, Any]:
+        from src.database.models import BulkReanalysisJob
+        from src.utils.runtime_status import publish_status
+
+        db = self.session_maker()
+        try:
+            job = db.get(BulkReanalysisJob, job_id)
+            if self._stop_reason == CANCELLED or job.status == CANCELLED:
+                job.status = CANCELLED
+            elif self._stop_reason:
+                job.status = FAILED
+                job.error_message = self._stop_reason
+            else:
+                job.status = COMPLETED
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            report = job_report(db, job_id)
+        finally:
+            db.close()
+        publish_status(f'bulk_reanalysis:{job_id}', report['progress'])
+        logger.info("Bulk re-analysis job finished", job_id=job_id, status=report['status'], **report['progress'])
+        return report
+
+    async def _submit_batch(self, job_id: int, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the prompts of the remaining tickets and submit them as a batch
+
+        Tickets the local classifier settles and tickets that can't be prepared
+        are stored right away. The job stays running until the batch results
+        are delivered (handle_batch_results).
+        """
+        from src.ai.batch_client import BatchClient
+
+        if state['open_batches']:
+            logger.info("Bulk re-analysis job is waiting for its batch", job_id=job_id, batches=state['open_batches'])
+        else:
+            engine = self._create_engine(state['system_prompt'])
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def build(ticket_id: int) -> Optional[Dict[str, Any]]:
+                async with semaphore:
+                    prepared = None
+                    try:
+                        prepared = await asyncio.to_thread(self._prepare, ticket_id)
+                        request = prepared['request']
+                        local = engine._preclassify(request['email_data'])
+                        if local and local['route'] == 'skip_llm':
+                            analysis = engine._local_analysis(local, request['email_data'], request['customer_language'])
+                            await asyncio.to_thread(self._store, job_id, ticket_id, state['prompt_version_id'],
+                                                    prepared, analysis, None, 0.0)
+                            return None
+                        call = await asyncio.to_thread(
+                            engine.build_batch_request,
+                            **{key: value for key, value in request.items() if key != 'live_tracking'}
+                        )
+                    except Exception as e:
+                        await asyncio.to_thread(self._store, job_id, ticket_id, state['prompt_version_id'],
+                                                prepared, None, str(e), 0.0)
+                        return None
+                    context = {key: value for key, value in prepared.items() if key != 'request'}
+                    return {
+                        'custom_id': f'ticket-{ticket_id}',
+                        **{key: value for key, value in call.items() if key != 'context'},
+                        'context': {**context, **call['context'], 'ticket_id': ticket_id},
+                    }
+
+            requests = [request for request in await asyncio.gather(*(build(t) for t in state['pending'])) if request]
+            if requests:
+                batch_ids = await asyncio.to_thread(BatchClient(self.session_maker).submit, _batch_owner(job_id), requests)
+                logger.info("Bulk re-analysis batch submitted", job_id=job_id, requests=len(requests), batches=batch_ids)
+            else:
+                return await asyncio.to_thread(self._finish, job_id)
+
+        db = self.session_maker()
+        try:
+            return job_report(db, job_id)
+        finally:
+            db.close()
+
+    async def run(self, job_id: int) -> Dict[str, Any]:
+        """
+        Run a job until all its tickets have a result, it is cancelled or a dependency circuit opens
+
+        Args:
+            job_id: BulkReanalysisJob ID (pending, running/interrupted, failed or cancelled jobs are resumed)
+
+        Returns:
+            Job report (see job_report)
+        """
+        from src.utils.rate_limiter import set_request_priority
+
+        set_request_priority('low')
+        self._stop_reason = None
+        state = await asyncio.to_thread(self._start, job_id)
+        pending = state['pending']
+        logger.info("Bulk re-analysis job started", job_id=job_id, remaining=len(pending),
+                    concurrency=self.concurrency, batch_mode=state['batch_mode'])
+
+        if state['batch_mode']:
+            return await self._submit_batch(job_id, state)
+
+        try:
+            engine = self._create_engine(state['system_prompt'])
+            queue: asyncio.Queue = asyncio.Queue()
+            for ticket_id in pending:
+                queue.put_nowait(ticket_id)
+            processed = 0
+
+            async def worker():
+                nonlocal processed
+                while not self._stop_reason:
+                    try:
+                        ticket_id = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    await self._process(job_id, state['prompt_version_id'], engine, ticket_id)
+                    processed += 1
+                    if processed % settings.bulk_reanalysis_progress_every == 0:
+                        await asyncio.to_thread(self._checkpoint, job_id)
+
+            await asyncio.gather(*(worker() for _ in range(max(1, min(self.concurrency, len(pending))))))
+        except Exception as e:
+            logger.error("Bulk re-analysis job failed", job_id=job_id, error=str(e))
+            self._stop_reason = self._stop_reason or str(e)
+
+        return await asyncio.to_thread(self._finish, job_id)
+
+
+def handle_batch_results(reference: str, results: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Store the delivered batch results of a bulk re-analysis job (BatchClient handler)
+
+    The job completes once none of its batches is outstanding.
+
+    Args:
+        reference: Job ID
+        results: BatchClient.results() of the delivered batch
+    """
+    from src.database.models import BulkReanalysisJob
+
+    job_id = int(reference)
+    runner = BulkReanalysisRunner()
+    db = runner.session_maker()
+    try:
+        job = db.get(BulkReanalysisJob, job_id)
+        if job is None:
+            logger.warning("Batch results for unknown bulk re-analysis job", job_id=job_id)
+            return
+        system_prompt = job.prompt_version.prompt_text if job.prompt_version else None
+        prompt_version_id = job.prompt_version_id
+    finally:
+        db.close()
+
+    engine = runner._create_engine(system_prompt)
+    for result in results.values():
+        context = result['context'] or {}
+        ticket_id = context['ticket_id']
+        if result['status'] != 'succeeded':
+            runner._store(job_id, ticket_id, prompt_version_id, context, None, result['error'] or 'Batch request failed', 0.0)
+            continue
+        request = {**result['request'], 'context': context}
+        analysis = engine.finish_batch_analysis(request, result['response'], result['usage'])
+        runner._store(job_id, ticket_id, prompt_version_id, context, analysis, analysis.get('error'), 0.0)
+
+    db = runner.session_maker()
+    try:
+        # delivered_at of the current batch is already set
+        outstanding = _open_batch_ids(db, job_id)
+    finally:
+        db.close()
+    if not outstanding:
+        runner._finish(job_id)
+
+
+def job_report(db: Any, job_id: int) -> Dict[str, Any]:
+    """
+    Progress, throughput, cost and outcome of a job
+
+    Outcomes are compared with each ticket's previous decision: intent changes,
+    and agreement with decisions a human marked 'correct' / 'incorrect'.
+
+    Args:
+        db: Database session
+        job_id: BulkReanalysisJob ID
+
+    Returns:
+        Report dict
+
+    Raises:
+        ValueError: If the job doesn't exist
+    """
+    from src.database.models import BulkReanalysisJob, BulkReanalysisResult
+
+    job = db.get(BulkReanalysisJob, job_id)
+    if job is None:
+        raise ValueError(f"Bulk re-analysis job {job_id} not found")
+
+    results = db.query(BulkReanalysisResult).filter(BulkReanalysisResult.job_id == job_id).all()
+    analyzed = [r for r in results if not r.error_message]
+    failed = len(results) - len(analyzed)
+    remaining = max(0, job.total_tickets - len(results))
+
+    # Throughput of the latest run
+    elapsed = 0.0
+    run_count = 0
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        run_count = sum(1 for r in results if r.created_at >= job.started_at)
+    per_minute = run_count / (elapsed / 60) if elapsed > 0 else 0.0
+
+    cost = sum(r.cost_usd or 0.0 for r in analyzed)
+    cost_per_ticket = cost / len(analyzed) if analyzed else 0.0
+
+    compared = [r for r in analyzed if r.previous_intent]
+    confirmed = [r for r in compared if r.previous_feedback == 'correct']
+    rejected = [r for r in compared if r.previous_feedback == 'incorrect']
+
+    return {
+        'job_id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'batch_mode': bool(job.batch_mode),
+        'prompt_version_id': job.prompt_version_id,
+        'filters': job.filters,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'error_message': job.error_message,
+        'progress': {
+            'total': job.total_tickets,
+            'analyzed': len(analyzed),
+            'failed': failed,
+            'remaining': remaining,
+            'percent': round(100.0 * len(results) / job.total_tickets, 1) if job.total_tickets else 100.0,
+            'tickets_per_minute': round(per_minute, 1),
+            'eta_seconds': round(remaining / per_minute * 60) if per_minute and job.status == RUNNING else None,
+        },
+        'cost': {
+            'input_tokens': sum(r.input_tokens or 0 for r in analyzed),
+            'cached_input_tokens': sum(r.cached_input_tokens or 0 for r in analyzed),
+            'output_tokens': sum(r.output_tokens or 0 for r in analyzed),
+            'cost_usd': round(cost, 4),
+            'cost_per_ticket_usd': round(cost_per_ticket, 5),
+            'projected_total_usd': round(cost + cost_per_ticket * (remaining + failed), 4),
+            'response_cache_hits': sum(1 for r in analyzed if r.cached),
+            'mean_latency_ms': round(sum(r.latency_ms or 0 for r in analyzed) / len(analyzed), 1) if analyzed else None,
+        },
+        'outcome': {
+            'intents': dict(Counter(r.detected_intent for r in analyzed).most_common()),
+            'tiers': dict(Counter(r.tier for r in analyzed)),
+            'escalation_rate': round(sum(1 for r in analyzed if r.requires_escalation) / len(analyzed), 3) if analyzed else None,
+            'compared_with_previous': len(compared),
+            'intent_changed': sum(1 for r in compared if r.detected_intent != r.previous_intent),
+            'agreement_with_confirmed': round(
+                sum(1 for r in confirmed if r.detected_intent == r.previous_intent) / len(confirmed), 3
+            ) if confirmed else None,
+            'confirmed_decisions': len(confirmed),
+            'changed_on_rejected': round(
+                sum(1 for r in rejected if r.detected_intent != r.previous_intent) / len(rejected), 3
+            ) if rejected else None,
+            'rejected_decisions': len(rejected),
+        },
+    }
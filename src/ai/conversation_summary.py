@@ -0,0 +1,244 @@
+"""
+Conversation Summary
+Rolling per-ticket summary of the conversation for AI prompts
+
+Instead of re-sending the latest raw messages of every thread on each
+analysis, older ticketDetails are folded into a stored summary by the cheap
+(triage) model. The analysis prompt gets the summary plus the messages after
+its watermark, so long tickets send fewer tokens and keep their early context.
+
+The summary is only ever extended: a fold sends the previous summary and the
+messages that aged out of the verbatim window, then moves the watermark to the
+last folded ticketDetail. If the watermark detail disappears from the ticket
+data the summary is rebuilt from the start.
+"""
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+from .analysis_schema import extract_json_object
+from .pricing import estimate_cost
+from .prompt_budget import count_tokens
+from .provider_clients import pop_last_usage
+from .ticket_history import build_ticket_history, group_entries, history_entries
+
+logger = structlog.get_logger(__name__)
+
+SUMMARY_FIELDS = ('customer', 'supplier', 'internal', 'open_items')
+
+# Static (cacheable) summarization instructions
+SUMMARY_INSTRUCTIONS = """You maintain the running summary of a customer support ticket of a dropshipping company.
+You get the current summary (empty for a new ticket) and the next messages of the ticket in chronological order.
+Return the updated summary covering everything so far.
+
+Keep all facts later replies depend on: order/purchase order/tracking numbers, products, dates and deadlines,
+what the customer asked for, what we told or promised the customer, what we asked the supplier and what the
+supplier answered, return/refund/replacement decisions, and anything still unresolved.
+Drop greetings, signatures, quoted text and repetition. Never invent facts.
+Keep each text field under 120 words. Write the summary in English.
+
+Respond with ONLY this JSON object:
+{
+  "customer": "state of the conversation with the customer",
+  "supplier": "state of the conversation with the supplier",
+  "internal": "relevant internal notes",
+  "open_items": ["open question, promise or pending action", "..."]
+}
+"""
+
+Entry = Tuple[str, str, Dict[str, Any]]
+
+
+def _fold_prompt(previous: Optional[Dict[str, Any]], entries: List[Entry]) -> str:
+    """Summarization prompt for one fold"""
+    messages = [{'thread': thread, **entry} for _, thread, entry in entries]
+    return (
+        f"Current summary (JSON):\n{json.dumps(previous or {}, ensure_ascii=False)}\n\n"
+        f"Next messages (JSON):\n{json.dumps(messages, ensure_ascii=False, separators=(',', ':'))}\n"
+    )
+
+
+def _parse_summary(response: str) -> Dict[str, Any]:
+    """
+    Validate the model's summary JSON
+
+    Raises:
+        ValueError: If the response is not a summary object
+    """
+    parsed = extract_json_object(response)
+    summary = {field: parsed.get(field) for field in SUMMARY_FIELDS}
+    if not any(summary.values()):
+        raise ValueError("Empty conversation summary")
+    summary['open_items'] = [str(item) for item in summary['open_items'] or [] if item]
+    for field in ('customer', 'supplier', 'internal'):
+        summary[field] = str(summary[field] or '')
+    return summary
+
+
+def _chunks(entries: List[Entry], max_tokens: int) -> List[List[Entry]]:
+    """Split entries into consecutive folds of at most max_tokens (at least one entry each)"""
+    chunks, current, size = [], [], 0
+    for item in entries:
+        tokens = count_tokens(json.dumps(item[2], ensure_ascii=False))
+        if current and size + tokens > max_tokens:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ConversationSummarizer:
+    """
+    Builds the ticket history for analysis prompts from the stored rolling summary
+
+    Usage:
+        summarizer = ConversationSummarizer(SessionMaker, ai_engine)
+        ticket_history = summarizer.ticket_history(ticket_data)
+    """
+
+    def __init__(self, session_maker: Callable, ai_engine: Any):
+        """
+        Args:
+            session_maker: SQLAlchemy session factory
+            ai_engine: AIEngine whose triage model (else the main model) writes the summaries
+        """
+        self.session_maker = session_maker
+        self.ai_engine = ai_engine
+
+    def ticket_history(self, ticket_data: Dict[str, Any], update: bool = True) -> Dict[str, Any]:
+        """
+        Summary plus the messages after it, in the build_ticket_history() format
+
+        Args:
+            ticket_data: Ticket data from the ticketing API (with ticketDetails)
+            update: Fold aged-out messages into the stored summary; when False
+                (e.g. re-analysis of older ticket snapshots) the stored summary is only read
+
+        Returns:
+            Dict with customer_thread, supplier_thread and internal_notes, plus
+            'conversation_summary' when earlier messages are summarized
+        """
+        ticket_number = ticket_data.get('ticketNumber')
+        if not settings.conversation_summary_enabled or not ticket_number:
+            return build_ticket_history(ticket_data)
+
+        entries = history_entries(
+            ticket_data,
+            message_chars=settings.conversation_summary_message_chars,
+            note_chars=settings.conversation_summary_message_chars
+        )
+
+        try:
+            record = self._load(ticket_number)
+            summary, delta = self._split(record, entries)
+
+            keep = settings.conversation_summary_keep_recent
+            if update and len(delta) >= keep + settings.conversation_summary_fold_min:
+                summary = self._fold(ticket_number, summary, delta[:-keep] if keep else delta)
+                delta = delta[-keep:] if keep else []
+        except Exception as e:
+            logger.warning("Conversation summary unavailable, using recent history", ticket_number=ticket_number,
+                           error=str(e))
+            return build_ticket_history(ticket_data)
+
+        if summary is None:
+            if len(delta) >= keep + settings.conversation_summary_fold_min:
+                # Long conversation nobody summarized yet (update=False)
+                return build_ticket_history(ticket_data)
+            # Short conversation: everything fits verbatim
+            return group_entries(delta)
+        return {'conversation_summary': summary, **group_entries(delta)}
+
+    def _load(self, ticket_number: str) -> Optional[Dict[str, Any]]:
+        from src.database.models import TicketConversationSummary
+
+        db = self.session_maker()
+        try:
+            record = db.get(TicketConversationSummary, ticket_number)
+            if record is None:
+                return None
+            return {
+                'summary': record.summary,
+                'watermark': record.watermark_detail_key,
+                'timestamp': record.watermark_timestamp,
+                'entries': record.summarized_entries,
+            }
+        finally:
+            db.close()
+
+    @staticmethod
+    def _split(record: Optional[Dict[str, Any]], entries: List[Entry]) -> Tuple[Optional[Dict[str, Any]], List[Entry]]:
+        """Stored summary (prompt form) and the entries after its watermark"""
+        if record is None:
+            return None, entries
+        keys = [key for key, _, _ in entries]
+        if record['watermark'] not in keys:
+            return None, entries
+        position = keys.index(record['watermark']) + 1
+        return {**record['summary'], 'covers_until': record['timestamp'], 'messages': record['entries']}, entries[position:]
+
+    def _fold(self, ticket_number: str, summary: Optional[Dict[str, Any]], entries: List[Entry]) -> Dict[str, Any]:
+        """Fold entries into the summary (one call per chunk) and store it after each call"""
+        provider = self.ai_engine.triage_provider or self.ai_engine.provider
+        previous = {field: summary[field] for field in SUMMARY_FIELDS} if summary else None
+        covered = summary['messages'] if summary else 0
+
+        for chunk in _chunks(entries, settings.conversation_summary_fold_max_tokens):
+            pop_last_usage()
+            started = time.monotonic()
+            response = provider.generate_response(
+                _fold_prompt(previous, chunk),
+                temperature=0.0,
+                system_text=SUMMARY_INSTRUCTIONS,
+                purpose='summary'
+            )
+            usage = pop_last_usage() or {}
+            previous = _parse_summary(response)
+            covered = self._store(ticket_number, previous, chunk[-1], len(chunk), reset=summary is None, usage=usage)
+            summary = previous
+            logger.info(
+                "Conversation summary updated",
+                ticket_number=ticket_number,
+                folded=len(chunk),
+                summarized=covered,
+                input_tokens=usage.get('input_tokens'),
+                output_tokens=usage.get('output_tokens'),
+                latency_ms=round((time.monotonic() - started) * 1000, 1)
+            )
+
+        return {**previous, 'covers_until': entries[-1][2].get('timestamp'), 'messages': covered}
+
+    def _store(self, ticket_number: str, summary: Dict[str, Any], last: Entry, folded: int,
+               reset: bool, usage: Dict[str, Any]) -> int:
+        """Persist the summary and move the watermark to the last folded entry; returns entries covered"""
+        from src.database.models import TicketConversationSummary
+
+        db = self.session_maker()
+        try:
+            record = db.get(TicketConversationSummary, ticket_number)
+            if record is None:
+                record = TicketConversationSummary(ticket_number=ticket_number, summarized_entries=0,
+                                                   input_tokens=0, output_tokens=0, cost_usd=0.0)
+                db.add(record)
+            elif reset:
+                # Watermark no longer in the ticket data: this is a rebuild from the first message
+                record.summarized_entries = 0
+            model = usage.get('model')
+            record.summary = summary
+            record.watermark_detail_key = last[0]
+            record.watermark_timestamp = last[2].get('timestamp')
+            record.summarized_entries += folded
+            record.model = model or record.model
+            record.input_tokens += usage.get('input_tokens', 0) or 0
+            record.output_tokens += usage.get('output_tokens', 0) or 0
+            record.cost_usd += estimate_cost(model, usage) if model else 0.0
+            db.commit()
+            return record.summarized_entries
+        finally:
+            db.close()
+
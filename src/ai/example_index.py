@@ -0,0 +1,227 @@
+"""
+Message Example Index
+Few-shot retrieval over AIMessageExample for analysis prompts
+
+Enabled examples are held in memory, grouped by (language, recipient_type,
+scenario). For each analysis the examples of the customer and supplier
+language are ranked by TF-IDF cosine similarity to the email, with a bonus
+for the scenario matching the intent predicted so far (triage or local
+classifier), and the best ones are added to the prompt until the top-k or
+the token budget is reached.
+
+The index reloads when the example table changes: the example endpoints
+invalidate it directly, other processes notice the changed table signature
+within settings.ai_examples_refresh_seconds.
+"""
+import math
+import re
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+from .prompt_budget import count_tokens
+
+logger = structlog.get_logger(__name__)
+
+RECIPIENT_TYPES = ('customer', 'supplier')
+
+_TOKEN = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+
+Key = Tuple[str, str, str]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of three or more letters (numbers and short words carry no topic)"""
+    return _TOKEN.findall((text or '').lower())
+
+
+def _base_language(language: Optional[str]) -> str:
+    return (language or '').split('-')[0].lower()
+
+
+def format_example(example: Dict[str, Any]) -> str:
+    """Prompt text of one example"""
+    label = 'GOOD' if example['example_type'] == 'good' else 'BAD'
+    lines = [f"[{label} {example['recipient_type']} message, {example['language']}, {example['scenario']}]"]
+    if example['example_type'] != 'good' and example.get('violation_type'):
+        lines.append(f"Violation: {example['violation_type']}")
+    if example.get('explanation'):
+        lines.append(f"Why: {example['explanation']}")
+    lines.append(example['message_text'].strip())
+    return '\n'.join(lines)
+
+
+class ExampleIndex:
+    """In-memory retrieval index over the enabled message examples"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups: Dict[Key, List[Dict[str, Any]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._signature: Optional[Tuple[Any, ...]] = None
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        """Reload on the next lookup (call after creating, updating or deleting examples)"""
+        self._checked_at = 0.0
+        self._signature = None
+
+    def _refresh(self) -> None:
+        if time.monotonic() - self._checked_at < settings.ai_examples_refresh_seconds:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < settings.ai_examples_refresh_seconds:
+                return
+            from sqlalchemy import func
+            from src.database.models import AIMessageExample
+            from src.utils.runtime_status import get_session_maker
+
+            db = get_session_maker()()
+            try:
+                signature = tuple(db.query(
+                    func.count(AIMessageExample.id),
+                    func.max(AIMessageExample.id),
+                    func.max(AIMessageExample.updated_at)
+                ).one())
+                if signature != self._signature:
+                    rows = db.query(AIMessageExample).filter(AIMessageExample.enabled == True).all()
+                    self._build([{
+                        'id': row.id,
+                        'language': row.language,
+                        'recipient_type': row.recipient_type,
+                        'scenario': row.scenario,
+                        'example_type': row.example_type,
+                        'message_text': row.message_text or '',
+                        'violation_type': row.violation_type,
+                        'explanation': row.explanation,
+                    } for row in rows])
+                    self._signature = signature
+                    logger.info("Loaded message examples", examples=len(rows), groups=len(self._groups))
+                self._checked_at = time.monotonic()
+            except Exception as e:
+                logger.warning("Failed to load message examples", error=str(e))
+                self._checked_at = time.monotonic()
+            finally:
+                db.close()
+
+    def _build(self, examples: List[Dict[str, Any]]) -> None:
+        """Group examples and precompute their TF-IDF vectors"""
+        document_frequency = Counter()
+        for example in examples:
+            example['terms'] = Counter(tokenize(f"{example['message_text']} {example.get('explanation') or ''}"))
+            document_frequency.update(example['terms'].keys())
+
+        total = len(examples)
+        idf = {term: math.log((1 + total) / (1 + count)) + 1.0 for term, count in document_frequency.items()}
+
+        groups: Dict[Key, List[Dict[str, Any]]] = {}
+        for example in examples:
+            weights = {term: count * idf[term] for term, count in example['terms'].items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            example['vector'] = {term: weight / norm for term, weight in weights.items()}
+            example['text'] = format_example(example)
+            example['tokens'] = count_tokens(example['text'])
+            key = (example['language'], example['recipient_type'], example['scenario'])
+            groups.setdefault(key, []).append(example)
+
+        self._groups, self._idf = groups, idf
+
+    def _query_vector(self, text: str) -> Dict[str, float]:
+        weights = {
+            term: count * self._idf[term]
+            for term, count in Counter(tokenize(text)).items() if term in self._idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {term: weight / norm for term, weight in weights.items()}
+
+    def _candidates(self, language: str, recipient_type: str) -> List[Dict[str, Any]]:
+        """Examples in the exact language, else in the same base language ('de' for 'de-AT')"""
+        exact = [
+            example for (lang, recipient, _), examples in self._groups.items()
+            if lang == language and recipient == recipient_type for example in examples
+        ]
+        if exact:
+            return exact
+        base = _base_language(language)
+        return [
+            example for (lang, recipient, _), examples in self._groups.items()
+            if _base_language(lang) == base and recipient == recipient_type for example in examples
+        ]
+
+    def select(
+        self,
+        text: str,
+        customer_language: str,
+        supplier_language: Optional[str] = None,
+        scenario: Optional[str] = None,
+        top_k: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Most relevant examples for an email
+
+        Args:
+            text: Email subject and body
+            customer_language: Language code of customer drafts
+            supplier_language: Language code of supplier drafts
+            scenario: Intent predicted so far (examples of that scenario rank higher)
+            top_k: Maximum examples (default settings.ai_examples_top_k)
+            max_tokens: Token budget of the examples (default settings.ai_examples_max_tokens)
+
+        Returns:
+            Selected examples (dicts with id, example_type, recipient_type,
+            scenario, score and the prompt 'text'), customer examples first
+        """
+        self._refresh()
+        if not self._groups:
+            return []
+        top_k = settings.ai_examples_top_k if top_k is None else top_k
+        max_tokens = settings.ai_examples_max_tokens if max_tokens is None else max_tokens
+
+        query = self._query_vector(text[:settings.ai_examples_query_chars])
+        languages = {'customer': customer_language, 'supplier': supplier_language or settings.supplier_default_language}
+        ranked = []
+        for order, recipient_type in enumerate(RECIPIENT_TYPES):
+            for example in self._candidates(languages[recipient_type], recipient_type):
+                vector = example['vector']
+                score = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+                if scenario and example['scenario'] == scenario:
+                    score += settings.ai_examples_scenario_boost
+                if score >= settings.ai_examples_min_score:
+                    ranked.append((-score, example['id'], order, example, score))
+        ranked.sort(key=lambda item: item[:2])
+
+        selected, used = [], 0
+        for _, _, order, example, score in ranked:
+            if len(selected) >= top_k:
+                break
+            if used + example['tokens'] > max_tokens:
+                continue
+            used += example['tokens']
+            selected.append((order, {
+                'id': example['id'],
+                'example_type': example['example_type'],
+                'recipient_type': example['recipient_type'],
+                'scenario': example['scenario'],
+                'score': round(score, 4),
+                'text': example['text'],
+            }))
+        return [example for _, example in sorted(selected, key=lambda item: item[0])]
+
+
+def format_examples(examples: List[Dict[str, Any]]) -> str:
+    """Prompt section for selected examples ('' when there are none)"""
+    if not examples:
+        return ''
+    return (
+        "\nReference message examples (follow the GOOD ones, never repeat the mistakes of the BAD ones):\n\n"
+        + '\n\n'.join(example['text'] for example in examples)
+        + "\n"
+    )
+
+
+# Shared per process
+example_index = ExampleIndex()
@@ -0,0 +1,255 @@
+"""
+Image Preprocessor
+Prepares image attachments for vision prompts
+
+Images are downsized so their long edge and pixel count stay within what the
+providers actually use (larger images are scaled down server-side anyway but
+still uploaded and, for some providers, billed), re-encoded (JPEG, or PNG for
+images with transparency) with EXIF and other metadata stripped, and
+near-duplicates (the same photo attached twice, re-compressed forwards) are
+dropped using a perceptual difference hash plus aspect ratio and average
+colour (the hash alone can't tell flat, low-detail images apart).
+
+Results are cached by the SHA-256 of the original file in memory and on disk
+(settings.attachments_dir/.image_cache), so the three providers, hedged and
+failover calls, repair calls and re-analyses all reuse one encoding.
+"""
+import base64
+import glob
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+_CACHE_SUBDIR = '.image_cache'
+
+# In-memory LRU of prepared images, keyed by content hash + encoding parameters
+_memory_cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_memory_bytes = 0
+_cache_lock = threading.Lock()
+
+# (path, size, mtime) -> content hash, so unchanged files aren't re-hashed
+_hash_memo: Dict[tuple, str] = {}
+
+
+def _content_hash(path: str) -> str:
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    cached = _hash_memo.get(memo_key)
+    if cached:
+        return cached
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def _cache_key(content_hash: str) -> str:
+    # Encoding parameters are part of the key so a settings change re-encodes
+    params = f"{settings.ai_image_max_edge_px}-{settings.ai_image_max_pixels}-{settings.ai_image_jpeg_quality}"
+    return f"{content_hash[:40]}-{hashlib.sha1(params.encode()).hexdigest()[:8]}"
+
+
+def _cache_dir() -> str:
+    return os.path.join(settings.attachments_dir, _CACHE_SUBDIR)
+
+
+def difference_hash(image: Any, size: int = 8) -> int:
+    """
+    Perceptual difference hash (dHash) of an image
+
+    Args:
+        image: PIL image
+        size: Hash grid size (size*size bits)
+
+    Returns:
+        Hash as an integer; near-identical images differ in only a few bits
+    """
+    from PIL import Image as PILImage
+
+    small = image.convert('L').resize((size + 1, size), PILImage.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _encode(path: str) -> Dict[str, Any]:
+    """Downsize, strip metadata and re-encode one image"""
+    from PIL import Image as PILImage, ImageOps
+
+    with PILImage.open(path) as original:
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    max_edge = settings.ai_image_max_edge_px
+    scale = min(1.0, max_edge / max(image.size))
+    if image.width * image.height * scale * scale > settings.ai_image_max_pixels:
+        scale = (settings.ai_image_max_pixels / (image.width * image.height)) ** 0.5
+    if scale < 1.0:
+        image = image.resize(
+            (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+            PILImage.LANCZOS
+        )
+
+    buffer = io.BytesIO()
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if has_alpha:
+        image.save(buffer, format='PNG', optimize=True)
+        mime_type = 'image/png'
+    else:
+        image.convert('RGB').save(buffer, format='JPEG', quality=settings.ai_image_jpeg_quality, optimize=True)
+        mime_type = 'image/jpeg'
+
+    return {
+        'mime_type': mime_type,
+        'data': buffer.getvalue(),
+        'width': image.width,
+        'height': image.height,
+        'dhash': difference_hash(image),
+        'color': image.convert('RGB').resize((1, 1), PILImage.BOX).getpixel((0, 0)),
+    }
+
+
+def _load_from_disk(key: str) -> Optional[Dict[str, Any]]:
+    matches = glob.glob(os.path.join(_cache_dir(), f"{key}_*"))
+    if not matches:
+        return None
+    file_path = matches[0]
+    try:
+        # File name: <key>_<dhash>_<rrggbb>_<width>x<height>.<ext>
+        _, dhash, color, dimensions = os.path.splitext(os.path.basename(file_path))[0].split('_')
+        width, height = (int(v) for v in dimensions.split('x'))
+        color = tuple(bytes.fromhex(color))
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except (OSError, ValueError):
+        return None
+    return {
+        'mime_type': 'image/png' if file_path.endswith('.png') else 'image/jpeg',
+        'data': data,
+        'width': width,
+        'height': height,
+        'dhash': int(dhash, 16),
+        'color': color,
+    }
+
+
+def _save_to_disk(key: str, entry: Dict[str, Any]) -> None:
+    ext = 'png' if entry['mime_type'] == 'image/png' else 'jpg'
+    color = bytes(entry['color']).hex()
+    file_name = f"{key}_{entry['dhash']:016x}_{color}_{entry['width']}x{entry['height']}.{ext}"
+    try:
+        os.makedirs(_cache_dir(), exist_ok=True)
+        tmp_path = os.path.join(_cache_dir(), f".{file_name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(entry['data'])
+        os.replace(tmp_path, os.path.join(_cache_dir(), file_name))
+    except OSError as e:
+        logger.warning("Failed to write image cache", error=str(e))
+
+
+def _remember(key: str, entry: Dict[str, Any]) -> None:
+    global _memory_bytes
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return
+        _memory_cache[key] = entry
+        _memory_bytes += len(entry['data'])
+        limit = settings.ai_image_cache_max_mb * 1024 * 1024
+        while _memory_bytes > limit and len(_memory_cache) > 1:
+            _, evicted = _memory_cache.popitem(last=False)
+            _memory_bytes -= len(evicted['data'])
+
+
+def prepare_image(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Prepared (downsized, re-encoded) version of one image, from cache when possible
+
+    Args:
+        path: Image file path
+
+    Returns:
+        Dict with mime_type, data (bytes), base64, width, height, dhash,
+        color (average RGB) and hash (of the original file), or None if the image can't be read
+    """
+    try:
+        content_hash = _content_hash(path)
+    except OSError as e:
+        logger.warning("Failed to load image", image_path=path, error=str(e))
+        return None
+
+    key = _cache_key(content_hash)
+    with _cache_lock:
+        entry = _memory_cache.get(key)
+        if entry is not None:
+            _memory_cache.move_to_end(key)
+            return entry
+
+    entry = _load_from_disk(key)
+    if entry is None:
+        try:
+            entry = _encode(path)
+        except Exception as e:
+            logger.warning("Failed to preprocess image", image_path=path, error=str(e))
+            return None
+        _save_to_disk(key, entry)
+        logger.info(
+            "Preprocessed image for vision prompt",
+            image_path=path,
+            original_bytes=os.path.getsize(path),
+            encoded_bytes=len(entry['data']),
+            width=entry['width'],
+            height=entry['height']
+        )
+
+    entry['hash'] = content_hash
+    entry['base64'] = base64.b64encode(entry['data']).decode('ascii')
+    _remember(key, entry)
+    return entry
+
+
+def is_near_duplicate(first: Dict[str, Any], second: Dict[str, Any]) -> bool:
+    """Whether two prepared images show the same picture"""
+    if bin(first['dhash'] ^ second['dhash']).count('1') > settings.ai_image_duplicate_distance:
+        return False
+    if abs(first['width'] / first['height'] - second['width'] / second['height']) > 0.02:
+        return False
+    return max(abs(a - b) for a, b in zip(first['color'], second['color'])) <= 16
+
+
+def prepare_images(paths: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """
+    Prepare the images of one prompt, dropping unreadable images and near-duplicates
+
+    Args:
+        paths: Image file paths
+
+    Returns:
+        Prepared images (see prepare_image) in attachment order
+    """
+    prepared: List[Dict[str, Any]] = []
+    for path in paths or []:
+        entry = prepare_image(path)
+        if entry is None:
+            continue
+        if any(is_near_duplicate(entry, kept) for kept in prepared):
+            logger.info("Skipping near-duplicate image", image_path=path)
+            continue
+        prepared.append(entry)
+    return prepared
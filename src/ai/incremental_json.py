@@ -0,0 +1,110 @@
+"""
+Incremental JSON
+Surfaces top-level fields of a streamed JSON object as soon as each completes
+
+The model streams one JSON object (optionally wrapped in a markdown code
+fence). Text before the first '{' is ignored. A top-level value is complete
+when the scanner, back at nesting depth 1 and outside a string, reaches the
+',' that follows it or the object's closing '}'.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Streaming parser for a single top-level JSON object
+
+    Usage:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.fields: dict = {}
+        self.complete = False
+        self._pos = 0             # Next character to scan
+        self._started = False     # Seen the opening '{'
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._token_start: Optional[int] = None  # Start of the current key or value
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text
+
+        Args:
+            chunk: Next piece of the response
+
+        Returns:
+            (key, value) pairs completed by this chunk, in order
+        """
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+
+        while self._pos < len(buffer) and not self.complete:
+            ch = buffer[self._pos]
+
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                    self._token_start = self._pos + 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                self._pos += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_value(self._pos, completed)
+                    self.complete = True
+            elif self._depth == 1:
+                if ch == ':' and self._key is None:
+                    try:
+                        self._key = json.loads(buffer[self._token_start:self._pos].strip())
+                    except ValueError:
+                        self._key = buffer[self._token_start:self._pos].strip().strip('"')
+                    self._token_start = self._pos + 1
+                elif ch == ',':
+                    self._complete_value(self._pos, completed)
+            self._pos += 1
+
+        return completed
+
+    def _complete_value(self, end: int, completed: List[Tuple[str, Any]]) -> None:
+        if self._key is not None:
+            raw = self.buffer[self._token_start:end].strip()
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                # Leave malformed values to the final parse of the whole response
+                value = None
+            else:
+                self.fields[self._key] = value
+                completed.append((self._key, value))
+        self._key = None
+        self._token_start = end + 1
+
+    def text(self) -> str:
+        """All text received so far"""
+        return self.buffer
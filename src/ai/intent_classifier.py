@@ -0,0 +1,487 @@
+"""
+Local Intent Classifier
+Millisecond pre-classifier trained offline from AIDecisionLog history
+
+A multinomial logistic regression over signed, hashed word n-gram features
+(NumPy only). Training labels are the intents the LLM detected, minus
+decisions a human marked 'incorrect'; decisions with 'correct' feedback are
+partly held out to report accuracy. Each training run is stored as a new
+IntentClassifierVersion; the active version is loaded by AIEngine to:
+- skip the LLM entirely for confident, formulaic intents that need no draft
+  (settings.ai_intent_classifier_skip_intents)
+- send confident intents that always need a draft straight to the full model,
+  without the triage call (settings.ai_intent_classifier_direct_intents)
+Both only apply to intents whose held-out precision at the confidence
+threshold meets settings.ai_intent_classifier_min_precision.
+"""
+import io
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+from .triage import LOCAL
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_NUM_FEATURES = 2 ** 16
+
+# Ticket type for each intent (see AIEngine.TICKET_TYPES)
+INTENT_TICKET_TYPES = {
+    'return_request': 1,
+    'tracking_inquiry': 2,
+    'price_question': 3,
+    'general_info': 4,
+    'tech_support': 5,
+    'complaint': 6,
+    'transport_damage': 7,
+}
+
+# Minimum held-out examples of an intent before its precision is trusted
+MIN_INTENT_SUPPORT = 10
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_DIGITS = re.compile(r'\d')
+
+# Feature 0 is a constant bias feature, so every row has at least one entry
+_BIAS = 0
+
+
+def tokenize(subject: str, body: str) -> List[str]:
+    """
+    Feature tokens of an email: subject words (marked), body words and word bigrams
+
+    Digits are collapsed so order numbers and dates share features.
+    """
+    subject_words = _TOKEN.findall(_DIGITS.sub('0', (subject or '').lower()))
+    body_words = _TOKEN.findall(_DIGITS.sub('0', (body or '')[:4000].lower()))
+    tokens = [f"s:{word}" for word in subject_words]
+    tokens.extend(body_words)
+    tokens.extend(f"{a} {b}" for a, b in zip(body_words, body_words[1:]))
+    return tokens
+
+
+def featurize(documents: List[Tuple[str, str]], num_features: int) -> Tuple[Any, Any, Any]:
+    """
+    Hash documents into an L2-normalized sparse matrix
+
+    Args:
+        documents: (subject, body) pairs
+        num_features: Size of the hashing space
+
+    Returns:
+        CSR arrays (indices, values, indptr)
+    """
+    import numpy as np
+
+    indices: List[int] = []
+    values: List[float] = []
+    indptr = [0]
+    for subject, body in documents:
+        row: Dict[int, float] = {_BIAS: 1.0}
+        for token in tokenize(subject, body):
+            h = zlib.crc32(token.encode('utf-8'))
+            index = 1 + h % (num_features - 1)
+            row[index] = row.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        norm = sum(v * v for v in row.values()) ** 0.5 or 1.0
+        indices.extend(row.keys())
+        values.extend(v / norm for v in row.values())
+        indptr.append(len(indices))
+    return (
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(values, dtype=np.float32),
+        np.asarray(indptr, dtype=np.int64),
+    )
+
+
+class IntentClassifier:
+    """Linear softmax classifier over hashed features"""
+
+    def __init__(self, labels: List[str], weights: Any, num_features: int):
+        self.labels = list(labels)
+        self.weights = weights  # (num_features, len(labels)) float32
+        self.num_features = num_features
+
+    @classmethod
+    def train(
+        cls,
+        documents: List[Tuple[str, str]],
+        labels: List[str],
+        num_features: int = DEFAULT_NUM_FEATURES,
+        epochs: int = 10,
+        learning_rate: float = 0.2,
+        batch_size: int = 128,
+        seed: int = 0
+    ) -> 'IntentClassifier':
+        """
+        Train with mini-batch AdaGrad on the softmax cross-entropy
+
+        AdaGrad's per-feature step sizes suit hashed n-grams, where most
+        features are rare.
+
+        Classes are weighted by inverse square-root frequency so rare intents
+        aren't drowned out by the common ones.
+
+        Args:
+            documents: (subject, body) pairs
+            labels: Intent per document
+            num_features: Size of the hashing space
+            epochs: Passes over the data
+            learning_rate: AdaGrad step size
+            batch_size: Documents per update
+            seed: Shuffle seed (training is deterministic)
+
+        Returns:
+            Trained classifier
+        """
+        import numpy as np
+
+        classes = sorted(set(labels))
+        class_index = {label: i for i, label in enumerate(classes)}
+        y = np.asarray([class_index[label] for label in labels], dtype=np.int64)
+        counts = np.bincount(y, minlength=len(classes)).astype(np.float32)
+        class_weight = (counts.max() / counts) ** 0.5
+
+        indices, values, indptr = featurize(documents, num_features)
+        weights = np.zeros((num_features, len(classes)), dtype=np.float32)
+        squared_grads = np.zeros_like(weights)
+        batch_grads = np.zeros_like(weights)
+        model = cls(classes, weights, num_features)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(documents))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                b_indices, b_values, b_indptr = _take_rows(indices, values, indptr, batch)
+                probs = model._probabilities(b_indices, b_values, b_indptr)
+                grad = probs
+                grad[np.arange(len(batch)), y[batch]] -= 1.0
+                grad *= class_weight[y[batch]][:, None] / len(batch)
+                rows = np.repeat(np.arange(len(batch)), np.diff(b_indptr))
+                np.add.at(batch_grads, b_indices, grad[rows] * b_values[:, None])
+                touched = np.unique(b_indices)
+                g = batch_grads[touched]
+                squared_grads[touched] += g * g
+                weights[touched] -= learning_rate * g / (np.sqrt(squared_grads[touched]) + 1e-8)
+                batch_grads[touched] = 0.0
+
+        return model
+
+    def _probabilities(self, indices: Any, values: Any, indptr: Any) -> Any:
+        import numpy as np
+
+        contributions = self.weights[indices] * values[:, None]
+        logits = np.add.reduceat(contributions, indptr[:-1], axis=0)
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, documents: List[Tuple[str, str]]) -> Any:
+        """Class probabilities, one row per (subject, body) document"""
+        return self._probabilities(*featurize(documents, self.num_features))
+
+    def predict(self, subject: str, body: str) -> Tuple[str, float]:
+        """
+        Classify one email
+
+        Returns:
+            (intent, confidence)
+        """
+        probs = self.predict_proba([(subject, body)])[0]
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    def to_bytes(self) -> bytes:
+        """Serialize the weights (compressed npz)"""
+        import numpy as np
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, weights=self.weights)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, labels: List[str], num_features: int) -> 'IntentClassifier':
+        import numpy as np
+
+        with np.load(io.BytesIO(data)) as archive:
+            weights = archive['weights']
+        return cls(labels, weights, num_features)
+
+
+def _take_rows(indices: Any, values: Any, indptr: Any, rows: Any) -> Tuple[Any, Any, Any]:
+    """Select rows of a CSR matrix"""
+    import numpy as np
+
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) if len(rows) else np.empty(0, np.int64)
+    return indices[positions], values[positions], np.concatenate([[0], np.cumsum(lengths)])
+
+
+def evaluate(classifier: IntentClassifier, documents: List[Tuple[str, str]], labels: List[str],
+             threshold: float) -> Dict[str, Any]:
+    """
+    Accuracy of a classifier on labelled documents
+
+    Args:
+        classifier: Trained classifier
+        documents: (subject, body) pairs
+        labels: True intents
+        threshold: Confidence threshold used by AIEngine
+
+    Returns:
+        Overall accuracy, coverage/accuracy above the threshold and per-intent
+        support, recall and precision at the threshold
+    """
+    if not documents:
+        return {'accuracy': None, 'coverage_at_threshold': None, 'accuracy_at_threshold': None, 'per_intent': {}}
+
+    probs = classifier.predict_proba(documents)
+    predicted = [classifier.labels[i] for i in probs.argmax(axis=1)]
+    confidence = probs.max(axis=1)
+    confident = confidence >= threshold
+
+    per_intent: Dict[str, Dict[str, Any]] = {}
+    for intent in sorted(set(labels) | set(classifier.labels)):
+        support = sum(1 for label in labels if label == intent)
+        hits = sum(1 for p, label in zip(predicted, labels) if p == intent and label == intent)
+        confident_predictions = [label for p, label, c in zip(predicted, labels, confident) if p == intent and c]
+        per_intent[intent] = {
+            'support': support,
+            'recall': round(hits / support, 4) if support else None,
+            'confident_predictions': len(confident_predictions),
+            'precision_at_threshold': (
+                round(sum(1 for label in confident_predictions if label == intent) / len(confident_predictions), 4)
+                if confident_predictions else None
+            ),
+        }
+
+    correct = [p == label for p, label in zip(predicted, labels)]
+    confident_correct = [ok for ok, c in zip(correct, confident) if c]
+    return {
+        'accuracy': round(sum(correct) / len(correct), 4),
+        'threshold': threshold,
+        'coverage_at_threshold': round(len(confident_correct) / len(correct), 4),
+        'accuracy_at_threshold': round(sum(confident_correct) / len(confident_correct), 4) if confident_correct else None,
+        'per_intent': per_intent,
+    }
+
+
+def load_training_data(db: Any) -> List[Dict[str, Any]]:
+    """
+    Labelled emails from the decision log
+
+    The latest decision per email is used; decisions marked 'incorrect' are
+    excluded (their intent may be what was wrong). Decisions the classifier
+    settled itself (the 'local' tier) are only used once a human confirmed
+    them, so the model does not retrain on its own predictions.
+
+    Returns:
+        Dicts with id, subject, body, intent and feedback
+    """
+    from src.database.models import AIDecisionLog, ProcessedEmail
+
+    rows = db.query(
+        AIDecisionLog.id, AIDecisionLog.gmail_message_id, AIDecisionLog.detected_intent,
+        AIDecisionLog.feedback, AIDecisionLog.tier, ProcessedEmail.subject, ProcessedEmail.message_body
+    ).join(
+        ProcessedEmail, ProcessedEmail.gmail_message_id == AIDecisionLog.gmail_message_id
+    ).filter(
+        AIDecisionLog.detected_intent.isnot(None),
+        ProcessedEmail.message_body.isnot(None)
+    ).order_by(AIDecisionLog.id).all()
+
+    latest: Dict[str, Any] = {}
+    for row in rows:
+        latest[row.gmail_message_id] = row
+
+    return [
+        {
+            'id': row.id,
+            'subject': row.subject or '',
+            'body': row.message_body or '',
+            'intent': row.detected_intent,
+            'feedback': row.feedback,
+        }
+        for row in latest.values()
+        if row.feedback != 'incorrect' and row.detected_intent not in ('unknown', '')
+        and (row.tier != LOCAL or row.feedback == 'correct')
+    ]
+
+
+def train_and_store(
+    db: Any,
+    holdout_fraction: float = 0.3,
+    num_features: int = DEFAULT_NUM_FEATURES,
+    epochs: int = 10,
+    activate_min_accuracy: Optional[float] = None,
+    created_by: Optional[str] = None
+) -> Any:
+    """
+    Train a new classifier version from the decision log and store it
+
+    A deterministic share of the decisions with 'correct' human feedback is
+    held out for evaluation; everything else is used for training.
+
+    Args:
+        db: Database session
+        holdout_fraction: Share of feedback-confirmed decisions held out
+        num_features: Size of the hashing space
+        epochs: Training epochs
+        activate_min_accuracy: Activate the new version if its held-out accuracy
+            reaches this (None = don't activate)
+        created_by: Recorded on the version
+
+    Returns:
+        The stored IntentClassifierVersion
+
+    Raises:
+        ValueError: If there is too little training data
+    """
+    from sqlalchemy import func
+    from src.database.models import IntentClassifierVersion
+
+    examples = load_training_data(db)
+    holdout = [
+        e for e in examples
+        if e['feedback'] == 'correct' and zlib.crc32(str(e['id']).encode()) % 1000 < holdout_fraction * 1000
+    ]
+    holdout_ids = {e['id'] for e in holdout}
+    train = [e for e in examples if e['id'] not in holdout_ids]
+    if len(train) < 50 or len({e['intent'] for e in train}) < 2:
+        raise ValueError(f"Not enough training data ({len(train)} decisions)")
+
+    started = time.monotonic()
+    classifier = IntentClassifier.train(
+        [(e['subject'], e['body']) for e in train], [e['intent'] for e in train],
+        num_features=num_features, epochs=epochs
+    )
+    training_seconds = time.monotonic() - started
+
+    metrics = evaluate(
+        classifier, [(e['subject'], e['body']) for e in holdout], [e['intent'] for e in holdout],
+        settings.ai_intent_classifier_threshold
+    )
+    metrics['training_seconds'] = round(training_seconds, 2)
+    metrics['train_accuracy'] = evaluate(
+        classifier, [(e['subject'], e['body']) for e in train], [e['intent'] for e in train],
+        settings.ai_intent_classifier_threshold
+    )['accuracy']
+
+    version_number = (db.query(func.max(IntentClassifierVersion.version_number)).scalar() or 0) + 1
+    version = IntentClassifierVersion(
+        version_number=version_number,
+        model_data=classifier.to_bytes(),
+        labels=classifier.labels,
+        num_features=num_features,
+        trained_on=len(train),
+        holdout_size=len(holdout),
+        holdout_accuracy=metrics['accuracy'],
+        metrics=metrics,
+        created_by=created_by,
+        is_active=False
+    )
+    db.add(version)
+
+    if activate_min_accuracy is not None and metrics['accuracy'] is not None and metrics['accuracy'] >= activate_min_accuracy:
+        db.query(IntentClassifierVersion).filter(IntentClassifierVersion.is_active == True).update({'is_active': False})
+        version.is_active = True
+
+    db.commit()
+    logger.info(
+        "Trained intent classifier",
+        version=version_number,
+        trained_on=len(train),
+        holdout_size=len(holdout),
+        holdout_accuracy=metrics['accuracy'],
+        active=version.is_active
+    )
+    return version
+
+
+class ActiveClassifier:
+    """The active classifier version, reloaded when another version is activated"""
+
+    def __init__(self):
+        self._classifier: Optional[IntentClassifier] = None
+        self._version: Optional[int] = None
+        self._metrics: Dict[str, Any] = {}
+        self._checked_at = 0.0
+
+    def _refresh(self) -> None:
+        if time.monotonic() - self._checked_at < settings.ai_intent_classifier_refresh_seconds:
+            return
+        self._checked_at = time.monotonic()
+        from src.database.models import IntentClassifierVersion
+        from src.utils.runtime_status import get_session_maker
+
+        db = get_session_maker()()
+        try:
+            active = db.query(IntentClassifierVersion.version_number).filter(
+                IntentClassifierVersion.is_active == True
+            ).scalar()
+            if active is None:
+                self._classifier, self._version = None, None
+                return
+            if active == self._version:
+                return
+            row = db.query(IntentClassifierVersion).filter(IntentClassifierVersion.version_number == active).first()
+            self._classifier = IntentClassifier.from_bytes(row.model_data, row.labels, row.num_features)
+            self._version = active
+            self._metrics = row.metrics or {}
+            logger.info("Loaded intent classifier", version=active, holdout_accuracy=row.holdout_accuracy)
+        except Exception as e:
+            logger.warning("Failed to load intent classifier", error=str(e))
+        finally:
+            db.close()
+
+    def _trusted(self, intent: str) -> bool:
+        """Whether held-out precision for this intent at the threshold is good enough"""
+        stats = (self._metrics.get('per_intent') or {}).get(intent) or {}
+        precision = stats.get('precision_at_threshold')
+        return (
+            precision is not None
+            and stats.get('confident_predictions', 0) >= MIN_INTENT_SUPPORT
+            and precision >= settings.ai_intent_classifier_min_precision
+        )
+
+    def classify(self, email_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Pre-classify an email
+
+        Returns:
+            None without an active classifier, else a dict with intent,
+            ticket_type_id, confidence, version, latency_ms and route:
+            'skip_llm', 'direct' (full model, no triage) or 'default'
+        """
+        self._refresh()
+        classifier = self._classifier
+        if classifier is None:
+            return None
+
+        started = time.monotonic()
+        intent, confidence = classifier.predict(email_data.get('subject') or '', email_data.get('body') or '')
+        route = 'default'
+        if confidence >= settings.ai_intent_classifier_threshold and self._trusted(intent):
+            if intent in _split(settings.ai_intent_classifier_skip_intents):
+                route = 'skip_llm'
+            elif intent in _split(settings.ai_intent_classifier_direct_intents):
+                route = 'direct'
+        return {
+            'intent': intent,
+            'ticket_type_id': INTENT_TICKET_TYPES.get(intent, 0),
+            'confidence': round(confidence, 4),
+            'version': self._version,
+            'route': route,
+            'latency_ms': round((time.monotonic() - started) * 1000, 2),
+        }
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+active_classifier = ActiveClassifier()
@@ -4,61 +4,30 @@ Detects the language of incoming emails for multilingual support
 """
 from typing import Optional
 import structlog
-from langdetect import detect, DetectorFactory, LangDetectException
 
-logger = structlog.get_logger(__name__)
-
-# Set seed for consistent results
-DetectorFactory.seed = 0
+from .language_service import language_service
 
-# Mapping of langdetect codes to culture names
-LANGUAGE_MAPPING = {
-    'de': 'de-DE',
-    'en': 'en-US',
-    'fr': 'fr-FR',
-    'es': 'es-ES',
-    'it': 'it-IT',
-    'nl': 'nl-NL',
-    'pl': 'pl-PL',
-    'pt': 'pt-PT',
-}
+logger = structlog.get_logger(__name__)
 
 
 class LanguageDetector:
     """Detects language of text content"""
 
     @staticmethod
-    def detect_language(text: str) -> str:
+    def detect_language(text: str, known_language: Optional[str] = None) -> str:
         """
         Detect language of text
 
         Args:
             text: Text to analyze
+            known_language: Customer language already known for the ticket;
+                returned as-is for short follow-ups
 
         Returns:
             Culture name (e.g., 'de-DE', 'en-US')
             Defaults to 'en-US' if detection fails
         """
-        if not text or not text.strip():
-            logger.warning("Empty text provided for language detection")
-            return 'en-US'
-
-        try:
-            # Detect language code
-            lang_code = detect(text)
-            logger.debug("Detected language", lang_code=lang_code)
-
-            # Map to culture name
-            culture_name = LANGUAGE_MAPPING.get(lang_code, 'en-US')
-            logger.info("Language detected", culture=culture_name)
-            return culture_name
-
-        except LangDetectException as e:
-            logger.warning("Language detection failed", error=str(e))
-            return 'en-US'
-        except Exception as e:
-            logger.error("Unexpected error in language detection", error=str(e))
-            return 'en-US'
+        return language_service.detect(text, known_language=known_language)
 
     @staticmethod
     def get_language_name(culture: str) -> str:
@@ -106,14 +75,8 @@ class LanguageDetector:
                 logger.debug("Text too short for reliable language validation", length=len(text))
                 return True, expected_language  # Assume correct for short text
 
-            # Detect actual language
-            detected = LanguageDetector.detect_language(text)
-
-            # Check if detected matches expected (ignore regional variants)
-            expected_base = expected_language.split('-')[0].lower()  # de-DE → de
-            detected_base = detected.split('-')[0].lower()  # de-DE → de
-
-            is_valid = expected_base == detected_base
+            # Detect actual language and compare, ignoring regional variants (de-DE → de)
+            is_valid, detected = language_service.validate(text, expected_language)
 
             if not is_valid:
                 logger.warning(
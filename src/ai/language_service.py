@@ -0,0 +1,174 @@
+"""
+Language Detection Service
+Fast, memoized language detection shared by the AI engine and message validation
+
+- Only a bounded window of the text is classified: the first
+  settings.language_detection_window_chars characters of the newest content,
+  after dropping quoted reply lines, URLs, email addresses and digits (which
+  carry no language signal and, in quoted history, often the wrong one).
+- The backend is py3langid (naive Bayes over byte n-grams, NumPy) restricted
+  to settings.language_detection_candidates; langdetect is the fallback when
+  py3langid is not installed. The model is loaded once per process.
+- Results are memoized by a hash of the sampled window.
+- Short follow-ups on a ticket whose customer language is already known
+  return that language without detection (short texts are where detection
+  is least reliable).
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_CULTURE = 'en-US'
+
+# Mapping of detector language codes to culture names
+LANGUAGE_MAPPING = {
+    'de': 'de-DE',
+    'en': 'en-US',
+    'fr': 'fr-FR',
+    'es': 'es-ES',
+    'it': 'it-IT',
+    'nl': 'nl-NL',
+    'pl': 'pl-PL',
+    'pt': 'pt-PT',
+}
+
+_QUOTE_HEADER = re.compile(
+    r'^\s*(On .+ wrote:|Am .+ schrieb .+:|Le .+ a écrit\s*:|El .+ escribió:|Il .+ ha scritto:|Op .+ schreef .+:'
+    r'|-{2,}\s*(Original Message|Ursprüngliche Nachricht|Message d\'origine)\s*-{2,})\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+_NOISE = re.compile(r'https?://\S+|www\.\S+|\S+@\S+|\d+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def sample_text(text: str, window: int) -> str:
+    """
+    Bounded, cleaned text window used for detection
+
+    Args:
+        text: Full text (subject + body)
+        window: Maximum characters to keep
+
+    Returns:
+        Cleaned sample (may be empty)
+    """
+    if not text:
+        return ''
+    header = _QUOTE_HEADER.search(text)
+    if header and header.start() > 0:
+        text = text[:header.start()]
+    lines = [line for line in text[:window * 4].splitlines() if not line.lstrip().startswith('>')]
+    sample = _NOISE.sub(' ', '\n'.join(lines))
+    return _WHITESPACE.sub(' ', sample).strip()[:window]
+
+
+class LanguageService:
+    """Detects languages with a process-wide model and result cache"""
+
+    def __init__(self, cache_size: int = 10000):
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._identifier = None
+        self._backend: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load_backend(self) -> None:
+        with self._lock:
+            if self._backend is not None:
+                return
+            candidates = [c.strip() for c in settings.language_detection_candidates.split(',') if c.strip()]
+            try:
+                from py3langid.langid import LanguageIdentifier, MODEL_FILE
+
+                identifier = LanguageIdentifier.from_model_file(MODEL_FILE, norm_probs=True)
+                if candidates:
+                    identifier.set_languages(candidates)
+                self._identifier = identifier
+                self._backend = 'py3langid'
+            except ImportError:
+                from langdetect import DetectorFactory
+
+                # Consistent results
+                DetectorFactory.seed = 0
+                self._backend = 'langdetect'
+            logger.info("Language detection backend loaded", backend=self._backend)
+
+    def _classify(self, sample: str) -> str:
+        """Language code of a (non-empty) sample"""
+        if self._backend is None:
+            self._load_backend()
+        if self._backend == 'py3langid':
+            code, _ = self._identifier.classify(sample)
+            return code
+        from langdetect import detect
+        return detect(sample)
+
+    def detect(self, text: str, known_language: Optional[str] = None) -> str:
+        """
+        Detect the language of text
+
+        Args:
+            text: Text to analyze
+            known_language: Customer language already known for the ticket
+                (used as-is for short texts)
+
+        Returns:
+            Culture name (e.g., 'de-DE', 'en-US'); 'en-US' if detection fails
+        """
+        sample = sample_text(text, settings.language_detection_window_chars)
+        if known_language and len(sample) < settings.language_detection_short_text_chars:
+            logger.debug("Short text on known ticket, using its language", culture=known_language, length=len(sample))
+            return known_language
+        if not sample:
+            logger.warning("Empty text provided for language detection")
+            return known_language or DEFAULT_CULTURE
+
+        key = hashlib.sha1(sample.encode('utf-8')).hexdigest()
+        with self._lock:
+            culture = self._cache.get(key)
+            if culture is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return culture
+            self.misses += 1
+
+        try:
+            code = self._classify(sample)
+            culture = LANGUAGE_MAPPING.get(code, DEFAULT_CULTURE)
+            logger.debug("Language detected", culture=culture, backend=self._backend)
+        except Exception as e:
+            # langdetect raises LangDetectException for text without features
+            logger.warning("Language detection failed", error=str(e))
+            return known_language or DEFAULT_CULTURE
+
+        with self._lock:
+            self._cache[key] = culture
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return culture
+
+    def validate(self, text: str, expected_language: str) -> Tuple[bool, str]:
+        """
+        Validate that text is in the expected language (regional variants ignored)
+
+        Returns:
+            Tuple of (is_valid, detected culture)
+        """
+        detected = self.detect(text)
+        return expected_language.split('-')[0].lower() == detected.split('-')[0].lower(), detected
+
+    @property
+    def backend(self) -> Optional[str]:
+        return self._backend
+
+
+language_service = LanguageService()
@@ -0,0 +1,95 @@
+"""
+AI Model Pricing
+Approximate list prices used to estimate the cost of AI calls
+
+Prices are USD per 1M tokens: (input, cached input, output). Models are
+matched by the longest known prefix of the model name, so dated snapshots
+('gpt-4o-2024-08-06') resolve to their family. Update when providers change
+their price lists; unknown models are reported with zero cost.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    # OpenAI
+    'gpt-5-nano': (0.05, 0.005, 0.40),
+    'gpt-5-mini': (0.25, 0.025, 2.00),
+    'gpt-5': (1.25, 0.125, 10.00),
+    'gpt-4.1-nano': (0.10, 0.025, 0.40),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1': (2.00, 0.50, 8.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'chatgpt-4o': (5.00, 5.00, 15.00),
+    'gpt-4-turbo': (10.00, 10.00, 30.00),
+    'gpt-4': (30.00, 30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 0.50, 1.50),
+    'o1-mini': (1.10, 0.55, 4.40),
+    'o1': (15.00, 7.50, 60.00),
+    # Anthropic
+    'claude-3-haiku': (0.25, 0.03, 1.25),
+    'claude-3-5-haiku': (0.80, 0.08, 4.00),
+    'claude-haiku-4': (1.00, 0.10, 5.00),
+    'claude-3-5-sonnet': (3.00, 0.30, 15.00),
+    'claude-3-7-sonnet': (3.00, 0.30, 15.00),
+    'claude-sonnet-4': (3.00, 0.30, 15.00),
+    'claude-3-opus': (15.00, 1.50, 75.00),
+    'claude-opus-4': (15.00, 1.50, 75.00),
+    # Google
+    'gemini-1.5-flash': (0.075, 0.01875, 0.30),
+    'gemini-1.5-pro': (1.25, 0.3125, 5.00),
+    'gemini-2.0-flash': (0.10, 0.025, 0.40),
+    'gemini-2.5-flash': (0.30, 0.075, 2.50),
+    'gemini-2.5-pro': (1.25, 0.31, 10.00),
+}
+
+# Anthropic bills prompt cache writes at a premium over regular input
+CACHE_WRITE_MULTIPLIER = 1.25
+
+# OpenAI and Anthropic batch APIs bill at half the interactive price
+BATCH_MULTIPLIER = 0.5
+
+
+def get_model_prices(model: str) -> Optional[Tuple[float, float, float]]:
+    """
+    Look up prices for a model
+
+    Args:
+        model: Model name (e.g. 'gpt-4o-mini', 'claude-3-5-haiku-20241022')
+
+    Returns:
+        (input, cached input, output) USD per 1M tokens, or None if unknown
+    """
+    name = (model or '').lower()
+    matches = [prefix for prefix in MODEL_PRICES if name.startswith(prefix)]
+    if not matches:
+        return None
+    return MODEL_PRICES[max(matches, key=len)]
+
+
+def estimate_cost(model: str, usage: Optional[Dict[str, Any]]) -> float:
+    """
+    Estimate the USD cost of a call from its recorded usage
+
+    Args:
+        model: Model name
+        usage: Usage dict from provider_clients.record_usage() ('batch': True for batch API calls)
+
+    Returns:
+        Estimated cost in USD (0.0 if the model or usage is unknown)
+    """
+    prices = get_model_prices(model)
+    if not prices or not usage:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    cached = usage.get('cached_input_tokens', 0) or 0
+    written = usage.get('cache_write_tokens', 0) or 0
+    uncached = max(0, (usage.get('input_tokens', 0) or 0) - cached - written)
+    cost = (
+        uncached * input_price
+        + cached * cached_price
+        + written * input_price * CACHE_WRITE_MULTIPLIER
+        + (usage.get('output_tokens', 0) or 0) * output_price
+    )
+    if usage.get('batch'):
+        cost *= BATCH_MULTIPLIER
+    return cost / 1_000_000
@@ -0,0 +1,254 @@
+"""
+Prompt Budget
+Token-budgeted assembly of the variable analysis prompt sections
+
+Sections are filled in priority order, each up to its own cap and the shared
+total (settings.ai_prompt_max_tokens):
+
+1. ticket data  - small and authoritative, never truncated
+2. email body   - keeps head and tail (greeting/question and signature/quote start)
+3. history      - drops the oldest messages first
+4. attachments  - extracted text, shared evenly between attachments, head kept
+
+Budget left unused by higher priority sections is handed down to truncated
+lower priority ones. Token counts use tiktoken when installed and a
+conservative character estimate otherwise.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+TRUNCATION_MARKER = "\n[... truncated ...]\n"
+
+# Rough characters per token for the fallback estimate (German/French text
+# tokenizes worse than English, so stay on the safe side)
+_CHARS_PER_TOKEN = 3.5
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Load the tiktoken encoding once (None if tiktoken is not installed)"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('o200k_base')
+        except Exception as e:
+            logger.info("tiktoken unavailable, using character based token estimate", error=str(e))
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Count (or estimate) the tokens in a text
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Token count
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(len(text) / _CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """
+    Truncate text to at most max_tokens
+
+    Args:
+        text: Text to truncate
+        max_tokens: Token limit
+        keep_tail: Keep the first two thirds and the last third instead of only the head
+
+    Returns:
+        Text (with a truncation marker if it was cut)
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ''
+
+    budget = max(0, max_tokens - count_tokens(TRUNCATION_MARKER))
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if keep_tail:
+            head, tail = (budget * 2) // 3, budget // 3
+            return encoding.decode(tokens[:head]) + TRUNCATION_MARKER + (encoding.decode(tokens[-tail:]) if tail else '')
+        return encoding.decode(tokens[:budget]) + TRUNCATION_MARKER
+
+    chars = int(budget * _CHARS_PER_TOKEN)
+    if keep_tail:
+        head, tail = (chars * 2) // 3, chars // 3
+        return text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail else '')
+    return text[:chars] + TRUNCATION_MARKER
+
+
+def serialize_history(ticket_history: Optional[Dict[str, Any]]) -> str:
+    """Compact JSON serialization of the ticket history used in prompts"""
+    if not ticket_history:
+        return ''
+    return json.dumps(ticket_history, ensure_ascii=False, separators=(',', ':'))
+
+
+def format_attachment_texts(attachment_texts: List[Dict[str, Any]]) -> str:
+    """Render extracted attachment texts as the prompt's attachment block"""
+    if not attachment_texts:
+        return ''
+    block = "\n\n--- ATTACHMENT CONTENT ---\n"
+    for att_text in attachment_texts:
+        block += f"\n[{att_text['filename']}]:\n{att_text['text']}\n"
+    return block
+
+
+class PromptBudget:
+    """
+    Fits the variable prompt sections into a token budget
+
+    Args:
+        max_tokens: Total budget for body, history and attachments
+        body_tokens: Cap for the email body
+        history_tokens: Cap for the serialized conversation history
+        attachment_tokens: Cap for all attachment texts together
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        body_tokens: Optional[int] = None,
+        history_tokens: Optional[int] = None,
+        attachment_tokens: Optional[int] = None
+    ):
+        self.max_tokens = max_tokens or settings.ai_prompt_max_tokens
+        self.caps = {
+            'body': settings.ai_prompt_body_tokens if body_tokens is None else body_tokens,
+            'history': settings.ai_prompt_history_tokens if history_tokens is None else history_tokens,
+            'attachments': settings.ai_prompt_attachment_tokens if attachment_tokens is None else attachment_tokens,
+        }
+
+    def _allocate(self, needed: Dict[str, int], reserved: int) -> Dict[str, int]:
+        """Assign budgets in priority order, then hand leftovers to truncated sections"""
+        order = ['body', 'history', 'attachments']
+        remaining = max(0, self.max_tokens - reserved)
+        budgets = {}
+        for name in order:
+            budgets[name] = min(needed[name], self.caps[name], remaining)
+            remaining -= budgets[name]
+        for name in order:
+            if remaining <= 0:
+                break
+            extra = min(needed[name] - budgets[name], remaining)
+            budgets[name] += extra
+            remaining -= extra
+        return budgets
+
+    def _fit_history(self, ticket_history: Dict[str, Any], budget: int) -> Dict[str, Any]:
+        """Drop the oldest entries across threads until the serialized history fits"""
+        history = {key: list(value) if isinstance(value, list) else value for key, value in ticket_history.items()}
+        threads = [key for key, value in history.items() if isinstance(value, list)]
+
+        while count_tokens(serialize_history(history)) > budget:
+            candidates = [key for key in threads if history[key]]
+            if not candidates:
+                break
+            # Oldest remaining entry over all threads ('YYYY-MM-DD HH:MM' timestamps sort lexically)
+            oldest = min(candidates, key=lambda key: str(history[key][0].get('timestamp', '')))
+            history[oldest].pop(0)
+        return history
+
+    def _fit_attachments(self, attachment_texts: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Share the budget evenly between attachments, giving short ones what they need"""
+        fitted = []
+        pending = sorted(range(len(attachment_texts)), key=lambda i: count_tokens(attachment_texts[i].get('text')))
+        remaining = budget - count_tokens(format_attachment_texts([{'filename': '', 'text': ''}]))
+        for position, index in enumerate(pending):
+            attachment = attachment_texts[index]
+            overhead = count_tokens(f"\n[{attachment['filename']}]:\n\n")
+            share = remaining // (len(pending) - position) - overhead
+            text = truncate_to_tokens(attachment.get('text') or '', max(0, share))
+            remaining -= count_tokens(text) + overhead
+            fitted.append((index, {**attachment, 'text': text}))
+        return [attachment for _, attachment in sorted(fitted, key=lambda item: item[0])]
+
+    def fit(
+        self,
+        body: str,
+        ticket_history: Optional[Dict[str, Any]] = None,
+        attachment_texts: Optional[List[Dict[str, Any]]] = None,
+        reserved_tokens: int = 0
+    ) -> Tuple[str, Optional[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Fit the sections into the budget
+
+        Args:
+            body: Email body
+            ticket_history: Structured conversation history
+            attachment_texts: Extracted attachment texts ({'filename', 'text'})
+            reserved_tokens: Tokens already used by fixed sections (ticket data, headers)
+
+        Returns:
+            Tuple of (body, history, attachment_texts, stats) where stats holds
+            the per-section token counts and the names of truncated sections
+        """
+        attachment_texts = attachment_texts or []
+        needed = {
+            'body': count_tokens(body),
+            'history': count_tokens(serialize_history(ticket_history)),
+            'attachments': count_tokens(format_attachment_texts(attachment_texts)),
+        }
+        budgets = self._allocate(needed, reserved_tokens)
+
+        truncated = [name for name in needed if needed[name] > budgets[name]]
+        if 'body' in truncated:
+            body = truncate_to_tokens(body, budgets['body'], keep_tail=True)
+        if 'history' in truncated and ticket_history:
+            ticket_history = self._fit_history(ticket_history, budgets['history'])
+        if 'attachments' in truncated:
+            attachment_texts = self._fit_attachments(attachment_texts, budgets['attachments'])
+
+        stats = {
+            'sections': {
+                'body': count_tokens(body),
+                'history': count_tokens(serialize_history(ticket_history)),
+                'attachments': count_tokens(format_attachment_texts(attachment_texts)),
+                'fixed': reserved_tokens,
+            },
+            'requested': needed,
+            'truncated': truncated,
+        }
+        if truncated:
+            logger.info("Prompt sections truncated to budget", truncated=truncated, requested=needed, budgets=budgets)
+        return body, ticket_history, attachment_texts, stats
+
+
+def prompt_token_fields(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    AIDecisionLog column values for the prompt size of an analysis
+
+    Args:
+        analysis: Result of AIEngine.analyze_email()
+
+    Returns:
+        Dict with prompt_tokens, prompt_token_stats and prompt_truncated
+    """
+    stats = analysis.get('prompt_stats') or {}
+    if not stats:
+        return {}
+    return {
+        'prompt_tokens': stats.get('prompt_tokens'),
+        'prompt_token_stats': stats,
+        'prompt_truncated': bool(stats.get('truncated')),
+    }
@@ -0,0 +1,156 @@
+"""
+Prompt Registry
+Process-wide cache of the active system prompt with hot reload
+
+The system prompt can come from three places, in this order:
+1. SystemSetting 'ai_system_prompt' (explicit override)
+2. The newer of the active PromptVersion and the prompt file (settings.prompt_path);
+   approving a version writes both, editing the prompt in the settings only the file
+3. Whichever of the two exists
+
+Every caller gets the cached text. At most every settings.prompt_registry_check_seconds
+a cheap version check (setting timestamp, active version id, file mtime) runs,
+and the prompt is only re-read when that token changed. Approving a new
+version in one process therefore reaches the orchestrator and every other
+worker without a restart.
+"""
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+SETTING_KEY = 'ai_system_prompt'
+
+
+def prompt_file_path() -> Path:
+    """Location of the prompt file (relative paths are resolved against the working directory)"""
+    if getattr(settings, 'prompt_path', None):
+        path = Path(settings.prompt_path)
+        return path if path.is_absolute() else Path.cwd() / path
+    return Path.cwd() / "prompts" / "system_prompt.txt"
+
+
+class PromptRegistry:
+    """The active system prompt, reloaded when its source changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token: Optional[Tuple[Any, ...]] = None
+        self._current: Dict[str, Any] = {'text': None, 'source': None, 'version_id': None, 'version_number': None}
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        """Run the version check on the next call (after approving or editing a prompt)"""
+        self._checked_at = 0.0
+
+    def current(self) -> Dict[str, Any]:
+        """
+        Active prompt
+
+        Returns:
+            Dict with text (None when no prompt is configured), source
+            ('setting', 'version', 'file'), version_id and version_number
+            (the active PromptVersion, if any) and loaded_at
+        """
+        if time.monotonic() - self._checked_at >= settings.prompt_registry_check_seconds:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= settings.prompt_registry_check_seconds:
+                    self._refresh()
+                    self._checked_at = time.monotonic()
+        return self._current
+
+    def text(self) -> Optional[str]:
+        """Active prompt text (None when no prompt is configured)"""
+        return self.current()['text']
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return prompt_file_path().stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh(self) -> None:
+        from src.database.models import PromptVersion, SystemSetting
+        from src.utils.runtime_status import get_session_maker
+
+        file_mtime = self._file_mtime()
+        db = get_session_maker()()
+        try:
+            setting_updated = db.query(SystemSetting.updated_at).filter(SystemSetting.key == SETTING_KEY).scalar()
+            active = db.query(PromptVersion.id, PromptVersion.version_number, PromptVersion.created_at).filter(
+                PromptVersion.is_active == True
+            ).order_by(PromptVersion.version_number.desc()).first()
+            token = (setting_updated, active.id if active else None, file_mtime)
+            if token == self._token:
+                return
+
+            current = self._resolve(db, active, file_mtime)
+            previous = self._current
+            self._current = {**current, 'loaded_at': datetime.utcnow().isoformat()}
+            self._token = token
+            if current['text'] != previous['text']:
+                logger.info(
+                    "Loaded system prompt",
+                    source=current['source'],
+                    version=current['version_number'],
+                    chars=len(current['text'] or '')
+                )
+        except Exception as e:
+            # Keep serving the last known prompt; a first failure falls back to the file
+            logger.warning("Failed to check system prompt version", error=str(e))
+            if self._token is None:
+                self._current = {**self._from_file(None), 'loaded_at': datetime.utcnow().isoformat()}
+                self._token = (None, None, file_mtime)
+        finally:
+            db.close()
+
+    def _resolve(self, db: Any, active: Any, file_mtime: Optional[int]) -> Dict[str, Any]:
+        from src.database.models import PromptVersion, SystemSetting
+
+        setting = db.query(SystemSetting).filter(SystemSetting.key == SETTING_KEY).first()
+        if setting and setting.value:
+            return {'text': setting.value, 'source': 'setting', 'version_id': None, 'version_number': None}
+
+        version = db.get(PromptVersion, active.id) if active else None
+        from_file = self._from_file(version)
+        if version is None:
+            return from_file
+        version_current = {
+            'text': version.prompt_text, 'source': 'version',
+            'version_id': version.id, 'version_number': version.version_number,
+        }
+        if from_file['text'] is None or from_file['text'] == (version.prompt_text or '').strip():
+            return version_current
+        # Both exist and differ: the more recently written one wins
+        file_written = datetime.utcfromtimestamp(file_mtime / 1e9) if file_mtime else None
+        if file_written and version.created_at and file_written > version.created_at:
+            return from_file
+        return version_current
+
+    @staticmethod
+    def _from_file(version: Any) -> Dict[str, Any]:
+        """Prompt file contents; the version is only reported when the file matches it"""
+        text = None
+        try:
+            path = prompt_file_path()
+            if path.exists():
+                text = path.read_text(encoding="utf-8").strip() or None
+        except Exception as e:
+            logger.warning("Failed to load system prompt from file", error=str(e))
+        matches = version is not None and text is not None and text == (version.prompt_text or '').strip()
+        return {
+            'text': text,
+            'source': 'file' if text is not None else None,
+            'version_id': version.id if matches else None,
+            'version_number': version.version_number if matches else None,
+        }
+
+
+# Shared per process
+prompt_registry = PromptRegistry()
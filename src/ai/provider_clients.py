@@ -0,0 +1,236 @@
+"""
+Shared AI Provider Clients
+Pooled keep-alive HTTP clients and per-provider concurrency limits
+
+Creating an OpenAI/Anthropic client per AIEngine meant a fresh connection
+pool (and TLS handshake) for every web request. Clients here are created
+once per (provider, API key) and shared. Async clients are additionally
+keyed by event loop, because an httpx.AsyncClient's connections belong to
+the loop that opened them.
+
+Concurrency per provider is bounded by settings.ai_max_concurrent_requests,
+with a threading semaphore for blocking calls and an asyncio semaphore per
+event loop for async calls.
+
+Providers report token usage (including prefix cache hits) through
+record_usage(); it is kept per thread/task so concurrent analyses don't mix.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+_lock = threading.Lock()
+_sync_clients: Dict[Tuple[str, str], Any] = {}
+_async_clients: Dict[Tuple[str, str, int], Any] = {}
+_thread_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_async_semaphores: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+_last_usage: ContextVar[Optional[Dict[str, Any]]] = ContextVar('ai_last_usage', default=None)
+
+
+def _httpx_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=settings.ai_http_max_connections,
+        max_keepalive_connections=settings.ai_http_max_connections,
+        keepalive_expiry=settings.ai_http_keepalive_seconds
+    )
+
+
+def _timeout():
+    import httpx
+    return httpx.Timeout(settings.ai_request_timeout_seconds, connect=10.0)
+
+
+def _loop_id() -> int:
+    return id(asyncio.get_running_loop())
+
+
+def get_openai_client(api_key: str, async_client: bool = False) -> Any:
+    """
+    Shared OpenAI client with a pooled keep-alive HTTP client
+
+    Args:
+        api_key: OpenAI API key
+        async_client: Return an AsyncOpenAI client bound to the running event loop
+
+    Returns:
+        openai.OpenAI or openai.AsyncOpenAI instance
+    """
+    import httpx
+    import openai
+
+    if async_client:
+        key = ('openai', api_key, _loop_id())
+        client = _async_clients.get(key)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                http_client=httpx.AsyncClient(limits=_httpx_limits(), timeout=_timeout())
+            )
+            _async_clients[key] = client
+        return client
+
+    key = ('openai', api_key)
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            client = openai.OpenAI(
+                api_key=api_key,
+                http_client=httpx.Client(limits=_httpx_limits(), timeout=_timeout())
+            )
+            _sync_clients[key] = client
+            logger.info("Created shared OpenAI client", max_connections=settings.ai_http_max_connections)
+    return client
+
+
+def get_anthropic_client(api_key: str, async_client: bool = False) -> Any:
+    """
+    Shared Anthropic client with a pooled keep-alive HTTP client
+
+    Args:
+        api_key: Anthropic API key
+        async_client: Return an AsyncAnthropic client bound to the running event loop
+
+    Returns:
+        anthropic.Anthropic or anthropic.AsyncAnthropic instance
+    """
+    import httpx
+    import anthropic
+
+    if async_client:
+        key = ('anthropic', api_key, _loop_id())
+        client = _async_clients.get(key)
+        if client is None:
+            client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                http_client=httpx.AsyncClient(limits=_httpx_limits(), timeout=_timeout())
+            )
+            _async_clients[key] = client
+        return client
+
+    key = ('anthropic', api_key)
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            client = anthropic.Anthropic(
+                api_key=api_key,
+                http_client=httpx.Client(limits=_httpx_limits(), timeout=_timeout())
+            )
+            _sync_clients[key] = client
+            logger.info("Created shared Anthropic client", max_connections=settings.ai_http_max_connections)
+    return client
+
+
+@contextmanager
+def provider_slot(provider: str):
+    """Bound concurrent blocking calls per provider"""
+    semaphore = _thread_semaphores.get(provider)
+    if semaphore is None:
+        with _lock:
+            semaphore = _thread_semaphores.setdefault(
+                provider, threading.BoundedSemaphore(settings.ai_max_concurrent_requests)
+            )
+    with semaphore:
+        yield
+
+
+@asynccontextmanager
+async def async_provider_slot(provider: str):
+    """Bound concurrent async calls per provider (per event loop)"""
+    key = (provider, _loop_id())
+    semaphore = _async_semaphores.get(key)
+    if semaphore is None:
+        semaphore = _async_semaphores.setdefault(key, asyncio.Semaphore(settings.ai_max_concurrent_requests))
+    async with semaphore:
+        yield
+
+
+async def aclose_loop_clients() -> None:
+    """Close async clients bound to the running loop (call before the loop shuts down)"""
+    loop_id = _loop_id()
+    for key in [k for k in _async_clients if k[2] == loop_id]:
+        client = _async_clients.pop(key)
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug("Failed to close async AI client", provider=key[0], error=str(e))
+    for key in [k for k in _async_semaphores if k[1] == loop_id]:
+        _async_semaphores.pop(key, None)
+
+
+def record_usage(
+    provider: str,
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cached_input_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> Dict[str, Any]:
+    """
+    Record token usage of the call that just completed
+
+    Args:
+        provider: Provider name
+        model: Model name
+        input_tokens: Total prompt tokens (cached ones included)
+        output_tokens: Completion tokens
+        cached_input_tokens: Prompt tokens served from the provider's prefix cache
+        cache_write_tokens: Prompt tokens written to the cache (Anthropic)
+
+    Returns:
+        The usage dict
+    """
+    usage = {
+        'provider': provider,
+        'model': model,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cached_input_tokens': cached_input_tokens,
+        'cache_write_tokens': cache_write_tokens,
+        'cache_hit_ratio': round(cached_input_tokens / input_tokens, 3) if input_tokens else 0.0,
+    }
+    _last_usage.set(usage)
+    logger.info("AI token usage", **usage)
+    return usage
+
+
+def pop_last_usage() -> Optional[Dict[str, Any]]:
+    """Return and clear the usage recorded by the last call in this thread/task"""
+    usage = _last_usage.get()
+    _last_usage.set(None)
+    return usage
+
+
+def peek_last_usage() -> Optional[Dict[str, Any]]:
+    """Return the usage recorded by the last call in this thread/task without clearing it"""
+    return _last_usage.get()
+
+
+def set_last_usage(usage: Optional[Dict[str, Any]]) -> None:
+    """Make usage recorded in another thread/task visible to the current one"""
+    _last_usage.set(usage)
+
+
+def combine_usage(*usages: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Sum the usage of several calls made for one result (e.g. an analysis and its repair)
+
+    Provider and model are taken from the first call.
+    """
+    usages = [usage for usage in usages if usage]
+    if not usages:
+        return None
+    combined = dict(usages[0])
+    for usage in usages[1:]:
+        for key in ('input_tokens', 'output_tokens', 'cached_input_tokens', 'cache_write_tokens'):
+            combined[key] = (combined.get(key, 0) or 0) + (usage.get(key, 0) or 0)
+    input_tokens = combined.get('input_tokens', 0)
+    combined['cache_hit_ratio'] = round(combined.get('cached_input_tokens', 0) / input_tokens, 3) if input_tokens else 0.0
+    return combined
@@ -0,0 +1,415 @@
+"""
+AI Provider Router
+Routes calls over several configured providers with hedging and failover
+
+- Failover: errors (including 429s and open circuits) or responses that fail
+  validation move on to the next provider in order.
+- Hedging: when the first request has not answered within the primary's
+  recent latency percentile (settings.ai_hedge_latency_percentile, at least
+  settings.ai_hedge_min_delay_seconds), a second request is sent to the next
+  provider (or the same one if only one is configured) and the first valid
+  answer wins.
+
+Per-provider latency, error and hedge stats are kept per process and
+published as 'ai_router:<pid>' runtime statuses. Each call's final outcome
+(latency, attempts, tokens) is reported to the call telemetry (telemetry.py).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+from src.utils.rate_limiter import is_throttle_error
+from .provider_clients import peek_last_usage, pop_last_usage, set_last_usage
+from .telemetry import record_call
+
+logger = structlog.get_logger(__name__)
+
+Validator = Optional[Callable[[str], Any]]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_last_publish = 0.0
+
+PUBLISH_INTERVAL_SECONDS = 30
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Shared worker pool for blocking (sync) hedged calls"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ai_max_concurrent_requests * 2,
+                    thread_name_prefix='ai-router'
+                )
+    return _executor
+
+
+def parse_fallback_providers(value: str) -> List[Tuple[str, str]]:
+    """
+    Parse 'provider:model,provider:model' into (provider, model) pairs
+
+    Args:
+        value: Setting value (e.g. 'anthropic:claude-3-5-sonnet-20241022,gemini:gemini-1.5-pro')
+
+    Returns:
+        List of (provider, model) tuples
+    """
+    pairs = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if ':' not in part:
+            continue
+        provider, model = part.split(':', 1)
+        if provider.strip() and model.strip():
+            pairs.append((provider.strip(), model.strip()))
+    return pairs
+
+
+class ProviderStats:
+    """Rolling latency window and counters for one routed provider"""
+
+    WINDOW = 200
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=self.WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.invalid = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def record(self, latency: float, error: Optional[BaseException] = None, invalid: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            if invalid:
+                self.invalid += 1
+            elif error is not None:
+                self.errors += 1
+                if is_throttle_error(error):
+                    self.throttled += 1
+            else:
+                self.latencies.append(latency)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency percentile in seconds (None with too few samples)"""
+        with self._lock:
+            if len(self.latencies) < settings.ai_hedge_min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self._lock:
+            return {
+                'provider': self.name,
+                'calls': self.calls,
+                'errors': self.errors,
+                'throttled': self.throttled,
+                'invalid_responses': self.invalid,
+                'error_rate': round((self.errors + self.invalid) / self.calls, 3) if self.calls else 0.0,
+                'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'latency_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                'hedges_sent': self.hedges_sent,
+                'hedges_won': self.hedges_won,
+            }
+
+
+_stats: Dict[str, ProviderStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _get_stats(name: str) -> ProviderStats:
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = ProviderStats(name)
+        return _stats[name]
+
+
+def get_router_stats() -> List[Dict[str, Any]]:
+    """Snapshots of all routed providers in this process"""
+    return [stats.snapshot() for stats in list(_stats.values())]
+
+
+class ProviderRouter:
+    """
+    AIProvider facade over an ordered list of providers
+
+    Args:
+        providers: (label, provider) pairs; the first is the primary.
+            Labels are 'provider:model' strings used in stats and logs.
+    """
+
+    name = 'router'
+
+    def __init__(self, providers: List[Tuple[str, Any]]):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self.providers = providers
+
+    @property
+    def primary(self) -> Any:
+        return self.providers[0][1]
+
+    def __getattr__(self, item: str) -> Any:
+        # model, client, ... of the primary provider
+        return getattr(self.providers[0][1], item)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _hedge_delay(self, label: str) -> Optional[float]:
+        """Seconds to wait before hedging (None when hedging is off)"""
+        if not settings.ai_hedging_enabled:
+            return None
+        observed = _get_stats(label).percentile(settings.ai_hedge_latency_percentile)
+        return max(settings.ai_hedge_min_delay_seconds, observed or 0.0)
+
+    def _hedge_target(self, index: int) -> Tuple[str, Any]:
+        return self.providers[index + 1] if index + 1 < len(self.providers) else self.providers[index]
+
+    def _finish(self, label: str, started: float, response: Optional[str], error: Optional[BaseException],
+                validator: Validator) -> Optional[BaseException]:
+        """Record the outcome of one attempt; returns the error (or validation error) if it failed"""
+        latency = time.monotonic() - started
+        invalid = False
+        if error is None and validator is not None:
+            try:
+                validator(response)
+            except Exception as e:
+                error, invalid = e, True
+        _get_stats(label).record(latency, error=error, invalid=invalid)
+        if error is not None:
+            logger.warning("AI provider attempt failed", provider=label, error=str(error)[:200],
+                           invalid_response=invalid, latency_ms=round(latency * 1000))
+        self._maybe_publish()
+        return error
+
+    @staticmethod
+    def _maybe_publish() -> None:
+        global _last_publish
+        if time.monotonic() - _last_publish < PUBLISH_INTERVAL_SECONDS:
+            return
+        _last_publish = time.monotonic()
+        from src.utils.runtime_status import publish_status
+        publish_status(f"ai_router:{os.getpid()}", {'providers': get_router_stats()})
+
+    # ------------------------------------------------------------------
+    # Blocking calls
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _call(provider: Any, kwargs: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Run in a worker: call the provider and hand its usage back to the caller"""
+        response = provider.generate_response(**kwargs)
+        return response, pop_last_usage()
+
+    def _submit(self, label: str, provider: Any, kwargs: Dict[str, Any]):
+        future = _get_executor().submit(copy_context().run, self._call, provider, kwargs)
+        future.label = label
+        future.started = time.monotonic()
+        return future
+
+    def generate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None,
+                          images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None,
+                          validator: Validator = None, purpose: str = 'other') -> str:
+        """
+        Generate a response, failing over and hedging across providers
+
+        Args:
+            prompt: Text prompt
+            temperature: Sampling temperature
+            system_text: System message/instructions
+            images: List of image paths for vision analysis
+            response_schema: JSON schema for the provider's native structured output mode
+            validator: Optional callable raising on unusable responses (e.g. analysis_schema.extract_json_object)
+            purpose: What the call is for, reported to the call telemetry ('analysis', 'repair', ...)
+
+        Returns:
+            First valid response
+
+        Raises:
+            The last provider error when every provider failed
+        """
+        kwargs = {'prompt': prompt, 'temperature': temperature, 'system_text': system_text, 'images': images,
+                  'response_schema': response_schema}
+        last_error: Optional[BaseException] = None
+        started = time.monotonic()
+        attempts, any_hedged = 0, False
+
+        for index, (label, provider) in enumerate(self.providers):
+            first = self._submit(label, provider, kwargs)
+            attempts += 1
+            pending = {first}
+            hedge_delay = self._hedge_delay(label)
+            hedged = False
+
+            while pending:
+                timeout = hedge_delay if (hedge_delay is not None and not hedged) else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # Primary attempt is slow: hedge
+                    hedge_label, hedge_provider = self._hedge_target(index)
+                    _get_stats(label).hedges_sent += 1
+                    logger.info("Hedging slow AI request", provider=label, hedge_provider=hedge_label,
+                                after_seconds=round(hedge_delay, 1))
+                    pending.add(self._submit(hedge_label, hedge_provider, kwargs))
+                    attempts += 1
+                    hedged = any_hedged = True
+                    continue
+
+                for future in done:
+                    try:
+                        response, usage = future.result()
+                        error = None
+                    except Exception as e:
+                        response, usage, error = None, None, e
+                    error = self._finish(future.label, future.started, response, error, validator)
+                    if error is None:
+                        if future is not first:
+                            _get_stats(label).hedges_won += 1
+                        set_last_usage(usage)
+                        record_call(purpose, future.label, time.monotonic() - started, usage, attempts, any_hedged)
+                        # Losing attempts can't be interrupted; they finish in the background
+                        return response
+                    last_error = error
+
+            # Every attempt for this provider failed: fail over
+            if index + 1 < len(self.providers):
+                logger.warning("Failing over to next AI provider", failed=label, next=self.providers[index + 1][0])
+
+        record_call(purpose, self.providers[-1][0], time.monotonic() - started, None, attempts, any_hedged, last_error)
+        raise last_error
+
+    # ------------------------------------------------------------------
+    # Async calls
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def _acall(provider: Any, kwargs: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        response = await provider.agenerate_response(**kwargs)
+        return response, pop_last_usage()
+
+    def _create_task(self, label: str, provider: Any, kwargs: Dict[str, Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(self._acall(provider, kwargs))
+        task.label = label
+        task.started = time.monotonic()
+        return task
+
+    async def agenerate_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None,
+                                 images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None,
+                                 validator: Validator = None, purpose: str = 'other') -> str:
+        """Async variant of generate_response (losing hedge requests are cancelled)"""
+        kwargs = {'prompt': prompt, 'temperature': temperature, 'system_text': system_text, 'images': images,
+                  'response_schema': response_schema}
+        last_error: Optional[BaseException] = None
+        started = time.monotonic()
+        attempts, any_hedged = 0, False
+
+        for index, (label, provider) in enumerate(self.providers):
+            first = self._create_task(label, provider, kwargs)
+            attempts += 1
+            pending = {first}
+            hedge_delay = self._hedge_delay(label)
+            hedged = False
+
+            try:
+                while pending:
+                    timeout = hedge_delay if (hedge_delay is not None and not hedged) else None
+                    done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                    if not done:
+                        hedge_label, hedge_provider = self._hedge_target(index)
+                        _get_stats(label).hedges_sent += 1
+                        logger.info("Hedging slow AI request", provider=label, hedge_provider=hedge_label,
+                                    after_seconds=round(hedge_delay, 1))
+                        pending.add(self._create_task(hedge_label, hedge_provider, kwargs))
+                        attempts += 1
+                        hedged = any_hedged = True
+                        continue
+
+                    for task in done:
+                        try:
+                            response, usage = task.result()
+                            error = None
+                        except Exception as e:
+                            response, usage, error = None, None, e
+                        error = self._finish(task.label, task.started, response, error, validator)
+                        if error is None:
+                            if task is not first:
+                                _get_stats(label).hedges_won += 1
+                            set_last_usage(usage)
+                            record_call(purpose, task.label, time.monotonic() - started, usage, attempts, any_hedged)
+                            return response
+                        last_error = error
+            finally:
+                for task in pending:
+                    task.cancel()
+
+            if index + 1 < len(self.providers):
+                logger.warning("Failing over to next AI provider", failed=label, next=self.providers[index + 1][0])
+
+        record_call(purpose, self.providers[-1][0], time.monotonic() - started, None, attempts, any_hedged, last_error)
+        raise last_error
+
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+
+    async def astream_response(self, prompt: str, temperature: float = 0.7, system_text: Optional[str] = None,
+                               images: Optional[list] = None, response_schema: Optional[Dict[str, Any]] = None,
+                               purpose: str = 'other') -> AsyncIterator[str]:
+        """
+        Stream from the first provider that starts answering
+
+        Providers that fail before producing any text are failed over; once
+        text has been streamed, errors propagate to the caller. Streams are
+        not hedged.
+        """
+        kwargs = {'prompt': prompt, 'temperature': temperature, 'system_text': system_text, 'images': images,
+                  'response_schema': response_schema}
+        last_error: Optional[BaseException] = None
+        call_started = time.monotonic()
+
+        for index, (label, provider) in enumerate(self.providers):
+            started = time.monotonic()
+            streamed = False
+            stream = provider.astream_response(**kwargs)
+            try:
+                async for chunk in stream:
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                self._finish(label, started, None, e, None)
+                if streamed:
+                    record_call(purpose, label, time.monotonic() - call_started, None, index + 1, error=e)
+                    raise
+                last_error = e
+                if index + 1 < len(self.providers):
+                    logger.warning("Failing over to next AI provider", failed=label, next=self.providers[index + 1][0])
+                continue
+            finally:
+                await stream.aclose()
+            self._finish(label, started, '', None, None)
+            # The usage stays with the caller (read back after the stream ends)
+            record_call(purpose, label, time.monotonic() - call_started, peek_last_usage(), index + 1)
+            return
+
+        record_call(purpose, self.providers[-1][0], time.monotonic() - call_started, None, len(self.providers),
+                    error=last_error)
+        raise last_error
+
@@ -0,0 +1,178 @@
+"""
+AI Response Cache
+Persistent cache of raw AI analysis responses keyed by a prompt fingerprint
+
+The fingerprint covers the provider/model, the system text (so a prompt
+version change invalidates entries), the normalized prompt, the temperature
+and the content hashes of attached images. Only responses that parsed
+successfully are stored. Entries expire after settings.ai_response_cache_ttl_hours
+and the table is trimmed to settings.ai_response_cache_max_entries, evicting
+the least recently used entries first.
+"""
+import hashlib
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+    except OSError:
+        # Unreadable image: fall back to the path so the key stays stable
+        digest.update(path.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return _WHITESPACE.sub(' ', prompt or '').strip()
+
+
+def fingerprint(
+    model_id: str,
+    system_text: Optional[str],
+    prompt: str,
+    temperature: float,
+    images: Optional[List[str]] = None
+) -> str:
+    """
+    Cache key for an AI call
+
+    Args:
+        model_id: Provider and model ('openai:gpt-4o')
+        system_text: System text sent with the call
+        prompt: User prompt
+        temperature: Sampling temperature
+        images: Image paths attached to the call
+
+    Returns:
+        Hex sha256 fingerprint
+    """
+    digest = hashlib.sha256()
+    for part in (
+        model_id,
+        hashlib.sha256((system_text or '').encode('utf-8')).hexdigest(),
+        normalize_prompt(prompt),
+        f"{temperature:.3f}",
+        *sorted(_hash_file(path) for path in images or []),
+    ):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class AIResponseCache:
+    """
+    Database backed response cache
+
+    Args:
+        session_maker: SQLAlchemy sessionmaker (defaults to the shared one)
+    """
+
+    def __init__(self, session_maker=None):
+        if session_maker is None:
+            from src.utils.runtime_status import get_session_maker
+            session_maker = get_session_maker()
+        self.SessionMaker = session_maker
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response
+
+        Args:
+            key: Fingerprint
+
+        Returns:
+            Raw response text, or None on a miss or expired entry
+        """
+        from src.database.models import AIResponseCacheEntry
+
+        session = self.SessionMaker()
+        try:
+            entry = session.query(AIResponseCacheEntry).filter(AIResponseCacheEntry.key == key).first()
+            if entry is None:
+                return None
+            now = datetime.utcnow()
+            if entry.expires_at <= now:
+                session.delete(entry)
+                session.commit()
+                return None
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_used_at = now
+            session.commit()
+            logger.info("AI response cache hit", key=key[:12], hit_count=entry.hit_count, model=entry.model_id)
+            return entry.response
+        except Exception as e:
+            session.rollback()
+            logger.warning("AI response cache lookup failed", error=str(e))
+            return None
+        finally:
+            session.close()
+
+    def put(self, key: str, model_id: str, response: str) -> None:
+        """
+        Store a response and evict expired/least recently used entries
+
+        Args:
+            key: Fingerprint
+            model_id: Provider and model the response came from
+            response: Raw response text
+        """
+        from src.database.models import AIResponseCacheEntry
+
+        session = self.SessionMaker()
+        try:
+            now = datetime.utcnow()
+            session.merge(AIResponseCacheEntry(
+                key=key,
+                model_id=model_id,
+                response=response,
+                created_at=now,
+                last_used_at=now,
+                expires_at=now + timedelta(hours=settings.ai_response_cache_ttl_hours),
+                hit_count=0
+            ))
+            session.flush()
+
+            session.query(AIResponseCacheEntry).filter(
+                AIResponseCacheEntry.expires_at <= now
+            ).delete(synchronize_session=False)
+
+            overflow = session.query(AIResponseCacheEntry).count() - settings.ai_response_cache_max_entries
+            if overflow > 0:
+                stale = session.query(AIResponseCacheEntry.key).order_by(
+                    AIResponseCacheEntry.last_used_at.asc()
+                ).limit(overflow).subquery()
+                session.query(AIResponseCacheEntry).filter(
+                    AIResponseCacheEntry.key.in_(stale.select())
+                ).delete(synchronize_session=False)
+
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning("Failed to store AI response in cache", error=str(e))
+        finally:
+            session.close()
+
+    def clear(self) -> int:
+        """Delete all entries (returns the number removed)"""
+        from src.database.models import AIResponseCacheEntry
+
+        session = self.SessionMaker()
+        try:
+            removed = session.query(AIResponseCacheEntry).delete(synchronize_session=False)
+            session.commit()
+            return removed
+        finally:
+            session.close()
@@ -0,0 +1,319 @@
+"""
+AI Call Telemetry
+Latency, token and cost record of every AI provider call
+
+ProviderRouter (and GuardedProvider when used on its own, e.g. the triage
+model) report each generate_response() call once it has a final outcome:
+the provider that answered, wall-clock latency including hedges and
+failovers, the number of provider requests it took and the token usage
+with its estimated cost.
+
+Calls made while AIEngine analyzes an email are collected on the analysis
+('ai_calls') and stored with its AIDecisionLog (see call_telemetry_fields()),
+so they are linked to the decision and the prompt version that produced it.
+All other calls (summaries, prompt tools, batch stand-in, analyses that are
+not logged as decisions) are buffered and written in small batches.
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+import structlog
+
+from config.settings import settings
+from .pricing import estimate_cost
+
+logger = structlog.get_logger(__name__)
+
+# Calls of the analysis running in this thread/task (None outside analyses)
+_collector: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar('ai_call_collector', default=None)
+
+ANALYSIS_PURPOSES = ('analysis', 'repair')
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+
+@contextmanager
+def collect_calls() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Collect the calls recorded inside the block instead of writing them
+
+    Yields:
+        List the call records are appended to
+    """
+    previous = _collector.get()
+    calls: List[Dict[str, Any]] = []
+    _collector.set(calls)
+    try:
+        yield calls
+    finally:
+        # set() rather than reset(): async generators may finish in another context
+        _collector.set(previous)
+
+
+def record_call(
+    purpose: str,
+    label: Optional[str],
+    latency: float,
+    usage: Optional[Dict[str, Any]] = None,
+    attempts: int = 1,
+    hedged: bool = False,
+    error: Optional[BaseException] = None
+) -> None:
+    """
+    Record the outcome of one generate_response() call
+
+    Args:
+        purpose: What the call was for ('analysis', 'repair', 'triage', 'summary', ...)
+        label: 'provider:model' that answered (or failed last)
+        latency: Seconds from the first request to the final outcome
+        usage: Usage dict from provider_clients.record_usage() (None when unknown)
+        attempts: Provider requests made, hedges and failovers included
+        hedged: Whether a hedge request was sent
+        error: Final error when the call failed
+    """
+    if not settings.ai_telemetry_enabled:
+        return
+    provider, _, model = (label or '').partition(':')
+    usage = usage or {}
+    model = usage.get('model') or model or None
+    record = {
+        'purpose': purpose,
+        'provider': usage.get('provider') or provider or None,
+        'model': model,
+        'latency_ms': round(latency * 1000, 1),
+        'attempts': attempts,
+        'hedged': hedged,
+        'success': error is None,
+        'error_message': str(error)[:500] if error is not None else None,
+        'response_cached': False,
+        'input_tokens': usage.get('input_tokens', 0) or 0,
+        'output_tokens': usage.get('output_tokens', 0) or 0,
+        'cached_input_tokens': usage.get('cached_input_tokens', 0) or 0,
+        'cache_write_tokens': usage.get('cache_write_tokens', 0) or 0,
+        'cost_usd': round(estimate_cost(model, usage), 6) if model and usage else 0.0,
+        'created_at': datetime.utcnow().isoformat(),
+    }
+    _add(record)
+
+
+def record_cache_hit(purpose: str, model_id: Optional[str]) -> None:
+    """Record a call answered by the AI response cache (no provider request)"""
+    if not settings.ai_telemetry_enabled:
+        return
+    provider, _, model = (model_id or '').partition(':')
+    _add({
+        'purpose': purpose,
+        'provider': provider or None,
+        'model': model or None,
+        'latency_ms': 0.0,
+        'attempts': 0,
+        'hedged': False,
+        'success': True,
+        'error_message': None,
+        'response_cached': True,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cached_input_tokens': 0,
+        'cache_write_tokens': 0,
+        'cost_usd': 0.0,
+        'created_at': datetime.utcnow().isoformat(),
+    })
+
+
+def _add(record: Dict[str, Any]) -> None:
+    calls = _collector.get()
+    if calls is not None:
+        calls.append(record)
+    else:
+        writer.add([record])
+
+
+def _row(record: Dict[str, Any]) -> Any:
+    from src.database.models import AICallTelemetry
+
+    fields = dict(record)
+    fields['created_at'] = datetime.fromisoformat(fields['created_at'])
+    if fields['purpose'] not in ANALYSIS_PURPOSES:
+        fields.pop('prompt_version_id', None)
+    return AICallTelemetry(**fields)
+
+
+def _analysis_records(analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Calls of an analysis, tagged with its intent and prompt version"""
+    return [
+        {**record, 'prompt_version_id': analysis.get('prompt_version_id'), 'intent': analysis.get('intent')}
+        for record in analysis.get('ai_calls') or []
+    ]
+
+
+def call_telemetry_fields(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    AIDecisionLog constructor values linking an analysis' calls to the decision
+
+    Args:
+        analysis: Result of AIEngine.analyze_email()
+
+    Returns:
+        Dict with prompt_version_id and ai_calls (AICallTelemetry rows)
+    """
+    fields: Dict[str, Any] = {'prompt_version_id': analysis.get('prompt_version_id')}
+    if settings.ai_telemetry_enabled and analysis.get('ai_calls'):
+        fields['ai_calls'] = [_row(record) for record in _analysis_records(analysis)]
+    return fields
+
+
+def record_analysis_calls(analysis: Dict[str, Any]) -> None:
+    """Write the calls of an analysis that is not logged as an AIDecisionLog"""
+    if settings.ai_telemetry_enabled and analysis.get('ai_calls'):
+        writer.add(_analysis_records(analysis))
+
+
+class TelemetryWriter:
+    """Buffers call records that belong to no decision and writes them in batches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._flushed_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def add(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._pending.extend(records)
+            due = (len(self._pending) >= settings.ai_telemetry_flush_size
+                   or time.monotonic() - self._flushed_at >= settings.ai_telemetry_flush_seconds)
+            if due:
+                self._flushed_at = time.monotonic()
+        if due:
+            # Off the caller's thread: callers may be on the event loop
+            threading.Thread(target=self.flush, name='ai-telemetry', daemon=True).start()
+
+    def flush(self) -> None:
+        """Write all pending records"""
+        with self._lock:
+            records, self._pending = self._pending, []
+            self._flushed_at = time.monotonic()
+        if not records:
+            return
+        from src.utils.runtime_status import get_session_maker
+
+        db = get_session_maker()()
+        try:
+            db.add_all([_row(record) for record in records])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Failed to store AI call telemetry", calls=len(records), error=str(e))
+        finally:
+            db.close()
+
+
+def telemetry_summary(db: Any, days: int = 7) -> Dict[str, Any]:
+    """
+    Aggregate stored call telemetry
+
+    Args:
+        db: Database session
+        days: Window in days (ending now)
+
+    Returns:
+        Dict with overall totals, latency percentiles per model and purpose,
+        tokens per intent, cost per day and cache hit rates
+    """
+    from src.database.models import AICallTelemetry
+
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.query(
+        AICallTelemetry.decision_id,
+        AICallTelemetry.purpose,
+        AICallTelemetry.intent,
+        AICallTelemetry.provider,
+        AICallTelemetry.model,
+        AICallTelemetry.latency_ms,
+        AICallTelemetry.attempts,
+        AICallTelemetry.success,
+        AICallTelemetry.response_cached,
+        AICallTelemetry.input_tokens,
+        AICallTelemetry.output_tokens,
+        AICallTelemetry.cached_input_tokens,
+        AICallTelemetry.cost_usd,
+        AICallTelemetry.created_at
+    ).filter(AICallTelemetry.created_at >= since).all()
+
+    def group(key) -> Dict[str, List[Any]]:
+        groups: Dict[str, List[Any]] = {}
+        for row in rows:
+            groups.setdefault(key(row), []).append(row)
+        return groups
+
+    def stats(group_rows: List[Any]) -> Dict[str, Any]:
+        # Latency of requests that reached a provider
+        latencies = [row.latency_ms for row in group_rows if row.success and not row.response_cached]
+        input_tokens = sum(row.input_tokens or 0 for row in group_rows)
+        return {
+            'calls': len(group_rows),
+            'failed': sum(1 for row in group_rows if not row.success),
+            'retries': sum(max((row.attempts or 1) - 1, 0) for row in group_rows if not row.response_cached),
+            'latency_p50_ms': _percentile(latencies, 0.5),
+            'latency_p95_ms': _percentile(latencies, 0.95),
+            'input_tokens': input_tokens,
+            'output_tokens': sum(row.output_tokens or 0 for row in group_rows),
+            'cached_input_tokens': sum(row.cached_input_tokens or 0 for row in group_rows),
+            'prompt_cache_hit_rate': round(
+                sum(row.cached_input_tokens or 0 for row in group_rows) / input_tokens, 3
+            ) if input_tokens else 0.0,
+            'cost_usd': round(sum(row.cost_usd or 0.0 for row in group_rows), 4),
+        }
+
+    tokens_per_intent = []
+    for intent, intent_rows in sorted(group(lambda row: row.intent or 'unknown').items()):
+        intent_rows = [row for row in intent_rows if row.purpose in ANALYSIS_PURPOSES + ('triage',)]
+        if not intent_rows:
+            continue
+        decisions = {row.decision_id for row in intent_rows if row.decision_id is not None}
+        entry = {'intent': intent, 'decisions': len(decisions), **stats(intent_rows)}
+        total_tokens = entry['input_tokens'] + entry['output_tokens']
+        entry['avg_tokens_per_decision'] = round(total_tokens / len(decisions)) if decisions else None
+        tokens_per_intent.append(entry)
+
+    analyses = [row for row in rows if row.purpose == 'analysis']
+    overall = stats(rows)
+    return {
+        'days': days,
+        'since': since.isoformat(),
+        'overall': overall,
+        'by_model': [
+            {'provider': key.split(':', 1)[0] or None, 'model': key.split(':', 1)[1] or None, **stats(model_rows)}
+            for key, model_rows in sorted(group(lambda row: f"{row.provider or ''}:{row.model or ''}").items())
+        ],
+        'by_purpose': [
+            {'purpose': purpose, **stats(purpose_rows)}
+            for purpose, purpose_rows in sorted(group(lambda row: row.purpose).items())
+        ],
+        'tokens_per_intent': tokens_per_intent,
+        'cost_per_day': [
+            {'date': date, 'calls': len(day_rows),
+             'cost_usd': round(sum(row.cost_usd or 0.0 for row in day_rows), 4)}
+            for date, day_rows in sorted(group(lambda row: row.created_at.date().isoformat()).items())
+        ],
+        'cache': {
+            'prompt_cache_hit_rate': overall['prompt_cache_hit_rate'],
+            'response_cache_hits': sum(1 for row in analyses if row.response_cached),
+            'response_cache_hit_rate': round(
+                sum(1 for row in analyses if row.response_cached) / len(analyses), 3
+            ) if analyses else 0.0,
+        },
+    }
+
+
+# Shared per process
+writer = TelemetryWriter()
@@ -0,0 +1,110 @@
+"""
+Ticket History
+Structured conversation history of a ticket for AI prompts
+
+Shared by the orchestrator (live analyses) and bulk re-analysis jobs so both
+send the model the same context. Long conversations are condensed by
+conversation_summary.py, which uses history_entries() below.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+THREADS = ('customer_thread', 'supplier_thread', 'internal_notes')
+
+# Last N entries per thread when no rolling summary is available
+THREAD_LIMITS = {'customer_thread': 4, 'supplier_thread': 4, 'internal_notes': 3}
+
+# (sourceTicketSideTypeId, targetTicketSideTypeId) -> (thread, direction)
+# 1 = System/Operator, 2 = Customer, 3 = Supplier
+ROUTES = {
+    (2, 1): ('customer_thread', 'inbound'),    # Customer to us
+    (1, 2): ('customer_thread', 'outbound'),   # Us to customer
+    (1, 3): ('supplier_thread', 'outbound'),   # Us to supplier
+    (3, 1): ('supplier_thread', 'inbound'),    # Supplier to us
+    (1, 1): ('internal_notes', None),          # Internal note
+}
+
+
+def detail_key(detail: Dict[str, Any]) -> str:
+    """Stable identifier of a ticketDetail (its ID, else its creation time)"""
+    return str(detail.get('id') or detail.get('createdDateTime') or '')
+
+
+def _is_ai_agent_message(comment: str) -> bool:
+    # Skip ALL AI Agent messages (case-insensitive)
+    comment_lower = comment.strip().lower()
+    return (comment_lower.startswith('ai agent') or
+            'ai agent proposes' in comment_lower or
+            'ai agent suggests' in comment_lower or
+            comment.strip().startswith('🚨'))  # Escalation emoji
+
+
+def _format_timestamp(created_at: str) -> str:
+    # Parse date to simpler format
+    try:
+        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+        return dt.strftime('%Y-%m-%d %H:%M')
+    except Exception:
+        return created_at[:16] if len(created_at) >= 16 else created_at
+
+
+def history_entries(
+    ticket_data: Dict[str, Any],
+    message_chars: int = 400,
+    note_chars: int = 250
+) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Conversation entries of a ticket in chronological order
+
+    Args:
+        ticket_data: Ticket data from the ticketing API (with ticketDetails)
+        message_chars: Characters kept of customer/supplier messages
+        note_chars: Characters kept of internal notes
+
+    Returns:
+        List of (detail_key, thread, entry) tuples; AI agent messages and
+        details that belong to no thread are left out
+    """
+    entries = []
+    for detail in ticket_data.get('ticketDetails', []) or []:
+        comment = detail.get('comment', '')
+        if not comment or _is_ai_agent_message(comment):
+            continue
+
+        route = ROUTES.get((detail.get('sourceTicketSideTypeId'), detail.get('targetTicketSideTypeId')))
+        if not route:
+            continue
+        thread, direction = route
+
+        timestamp = _format_timestamp(detail.get('createdDateTime', '') or '')
+        if direction is None:
+            entry = {'timestamp': timestamp, 'note': comment[:note_chars]}
+        else:
+            entry = {'timestamp': timestamp, 'direction': direction, 'message': comment[:message_chars]}
+        entries.append((detail_key(detail), thread, entry))
+    return entries
+
+
+def group_entries(entries: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Split history_entries() output into the customer/supplier/internal threads"""
+    history = {thread: [] for thread in THREADS}
+    for _, thread, entry in entries:
+        history[thread].append(entry)
+    return history
+
+
+def build_ticket_history(ticket_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build structured ticket history for AI context
+    Returns a clean JSON structure instead of text blobs
+
+    Args:
+        ticket_data: Ticket data from the ticketing API (with ticketDetails)
+
+    Returns:
+        Dict with customer_thread, supplier_thread and internal_notes
+    """
+    history = group_entries(history_entries(ticket_data))
+
+    # Return structured data (keep last N messages for each thread)
+    return {thread: history[thread][-limit:] for thread, limit in THREAD_LIMITS.items()}
@@ -0,0 +1,191 @@
+"""
+AI Triage
+First tier of the model cascade: a cheap model classifies the email and
+decides whether a customer or supplier draft is needed at all
+
+Emails the triage model handles confidently without a draft (notifications,
+auto-replies, spam, pure acknowledgements that need no answer) never reach
+the expensive drafting model. Everything else, including anything the triage
+model flags for escalation, goes on to the full analysis.
+
+Per-tier call counts, latency, cost and escalations are kept per process and
+published as 'ai_cascade:<pid>' runtime statuses.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+import structlog
+
+from config.settings import settings
+from .pricing import estimate_cost
+from .prompt_budget import serialize_history, truncate_to_tokens
+
+logger = structlog.get_logger(__name__)
+
+TRIAGE = 'triage'
+FULL = 'full'
+LOCAL = 'local'  # Settled by the local intent classifier (see intent_classifier.py)
+
+# Static (cacheable) triage instructions
+TRIAGE_INSTRUCTIONS = """You triage incoming emails for the customer support team of a dropshipping company.
+Classify the email and decide whether it needs a written reply (to the customer) or a message to the supplier.
+
+A draft IS needed when the sender asks a question, reports a problem, requests a return/refund/cancellation,
+provides information we asked for, thanks us for help in a customer conversation, or when the supplier
+must be contacted.
+A draft is NOT needed for automated notifications (shipping/delivery/marketplace notices), auto-replies,
+out-of-office messages, newsletters, spam, or messages that only confirm something with nothing to answer.
+
+Set requires_escalation to true for legal threats, chargebacks/A-to-z claims, very angry customers,
+or anything you are unsure about.
+
+Respond with ONLY this JSON object:
+{
+  "intent": "one of: tracking_inquiry, return_request, price_question, general_info, tech_support, complaint, transport_damage, notification, other",
+  "ticket_type_id": integer (1=Return, 2=Tracking, 3=Price, 4=GeneralInfo, 5=TechSupport, 6=SupportEnquiry, 7=TransportDamage, 0=Unknown),
+  "confidence": float between 0.0 and 1.0,
+  "needs_customer_response": boolean,
+  "needs_supplier_action": boolean,
+  "requires_escalation": boolean,
+  "summary": "one sentence summary"
+}
+"""
+
+TRIAGE_REQUIRED_FIELDS = ['intent', 'confidence', 'needs_customer_response', 'needs_supplier_action']
+
+
+def build_triage_prompt(email_data: Dict[str, Any], ticket_history: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the (short) per-email triage prompt
+
+    Args:
+        email_data: Email details (subject, body, from)
+        ticket_history: Structured conversation history (only the latest entries are included)
+
+    Returns:
+        Prompt text
+    """
+    body = truncate_to_tokens(email_data.get('body') or '', settings.ai_triage_max_body_tokens, keep_tail=True)
+    prompt = f"""Email:
+- From: {email_data.get('from', '')}
+- Subject: {email_data.get('subject') or ''}
+- Body:
+{body}
+"""
+    if ticket_history:
+        # Latest verbatim entries only (the rolling conversation summary is left to the full model)
+        recent = {
+            key: value[-2:]
+            for key, value in ticket_history.items()
+            if isinstance(value, list)
+        }
+        if any(recent.values()):
+            prompt += f"\nMost recent conversation entries (JSON):\n{serialize_history(recent)}\n"
+    return prompt
+
+
+def parse_triage_response(response: str) -> Dict[str, Any]:
+    """
+    Parse the triage model's JSON answer
+
+    Raises:
+        ValueError: If the response is not valid triage JSON
+    """
+    text = (response or '').strip()
+    if '{' in text and '}' in text:
+        text = text[text.find('{'):text.rfind('}') + 1]
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid triage JSON: {e}")
+    for field in TRIAGE_REQUIRED_FIELDS:
+        if field not in parsed:
+            raise ValueError(f"Missing triage field: {field}")
+    parsed['confidence'] = float(parsed.get('confidence') or 0.0)
+    return parsed
+
+
+def triage_is_final(triage: Dict[str, Any]) -> bool:
+    """Whether the triage result can stand without the drafting model"""
+    return (
+        not triage.get('needs_customer_response')
+        and not triage.get('needs_supplier_action')
+        and not triage.get('requires_escalation')
+        and triage.get('confidence', 0.0) >= settings.ai_triage_confidence_threshold
+    )
+
+
+class CascadeStats:
+    """Per-tier counters for this process"""
+
+    PUBLISH_INTERVAL_SECONDS = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, float]] = {}
+        self._last_publish = 0.0
+
+    def record(
+        self,
+        tier: str,
+        model: str,
+        latency_ms: float,
+        usage: Optional[Dict[str, Any]] = None,
+        escalated: bool = False,
+        resolved: bool = False,
+        failed: bool = False
+    ) -> None:
+        """
+        Record one call of a tier
+
+        Args:
+            tier: 'local', 'triage' or 'full'
+            model: Model name (for cost estimation)
+            latency_ms: Call latency
+            usage: Token usage of the call
+            escalated: Whether the result requires escalation
+            resolved: Whether this tier produced the final analysis
+            failed: Whether the call failed
+        """
+        with self._lock:
+            stats = self._tiers.setdefault(tier, {
+                'calls': 0, 'resolved': 0, 'escalated': 0, 'failed': 0,
+                'latency_ms_total': 0.0, 'latency_ms_max': 0.0,
+                'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0,
+            })
+            stats['calls'] += 1
+            stats['resolved'] += int(resolved)
+            stats['escalated'] += int(escalated)
+            stats['failed'] += int(failed)
+            stats['latency_ms_total'] += latency_ms
+            stats['latency_ms_max'] = max(stats['latency_ms_max'], latency_ms)
+            if usage:
+                stats['input_tokens'] += usage.get('input_tokens', 0) or 0
+                stats['output_tokens'] += usage.get('output_tokens', 0) or 0
+                stats['cost_usd'] += estimate_cost(usage.get('model') or model, usage)
+            publish = time.monotonic() - self._last_publish >= self.PUBLISH_INTERVAL_SECONDS
+            if publish:
+                self._last_publish = time.monotonic()
+
+        if publish:
+            from src.utils.runtime_status import publish_status
+            publish_status(f"ai_cascade:{os.getpid()}", self.snapshot())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-tier stats with averages"""
+        with self._lock:
+            tiers = {}
+            for tier, stats in self._tiers.items():
+                calls = stats['calls'] or 1
+                tiers[tier] = {
+                    **stats,
+                    'cost_usd': round(stats['cost_usd'], 6),
+                    'latency_ms_avg': round(stats['latency_ms_total'] / calls, 1),
+                    'cost_usd_avg': round(stats['cost_usd'] / calls, 6),
+                }
+            return {'tiers': tiers}
+
+
+cascade_stats = CascadeStats()
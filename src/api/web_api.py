@@ -2,14 +2,15 @@
 Web API for AI Agent Management UI
 FastAPI application that exposes existing system functionality via REST API
 """
+import asyncio
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import structlog
 import re
 import html
 from html.parser import HTMLParser
 from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, status, Form, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -23,11 +24,20 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from config.settings import settings
-from src.database.models import TicketState, AIDecisionLog, ProcessedEmail, PendingEmailRetry, User, PendingMessage, MessageTemplate, Attachment, TicketAuditLog, CustomStatus, Supplier, init_database
-from src.ai.ai_engine import AIEngine
+from src.database.models import TicketState, AIDecisionLog, ProcessedEmail, PendingEmailRetry, User, PendingMessage, MessageTemplate, Attachment, TicketAuditLog, CustomStatus, Supplier, TrackingAlert, init_database
+from src.ai.ai_engine import get_ai_engine
+from src.ai.prompt_registry import prompt_file_path, prompt_registry
+from src.ai.example_index import example_index
+from src.ai.prompt_budget import prompt_token_fields
+from src.ai.telemetry import call_telemetry_fields, telemetry_summary
 from src.api.ticketing_client import TicketingAPIClient
 from src.utils.message_service import MessageService
+from src.utils.phrase_guard import phrase_guard
+from src.utils.rate_limiter import rate_limited, set_request_priority, get_rate_limit_status
+from src.utils.circuit_breaker import CircuitOpenError, circuit_protected, get_breaker_snapshots
+from src.utils.runtime_status import read_status, read_statuses
 from src.utils.text_filter import TextFilter
+from src.utils.tracking_refresher import TrackingRefresher, run_tracking_refresher
 from src.utils.status_manager import update_ticket_status
 from src.utils.audit_logger import (
     log_message_sent, log_attachment_added, log_ticket_reprocessed,
@@ -60,6 +70,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request, exc: CircuitOpenError):
+    """Report an open circuit as temporarily unavailable instead of a server error"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Dependency '{exc.name}' is temporarily unavailable", "retry_after_seconds": round(exc.retry_after)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -243,6 +263,21 @@ class PromptApprovalRequest(BaseModel):
     change_summary: str
 
 
+class BulkReanalysisRequest(BaseModel):
+    name: Optional[str] = None
+    prompt_version_id: Optional[int] = None  # None = current system prompt
+    statuses: List[str] = []
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    intents: List[str] = []
+    feedback: List[str] = []  # 'correct', 'incorrect', 'partially_correct', 'none'
+    escalated: Optional[bool] = None
+    ticket_numbers: List[str] = []
+    limit: Optional[int] = None
+    batch_mode: bool = False  # Submit through the provider batch API (results within 24h, half price)
+    dry_run: bool = False  # Only count the matching tickets
+
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -330,6 +365,11 @@ class BlockedPromisePhraseUpdate(BaseModel):
     enabled: Optional[bool] = None
 
 
+class BlockedPhraseScanRequest(BaseModel):
+    text: str
+    language: Optional[str] = None
+
+
 class TicketIdentifiersUpdate(BaseModel):
     order_number: Optional[str] = None
     purchase_order_number: Optional[str] = None
@@ -338,6 +378,9 @@ class TicketIdentifiersUpdate(BaseModel):
 # Initialize database session maker
 SessionMaker = init_database()
 
+# Background tracking refresh of open tickets (started with the app)
+tracking_refresher = TrackingRefresher(SessionMaker)
+
 # Database dependency
 def get_db():
     """Get database session"""
@@ -348,6 +391,11 @@ def get_db():
         session.close()
 
 
+def get_ticketing_client():
+    """Ticketing API client behind the circuit breaker and low-priority rate limit"""
+    return circuit_protected(rate_limited(TicketingAPIClient(), 'ticketing', priority='low'), 'ticketing')
+
+
 # Helper function to ensure timezone-aware datetimes
 def ensure_utc(dt: Optional[datetime]) -> Optional[datetime]:
     """Convert naive datetime to UTC-aware datetime"""
@@ -410,6 +458,10 @@ def get_current_user(
     return user
 
 
+_batch_poller_task: Optional[asyncio.Task] = None
+_tracking_refresher_task: Optional[asyncio.Task] = None
+
+
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_event():
@@ -421,12 +473,24 @@ async def startup_event():
 
     # Start message retry scheduler
     try:
-        ticketing_client = TicketingAPIClient()
+        ticketing_client = get_ticketing_client()
         start_scheduler(ticketing_client, SessionMaker)
         logger.info("Message retry scheduler started")
     except Exception as e:
         logger.error(f"Failed to start message retry scheduler: {e}", exc_info=True)
 
+    # Start AI batch poller (delivers batch API results to their owners)
+    global _batch_poller_task
+    from src.ai.batch_client import run_batch_poller
+    _batch_poller_task = asyncio.create_task(run_batch_poller(SessionMaker))
+    logger.info("AI batch poller started")
+
+    # Start tracking refresher (keeps the tracking cache of open tickets warm)
+    global _tracking_refresher_task
+    if settings.tracking_refresh_enabled:
+        _tracking_refresher_task = asyncio.create_task(run_tracking_refresher(tracking_refresher))
+        logger.info("Tracking refresher started")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -440,6 +504,18 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"Error stopping scheduler: {e}", exc_info=True)
 
+    if _batch_poller_task is not None:
+        _batch_poller_task.cancel()
+    if _tracking_refresher_task is not None:
+        _tracking_refresher_task.cancel()
+
+    # Close pooled async AI clients bound to this event loop
+    try:
+        from src.ai.provider_clients import aclose_loop_clients
+        await aclose_loop_clients()
+    except Exception as e:
+        logger.error(f"Error closing AI clients: {e}", exc_info=True)
+
 
 # Health check
 @app.get("/health")
@@ -731,14 +807,12 @@ async def link_email_to_order(
     # Import orchestrator and reprocess
     try:
         from src.orchestrator import SupportAgentOrchestrator
-        from src.email.gmail_monitor import GmailMonitor
 
         # Initialize components
-        gmail_monitor = GmailMonitor()
         orchestrator = SupportAgentOrchestrator()
 
-        # Fetch fresh email data from Gmail
-        email_data = gmail_monitor._get_message_details(processed_email.gmail_message_id)
+        # Fetch fresh email data from the configured email source
+        email_data = orchestrator.email_source.get_message(processed_email.gmail_message_id)
         if not email_data:
             raise HTTPException(status_code=404, detail="Could not fetch email from Gmail")
 
@@ -917,9 +991,8 @@ async def get_ticket_detail(
 
     # Then, fetch ticket messages from ticketing system API (if not imported)
     if ticket.current_state != 'imported':
-        from src.api.ticketing_client import TicketingAPIClient
         try:
-            ticketing_client = TicketingAPIClient()
+            ticketing_client = get_ticketing_client()
             ticket_data = ticketing_client.get_ticket_by_ticket_number(ticket_number)
             if ticket_data and len(ticket_data) > 0:
                 # The API returns ticketDetails array with message objects
@@ -1081,10 +1154,16 @@ async def get_ticket_detail(
 @app.get("/api/tickets/{ticket_number}/check-tracking")
 async def check_ticket_tracking(
     ticket_number: str,
+    refresh: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Check live tracking status for a ticket"""
+    """
+    Check live tracking status for a ticket
+
+    The status comes from the shared tracking cache while it is fresh;
+    refresh=true asks the carrier again.
+    """
     # Get ticket from database
     ticket = db.query(TicketState).filter(
         TicketState.ticket_number == ticket_number
@@ -1104,21 +1183,29 @@ async def check_ticket_tracking(
             'status': None
         }
 
-    # Use tracking checker
+    # Use the shared tracking cache
     try:
-        from src.utils.tracking_checker import TrackingChecker, extract_house_number
-
-        # Extract house number from address
-        house_number = extract_house_number(ticket.customer_address) if ticket.customer_address else None
+        from src.utils.tracking_cache import tracking_cache
 
-        checker = TrackingChecker()
-        result = checker.check_tracking(
-            tracking_number=ticket.tracking_number,
-            carrier_name=ticket.carrier_name,
-            tracking_url=ticket.tracking_url,
-            postal_code=ticket.customer_postal_code,
-            house_number=house_number
+        parcel = {
+            'tracking_number': ticket.tracking_number,
+            'carrier': ticket.carrier_name,
+            'tracking_url': ticket.tracking_url,
+            'postal_code': ticket.customer_postal_code,
+            'address': ticket.customer_address,
+        }
+        result = await asyncio.to_thread(
+            tracking_cache.lookup, parcel, refresh, settings.tracking_lookup_timeout_seconds
         )
+        if result is None:
+            return {
+                'success': False,
+                'error': 'The carrier has not answered yet; try again shortly',
+                'tracking_number': ticket.tracking_number,
+                'carrier': ticket.carrier_name,
+                'tracking_url': ticket.tracking_url,
+                'status': None
+            }
 
         logger.info(
             "Manual tracking check from UI",
@@ -1126,6 +1213,7 @@ async def check_ticket_tracking(
             tracking_number=ticket.tracking_number,
             carrier=ticket.carrier_name,
             status=result.get('status'),
+            cached=result.get('cached'),
             user=current_user.username
         )
 
@@ -1133,14 +1221,16 @@ async def check_ticket_tracking(
             'success': True,
             'error': result.get('error'),
             'tracking_number': ticket.tracking_number,
-            'carrier': result.get('carrier', ticket.carrier_name),
-            'tracking_url': result.get('tracking_url', ticket.tracking_url),
+            'carrier': result.get('carrier') or ticket.carrier_name,
+            'tracking_url': result.get('tracking_url') or ticket.tracking_url,
             'status': result.get('status'),
             'status_text': result.get('status_text'),
             'last_update': result.get('last_update'),
             'location': result.get('location'),
             'estimated_delivery': result.get('estimated_delivery'),
-            'cached': result.get('cached', False)
+            'checked_at': result.get('checked_at'),
+            'cached': result.get('cached', False),
+            'stale': result.get('stale', False)
         }
 
     except Exception as e:
@@ -1157,6 +1247,7 @@ async def check_ticket_tracking(
 
 class ReprocessRequest(BaseModel):
     force_merge: bool = False  # If True, merge with found ticket even if it's different
+    force_refresh: bool = False  # If True, skip the AI response cache
 
 
 @app.post("/api/tickets/{ticket_number}/reprocess")
@@ -1180,8 +1271,7 @@ async def reprocess_ticket(
         raise HTTPException(status_code=404, detail="Ticket not found")
 
     try:
-        from src.api.ticketing_client import TicketingAPIClient
-        ticketing_client = TicketingAPIClient()
+        ticketing_client = get_ticketing_client()
 
         # STEP 1: Check if identifiers exist and search old system
         existing_ticket_in_old_system = None
@@ -1337,12 +1427,15 @@ async def reprocess_ticket(
                     supplier_language = supplier.language_code
 
         # Re-run AI analysis
-        ai_engine = AIEngine()
+        set_request_priority('low')
+        ai_engine = get_ai_engine()
 
-        analysis = ai_engine.analyze_email(
+        analysis = await ai_engine.aanalyze_email(
             email_data=email_data,
             ticket_data=ticket_api_data,
-            supplier_language=supplier_language
+            supplier_language=supplier_language,
+            customer_language=ticket.customer_language,
+            bypass_cache=request.force_refresh
         )
 
         # Create new AI decision log
@@ -1351,10 +1444,13 @@ async def reprocess_ticket(
             detected_language=analysis.get('language'),
             detected_intent=analysis.get('intent'),
             confidence_score=analysis.get('confidence'),
+            tier=analysis.get('tier'),
             recommended_action=analysis.get('summary'),
             response_generated=analysis.get('customer_response'),
             action_taken='reprocessed' if analysis.get('requires_escalation') else 'analyzed',
-            deployment_phase=settings.deployment_phase
+            deployment_phase=settings.deployment_phase,
+            **prompt_token_fields(analysis),
+            **call_telemetry_fields(analysis)
         )
         db.add(new_decision)
 
@@ -1444,6 +1540,243 @@ async def reprocess_ticket(
 class AnalyzeRequest(BaseModel):
     ignored_message_ids: List[int] = []
     preview_only: bool = False
+    force_refresh: bool = False  # If True, skip the AI response cache
+    cancel_on_escalation: bool = False  # Streaming only: stop once the model escalates
+
+
+def build_manual_analysis_input(ticket: TicketState, ignored_message_ids: List[int], db: Session) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Build email and ticket data for a manual (operator triggered) analysis
+
+    The stored messages of the ticket are labeled, filtered, de-duplicated and
+    combined into one conversation body.
+
+    Args:
+        ticket: Ticket to analyze
+        ignored_message_ids: processed_emails IDs to leave out
+        db: Database session
+
+    Returns:
+        Tuple of (email_data, ticket_data) for AIEngine.analyze_email()
+
+    Raises:
+        HTTPException: If the ticket is unknown to the API or no messages remain
+    """
+    # Get messages from database with source/target info
+    from sqlalchemy import text
+
+    # First get ticketDetails from API to determine message types
+    ticketing_client = get_ticketing_client()
+    ticket_data_api = ticketing_client.get_ticket_by_ticket_number(ticket.ticket_number)
+
+    if not ticket_data_api:
+        raise HTTPException(status_code=404, detail="Ticket not found in API")
+
+    ticket_details = ticket_data_api[0].get('ticketDetails', [])
+
+    # Build a map of message ID to type
+    message_types = {}
+    for detail in ticket_details:
+        detail_id = detail.get('id')
+        source = detail.get('sourceTicketSideTypeId')
+        target = detail.get('targetTicketSideTypeId')
+
+        # Determine message type: 1=System/Operator, 2=Customer, 3=Supplier
+        if source == 2 and target == 1:
+            msg_type = "customer_to_us"
+        elif source == 1 and target == 2:
+            msg_type = "us_to_customer"
+        elif source == 1 and target == 3:
+            msg_type = "us_to_supplier"
+        elif source == 3 and target == 1:
+            msg_type = "supplier_to_us"
+        elif source == 1 and target == 1:
+            msg_type = "internal_note"
+        else:
+            msg_type = "unknown"
+
+        message_types[detail_id] = msg_type
+
+    # Get messages from database
+    result = db.execute(text("""
+        SELECT id, message_body, from_address, processed_at
+        FROM processed_emails
+        WHERE ticket_id = :ticket_id
+        ORDER BY processed_at ASC
+    """), {"ticket_id": ticket.id}).fetchall()
+
+    # Helper function to strip HTML and normalize text
+    import html
+    from html.parser import HTMLParser
+
+    class MLStripper(HTMLParser):
+        def __init__(self):
+            super().__init__()
+            self.reset()
+            self.strict = False
+            self.convert_charrefs= True
+            self.text = []
+        def handle_data(self, d):
+            self.text.append(d)
+        def get_data(self):
+            return ''.join(self.text)
+
+    def strip_html_tags(html_text):
+        s = MLStripper()
+        s.feed(html_text)
+        return s.get_data()
+
+    def normalize_for_comparison(text):
+        """Normalize text for duplicate detection"""
+        if not text:
+            return ""
+        # Strip HTML
+        text = strip_html_tags(text)
+        # Decode HTML entities
+        text = html.unescape(text)
+        # Lowercase and remove extra whitespace
+        text = re.sub(r'\s+', ' ', text.lower()).strip()
+        # Remove common email artifacts
+        text = re.sub(r'http[s]?://\S+', '', text)  # URLs
+        text = re.sub(r'[-_]{10,}', '', text)  # Separator lines
+        return text
+
+    # Initialize text filter
+    text_filter = TextFilter(db)
+
+    # Build structured conversation, excluding ignored messages
+    conversation_parts = []
+    seen_content = set()  # To detect duplicates
+
+    for msg_id, body, from_addr, created_at in result:
+        if msg_id not in ignored_message_ids:
+            # Extract actual ID from gmail_message_id (format: imported_{ticket_number}_{id})
+            detail_id = None
+            db_msg = db.execute(text("SELECT gmail_message_id FROM processed_emails WHERE id = :id"),
+                               {"id": msg_id}).fetchone()
+            if db_msg:
+                parts = db_msg[0].split('_')
+                if len(parts) >= 3:
+                    try:
+                        detail_id = int(parts[-1])
+                    except:
+                        pass
+
+            msg_type = message_types.get(detail_id, "unknown")
+
+            # Apply text filtering to remove boilerplate FIRST
+            body_filtered = text_filter.filter_email_body(body or '')
+
+            # Then normalize for duplicate detection
+            body_normalized = normalize_for_comparison(body_filtered)
+
+            # Skip if empty after normalization
+            if not body_normalized or len(body_normalized) < 20:
+                continue
+
+            # Skip duplicates
+            if body_normalized in seen_content:
+                continue
+
+            # Check if this message contains a previous message (email threading)
+            is_duplicate = False
+            for prev_content in seen_content:
+                if len(prev_content) > 50 and prev_content in body_normalized:
+                    is_duplicate = True
+                    break
+
+            if is_duplicate:
+                continue
+
+            seen_content.add(body_normalized)
+
+            # Format message with clear label
+            if msg_type == "customer_to_us":
+                label = "MESSAGE FROM CUSTOMER"
+            elif msg_type == "us_to_customer":
+                label = "OUR RESPONSE TO CUSTOMER"
+            elif msg_type == "us_to_supplier":
+                label = "OUR MESSAGE TO SUPPLIER"
+            elif msg_type == "supplier_to_us":
+                label = "SUPPLIER'S RESPONSE"
+            elif msg_type == "internal_note":
+                label = "INTERNAL NOTE"
+            else:
+                label = "MESSAGE"
+
+            conversation_parts.append(f"[{label}] ({created_at})\n{body_normalized}")
+
+    if not conversation_parts:
+        raise HTTPException(status_code=400, detail="No messages to analyze (all messages ignored)")
+
+    # Build clean, structured conversation
+    combined_body = '\n\n' + '='*80 + '\n\n'.join(conversation_parts)
+
+    # Build email data for AI analysis
+    email_data = {
+        'subject': f'Ticket {ticket.ticket_number}',
+        'body': combined_body,
+        'from': ticket.customer_email
+    }
+
+    # Build ticket data
+    ticket_data_dict = {
+        'ticketNumber': ticket.ticket_number,
+        'customerName': ticket.customer_name,
+        'customerEmail': ticket.customer_email,
+        'orderNumber': ticket.order_number,
+        'trackingNumber': ticket.tracking_number,
+        'carrierName': ticket.carrier_name,
+        'supplierName': ticket.supplier_name,
+        'items': ticket.product_details
+    }
+
+    return email_data, ticket_data_dict
+
+
+def record_manual_analysis(ticket: TicketState, analysis: Dict[str, Any], db: Session, user_id: int) -> AIDecisionLog:
+    """
+    Log a manual analysis result and update the ticket status
+
+    Args:
+        ticket: Analyzed ticket
+        analysis: AIEngine analysis result
+        db: Database session
+        user_id: Operator who triggered the analysis
+
+    Returns:
+        The stored AIDecisionLog
+    """
+    new_decision = AIDecisionLog(
+        ticket_id=ticket.id,
+        detected_language=analysis.get('language'),
+        detected_intent=analysis.get('intent'),
+        confidence_score=analysis.get('confidence'),
+        tier=analysis.get('tier'),
+        recommended_action=analysis.get('summary'),
+        response_generated=analysis.get('customer_response'),
+        action_taken='manual_analysis',
+        deployment_phase=settings.deployment_phase,
+        **prompt_token_fields(analysis),
+        **call_telemetry_fields(analysis)
+    )
+    db.add(new_decision)
+
+    # Update status based on analysis result
+    if analysis.get('requires_escalation'):
+        update_ticket_status(ticket.ticket_number, 'ESCALATED', db)
+    else:
+        update_ticket_status(ticket.ticket_number, 'In Progress', db)
+
+    db.commit()
+
+    # Log the analysis action
+    log_ticket_analyzed(
+        db=db,
+        ticket_number=ticket.ticket_number,
+        user_id=user_id
+    )
+    return new_decision
 
 
 @app.post("/api/tickets/{ticket_number}/analyze")
@@ -1462,243 +1795,65 @@ async def analyze_ticket(
         raise HTTPException(status_code=404, detail="Ticket not found")
 
     try:
-        # Get messages from database with source/target info
-        from sqlalchemy import text
-
-        # First get ticketDetails from API to determine message types
-        from src.api.ticketing_client import TicketingAPIClient
-        ticketing_client = TicketingAPIClient()
-        ticket_data_api = ticketing_client.get_ticket_by_ticket_number(ticket_number)
-
-        if not ticket_data_api:
-            raise HTTPException(status_code=404, detail="Ticket not found in API")
-
-        ticket_details = ticket_data_api[0].get('ticketDetails', [])
-
-        # Build a map of message ID to type
-        message_types = {}
-        for detail in ticket_details:
-            detail_id = detail.get('id')
-            source = detail.get('sourceTicketSideTypeId')
-            target = detail.get('targetTicketSideTypeId')
-
-            # Determine message type: 1=System/Operator, 2=Customer, 3=Supplier
-            if source == 2 and target == 1:
-                msg_type = "customer_to_us"
-            elif source == 1 and target == 2:
-                msg_type = "us_to_customer"
-            elif source == 1 and target == 3:
-                msg_type = "us_to_supplier"
-            elif source == 3 and target == 1:
-                msg_type = "supplier_to_us"
-            elif source == 1 and target == 1:
-                msg_type = "internal_note"
-            else:
-                msg_type = "unknown"
-
-            message_types[detail_id] = msg_type
-
-        # Get messages from database
-        result = db.execute(text("""
-            SELECT id, message_body, from_address, processed_at
-            FROM processed_emails
-            WHERE ticket_id = :ticket_id
-            ORDER BY processed_at ASC
-        """), {"ticket_id": ticket.id}).fetchall()
-
-        # Helper function to strip HTML and normalize text
-        import html
-        from html.parser import HTMLParser
-
-        class MLStripper(HTMLParser):
-            def __init__(self):
-                super().__init__()
-                self.reset()
-                self.strict = False
-                self.convert_charrefs= True
-                self.text = []
-            def handle_data(self, d):
-                self.text.append(d)
-            def get_data(self):
-                return ''.join(self.text)
-
-        def strip_html_tags(html_text):
-            s = MLStripper()
-            s.feed(html_text)
-            return s.get_data()
-
-        def normalize_for_comparison(text):
-            """Normalize text for duplicate detection"""
-            if not text:
-                return ""
-            # Strip HTML
-            text = strip_html_tags(text)
-            # Decode HTML entities
-            text = html.unescape(text)
-            # Lowercase and remove extra whitespace
-            text = re.sub(r'\s+', ' ', text.lower()).strip()
-            # Remove common email artifacts
-            text = re.sub(r'http[s]?://\S+', '', text)  # URLs
-            text = re.sub(r'[-_]{10,}', '', text)  # Separator lines
-            return text
-
-        # Initialize text filter
-        text_filter = TextFilter(db)
-
-        # Build structured conversation, excluding ignored messages
-        conversation_parts = []
-        seen_content = set()  # To detect duplicates
-
-        for msg_id, body, from_addr, created_at in result:
-            if msg_id not in request.ignored_message_ids:
-                # Extract actual ID from gmail_message_id (format: imported_{ticket_number}_{id})
-                detail_id = None
-                db_msg = db.execute(text("SELECT gmail_message_id FROM processed_emails WHERE id = :id"),
-                                   {"id": msg_id}).fetchone()
-                if db_msg:
-                    parts = db_msg[0].split('_')
-                    if len(parts) >= 3:
-                        try:
-                            detail_id = int(parts[-1])
-                        except:
-                            pass
-
-                msg_type = message_types.get(detail_id, "unknown")
-
-                # Apply text filtering to remove boilerplate FIRST
-                body_filtered = text_filter.filter_email_body(body or '')
-
-                # Then normalize for duplicate detection
-                body_normalized = normalize_for_comparison(body_filtered)
-
-                # Skip if empty after normalization
-                if not body_normalized or len(body_normalized) < 20:
-                    continue
-
-                # Skip duplicates
-                if body_normalized in seen_content:
-                    continue
-
-                # Check if this message contains a previous message (email threading)
-                is_duplicate = False
-                for prev_content in seen_content:
-                    if len(prev_content) > 50 and prev_content in body_normalized:
-                        is_duplicate = True
-                        break
-
-                if is_duplicate:
-                    continue
-
-                seen_content.add(body_normalized)
-
-                # Format message with clear label
-                if msg_type == "customer_to_us":
-                    label = "MESSAGE FROM CUSTOMER"
-                elif msg_type == "us_to_customer":
-                    label = "OUR RESPONSE TO CUSTOMER"
-                elif msg_type == "us_to_supplier":
-                    label = "OUR MESSAGE TO SUPPLIER"
-                elif msg_type == "supplier_to_us":
-                    label = "SUPPLIER'S RESPONSE"
-                elif msg_type == "internal_note":
-                    label = "INTERNAL NOTE"
-                else:
-                    label = "MESSAGE"
-
-                conversation_parts.append(f"[{label}] ({created_at})\n{body_normalized}")
-
-        if not conversation_parts:
-            raise HTTPException(status_code=400, detail="No messages to analyze (all messages ignored)")
-
-        # Build clean, structured conversation
-        combined_body = '\n\n' + '='*80 + '\n\n'.join(conversation_parts)
+        email_data, ticket_data_dict = build_manual_analysis_input(ticket, request.ignored_message_ids, db)
 
-        # Build email data for AI analysis
-        email_data = {
-            'subject': f'Ticket {ticket.ticket_number}',
-            'body': combined_body,
-            'from': ticket.customer_email
-        }
-
-        # Build ticket data
-        ticket_data_dict = {
-            'ticketNumber': ticket.ticket_number,
-            'customerName': ticket.customer_name,
-            'customerEmail': ticket.customer_email,
-            'orderNumber': ticket.order_number,
-            'trackingNumber': ticket.tracking_number,
-            'carrierName': ticket.carrier_name,
-            'supplierName': ticket.supplier_name,
-            'items': ticket.product_details
-        }
-
-        # If preview_only, build and return the prompt without running analysis
+        # If preview_only, build and return the prompt the analysis would send
         if request.preview_only:
-            from src.ai.ai_engine import AIEngine
-            ai_engine = AIEngine()
-
-            # Detect language
-            combined_text = f"{email_data['subject']} {email_data['body']}"
-            language = ai_engine.language_detector.detect_language(combined_text)
-            language_name = ai_engine.language_detector.get_language_name(language)
-
-            # Build the prompt
-            prompt = ai_engine._build_analysis_prompt(
-                subject=email_data['subject'],
-                body=email_data['body'],
-                from_address=email_data['from'],
-                language=language_name,
-                ticket_data=ticket_data_dict,
-                ticket_history=None,
-                supplier_language=ticket.customer_language
+            from src.database.models import AIMessageExample
+            ai_engine = get_ai_engine()
+
+            # Same budgeted prompt, examples and live tracking as aanalyze_email (without triage)
+            prompt, _, language, prompt_stats = await asyncio.to_thread(
+                ai_engine._prepare_analysis,
+                email_data, ticket_data_dict, None, ticket.customer_language,
+                ai_engine._check_live_tracking, ticket.customer_language
             )
 
+            # Injected examples in prompt order
+            example_rows = {
+                ex.id: ex for ex in db.query(AIMessageExample).filter(
+                    AIMessageExample.id.in_(prompt_stats['examples'])
+                ).all()
+            } if prompt_stats['examples'] else {}
+            message_examples = [
+                {
+                    'id': ex.id,
+                    'language': ex.language,
+                    'recipient_type': ex.recipient_type,
+                    'scenario': ex.scenario,
+                    'example_type': ex.example_type,
+                    'message_text': ex.message_text,
+                }
+                for ex in (example_rows.get(example_id) for example_id in prompt_stats['examples'])
+                if ex is not None
+            ]
+
             return {
                 "preview": True,
-                "system_prompt": ai_engine.system_prompt or "No custom system prompt configured",
+                "system_prompt": ai_engine._build_analysis_system_text(),
                 "user_prompt": prompt,
+                "language": language,
+                "prompt_stats": prompt_stats,
+                "message_examples": message_examples,
                 "email_data": email_data,
                 "ticket_data": ticket_data_dict
             }
 
         # Run AI analysis
-        from src.ai.ai_engine import AIEngine
-        ai_engine = AIEngine()
+        set_request_priority('low')
+        ai_engine = get_ai_engine()
 
-        analysis = ai_engine.analyze_email(
+        analysis = await ai_engine.aanalyze_email(
             email_data=email_data,
             ticket_data=ticket_data_dict,
             ticket_history=None,
-            supplier_language=ticket.customer_language
+            supplier_language=ticket.customer_language,
+            customer_language=ticket.customer_language,
+            bypass_cache=request.force_refresh
         )
 
-        # Log AI decision
-        new_decision = AIDecisionLog(
-            ticket_id=ticket.id,
-            detected_language=analysis.get('language'),
-            detected_intent=analysis.get('intent'),
-            confidence_score=analysis.get('confidence'),
-            recommended_action=analysis.get('summary'),
-            response_generated=analysis.get('customer_response'),
-            action_taken='manual_analysis',
-            deployment_phase=settings.deployment_phase
-        )
-        db.add(new_decision)
-
-        # Update status based on analysis result
-        if analysis.get('requires_escalation'):
-            update_ticket_status(ticket.ticket_number, 'ESCALATED', db)
-        else:
-            update_ticket_status(ticket.ticket_number, 'In Progress', db)
-
-        db.commit()
-
-        # Log the analysis action
-        log_ticket_analyzed(
-            db=db,
-            ticket_number=ticket_number,
-            user_id=current_user.id
-        )
+        # Log AI decision and update the ticket status
+        new_decision = record_manual_analysis(ticket, analysis, db, current_user.id)
 
         logger.info("Manual AI analysis completed", ticket_number=ticket_number, decision_id=new_decision.id)
 
@@ -1718,6 +1873,72 @@ async def analyze_ticket(
         raise HTTPException(status_code=500, detail=f"Failed to analyze ticket: {str(e)}")
 
 
+@app.post("/api/tickets/{ticket_number}/analyze/stream")
+async def analyze_ticket_stream(
+    ticket_number: str,
+    request: AnalyzeRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Run AI analysis on imported ticket, streaming results as NDJSON
+
+    Emits one JSON object per line: a 'meta' event, a 'field' event for each
+    top-level analysis field as soon as the model completes it (classification
+    first, drafts last), then a final 'analysis' event carrying decision_id
+    (or an 'error' event).
+    """
+    ticket = db.query(TicketState).filter(
+        TicketState.ticket_number == ticket_number
+    ).first()
+
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    try:
+        email_data, ticket_data_dict = build_manual_analysis_input(ticket, request.ignored_message_ids, db)
+    except Exception as e:
+        logger.error("Failed to prepare ticket analysis", ticket_number=ticket_number, error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to analyze ticket: {str(e)}")
+
+    import json
+    ai_engine = get_ai_engine()
+    supplier_language = ticket.customer_language
+    user_id = current_user.id
+
+    async def events():
+        set_request_priority('low')
+        try:
+            async for event in ai_engine.astream_analysis(
+                email_data=email_data,
+                ticket_data=ticket_data_dict,
+                ticket_history=None,
+                supplier_language=supplier_language,
+                customer_language=supplier_language,
+                bypass_cache=request.force_refresh,
+                cancel_on_escalation=request.cancel_on_escalation
+            ):
+                if event['event'] in ('analysis', 'error'):
+                    # The request session is closed once streaming starts; use a fresh one
+                    stream_db = SessionMaker()
+                    try:
+                        stream_ticket = stream_db.query(TicketState).filter(
+                            TicketState.ticket_number == ticket_number
+                        ).first()
+                        decision = record_manual_analysis(stream_ticket, event['analysis'], stream_db, user_id)
+                        event['decision_id'] = decision.id
+                    finally:
+                        stream_db.close()
+                    logger.info("Streamed AI analysis completed", ticket_number=ticket_number,
+                                decision_id=event['decision_id'])
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            logger.error("Failed to stream ticket analysis", ticket_number=ticket_number, error=str(e))
+            yield json.dumps({'event': 'error', 'error': str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.post("/api/tickets/{ticket_number}/refresh")
 async def refresh_ticket(
     ticket_number: str,
@@ -1734,8 +1955,7 @@ async def refresh_ticket(
 
     try:
         # Fetch fresh ticket data from API
-        from src.api.ticketing_client import TicketingAPIClient
-        ticketing_client = TicketingAPIClient()
+        ticketing_client = get_ticketing_client()
         ticket_data = ticketing_client.get_ticket_by_ticket_number(ticket_number)
 
         if not ticket_data or len(ticket_data) == 0:
@@ -2848,14 +3068,38 @@ async def delete_feedback(
 
 
 # Prompt improvement endpoints
+async def submit_prompt_batch(kind: str, prompt: str, temperature: float, context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Submit a prompt improvement call through the batch API instead of waiting for it
+
+    The result is read with GET /api/ai-batches/{batch_id}.
+    """
+    from src.ai.batch_client import BatchClient
+
+    # Off the event loop: submitting uploads the batch file to the provider
+    batch_ids = await asyncio.to_thread(
+        BatchClient(SessionMaker).submit,
+        f'prompt_improvement:{kind}',
+        [{'custom_id': kind, 'prompt': prompt, 'temperature': temperature, 'context': context}]
+    )
+    return {
+        "success": True,
+        "batch_id": batch_ids[0],
+        "message": "Submitted for batch processing; poll /api/ai-batches/{batch_id} for the result"
+    }
+
+
 @app.post("/api/prompt/analyze-feedback")
 async def analyze_feedback_for_prompt_improvement(
+    batch: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Use Claude to analyze unaddressed feedback and suggest prompt improvements
     Returns suggested improvements with explanations
+
+    With batch=true the analysis is submitted through the batch API and a batch_id is returned.
     """
     if current_user.role not in ['admin', 'operator']:
         raise HTTPException(status_code=403, detail="Operator or admin access required")
@@ -2876,21 +3120,9 @@ async def analyze_feedback_for_prompt_improvement(
             }
 
         # Load current system prompt
-        import os
-        from pathlib import Path
-
-        if hasattr(settings, 'prompt_path') and settings.prompt_path:
-            prompt_path = Path(settings.prompt_path)
-            if not prompt_path.is_absolute():
-                prompt_path = Path(os.getcwd()) / prompt_path
-        else:
-            prompt_path = Path(os.getcwd()) / "prompts" / "system_prompt.txt"
-
-        current_prompt = ""
-        if prompt_path.exists():
-            current_prompt = prompt_path.read_text(encoding='utf-8')
-        else:
-            raise HTTPException(status_code=404, detail="System prompt file not found")
+        current_prompt = await asyncio.to_thread(prompt_registry.text)
+        if not current_prompt:
+            raise HTTPException(status_code=404, detail="System prompt not found")
 
         # Prepare feedback summary for AI analysis
         feedback_summary = []
@@ -2907,8 +3139,6 @@ async def analyze_feedback_for_prompt_improvement(
             })
 
         # Use AI to analyze patterns and suggest improvements
-        ai_engine = AIEngine()
-
         analysis_prompt = f"""You are an AI prompt engineering expert. Analyze the following feedback on an AI support agent's performance and suggest improvements to the system prompt.
 
 CURRENT SYSTEM PROMPT:
@@ -2924,9 +3154,16 @@ Analyze the patterns in the feedback and provide:
 
 Focus on the most impactful improvements. Be specific and concrete."""
 
-        analysis_result = ai_engine.provider.generate_response(
+        if batch:
+            return await submit_prompt_batch('analyze-feedback', analysis_prompt, 0.3,
+                                             {'feedback_count': len(feedback_summary), 'user': current_user.username})
+
+        set_request_priority('low')
+        ai_engine = get_ai_engine()
+        analysis_result = await ai_engine.provider.agenerate_response(
             prompt=analysis_prompt,
-            temperature=0.3
+            temperature=0.3,
+            purpose='prompt_feedback'
         )
 
         logger.info(
@@ -2949,12 +3186,15 @@ Focus on the most impactful improvements. Be specific and concrete."""
 
 @app.post("/api/prompt/generate-improved")
 async def generate_improved_prompt(
+    batch: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Generate a complete improved prompt based on feedback analysis
     Uses Claude to rewrite the entire prompt incorporating feedback
+
+    With batch=true the rewrite is submitted through the batch API and a batch_id is returned.
     """
     if current_user.role not in ['admin', 'operator']:
         raise HTTPException(status_code=403, detail="Operator or admin access required")
@@ -2973,21 +3213,9 @@ async def generate_improved_prompt(
             }
 
         # Load current system prompt
-        import os
-        from pathlib import Path
-
-        if hasattr(settings, 'prompt_path') and settings.prompt_path:
-            prompt_path = Path(settings.prompt_path)
-            if not prompt_path.is_absolute():
-                prompt_path = Path(os.getcwd()) / prompt_path
-        else:
-            prompt_path = Path(os.getcwd()) / "prompts" / "system_prompt.txt"
-
-        current_prompt = ""
-        if prompt_path.exists():
-            current_prompt = prompt_path.read_text(encoding='utf-8')
-        else:
-            raise HTTPException(status_code=404, detail="System prompt file not found")
+        current_prompt = await asyncio.to_thread(prompt_registry.text)
+        if not current_prompt:
+            raise HTTPException(status_code=404, detail="System prompt not found")
 
         # Prepare feedback summary
         feedback_summary = []
@@ -3001,8 +3229,6 @@ async def generate_improved_prompt(
             })
 
         # Use AI to generate improved prompt
-        ai_engine = AIEngine()
-
         improvement_prompt = f"""You are an AI prompt engineering expert. Improve the following system prompt based on operator feedback about incorrect AI decisions.
 
 CURRENT SYSTEM PROMPT:
@@ -3019,9 +3245,16 @@ Rewrite the ENTIRE system prompt to address these issues. Key improvements to ma
 
 Return ONLY the improved system prompt text. Do not include any preamble or explanation."""
 
-        improved_prompt = ai_engine.provider.generate_response(
+        if batch:
+            return await submit_prompt_batch('generate-improved', improvement_prompt, 0.3,
+                                             {'feedback_count': len(feedback_summary), 'user': current_user.username})
+
+        set_request_priority('low')
+        ai_engine = get_ai_engine()
+        improved_prompt = await ai_engine.provider.agenerate_response(
             prompt=improvement_prompt,
-            temperature=0.3
+            temperature=0.3,
+            purpose='prompt_improvement'
         )
 
         logger.info(
@@ -3057,8 +3290,6 @@ async def approve_prompt_version(
 
     try:
         from src.database.models import PromptVersion
-        import os
-        from pathlib import Path
 
         # Get count of unaddressed feedback that will be addressed by this version
         unaddressed_count = db.query(func.count(AIDecisionLog.id)).filter(
@@ -3091,17 +3322,12 @@ async def approve_prompt_version(
         ).update({"addressed": True})
 
         # Save new prompt to file
-        if hasattr(settings, 'prompt_path') and settings.prompt_path:
-            prompt_path = Path(settings.prompt_path)
-            if not prompt_path.is_absolute():
-                prompt_path = Path(os.getcwd()) / prompt_path
-        else:
-            prompt_path = Path(os.getcwd()) / "prompts" / "system_prompt.txt"
-
+        prompt_path = prompt_file_path()
         prompt_path.parent.mkdir(parents=True, exist_ok=True)
         prompt_path.write_text(request.new_prompt, encoding='utf-8')
 
         db.commit()
+        prompt_registry.invalidate()
 
         logger.info(
             "New prompt version approved and deployed",
@@ -3123,28 +3349,374 @@ async def approve_prompt_version(
         raise HTTPException(status_code=500, detail=f"Failed to approve prompt: {str(e)}")
 
 
+# Bulk re-analysis endpoints
+_bulk_reanalysis_tasks: Dict[int, asyncio.Task] = {}
+
+
+def _start_bulk_reanalysis(job_id: int) -> None:
+    """Run a bulk re-analysis job in the background of this process"""
+    from src.ai.bulk_reanalysis import BulkReanalysisRunner
+
+    task = _bulk_reanalysis_tasks.get(job_id)
+    if task and not task.done():
+        raise HTTPException(status_code=409, detail="Job is already running")
+    _bulk_reanalysis_tasks[job_id] = asyncio.create_task(BulkReanalysisRunner(SessionMaker).run(job_id))
+
+
+@app.post("/api/bulk-reanalysis")
+async def create_bulk_reanalysis(
+    request: BulkReanalysisRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Re-analyze a selection of tickets offline (e.g. with a new prompt version)
+    Results are stored per job; no messages are created and tickets are not updated
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    from src.ai.bulk_reanalysis import create_job, select_tickets
+
+    filters = request.dict(exclude={'name', 'prompt_version_id', 'batch_mode', 'dry_run'}, exclude_none=True)
+    filters = {key: value.isoformat() if isinstance(value, datetime) else value
+               for key, value in filters.items() if value != []}
+
+    if request.dry_run:
+        return {"success": True, "dry_run": True, "tickets": len(select_tickets(db, filters))}
+
+    try:
+        job = create_job(db, filters, request.prompt_version_id, request.name, current_user.username,
+                         batch_mode=request.batch_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if job.total_tickets:
+        _start_bulk_reanalysis(job.id)
+    return {"success": True, "job_id": job.id, "tickets": job.total_tickets}
+
+
+@app.get("/api/bulk-reanalysis")
+async def list_bulk_reanalysis_jobs(
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recent bulk re-analysis jobs with their reports"""
+    from src.ai.bulk_reanalysis import job_report
+    from src.database.models import BulkReanalysisJob
+
+    jobs = db.query(BulkReanalysisJob).order_by(BulkReanalysisJob.created_at.desc()).limit(limit).all()
+    return [job_report(db, job.id) for job in jobs]
+
+
+@app.get("/api/bulk-reanalysis/{job_id}")
+async def get_bulk_reanalysis_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Progress, throughput, cost and outcome of a bulk re-analysis job"""
+    from src.ai.bulk_reanalysis import job_report
+
+    try:
+        return job_report(db, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/api/bulk-reanalysis/{job_id}/results")
+async def get_bulk_reanalysis_results(
+    job_id: int,
+    changed_only: bool = False,
+    failed_only: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Per-ticket results of a job next to each ticket's previous decision"""
+    from src.database.models import BulkReanalysisResult
+
+    query = db.query(BulkReanalysisResult, TicketState.ticket_number).join(
+        TicketState, TicketState.id == BulkReanalysisResult.ticket_id
+    ).filter(BulkReanalysisResult.job_id == job_id)
+    if changed_only:
+        query = query.filter(
+            BulkReanalysisResult.error_message.is_(None),
+            BulkReanalysisResult.detected_intent != BulkReanalysisResult.previous_intent
+        )
+    if failed_only:
+        query = query.filter(BulkReanalysisResult.error_message.isnot(None))
+
+    rows = query.order_by(BulkReanalysisResult.id).offset(offset).limit(limit).all()
+    return [
+        {
+            "ticket_number": ticket_number,
+            "intent": result.detected_intent,
+            "previous_intent": result.previous_intent,
+            "previous_feedback": result.previous_feedback,
+            "confidence": result.confidence_score,
+            "requires_escalation": result.requires_escalation,
+            "escalation_reason": result.escalation_reason,
+            "summary": result.summary,
+            "customer_response": result.customer_response,
+            "supplier_action": result.supplier_action,
+            "tier": result.tier,
+            "cost_usd": result.cost_usd,
+            "latency_ms": result.latency_ms,
+            "error": result.error_message,
+        }
+        for result, ticket_number in rows
+    ]
+
+
+@app.post("/api/bulk-reanalysis/{job_id}/cancel")
+async def cancel_bulk_reanalysis(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stop a pending or running job (it can be resumed later)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    from src.ai.bulk_reanalysis import cancel_job
+
+    if not cancel_job(db, job_id):
+        raise HTTPException(status_code=400, detail="Job is not pending or running")
+    return {"success": True, "job_id": job_id}
+
+
+@app.post("/api/bulk-reanalysis/{job_id}/resume")
+async def resume_bulk_reanalysis(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Resume an interrupted, cancelled or failed job (failed tickets are retried)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    from src.database.models import BulkReanalysisJob
+
+    job = db.get(BulkReanalysisJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == 'completed':
+        raise HTTPException(status_code=400, detail="Job is already completed")
+
+    _start_bulk_reanalysis(job_id)
+    return {"success": True, "job_id": job_id}
+
+
+# AI batch endpoints
+@app.get("/api/ai-batches")
+async def list_ai_batches(
+    limit: int = 50,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recent AI batches"""
+    from src.ai.batch_client import batch_summary
+    from src.database.models import AIBatch
+
+    batches = db.query(AIBatch).order_by(AIBatch.created_at.desc()).limit(limit).all()
+    return [batch_summary(batch) for batch in batches]
+
+
+@app.get("/api/ai-batches/{batch_id}")
+async def get_ai_batch(
+    batch_id: int,
+    include_results: bool = True,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status of an AI batch and, once it has ended, its results"""
+    from src.ai.batch_client import BatchClient, FINAL_STATES, batch_summary
+    from src.database.models import AIBatch
+
+    batch = db.get(AIBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    response = batch_summary(batch)
+    if include_results and batch.status in FINAL_STATES:
+        results = BatchClient(SessionMaker).results(batch_id)
+        response["results"] = {
+            custom_id: {key: result[key] for key in ('status', 'response', 'usage', 'error', 'context')}
+            for custom_id, result in results.items()
+        }
+    return response
+
+
+@app.post("/api/ai-batches/{batch_id}/poll")
+async def poll_ai_batch(
+    batch_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Poll an AI batch now instead of waiting for the background poller"""
+    from src.ai.batch_client import BatchClient
+
+    try:
+        status_value = await asyncio.to_thread(BatchClient(SessionMaker).poll, batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"batch_id": batch_id, "status": status_value}
+
+
+@app.post("/api/ai-batches/{batch_id}/cancel")
+async def cancel_ai_batch(
+    batch_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel a submitted AI batch (completed requests are still delivered)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    from src.ai.batch_client import BatchClient
+
+    if not await asyncio.to_thread(BatchClient(SessionMaker).cancel, batch_id):
+        raise HTTPException(status_code=400, detail="Batch is not running")
+    return {"success": True, "batch_id": batch_id}
+
+
+# AI call telemetry endpoints
+@app.get("/api/ai-telemetry/summary")
+async def get_ai_telemetry_summary(
+    days: int = 7,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Aggregated AI call telemetry of the last N days
+
+    p50/p95 latency per model and purpose, tokens per intent, cost per day
+    and prompt/response cache hit rates.
+    """
+    if days < 1 or days > 365:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
+    return telemetry_summary(db, days)
+
+
+@app.get("/api/ai-decisions/{decision_id}/calls")
+async def get_ai_decision_calls(
+    decision_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """AI calls made for a decision (triage, analysis, repair) with latency, tokens and cost"""
+    from src.database.models import AICallTelemetry
+
+    decision = db.get(AIDecisionLog, decision_id)
+    if not decision:
+        raise HTTPException(status_code=404, detail="Decision not found")
+    calls = db.query(AICallTelemetry).filter(
+        AICallTelemetry.decision_id == decision_id
+    ).order_by(AICallTelemetry.created_at, AICallTelemetry.id).all()
+    return {
+        "decision_id": decision_id,
+        "prompt_version_id": decision.prompt_version_id,
+        "total_cost_usd": round(sum(call.cost_usd or 0.0 for call in calls), 6),
+        "calls": [{
+            "purpose": call.purpose,
+            "provider": call.provider,
+            "model": call.model,
+            "latency_ms": call.latency_ms,
+            "attempts": call.attempts,
+            "hedged": call.hedged,
+            "success": call.success,
+            "error_message": call.error_message,
+            "response_cached": call.response_cached,
+            "input_tokens": call.input_tokens,
+            "output_tokens": call.output_tokens,
+            "cached_input_tokens": call.cached_input_tokens,
+            "cost_usd": call.cost_usd,
+            "created_at": call.created_at.isoformat() if call.created_at else None,
+        } for call in calls]
+    }
+
+
+# Tracking alert endpoints (delivered/stuck parcels flagged by the tracking refresher)
+class TrackingAlertHandleRequest(BaseModel):
+    alert_ids: List[int]
+
+
+@app.get("/api/tracking-alerts")
+async def list_tracking_alerts(
+    kind: Optional[str] = None,
+    include_handled: bool = False,
+    limit: int = 200,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Parcels of open tickets that were delivered, returned or got stuck
+
+    Unhandled alerts are the batch to draft proactive customer messages for;
+    mark them handled once the messages are drafted.
+    """
+    if kind is not None and kind not in ('delivered', 'returned', 'stuck'):
+        raise HTTPException(status_code=400, detail="kind must be 'delivered', 'returned' or 'stuck'")
+    query = db.query(TrackingAlert).join(TicketState, TrackingAlert.ticket_id == TicketState.id)
+    if kind is not None:
+        query = query.filter(TrackingAlert.kind == kind)
+    if not include_handled:
+        query = query.filter(TrackingAlert.handled_at.is_(None))
+    alerts = query.order_by(TrackingAlert.detected_at.desc()).limit(min(max(limit, 1), 1000)).all()
+    return [{
+        "id": alert.id,
+        "kind": alert.kind,
+        "ticket_number": alert.ticket.ticket_number,
+        "customer_name": alert.ticket.customer_name,
+        "customer_language": alert.ticket.customer_language,
+        "tracking_number": alert.tracking_number,
+        "carrier": alert.carrier,
+        "status": alert.status,
+        "status_changed_at": alert.status_changed_at.isoformat() if alert.status_changed_at else None,
+        "detected_at": alert.detected_at.isoformat() if alert.detected_at else None,
+        "handled_at": alert.handled_at.isoformat() if alert.handled_at else None,
+        "handled_by": alert.handled_by,
+    } for alert in alerts]
+
+
+@app.post("/api/tracking-alerts/handle")
+async def handle_tracking_alerts(
+    request: TrackingAlertHandleRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Mark alerts handled (messages drafted or nothing to do)"""
+    alerts = db.query(TrackingAlert).filter(
+        TrackingAlert.id.in_(request.alert_ids),
+        TrackingAlert.handled_at.is_(None)
+    ).all()
+    now = datetime.utcnow()
+    for alert in alerts:
+        alert.handled_at = now
+        alert.handled_by = current_user.username
+    db.commit()
+    return {"success": True, "handled": len(alerts)}
+
+
+@app.post("/api/tracking-alerts/refresh")
+async def refresh_tracking(
+    current_user: User = Depends(get_current_user)
+):
+    """Refresh tracking of open tickets now instead of waiting for the next scheduled run"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return await asyncio.to_thread(tracking_refresher.run_once)
+
+
 # Settings endpoints
 @app.get("/api/settings")
 async def get_settings(current_user: User = Depends(get_current_user)):
     """Get current system settings"""
-    import os
-    from pathlib import Path
-
     # Load system prompt if it exists
     system_prompt = None
     try:
-        # Try to load from prompt_path setting
-        if hasattr(settings, 'prompt_path') and settings.prompt_path:
-            prompt_path = Path(settings.prompt_path)
-            # If it's not absolute, make it relative to current directory
-            if not prompt_path.is_absolute():
-                prompt_path = Path(os.getcwd()) / prompt_path
-        else:
-            # Fallback to default location
-            prompt_path = Path(os.getcwd()) / "prompts" / "system_prompt.txt"
-
-        if prompt_path.exists():
-            system_prompt = prompt_path.read_text(encoding='utf-8')
+        system_prompt = await asyncio.to_thread(prompt_registry.text)
     except Exception as e:
         logger.warning("Could not load system prompt", error=str(e))
 
@@ -3246,15 +3818,10 @@ async def update_settings(
 
         # Handle system prompt separately
         if updates.system_prompt is not None:
-            if hasattr(settings, 'prompt_path') and settings.prompt_path:
-                prompt_path = Path(settings.prompt_path)
-                if not prompt_path.is_absolute():
-                    prompt_path = Path(os.getcwd()) / prompt_path
-            else:
-                prompt_path = Path(os.getcwd()) / "prompts" / "system_prompt.txt"
-
+            prompt_path = prompt_file_path()
             prompt_path.parent.mkdir(parents=True, exist_ok=True)
             prompt_path.write_text(updates.system_prompt, encoding='utf-8')
+            prompt_registry.invalidate()
             changes_made.append('system_prompt updated')
 
         logger.info(
@@ -4029,7 +4596,7 @@ async def approve_pending_message(
         raise HTTPException(status_code=404, detail="Message not found")
 
     # Initialize services
-    ticketing_client = TicketingAPIClient()
+    ticketing_client = get_ticketing_client()
     message_service = MessageService(db, ticketing_client)
 
     if approval.action == "approve":
@@ -4081,7 +4648,7 @@ async def retry_pending_message(
     db: Session = Depends(get_db)
 ):
     """Retry a failed message"""
-    ticketing_client = TicketingAPIClient()
+    ticketing_client = get_ticketing_client()
     message_service = MessageService(db, ticketing_client)
 
     success = message_service.retry_failed_message(message_id)
@@ -4109,6 +4676,93 @@ async def get_scheduler_status(
         }
 
 
+@app.get("/api/system/rate-limits")
+async def get_rate_limits(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get current rate limit budgets and adaptive limits per external dependency"""
+    return {
+        "enabled": settings.rate_limit_enabled,
+        "low_priority_reserve": settings.rate_limit_low_priority_reserve,
+        "dependencies": get_rate_limit_status(db)
+    }
+
+
+@app.get("/api/system/email-queue")
+async def get_email_queue_metrics(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the last published email priority queue metrics (SLA remaining, breaches, top emails)"""
+    status = read_status(db, 'email_queue')
+    if not status:
+        return {"queued": 0, "published_at": None}
+    return status
+
+
+@app.get("/api/system/circuit-breakers")
+async def get_circuit_breakers(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get circuit breaker state
+
+    'published' holds the last state transition reported by each process
+    (typically the email poller); 'web_api' is this process's live view.
+    """
+    return {
+        "enabled": settings.circuit_breaker_enabled,
+        "published": list(read_statuses(db, 'circuit_breaker:').values()),
+        "web_api": get_breaker_snapshots()
+    }
+
+
+@app.get("/api/system/ai-cascade")
+async def get_ai_cascade_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get per-tier stats of the AI model cascade (calls, latency, cost, escalations)
+
+    'published' holds the periodic snapshots of each process (keyed by pid);
+    'web_api' is this process's live view.
+    """
+    from src.ai.triage import cascade_stats
+    return {
+        "enabled": settings.ai_triage_enabled,
+        "triage_model": f"{settings.ai_triage_provider}:{settings.ai_triage_model}",
+        "full_model": f"{settings.ai_provider}:{settings.ai_model}",
+        "confidence_threshold": settings.ai_triage_confidence_threshold,
+        "published": list(read_statuses(db, 'ai_cascade:').values()),
+        "web_api": cascade_stats.snapshot()
+    }
+
+
+@app.get("/api/system/ai-providers")
+async def get_ai_provider_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get per-provider latency/error/hedge stats of the AI provider router
+
+    'published' holds the periodic snapshots of each process (keyed by pid);
+    'web_api' is this process's live view.
+    """
+    from src.ai.provider_router import get_router_stats, parse_fallback_providers
+    return {
+        "primary": f"{settings.ai_provider}:{settings.ai_model}",
+        "fallbacks": [f"{provider}:{model}" for provider, model in parse_fallback_providers(settings.ai_fallback_providers)],
+        "hedging_enabled": settings.ai_hedging_enabled,
+        "hedge_latency_percentile": settings.ai_hedge_latency_percentile,
+        "published": list(read_statuses(db, 'ai_router:').values()),
+        "web_api": get_router_stats()
+    }
+
+
 # ============================================================================
 # System Settings Endpoints
 # ============================================================================
@@ -4225,6 +4879,7 @@ async def create_ai_example(
     db.add(new_example)
     db.commit()
     db.refresh(new_example)
+    example_index.invalidate()
 
     logger.info(f"AI example created by {current_user.username}", example_id=new_example.id)
 
@@ -4278,6 +4933,7 @@ async def update_ai_example(
 
     db.commit()
     db.refresh(example)
+    example_index.invalidate()
 
     logger.info(f"AI example updated by {current_user.username}", example_id=example.id)
 
@@ -4312,6 +4968,7 @@ async def delete_ai_example(
 
     db.delete(example)
     db.commit()
+    example_index.invalidate()
 
     logger.info(f"AI example deleted by {current_user.username}", example_id=example_id)
 
@@ -4382,6 +5039,7 @@ async def create_blocked_phrase(
     db.add(new_phrase)
     db.commit()
     db.refresh(new_phrase)
+    phrase_guard.invalidate()
 
     logger.info(f"Blocked phrase created by {current_user.username}", phrase_id=new_phrase.id)
 
@@ -4400,6 +5058,16 @@ async def create_blocked_phrase(
     )
 
 
+@app.post("/api/blocked-phrases/scan")
+async def scan_blocked_phrases(
+    request: BlockedPhraseScanRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Check a text against the enabled blocked phrases (hits with position and suggested alternative)"""
+    hits = await asyncio.to_thread(phrase_guard.scan, request.text, request.language)
+    return {"blocked": bool(hits), "hits": hits}
+
+
 @app.put("/api/blocked-phrases/{phrase_id}", response_model=BlockedPromisePhraseInfo)
 async def update_blocked_phrase(
     phrase_id: int,
@@ -4432,6 +5100,7 @@ async def update_blocked_phrase(
 
     db.commit()
     db.refresh(phrase)
+    phrase_guard.invalidate()
 
     logger.info(f"Blocked phrase updated by {current_user.username}", phrase_id=phrase.id)
 
@@ -4465,6 +5134,7 @@ async def delete_blocked_phrase(
 
     db.delete(phrase)
     db.commit()
+    phrase_guard.invalidate()
 
     logger.info(f"Blocked phrase deleted by {current_user.username}", phrase_id=phrase_id)
 
@@ -6,7 +6,7 @@ from datetime import datetime
 from typing import Optional
 from sqlalchemy import (
     Column, Integer, String, Text, DateTime, Boolean, Float,
-    ForeignKey, JSON, create_engine
+    ForeignKey, JSON, LargeBinary, UniqueConstraint, create_engine
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
@@ -207,6 +207,7 @@ class AIDecisionLog(Base):
     detected_language = Column(String(10))
     detected_intent = Column(String(100))  # e.g., 'tracking_inquiry', 'return_request'
     confidence_score = Column(Float)  # 0.0 to 1.0
+    tier = Column(String(20))  # 'local', 'triage' or 'full' (None for decisions logged before tiers were stored)
 
     # Decision
     recommended_action = Column(String(50))  # e.g., 'reply_to_customer', 'contact_supplier'
@@ -216,6 +217,11 @@ class AIDecisionLog(Base):
     # Phase tracking
     deployment_phase = Column(Integer)  # 1, 2, or 3
 
+    # Prompt size (token counts after budget truncation)
+    prompt_tokens = Column(Integer, nullable=True)
+    prompt_token_stats = Column(JSON, nullable=True)  # {sections: {...}, requested: {...}, truncated: [...]}
+    prompt_truncated = Column(Boolean, default=False)
+
     # Human feedback (for Phase 1 learning)
     feedback = Column(String(20))  # 'correct', 'incorrect', 'partially_correct'
     feedback_notes = Column(Text)
@@ -230,6 +236,7 @@ class AIDecisionLog(Base):
 
     # Relationship
     ticket = relationship('TicketState', backref='ai_decisions')
+    ai_calls = relationship('AICallTelemetry', backref='decision')
 
     def __repr__(self):
         return f"<AIDecisionLog(id={self.id}, intent={self.detected_intent}, confidence={self.confidence_score})>"
@@ -571,6 +578,329 @@ class BlockedPromisePhrase(Base):
 
 
 # Database initialization
+class RateLimitBucket(Base):
+    """
+    Shared token bucket per external dependency (gmail, ticketing, AI providers)
+    Lives in the database so the poller and web API processes draw from the same budget
+    """
+    __tablename__ = 'rate_limit_buckets'
+
+    name = Column(String(100), primary_key=True)  # 'gmail', 'ticketing', 'ai_openai', ...
+    tokens = Column(Float, nullable=False)
+    capacity = Column(Float, nullable=False)
+    rate = Column(Float, nullable=False)  # Current (adaptive) refill rate in tokens per second
+    base_rate = Column(Float, nullable=False)  # Configured rate; adaptive rate never exceeds it
+    last_refill = Column(Float, nullable=False)  # Epoch seconds
+
+    # Observed health (updated by whichever process reports last)
+    latency_ewma_ms = Column(Float)
+    error_rate = Column(Float)
+    throttled_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RateLimitBucket(name={self.name}, rate={self.rate}, tokens={self.tokens})>"
+
+
+class AIResponseCacheEntry(Base):
+    """
+    Cached raw AI analysis response keyed by prompt fingerprint
+    Lets repeated analyses of unchanged input skip the provider call
+    """
+    __tablename__ = 'ai_response_cache'
+
+    key = Column(String(64), primary_key=True)  # sha256 of model, system text, prompt, images
+    model_id = Column(String(150), nullable=False)  # e.g. 'openai:gpt-4o'
+    response = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<AIResponseCacheEntry(key={self.key[:12]}, model={self.model_id}, hits={self.hit_count})>"
+
+
+class AICallTelemetry(Base):
+    """
+    One AI provider call (after hedging and failover) with its latency, tokens and cost
+    Calls made for an analysis are linked to the AIDecisionLog that stored it
+    """
+    __tablename__ = 'ai_call_telemetry'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    decision_id = Column(Integer, ForeignKey('ai_decision_logs.id'), nullable=True, index=True)
+    prompt_version_id = Column(Integer, ForeignKey('prompt_versions.id'), nullable=True, index=True)  # Analysis calls only
+    purpose = Column(String(30), nullable=False, index=True)  # 'analysis', 'repair', 'triage', 'summary', ...
+    intent = Column(String(100), index=True)  # Intent of the analysis the call belongs to
+
+    provider = Column(String(50))
+    model = Column(String(100), index=True)
+    latency_ms = Column(Float)
+    attempts = Column(Integer, default=1)  # Provider requests incl. hedges and failovers (retries = attempts - 1)
+    hedged = Column(Boolean, default=False)
+    success = Column(Boolean, default=True, nullable=False)
+    error_message = Column(Text)
+    response_cached = Column(Boolean, default=False)  # Served from the AI response cache (no provider request)
+
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cached_input_tokens = Column(Integer, default=0)  # Provider prefix cache hits
+    cache_write_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<AICallTelemetry(id={self.id}, purpose={self.purpose}, model={self.model}, latency_ms={self.latency_ms})>"
+
+
+class IntentClassifierVersion(Base):
+    """
+    Trained local intent classifier (hashed n-gram linear model)
+    Trained offline from AIDecisionLog history; the active version pre-classifies emails
+    """
+    __tablename__ = 'intent_classifier_versions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    version_number = Column(Integer, nullable=False, unique=True, index=True)
+    model_data = Column(LargeBinary, nullable=False)  # Serialized weights (npz)
+    labels = Column(JSON, nullable=False)  # Intent per output column
+    num_features = Column(Integer, nullable=False)  # Hashing space size
+
+    # Training data
+    trained_on = Column(Integer, nullable=False)  # Decisions used for training
+    holdout_size = Column(Integer, nullable=False)  # Held-out decisions with 'correct' feedback
+
+    # Accuracy against held-out feedback
+    holdout_accuracy = Column(Float)
+    metrics = Column(JSON)  # {per_intent: {...}, coverage_at_threshold, ...}
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    created_by = Column(String(100))
+    is_active = Column(Boolean, default=False, index=True)  # Currently used by AIEngine
+
+    def __repr__(self):
+        return f"<IntentClassifierVersion(version={self.version_number}, accuracy={self.holdout_accuracy}, active={self.is_active})>"
+
+
+class TicketDataSnapshot(Base):
+    """
+    Ticket data fetched from the ticketing API
+    Reused by bulk re-analysis jobs so repeated runs over the same tickets skip the API
+    """
+    __tablename__ = 'ticket_data_snapshots'
+
+    ticket_number = Column(String(50), primary_key=True)
+    data = Column(JSON, nullable=False)  # get_ticket_by_ticket_number()[0]
+    fetched_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<TicketDataSnapshot(ticket_number={self.ticket_number}, fetched_at={self.fetched_at})>"
+
+
+class TicketConversationSummary(Base):
+    """
+    Rolling AI summary of a ticket conversation
+    Covers every ticketDetail up to and including the watermark; later
+    messages are sent to the model verbatim
+    """
+    __tablename__ = 'ticket_conversation_summaries'
+
+    ticket_number = Column(String(50), primary_key=True)
+    summary = Column(JSON, nullable=False)  # {customer, supplier, internal, open_items}
+    watermark_detail_key = Column(String(100), nullable=False)  # Last summarized ticketDetail (ID or creation time)
+    watermark_timestamp = Column(String(20))  # Its timestamp ('YYYY-MM-DD HH:MM')
+    summarized_entries = Column(Integer, default=0, nullable=False)
+    model = Column(String(100))
+    input_tokens = Column(Integer, default=0, nullable=False)  # Summed over all summarization calls
+    output_tokens = Column(Integer, default=0, nullable=False)
+    cost_usd = Column(Float, default=0.0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<TicketConversationSummary(ticket_number={self.ticket_number}, watermark={self.watermark_detail_key})>"
+
+
+class TrackingStatus(Base):
+    """
+    Last carrier tracking status of a parcel
+    Shared cache of live tracking lookups (see utils/tracking_cache.py)
+    """
+    __tablename__ = 'tracking_statuses'
+
+    tracking_number = Column(String(100), primary_key=True)
+    carrier = Column(String(100))
+    tracking_url = Column(String(500))
+    status = Column(String(50), index=True)  # Status code of the last successful lookup
+    result = Column(JSON)  # TrackingChecker result of the last lookup
+    error_message = Column(Text)  # Set when the last lookup failed
+    checked_at = Column(DateTime, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    status_changed_at = Column(DateTime)  # When the status last changed
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<TrackingStatus(tracking_number={self.tracking_number}, status={self.status}, checked_at={self.checked_at})>"
+
+
+class TrackingAlert(Base):
+    """
+    Parcel of an open ticket flagged by the background tracking refresher
+    Open alerts (handled_at empty) are the work list for proactive customer messages
+    """
+    __tablename__ = 'tracking_alerts'
+    __table_args__ = (UniqueConstraint('ticket_id', 'tracking_number', 'kind', name='uq_tracking_alert_parcel_kind'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ticket_id = Column(Integer, ForeignKey('ticket_states.id'), nullable=False, index=True)
+    tracking_number = Column(String(100), nullable=False, index=True)
+    kind = Column(String(20), nullable=False, index=True)  # 'delivered', 'returned' or 'stuck'
+    carrier = Column(String(100))
+    status = Column(String(50))  # Tracking status when flagged
+    status_changed_at = Column(DateTime)  # Since when the parcel has this status
+    detected_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    handled_at = Column(DateTime, index=True)  # Set once a message was drafted or the alert dismissed
+    handled_by = Column(String(100))
+
+    ticket = relationship('TicketState', backref='tracking_alerts')
+
+    def __repr__(self):
+        return f"<TrackingAlert(ticket_id={self.ticket_id}, tracking_number={self.tracking_number}, kind={self.kind})>"
+
+
+class BulkReanalysisJob(Base):
+    """
+    Offline re-analysis of a set of tickets with a given prompt version
+    Results are stored per ticket (BulkReanalysisResult); no messages are created
+    """
+    __tablename__ = 'bulk_reanalysis_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255))
+    prompt_version_id = Column(Integer, ForeignKey('prompt_versions.id'), nullable=True, index=True)  # None = current prompt
+    filters = Column(JSON)  # Selection filters (statuses, created_from/to, intents, feedback, ...)
+    ticket_ids = Column(JSON, nullable=False)  # Selected ticket_states IDs, frozen at creation so resumes see the same set
+    total_tickets = Column(Integer, nullable=False, default=0)
+    batch_mode = Column(Boolean, default=False)  # Submit through the provider batch API instead of live calls
+
+    # 'pending', 'running', 'completed', 'cancelled', 'failed'
+    status = Column(String(20), nullable=False, default='pending', index=True)
+    error_message = Column(Text)
+
+    created_by = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    started_at = Column(DateTime)  # Start of the latest run (resumes reset it)
+    finished_at = Column(DateTime)
+
+    prompt_version = relationship('PromptVersion')
+
+    def __repr__(self):
+        return f"<BulkReanalysisJob(id={self.id}, status={self.status}, total={self.total_tickets})>"
+
+
+class BulkReanalysisResult(Base):
+    """
+    Analysis of one ticket by a bulk re-analysis job
+    Stored next to the ticket's previous decision so prompt versions can be compared
+    """
+    __tablename__ = 'bulk_reanalysis_results'
+    __table_args__ = (UniqueConstraint('job_id', 'ticket_id', name='uq_bulk_result_job_ticket'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey('bulk_reanalysis_jobs.id'), nullable=False, index=True)
+    ticket_id = Column(Integer, ForeignKey('ticket_states.id'), nullable=False, index=True)
+    prompt_version_id = Column(Integer, ForeignKey('prompt_versions.id'), nullable=True, index=True)
+
+    # New analysis
+    detected_language = Column(String(10))
+    detected_intent = Column(String(100))
+    confidence_score = Column(Float)
+    requires_escalation = Column(Boolean)
+    escalation_reason = Column(Text)
+    summary = Column(Text)
+    customer_response = Column(Text)
+    supplier_action = Column(JSON)
+    tier = Column(String(20))  # 'local', 'triage' or 'full'
+
+    # Previous decision of the ticket (for comparison)
+    previous_decision_id = Column(Integer, ForeignKey('ai_decision_logs.id'), nullable=True)
+    previous_intent = Column(String(100))
+    previous_feedback = Column(String(20))
+
+    # Call cost
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cached_input_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+    latency_ms = Column(Float)
+    cached = Column(Boolean, default=False)  # Served from the AI response cache
+
+    error_message = Column(Text)  # Set when the ticket couldn't be analyzed (retried on resume)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    job = relationship('BulkReanalysisJob', backref='results')
+
+    def __repr__(self):
+        return f"<BulkReanalysisResult(job={self.job_id}, ticket={self.ticket_id}, intent={self.detected_intent})>"
+
+
+class AIBatch(Base):
+    """
+    AI requests submitted together to a provider batch API (or the local stand-in)
+    Results are fanned back to the owner (e.g. 'bulk_reanalysis:12') once the batch ends
+    """
+    __tablename__ = 'ai_batches'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    owner = Column(String(100), nullable=False, index=True)  # '<kind>:<reference>'
+    backend = Column(String(20), nullable=False)  # 'openai', 'anthropic' or 'local'
+    model = Column(String(100), nullable=False)
+    external_id = Column(String(255), index=True)  # Provider batch ID
+
+    # 'submitted', 'collecting', 'completed', 'failed', 'expired', 'cancelled'
+    status = Column(String(20), nullable=False, default='submitted', index=True)
+    request_count = Column(Integer, nullable=False, default=0)
+    succeeded_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    error_message = Column(Text)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_polled_at = Column(DateTime)
+    claimed_at = Column(DateTime)  # When a poller started collecting the results (status 'collecting')
+    completed_at = Column(DateTime)
+    delivered_at = Column(DateTime, index=True)  # Results handed to the owner
+
+    requests = relationship('AIBatchRequest', backref='batch', lazy='dynamic')
+
+    def __repr__(self):
+        return f"<AIBatch(id={self.id}, owner={self.owner}, backend={self.backend}, status={self.status})>"
+
+
+class AIBatchRequest(Base):
+    """
+    One request of an AIBatch with its result
+    """
+    __tablename__ = 'ai_batch_requests'
+    __table_args__ = (UniqueConstraint('batch_id', 'custom_id', name='uq_batch_request_custom_id'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    batch_id = Column(Integer, ForeignKey('ai_batches.id'), nullable=False, index=True)
+    custom_id = Column(String(64), nullable=False)  # Owner's key for the request
+    request = Column(JSON, nullable=False)  # prompt, system_text, temperature, images, response_schema
+    context = Column(JSON)  # Owner data returned with the result
+
+    # 'pending', 'succeeded', 'failed'
+    status = Column(String(20), nullable=False, default='pending')
+    response = Column(Text)
+    usage = Column(JSON)
+    error_message = Column(Text)
+
+    def __repr__(self):
+        return f"<AIBatchRequest(batch={self.batch_id}, custom_id={self.custom_id}, status={self.status})>"
+
+
 def init_database(database_url: Optional[str] = None) -> sessionmaker:
     """
     Initialize database and create tables
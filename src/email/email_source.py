@@ -0,0 +1,621 @@
+"""
+Email Sources
+Common interface for everything that feeds emails into the orchestrator
+
+Implementations:
+- GmailMonitor (src/email/gmail_monitor.py): live Gmail inbox
+- LocalMailSource: Maildir, mbox, single .eml file or a directory of .eml files
+- InMemoryEmailSource: pre-built email dicts (tests, benchmarks, load generation)
+
+All sources return the same email_data dict shape:
+    id, thread_id, message_id_header, subject, from, to, date, body, snippet,
+    label_ids, attachments (file paths), attachment_texts ([{'filename', 'text'}])
+"""
+import os
+import re
+import hashlib
+import mailbox
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+
+class EmailSource(ABC):
+    """Base class for email sources with shared identifier extraction helpers"""
+
+    @abstractmethod
+    def get_unprocessed_messages(self, max_results: Optional[int] = None, lookback_minutes: int = 10) -> List[Dict]:
+        """
+        Fetch the next batch of messages to process
+
+        Args:
+            max_results: Maximum number of messages to return
+            lookback_minutes: How many minutes back to search (sources may ignore this)
+
+        Returns:
+            List of email data dicts
+        """
+
+    @abstractmethod
+    def get_message(self, message_id: str) -> Optional[Dict]:
+        """
+        Fetch a single message by ID
+
+        Args:
+            message_id: Source-specific message ID
+
+        Returns:
+            Email data dict or None if not found
+        """
+
+    @abstractmethod
+    def mark_as_processed(self, message_id: str) -> bool:
+        """
+        Mark a message as processed in the source
+
+        Args:
+            message_id: Source-specific message ID
+
+        Returns:
+            True if successful, False otherwise
+        """
+
+    def _get_message_details(self, message_id: str) -> Optional[Dict]:
+        """Backwards compatible alias for get_message()"""
+        return self.get_message(message_id)
+
+    def _clean_html(self, html_content: str) -> str:
+        """
+        Clean HTML content by removing CSS, style tags, comments, and extracting text
+
+        Args:
+            html_content: Raw HTML string
+
+        Returns:
+            Clean plain text without HTML tags, CSS, or comments
+        """
+        try:
+            from bs4 import BeautifulSoup
+
+            # Parse HTML with BeautifulSoup
+            soup = BeautifulSoup(html_content, 'html.parser')
+
+            # Remove style tags and their contents
+            for style in soup.find_all('style'):
+                style.decompose()
+
+            # Remove script tags and their contents
+            for script in soup.find_all('script'):
+                script.decompose()
+
+            # Remove HTML comments
+            for comment in soup.find_all(string=lambda text: isinstance(text, str) and text.strip().startswith('<!--')):
+                comment.extract()
+
+            # Get text content
+            text = soup.get_text(separator='\n', strip=True)
+
+            # Clean up excessive whitespace while preserving paragraph breaks
+            lines = [line.strip() for line in text.split('\n')]
+            lines = [line for line in lines if line]  # Remove empty lines
+            clean_text = '\n'.join(lines)
+
+            logger.debug("HTML cleaned",
+                        original_length=len(html_content),
+                        cleaned_length=len(clean_text))
+
+            return clean_text
+
+        except Exception as e:
+            logger.error("Failed to clean HTML, falling back to regex", error=str(e))
+            # Fallback to simple regex if BeautifulSoup fails
+            return re.sub('<[^<]+?>', '', html_content)
+
+    def extract_order_number(self, text: str) -> Optional[str]:
+        """
+        Extract Amazon order number from email text
+
+        Amazon order numbers typically follow patterns like:
+        - 123-1234567-1234567 (standard format)
+        - Order #123-1234567-1234567
+        - Order ID: 123-1234567-1234567
+
+        Args:
+            text: Email subject or body text
+
+        Returns:
+            Order number if found, None otherwise
+        """
+        # Amazon order number pattern
+        patterns = [
+            r'\b(\d{3}-\d{7}-\d{7})\b',  # Standard format
+            r'Order\s*#?\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # With "Order" prefix
+            r'order\s+number\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # With "order number"
+            r'Bestellung\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # German
+            r'Commande\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # French
+        ]
+
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                order_number = match.group(1)
+                logger.debug("Extracted order number", order_number=order_number)
+                return order_number
+
+        return None
+
+    def extract_purchase_order_number(self, text: str) -> Optional[str]:
+        """
+        Extract purchase order number from email text.
+
+        Common pattern observed: 'D' followed by 9 digits (e.g., D425123006).
+        Also handle variants with prefixes like 'PO' or separators.
+
+        Args:
+            text: Email subject or body text
+
+        Returns:
+            Purchase order number if found, None otherwise
+        """
+        patterns = [
+            r"\b(D\d{9})\b",                 # Plain D#########
+            r"PO\s*[:#-]?\s*(D\d{9})",       # With 'PO' prefix
+        ]
+
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                po = match.group(1).upper()
+                logger.debug("Extracted purchase order", purchase_order=po)
+                return po
+
+        return None
+
+    def extract_ticket_number(self, text: str) -> Optional[str]:
+        """
+        Extract ticket number from email text.
+
+        Ticket numbers follow patterns like:
+        - DE12345678, FR12345678, ES12345678, etc.
+        - Ticket #DE12345678
+        - Ticket: DE12345678
+
+        Supports any 2-letter country code prefix.
+
+        Args:
+            text: Email subject or body text
+
+        Returns:
+            Ticket number if found, None otherwise
+        """
+        patterns = [
+            r'\b([A-Z]{2}\d{8})\b',                           # Plain XX########
+            r'Ticket\s*[:#-]?\s*([A-Z]{2}\d{8})',             # With 'Ticket' prefix
+            r'ticket\s+number\s*[:=]?\s*([A-Z]{2}\d{8})',     # With 'ticket number'
+            r'Ticketnummer\s*[:=]?\s*([A-Z]{2}\d{8})',        # German
+        ]
+
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                ticket_num = match.group(1).upper()
+                logger.debug("Extracted ticket number", ticket_number=ticket_num)
+                return ticket_num
+
+        return None
+
+    def extract_identifiers(self, subject: str, body: str) -> Dict[str, Optional[str]]:
+        """
+        Extract all identifiers from email with priority handling.
+
+        Priority: ticket_number > order_number > purchase_order_number
+
+        Args:
+            subject: Email subject
+            body: Email body
+
+        Returns:
+            Dictionary with 'ticket_number', 'order_number', 'purchase_order_number'
+        """
+        identifiers = {
+            'ticket_number': None,
+            'order_number': None,
+            'purchase_order_number': None
+        }
+
+        # Try ticket number (highest priority)
+        identifiers['ticket_number'] = self.extract_ticket_number(subject) or \
+                                       self.extract_ticket_number(body)
+
+        # Try Amazon order number
+        identifiers['order_number'] = self.extract_order_number(subject) or \
+                                     self.extract_order_number(body)
+
+        # Try purchase order number
+        identifiers['purchase_order_number'] = self.extract_purchase_order_number(subject) or \
+                                              self.extract_purchase_order_number(body)
+
+        return identifiers
+
+    def parse_sender_info(self, from_field: str) -> Tuple[str, str]:
+        """
+        Parse sender name and email from 'From' header
+
+        Args:
+            from_field: From header value (e.g., "John Doe <john@example.com>")
+
+        Returns:
+            Tuple of (name, email)
+        """
+        # Pattern: "Name" <email@domain.com> or just email@domain.com
+        match = re.match(r'^"?([^"<]+)"?\s*<([^>]+)>$', from_field)
+        if match:
+            name = match.group(1).strip()
+            email = match.group(2).strip()
+            return name, email
+
+        # Just an email address
+        match = re.match(r'^([^<>\s]+@[^<>\s]+)$', from_field)
+        if match:
+            email = match.group(1).strip()
+            return email, email
+
+        # Fallback
+        return from_field, from_field
+
+
+class InMemoryEmailSource(EmailSource):
+    """
+    Email source backed by a list of email data dicts
+
+    Useful for benchmarks and replaying generated load (see EmailLoadGenerator)
+    without touching Gmail or the filesystem.
+    """
+
+    def __init__(self, messages: Optional[Iterable[Dict]] = None):
+        self._messages: "OrderedDict[str, Dict]" = OrderedDict()
+        self._processed: set = set()
+        self._returned: set = set()
+        for message in messages or []:
+            self.add(message)
+
+    def add(self, email_data: Dict) -> None:
+        """Queue an email data dict"""
+        self._messages[email_data['id']] = email_data
+
+    def get_unprocessed_messages(self, max_results: Optional[int] = None, lookback_minutes: int = 10) -> List[Dict]:
+        """
+        Return the next queued messages (lookback is ignored)
+
+        Like LocalMailSource, each message is returned once; failed ones
+        continue through the orchestrator's retry queue (get_message).
+        """
+        limit = max_results or settings.gmail_max_results
+        pending = []
+        for message_id, email_data in self._messages.items():
+            if message_id in self._processed or message_id in self._returned:
+                continue
+            self._returned.add(message_id)
+            pending.append(email_data)
+            if len(pending) >= limit:
+                break
+        return pending
+
+    def queued_count(self) -> int:
+        """Messages not yet returned by get_unprocessed_messages()"""
+        return sum(1 for message_id in self._messages
+                   if message_id not in self._processed and message_id not in self._returned)
+
+    def is_processed(self, message_id: str) -> bool:
+        return message_id in self._processed
+
+    def get_message(self, message_id: str) -> Optional[Dict]:
+        return self._messages.get(message_id)
+
+    def mark_as_processed(self, message_id: str) -> bool:
+        if message_id == 'manual_import':
+            return True
+        self._processed.add(message_id)
+        return message_id in self._messages
+
+
+class LocalMailSource(EmailSource):
+    """
+    Email source reading exported mailboxes from disk
+
+    Supports a Maildir directory, an mbox file, a single .eml file or a
+    directory of .eml files. Messages are parsed lazily, attachments are
+    written to the attachments directory (organized by message ID, like
+    the Gmail source) and text-extractable attachments are converted with
+    the same TextExtractor used for Gmail.
+
+    Message IDs are stable hashes of the Message-ID header (or the file key),
+    so re-running a backfill skips messages already recorded in
+    ProcessedEmail/PendingEmailRetry and resumes where it stopped.
+
+    Args:
+        path: Path to the Maildir, mbox file, .eml file or .eml directory
+        attachments_dir: Where to store extracted attachments (defaults to settings.attachments_dir)
+    """
+
+    def __init__(self, path: str, attachments_dir: Optional[str] = None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Local mail source not found: {path}")
+
+        self.path = path
+        self.attachments_dir = attachments_dir or settings.attachments_dir
+        self.format = self._detect_format(path)
+        self._processed: set = set()
+        self._index: Optional["OrderedDict[str, Tuple[str, str]]"] = None
+        self._mailbox = None
+
+        logger.info("Local mail source initialized", path=path, format=self.format)
+
+    @staticmethod
+    def _detect_format(path: str) -> str:
+        """Detect the mailbox format from the path"""
+        if os.path.isdir(path):
+            if all(os.path.isdir(os.path.join(path, sub)) for sub in ('cur', 'new', 'tmp')):
+                return 'maildir'
+            return 'eml_dir'
+        if path.lower().endswith('.eml'):
+            return 'eml'
+        return 'mbox'
+
+    def _open_mailbox(self):
+        if self._mailbox is None:
+            if self.format == 'maildir':
+                self._mailbox = mailbox.Maildir(self.path, factory=None, create=False)
+            elif self.format == 'mbox':
+                self._mailbox = mailbox.mbox(self.path, factory=None, create=False)
+        return self._mailbox
+
+    def _build_index(self) -> "OrderedDict[str, Tuple[str, str]]":
+        """
+        Map stable message IDs to (kind, key) without parsing full bodies
+
+        Only headers are parsed here so indexing large exports stays fast.
+        """
+        if self._index is not None:
+            return self._index
+
+        index: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        header_parser = BytesParser(policy=policy.default)
+
+        if self.format in ('maildir', 'mbox'):
+            box = self._open_mailbox()
+            for key in box.iterkeys():
+                try:
+                    raw = box.get_bytes(key)
+                    headers = header_parser.parsebytes(raw, headersonly=True)
+                    index[self._stable_id(headers.get('Message-ID'), str(key))] = ('mailbox', key)
+                except Exception as e:
+                    logger.warning("Failed to index local message", key=str(key), error=str(e))
+        else:
+            files = [self.path] if self.format == 'eml' else sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.lower().endswith('.eml')
+            )
+            for file_path in files:
+                try:
+                    with open(file_path, 'rb') as f:
+                        headers = header_parser.parse(f, headersonly=True)
+                    index[self._stable_id(headers.get('Message-ID'), os.path.basename(file_path))] = ('file', file_path)
+                except Exception as e:
+                    logger.warning("Failed to index local message", file=file_path, error=str(e))
+
+        self._index = index
+        logger.info("Indexed local mail source", path=self.path, count=len(index))
+        return index
+
+    @staticmethod
+    def _stable_id(message_id_header: Optional[str], fallback_key: str) -> str:
+        """Derive a Gmail-like stable ID for a local message"""
+        basis = (message_id_header or '').strip() or fallback_key
+        return 'local_' + hashlib.sha1(basis.encode('utf-8', errors='ignore')).hexdigest()[:16]
+
+    def _read_bytes(self, kind: str, key: str) -> bytes:
+        if kind == 'mailbox':
+            return self._open_mailbox().get_bytes(key)
+        with open(key, 'rb') as f:
+            return f.read()
+
+    def get_unprocessed_messages(self, max_results: Optional[int] = None, lookback_minutes: int = 10) -> List[Dict]:
+        """
+        Return the next batch of messages not yet marked as processed
+
+        The lookback window is ignored: local sources are used for backfills,
+        where every message in the export should be processed.
+        """
+        limit = max_results or settings.gmail_max_results
+        if self._index is None:
+            # Resuming a backfill: skip what earlier runs already recorded
+            self._processed.update(self._recorded_ids(list(self._build_index())))
+        batch = []
+        for message_id in self._build_index():
+            if message_id in self._processed:
+                continue
+            # Each message is returned once: failed and parked messages continue
+            # through the orchestrator's retry queue (get_message), so they must
+            # not block the rest of the export
+            self._processed.add(message_id)
+            email_data = self.get_message(message_id)
+            if email_data:
+                batch.append(email_data)
+            if len(batch) >= limit:
+                break
+        return batch
+
+    @staticmethod
+    def _recorded_ids(message_ids: List[str]) -> set:
+        """IDs the orchestrator already processed, failed or queued for retry"""
+        from src.database.models import PendingEmailRetry, ProcessedEmail
+        from src.utils.runtime_status import get_session_maker
+
+        recorded: set = set()
+        db = get_session_maker()()
+        try:
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                for model in (ProcessedEmail, PendingEmailRetry):
+                    recorded.update(
+                        row[0] for row in db.query(model.gmail_message_id).filter(
+                            model.gmail_message_id.in_(chunk)
+                        )
+                    )
+        except Exception as e:
+            logger.warning("Failed to read processed local messages", error=str(e))
+        finally:
+            db.close()
+        return recorded
+
+    def get_message(self, message_id: str) -> Optional[Dict]:
+        """Parse a single message into the email data dict shape"""
+        location = self._build_index().get(message_id)
+        if not location:
+            return None
+
+        try:
+            raw = self._read_bytes(*location)
+            message = BytesParser(policy=policy.default).parsebytes(raw)
+            return self._to_email_data(message_id, message)
+        except Exception as e:
+            logger.error("Failed to parse local message", message_id=message_id, error=str(e))
+            return None
+
+    def mark_as_processed(self, message_id: str) -> bool:
+        """Remember the message as processed for the lifetime of this source"""
+        if message_id == 'manual_import':
+            logger.debug("Skipping local marking for manual import")
+            return True
+        self._processed.add(message_id)
+        return True
+
+    def _to_email_data(self, message_id: str, message: EmailMessage) -> Dict:
+        """Convert a parsed MIME message to the shared email data dict"""
+        date_str = message.get('Date')
+        try:
+            date = parsedate_to_datetime(date_str) if date_str else datetime.now()
+        except Exception:
+            date = datetime.now()
+
+        body = self._extract_body(message)
+        attachments, attachment_texts = self._extract_attachments(message_id, message)
+
+        message_id_header = message.get('Message-ID')
+        references = (message.get('References') or '').split()
+        thread_root = references[0] if references else (message.get('In-Reply-To') or message_id_header or message_id)
+
+        return {
+            'id': message_id,
+            'thread_id': self._stable_id(thread_root, message_id),
+            'message_id_header': message_id_header,
+            'subject': str(message.get('Subject') or '').strip(),
+            'from': str(message.get('From') or '').strip(),
+            'to': str(message.get('To') or '').strip(),
+            'date': date,
+            'body': body,
+            'snippet': ' '.join(body[:200].split()),
+            'label_ids': ['INBOX'],
+            'attachments': attachments,
+            'attachment_texts': attachment_texts
+        }
+
+    def _extract_body(self, message: EmailMessage) -> str:
+        """Prefer text/plain, fall back to cleaned text/html"""
+        part = message.get_body(preferencelist=('plain', 'html'))
+        if part is None:
+            return ''
+        try:
+            content = part.get_content()
+        except Exception:
+            payload = part.get_payload(decode=True) or b''
+            content = payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+        if part.get_content_subtype() == 'html':
+            content = self._clean_html(content)
+        return content.strip()
+
+    def _extract_attachments(self, message_id: str, message: EmailMessage) -> Tuple[List[str], List[Dict[str, str]]]:
+        """Write attachments to disk and extract text where possible"""
+        attachments: List[str] = []
+        attachment_texts: List[Dict[str, str]] = []
+
+        parts = list(message.iter_attachments())
+        if not parts:
+            return attachments, attachment_texts
+
+        folder = os.path.join(self.attachments_dir, message_id)
+        os.makedirs(folder, exist_ok=True)
+
+        seen_names = set()
+        for index, part in enumerate(parts):
+            data = part.get_payload(decode=True)
+            if not data:
+                continue
+            filename = os.path.basename(part.get_filename() or f"attachment_{index + 1}")
+            if filename in seen_names:
+                stem, ext = os.path.splitext(filename)
+                filename = f"{stem}_{index + 1}{ext}"
+            seen_names.add(filename)
+            file_path = os.path.join(folder, filename)
+            if not os.path.exists(file_path):
+                with open(file_path, 'wb') as f:
+                    f.write(data)
+            attachments.append(file_path)
+
+        try:
+            from src.email.attachment_handler import AttachmentHandler
+            from src.email.text_extractor import TextExtractor
+
+            attachment_handler = AttachmentHandler()
+            text_extractor = TextExtractor()
+
+            for file_path in attachments:
+                if attachment_handler.is_text_extractable(file_path):
+                    text = text_extractor.extract_text(file_path)
+                    if text:
+                        attachment_texts.append({
+                            'filename': os.path.basename(file_path),
+                            'text': text
+                        })
+        except Exception as e:
+            logger.warning("Failed to extract attachment text",
+                         message_id=message_id,
+                         error=str(e))
+
+        return attachments, attachment_texts
+
+
+def create_email_source(source_type: Optional[str] = None, path: Optional[str] = None) -> EmailSource:
+    """
+    Create the configured email source
+
+    Args:
+        source_type: 'gmail', 'local' or 'memory' (defaults to settings.email_source)
+        path: Mailbox path for the local source (defaults to settings.local_mail_path)
+
+    Returns:
+        EmailSource instance
+    """
+    source_type = source_type or settings.email_source
+
+    if source_type == 'gmail':
+        # Imported lazily so offline sources don't require Google libraries
+        from src.email.gmail_monitor import GmailMonitor
+        return GmailMonitor()
+    if source_type == 'local':
+        return LocalMailSource(path or settings.local_mail_path)
+    if source_type == 'memory':
+        return InMemoryEmailSource()
+
+    raise ValueError(f"Unknown email source: {source_type}")
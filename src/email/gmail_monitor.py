@@ -4,12 +4,10 @@ Monitors Gmail inbox for new support emails and processes them
 """
 import os
 import base64
-import re
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional
 from datetime import datetime, timezone
 from email.utils import parsedate_to_datetime
 import structlog
-from bs4 import BeautifulSoup
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -18,6 +16,8 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from config.settings import settings
+from src.email.email_source import EmailSource
+from src.utils.rate_limiter import limited_call, RateLimitExceeded
 
 logger = structlog.get_logger(__name__)
 
@@ -30,7 +30,7 @@ SCOPES = [
 ]
 
 
-class GmailMonitor:
+class GmailMonitor(EmailSource):
     """Monitors Gmail inbox for new support emails"""
 
     def __init__(self):
@@ -108,6 +108,11 @@ class GmailMonitor:
         self.service = build('gmail', 'v1', credentials=creds)
         logger.info("Gmail API client initialized")
 
+    def _execute(self, request):
+        """Execute a Gmail API request under the shared Gmail rate limit"""
+        with limited_call('gmail'):
+            return request.execute()
+
     def _ensure_processed_label(self) -> None:
         """Ensure the processed label exists, create if it doesn't"""
         try:
@@ -180,11 +185,11 @@ class GmailMonitor:
                        query=query,
                        lookback_minutes=lookback_minutes)
 
-            results = self.service.users().messages().list(
+            results = self._execute(self.service.users().messages().list(
                 userId='me',
                 q=query,
                 maxResults=(max_results or settings.gmail_max_results)
-            ).execute()
+            ))
 
             messages = results.get('messages', [])
 
@@ -215,6 +220,10 @@ class GmailMonitor:
             logger.error("Failed to fetch messages", error=str(e))
             raise
 
+    def get_message(self, message_id: str) -> Optional[Dict]:
+        """Fetch a single Gmail message by ID"""
+        return self._get_message_details(message_id)
+
     def _get_message_details(self, message_id: str) -> Optional[Dict]:
         """
         Get full details of a specific message
@@ -226,11 +235,11 @@ class GmailMonitor:
             Dictionary with message details
         """
         try:
-            message = self.service.users().messages().get(
+            message = self._execute(self.service.users().messages().get(
                 userId='me',
                 id=message_id,
                 format='full'
-            ).execute()
+            ))
 
             # Extract headers
             headers = message['payload']['headers']
@@ -330,51 +339,6 @@ class GmailMonitor:
                 return header['value']
         return None
 
-    def _clean_html(self, html_content: str) -> str:
-        """
-        Clean HTML content by removing CSS, style tags, comments, and extracting text
-
-        Args:
-            html_content: Raw HTML string
-
-        Returns:
-            Clean plain text without HTML tags, CSS, or comments
-        """
-        try:
-            # Parse HTML with BeautifulSoup
-            soup = BeautifulSoup(html_content, 'html.parser')
-
-            # Remove style tags and their contents
-            for style in soup.find_all('style'):
-                style.decompose()
-
-            # Remove script tags and their contents
-            for script in soup.find_all('script'):
-                script.decompose()
-
-            # Remove HTML comments
-            for comment in soup.find_all(string=lambda text: isinstance(text, str) and text.strip().startswith('<!--')):
-                comment.extract()
-
-            # Get text content
-            text = soup.get_text(separator='\n', strip=True)
-
-            # Clean up excessive whitespace while preserving paragraph breaks
-            lines = [line.strip() for line in text.split('\n')]
-            lines = [line for line in lines if line]  # Remove empty lines
-            clean_text = '\n'.join(lines)
-
-            logger.debug("HTML cleaned",
-                        original_length=len(html_content),
-                        cleaned_length=len(clean_text))
-
-            return clean_text
-
-        except Exception as e:
-            logger.error("Failed to clean HTML, falling back to regex", error=str(e))
-            # Fallback to simple regex if BeautifulSoup fails
-            return re.sub('<[^<]+?>', '', html_content)
-
     def _extract_body(self, payload: Dict) -> str:
         """
         Extract email body from message payload
@@ -423,198 +387,19 @@ class GmailMonitor:
             return True
 
         try:
-            self.service.users().messages().modify(
+            self._execute(self.service.users().messages().modify(
                 userId='me',
                 id=message_id,
                 body={'addLabelIds': [self.processed_label_id]}
-            ).execute()
+            ))
 
             logger.info("Marked message as processed", message_id=message_id)
             return True
 
-        except HttpError as e:
+        except (HttpError, RateLimitExceeded) as e:
             logger.error(
                 "Failed to mark message as processed",
                 message_id=message_id,
                 error=str(e)
             )
             return False
-
-    def extract_order_number(self, text: str) -> Optional[str]:
-        """
-        Extract Amazon order number from email text
-
-        Amazon order numbers typically follow patterns like:
-        - 123-1234567-1234567 (standard format)
-        - Order #123-1234567-1234567
-        - Order ID: 123-1234567-1234567
-
-        Args:
-            text: Email subject or body text
-
-        Returns:
-            Order number if found, None otherwise
-        """
-        # Amazon order number pattern
-        patterns = [
-            r'\b(\d{3}-\d{7}-\d{7})\b',  # Standard format
-            r'Order\s*#?\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # With "Order" prefix
-            r'order\s+number\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # With "order number"
-            r'Bestellung\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # German
-            r'Commande\s*[:=]?\s*(\d{3}-\d{7}-\d{7})',  # French
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                order_number = match.group(1)
-                logger.debug("Extracted order number", order_number=order_number)
-                return order_number
-
-        return None
-
-    def extract_ticket_number(self, text: str) -> Optional[str]:
-        """
-        Extract ticket number from email text
-
-        Ticket numbers follow the pattern: DE25006528 (country code + digits)
-
-        Args:
-            text: Email subject or body text
-
-        Returns:
-            Ticket number if found, None otherwise
-        """
-        patterns = [
-            r'\b([A-Z]{2}\d{8})\b',  # Standard format
-            r'Ticket\s*#?\s*[:=]?\s*([A-Z]{2}\d{8})',  # With "Ticket" prefix
-            r'ticket\s+number\s*[:=]?\s*([A-Z]{2}\d{8})',  # With "ticket number"
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                ticket_number = match.group(1)
-                logger.debug("Extracted ticket number", ticket_number=ticket_number)
-                return ticket_number
-
-        return None
-
-    def extract_purchase_order_number(self, text: str) -> Optional[str]:
-        """
-        Extract purchase order number from email text.
-
-        Common pattern observed: 'D' followed by 9 digits (e.g., D425123006).
-        Also handle variants with prefixes like 'PO' or separators.
-
-        Args:
-            text: Email subject or body text
-
-        Returns:
-            Purchase order number if found, None otherwise
-        """
-        patterns = [
-            r"\b(D\d{9})\b",                 # Plain D#########
-            r"PO\s*[:#-]?\s*(D\d{9})",       # With 'PO' prefix
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                po = match.group(1).upper()
-                logger.debug("Extracted purchase order", purchase_order=po)
-                return po
-
-        return None
-
-    def extract_ticket_number(self, text: str) -> Optional[str]:
-        """
-        Extract ticket number from email text.
-
-        Ticket numbers follow patterns like:
-        - DE12345678, FR12345678, ES12345678, etc.
-        - Ticket #DE12345678
-        - Ticket: DE12345678
-
-        Supports any 2-letter country code prefix.
-
-        Args:
-            text: Email subject or body text
-
-        Returns:
-            Ticket number if found, None otherwise
-        """
-        patterns = [
-            r'\b([A-Z]{2}\d{8})\b',                           # Plain XX########
-            r'Ticket\s*[:#-]?\s*([A-Z]{2}\d{8})',             # With 'Ticket' prefix
-            r'ticket\s+number\s*[:=]?\s*([A-Z]{2}\d{8})',     # With 'ticket number'
-            r'Ticketnummer\s*[:=]?\s*([A-Z]{2}\d{8})',        # German
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                ticket_num = match.group(1).upper()
-                logger.debug("Extracted ticket number", ticket_number=ticket_num)
-                return ticket_num
-
-        return None
-
-    def extract_identifiers(self, subject: str, body: str) -> Dict[str, Optional[str]]:
-        """
-        Extract all identifiers from email with priority handling.
-
-        Priority: ticket_number > order_number > purchase_order_number
-
-        Args:
-            subject: Email subject
-            body: Email body
-
-        Returns:
-            Dictionary with 'ticket_number', 'order_number', 'purchase_order_number'
-        """
-        identifiers = {
-            'ticket_number': None,
-            'order_number': None,
-            'purchase_order_number': None
-        }
-
-        # Try ticket number (highest priority)
-        identifiers['ticket_number'] = self.extract_ticket_number(subject) or \
-                                       self.extract_ticket_number(body)
-
-        # Try Amazon order number
-        identifiers['order_number'] = self.extract_order_number(subject) or \
-                                     self.extract_order_number(body)
-
-        # Try purchase order number
-        identifiers['purchase_order_number'] = self.extract_purchase_order_number(subject) or \
-                                              self.extract_purchase_order_number(body)
-
-        return identifiers
-
-    def parse_sender_info(self, from_field: str) -> Tuple[str, str]:
-        """
-        Parse sender name and email from 'From' header
-
-        Args:
-            from_field: From header value (e.g., "John Doe <john@example.com>")
-
-        Returns:
-            Tuple of (name, email)
-        """
-        # Pattern: "Name" <email@domain.com> or just email@domain.com
-        match = re.match(r'^"?([^"<]+)"?\s*<([^>]+)>$', from_field)
-        if match:
-            name = match.group(1).strip()
-            email = match.group(2).strip()
-            return name, email
-
-        # Just an email address
-        match = re.match(r'^([^<>\s]+@[^<>\s]+)$', from_field)
-        if match:
-            email = match.group(1).strip()
-            return email, email
-
-        # Fallback
-        return from_field, from_field
@@ -0,0 +1,543 @@
+"""
+Synthetic Email Load Generator
+Produces production-like support email corpora for sizing and backpressure tests
+
+The generated messages use the same identifier formats the pipeline already
+recognizes (see GmailMonitor.extract_* and MessageFormatter):
+- Amazon order numbers: 123-1234567-1234567
+- Ticket numbers: DE25006528 (country code + 8 digits)
+- Purchase order numbers: D425123006 ('D' + 9 digits)
+- Supplier references: "Ihre Referenz: ABC-12345", "Ticket#: SR-2025-118", ...
+
+Everything runs offline: no Gmail, ticketing or AI calls are made here.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from typing import Any, Dict, Iterator, List, Optional
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+# Default traffic mix, roughly matching what the support inbox receives
+DEFAULT_MIX = {
+    'customer_de': 0.35,
+    'customer_en': 0.15,
+    'customer_fr': 0.10,
+    'amazon_notification': 0.15,
+    'supplier_reply': 0.25,
+}
+
+CUSTOMER_LANGUAGES = {
+    'customer_de': 'de',
+    'customer_en': 'en',
+    'customer_fr': 'fr',
+}
+
+MARKETPLACE_DOMAINS = {
+    'de': 'marketplace.amazon.de',
+    'en': 'marketplace.amazon.co.uk',
+    'fr': 'marketplace.amazon.fr',
+}
+
+FIRST_NAMES = ['Anna', 'Lukas', 'Marie', 'Jonas', 'Sophie', 'Paul', 'Emma', 'Louis', 'Claire', 'James', 'Olivia', 'Hugo']
+LAST_NAMES = ['Müller', 'Schmidt', 'Dubois', 'Martin', 'Smith', 'Weber', 'Bernard', 'Taylor', 'Fischer', 'Laurent']
+PRODUCTS = ['Druckerpapier A4 80g', 'Toner HP 305A', 'Laminiergerät A3', 'Etiketten 70x36mm', 'Aktenvernichter P-4', 'Tintenpatrone Canon PG-545']
+SUPPLIERS = [
+    ('Büroversand GmbH', 'service@bueroversand.de'),
+    ('Papier Union', 'kundenservice@papierunion.de'),
+    ('OfficeLine Distribution', 'support@officeline-distribution.com'),
+    ('Fournitures Pro SARL', 'sav@fournitures-pro.fr'),
+]
+
+CUSTOMER_TEMPLATES = {
+    'de': [
+        ("Wo ist meine Bestellung {order}?",
+         "Hallo,\n\nich habe am {order_date} die Bestellung {order} aufgegeben ({product}), "
+         "aber das Paket ist immer noch nicht angekommen. Die Sendungsverfolgung zeigt seit Tagen keinen Fortschritt.\n"
+         "Können Sie mir bitte sagen, wo meine Lieferung ist?\n\nMit freundlichen Grüßen\n{name}"),
+        ("Beschädigte Ware - Bestellung {order}",
+         "Guten Tag,\n\nder Artikel {product} aus Bestellung {order} kam beschädigt an. Der Karton war eingedrückt "
+         "und das Gerät hat einen Riss im Gehäuse. Fotos habe ich angehängt.\nIch möchte einen Ersatz oder eine Erstattung.\n\n"
+         "Viele Grüße\n{name}"),
+        ("Rücksendung Bestellung {order}",
+         "Hallo,\n\nich möchte {product} zurücksenden, da es nicht zu meinem Drucker passt. Wie gehe ich vor?\n\n{name}"),
+        ("Re: Ihre Anfrage {ticket}",
+         "Vielen Dank für die schnelle Antwort! Das hat mir sehr geholfen.\n\nGruß\n{name}"),
+    ],
+    'en': [
+        ("Where is my order {order}?",
+         "Hello,\n\nI ordered {product} on {order_date} (order {order}) and it still hasn't arrived. "
+         "The tracking page has not been updated for several days.\nCould you please check where my parcel is?\n\n"
+         "Kind regards,\n{name}"),
+        ("Damaged item - order {order}",
+         "Hi,\n\nthe {product} from order {order} arrived damaged. The box was crushed and the device is cracked. "
+         "I attached photos.\nPlease send a replacement or refund.\n\nThanks,\n{name}"),
+        ("Return request for order {order}",
+         "Hello,\n\nI would like to return {product}, it is not compatible with my printer. What do I need to do?\n\n{name}"),
+        ("Re: Your ticket {ticket}",
+         "Thank you very much, that solved my problem.\n\nBest,\n{name}"),
+    ],
+    'fr': [
+        ("Où est ma commande {order} ?",
+         "Bonjour,\n\nj'ai commandé {product} le {order_date} (commande {order}) mais le colis n'est toujours pas arrivé. "
+         "Le suivi n'a pas bougé depuis plusieurs jours.\nPouvez-vous vérifier où se trouve mon colis ?\n\n"
+         "Cordialement,\n{name}"),
+        ("Article endommagé - commande {order}",
+         "Bonjour,\n\nl'article {product} de la commande {order} est arrivé endommagé. Le carton était écrasé. "
+         "Vous trouverez des photos en pièce jointe.\nJe souhaite un remplacement ou un remboursement.\n\n{name}"),
+        ("Retour commande {order}",
+         "Bonjour,\n\nje souhaite retourner {product}, il ne correspond pas à mon imprimante. Comment faire ?\n\n{name}"),
+        ("Re: Votre ticket {ticket}",
+         "Merci beaucoup pour votre aide rapide !\n\n{name}"),
+    ],
+}
+
+AMAZON_TEMPLATES = [
+    ("Rücksendegenehmigung für Bestellung {order}",
+     "Sehr geehrter Verkäufer,\n\nAmazon hat eine Rücksendegenehmigung für die Bestellung {order} erteilt.\n\n"
+     "Artikel: {product}\nGrund: Artikel defekt\n\nKundenkommentar:\n"
+     "Das Gerät lässt sich nicht einschalten, bitte um Erstattung des Kaufpreises.\n\n"
+     "Bitte bearbeiten Sie die Rücksendung innerhalb von 2 Werktagen."),
+    ("Return authorization for order {order}",
+     "Dear Seller,\n\nAmazon has approved a return request for order {order}.\n\n"
+     "Item: {product}\nReason: Item arrived damaged\n\nPlease process this return within 2 business days."),
+    ("Nachricht von Amazon-Kunde {name} (Bestellung: {order})",
+     "Sie haben eine Nachricht von einem Amazon-Kunden erhalten.\n\nBestellnummer: {order}\n\n"
+     "Hallo, wann wird meine Bestellung versendet?\n\nUm zu antworten, verwenden Sie bitte Seller Central."),
+]
+
+SUPPLIER_TEMPLATES = [
+    ("AW: Anfrage zu PO {po} / Ticket {ticket}",
+     "Sehr geehrte Damen und Herren,\n\nzu Ihrer Bestellung {po} teilen wir Ihnen mit, dass die Ware am {ship_date} "
+     "versendet wurde. Die Sendungsnummer lautet {tracking}.\n\nIhre Referenz: {supplier_ref}\n\n"
+     "Mit freundlichen Grüßen\n{supplier}"),
+    ("RE: PO {po} - return authorization",
+     "Hello,\n\nwe have approved the return for purchase order {po}. Please use reference Ticket#: {supplier_ref} "
+     "on the parcel.\n\nBest regards,\n{supplier}"),
+    ("AW: Reklamation {po}",
+     "Guten Tag,\n\nwir haben die Reklamation zu {po} aufgenommen. Ticket-Nr. {supplier_ref}\n"
+     "Bitte senden Sie uns Fotos der Beschädigung.\n\nFreundliche Grüße\n{supplier}"),
+]
+
+QUOTE_HEADERS = {
+    'de': "Am {date} schrieb {sender}:",
+    'en': "On {date}, {sender} wrote:",
+    'fr': "Le {date}, {sender} a écrit :",
+}
+
+# Minimal valid 1x1 PNG and single-page PDF so attachment handling paths are exercised
+_PNG_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082'
+)
+_PDF_BYTES = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+class EmailLoadGenerator:
+    """
+    Generates synthetic support emails in the same dict shape as GmailMonitor._get_message_details
+
+    Args:
+        mix: Mapping of email kind -> weight (see DEFAULT_MIX for available kinds)
+        seed: Random seed for reproducible corpora
+        attachments_dir: Directory where generated attachment files are written
+        attachment_rate: Probability that a customer/supplier email carries attachments
+        quoted_thread_rate: Probability that an email contains a quoted thread
+        max_quoted_depth: Maximum number of quoted previous messages per email
+        support_email: Address used as recipient of generated emails
+    """
+
+    def __init__(
+        self,
+        mix: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None,
+        attachments_dir: str = "attachments/loadgen",
+        attachment_rate: float = 0.2,
+        quoted_thread_rate: float = 0.4,
+        max_quoted_depth: int = 6,
+        support_email: str = "support@example.com"
+    ):
+        self.mix = self._normalize_mix(mix or DEFAULT_MIX)
+        self.seed = seed if seed is not None else random.randrange(1 << 30)
+        self.random = random.Random(self.seed)
+        self.attachments_dir = attachments_dir
+        self.attachment_rate = attachment_rate
+        self.quoted_thread_rate = quoted_thread_rate
+        self.max_quoted_depth = max_quoted_depth
+        self.support_email = support_email
+        self._counter = 0
+
+    @staticmethod
+    def _normalize_mix(mix: Dict[str, float]) -> Dict[str, float]:
+        """Validate kinds and normalize weights to sum to 1"""
+        known = set(DEFAULT_MIX)
+        unknown = set(mix) - known
+        if unknown:
+            raise ValueError(f"Unknown email kinds in mix: {sorted(unknown)} (known: {sorted(known)})")
+        total = sum(w for w in mix.values() if w > 0)
+        if total <= 0:
+            raise ValueError("Email mix must contain at least one positive weight")
+        return {k: w / total for k, w in mix.items() if w > 0}
+
+    @staticmethod
+    def parse_mix(value: str) -> Dict[str, float]:
+        """
+        Parse a mix specification like 'customer_de=0.5,supplier_reply=0.5'
+
+        Args:
+            value: Comma separated kind=weight pairs
+
+        Returns:
+            Mapping of kind -> weight
+        """
+        mix = {}
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            kind, _, weight = part.partition('=')
+            mix[kind.strip()] = float(weight) if weight else 1.0
+        return mix
+
+    # ------------------------------------------------------------------
+    # Identifier generators (formats mirror GmailMonitor.extract_*)
+    # ------------------------------------------------------------------
+
+    def _order_number(self) -> str:
+        r = self.random
+        return f"{r.randint(100, 999)}-{r.randint(0, 9999999):07d}-{r.randint(0, 9999999):07d}"
+
+    def _ticket_number(self, country: str = 'DE') -> str:
+        return f"{country}{self.random.randint(25000000, 25999999):08d}"
+
+    def _po_number(self) -> str:
+        return f"D{self.random.randint(0, 999999999):09d}"
+
+    def _supplier_reference(self) -> str:
+        r = self.random
+        prefix = r.choice(['SR', 'RMA', 'REK', 'CS'])
+        return f"{prefix}-{r.randint(2024, 2026)}-{r.randint(100, 99999)}"
+
+    def _tracking_number(self) -> str:
+        r = self.random
+        return r.choice([
+            ''.join(r.choice('0123456789') for _ in range(14)),  # DHL / DPD style
+            '1Z' + ''.join(r.choice('0123456789ABCDEFGHJKLMNPRSTUVWXYZ') for _ in range(16)),  # UPS style
+        ])
+
+    def _message_id(self) -> str:
+        self._counter += 1
+        return f"loadgen{self.seed:08x}{self._counter:08x}"
+
+    def _person(self) -> str:
+        return f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}"
+
+    # ------------------------------------------------------------------
+    # Email builders
+    # ------------------------------------------------------------------
+
+    def _pick_kind(self) -> str:
+        kinds = list(self.mix)
+        return self.random.choices(kinds, weights=[self.mix[k] for k in kinds], k=1)[0]
+
+    def generate(self, kind: Optional[str] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Generate a single email
+
+        Args:
+            kind: Optional email kind; picked from the mix if omitted
+            now: Reference time for the email date (defaults to current UTC time)
+
+        Returns:
+            Email data dict (same keys as GmailMonitor._get_message_details)
+        """
+        kind = kind or self._pick_kind()
+        now = now or datetime.now(timezone.utc)
+        date = now - timedelta(minutes=self.random.randint(0, 60 * 30))
+
+        context = {
+            'order': self._order_number(),
+            'ticket': self._ticket_number(),
+            'po': self._po_number(),
+            'product': self.random.choice(PRODUCTS),
+            'name': self._person(),
+            'order_date': (date - timedelta(days=self.random.randint(2, 14))).strftime('%d.%m.%Y'),
+            'ship_date': (date - timedelta(days=self.random.randint(0, 3))).strftime('%d.%m.%Y'),
+            'tracking': self._tracking_number(),
+            'supplier_ref': self._supplier_reference(),
+        }
+
+        if kind in CUSTOMER_LANGUAGES:
+            language = CUSTOMER_LANGUAGES[kind]
+            subject, body = self.random.choice(CUSTOMER_TEMPLATES[language])
+            local_part = ''.join(self.random.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(14))
+            from_address = f"{context['name']} - Amazon Marketplace <{local_part}@{MARKETPLACE_DOMAINS[language]}>"
+            # Damage reports mention photos, so they always carry attachments
+            with_attachments = 'otos' in body or self.random.random() < self.attachment_rate
+        elif kind == 'amazon_notification':
+            language = 'de'
+            subject, body = self.random.choice(AMAZON_TEMPLATES)
+            from_address = "Amazon <donotreply@amazon.de>"
+            with_attachments = False
+        elif kind == 'supplier_reply':
+            language = 'de'
+            supplier_name, supplier_email = self.random.choice(SUPPLIERS)
+            context['supplier'] = supplier_name
+            subject, body = self.random.choice(SUPPLIER_TEMPLATES)
+            from_address = f"{supplier_name} <{supplier_email}>"
+            with_attachments = self.random.random() < self.attachment_rate
+        else:
+            raise ValueError(f"Unknown email kind: {kind}")
+
+        subject = subject.format(**context)
+        body = body.format(**context)
+
+        if kind != 'amazon_notification' and self.random.random() < self.quoted_thread_rate:
+            body += self._quoted_thread(language, context, date)
+
+        message_id = self._message_id()
+        attachments, attachment_texts = ([], [])
+        if with_attachments:
+            attachments, attachment_texts = self._write_attachments(message_id, context)
+
+        return {
+            'id': message_id,
+            'thread_id': f"thread{message_id[7:]}",
+            'message_id_header': f"<{message_id}@loadgen.local>",
+            'subject': subject,
+            'from': from_address,
+            'to': self.support_email,
+            'date': date,
+            'body': body,
+            'snippet': body[:120].replace('\n', ' '),
+            'label_ids': ['INBOX'],
+            'attachments': attachments,
+            'attachment_texts': attachment_texts,
+            'loadgen_kind': kind,
+        }
+
+    def _quoted_thread(self, language: str, context: Dict[str, str], date: datetime) -> str:
+        """Build a long quoted reply chain like real mail clients produce"""
+        depth = self.random.randint(1, self.max_quoted_depth)
+        parts = []
+        for level in range(1, depth + 1):
+            quote_date = (date - timedelta(days=level)).strftime('%d.%m.%Y %H:%M')
+            header = QUOTE_HEADERS[language].format(date=quote_date, sender=self._person())
+            _, previous = self.random.choice(CUSTOMER_TEMPLATES[language])
+            previous = previous.format(**{**context, 'name': self._person()})
+            prefix = '>' * level + ' '
+            quoted = '\n'.join(prefix + line for line in previous.split('\n'))
+            parts.append(f"\n\n{'>' * (level - 1)}{' ' if level > 1 else ''}{header}\n{quoted}")
+        return ''.join(parts)
+
+    def _write_attachments(self, message_id: str, context: Dict[str, str]) -> tuple[List[str], List[Dict[str, str]]]:
+        """Write attachment files to disk, organized by message ID like AttachmentHandler"""
+        folder = os.path.join(self.attachments_dir, message_id)
+        os.makedirs(folder, exist_ok=True)
+
+        files = []
+        texts = []
+        count = self.random.randint(1, 3)
+        for index in range(count):
+            choice = self.random.choice(['image', 'pdf', 'text'])
+            if choice == 'image':
+                filename = f"photo_{index + 1}.png"
+                data = _PNG_BYTES
+            elif choice == 'pdf':
+                filename = f"lieferschein_{context['po']}_{index + 1}.pdf"
+                data = _PDF_BYTES
+                texts.append({
+                    'filename': filename,
+                    'text': f"Lieferschein {context['po']}\nBestellung {context['order']}\nArtikel: {context['product']}\n"
+                            + "Position 1 ... 1 Stück\n" * self.random.randint(5, 60)
+                })
+            else:
+                filename = f"notiz_{index + 1}.txt"
+                data = f"Referenz {context['supplier_ref']} / Bestellung {context['order']}\n".encode('utf-8')
+                texts.append({'filename': filename, 'text': data.decode('utf-8')})
+
+            path = os.path.join(folder, filename)
+            with open(path, 'wb') as f:
+                f.write(data)
+            files.append(path)
+
+        return files, texts
+
+    # ------------------------------------------------------------------
+    # Corpus output
+    # ------------------------------------------------------------------
+
+    def generate_batch(self, count: int) -> List[Dict[str, Any]]:
+        """Generate a list of emails"""
+        return [self.generate() for _ in range(count)]
+
+    def iter_paced(self, count: int, rate_per_second: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield emails at a configurable rate
+
+        Args:
+            count: Number of emails to yield
+            rate_per_second: Target emails per second (None = as fast as possible)
+
+        Yields:
+            Email data dicts
+        """
+        interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        next_at = time.monotonic()
+        for _ in range(count):
+            if interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            yield self.generate()
+
+    @staticmethod
+    def to_mime(email_data: Dict[str, Any]) -> EmailMessage:
+        """
+        Convert a generated email dict to an RFC 822 message (including attachments)
+
+        Args:
+            email_data: Email data dict
+
+        Returns:
+            EmailMessage ready to be written as .eml / mbox entry
+        """
+        import mimetypes
+
+        msg = EmailMessage()
+        msg['Subject'] = email_data['subject']
+        msg['From'] = email_data['from']
+        msg['To'] = email_data.get('to') or ''
+        msg['Date'] = format_datetime(email_data.get('date') or datetime.now(timezone.utc))
+        msg['Message-ID'] = email_data.get('message_id_header') or make_msgid()
+        msg.set_content(email_data['body'])
+
+        for path in email_data.get('attachments', []):
+            mime_type, _ = mimetypes.guess_type(path)
+            maintype, subtype = (mime_type or 'application/octet-stream').split('/', 1)
+            with open(path, 'rb') as f:
+                msg.add_attachment(f.read(), maintype=maintype, subtype=subtype, filename=os.path.basename(path))
+
+        return msg
+
+    def write_eml_directory(self, output_dir: str, count: int) -> List[str]:
+        """
+        Write a corpus of .eml files
+
+        Args:
+            output_dir: Target directory
+            count: Number of emails
+
+        Returns:
+            List of written file paths
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for email_data in self.generate_batch(count):
+            path = os.path.join(output_dir, f"{email_data['id']}.eml")
+            with open(path, 'wb') as f:
+                f.write(bytes(self.to_mime(email_data)))
+            paths.append(path)
+
+        logger.info("Wrote synthetic email corpus", output_dir=output_dir, count=count, seed=self.seed)
+        return paths
+
+    def write_mbox(self, path: str, count: int) -> int:
+        """
+        Write a corpus as a single mbox file
+
+        Args:
+            path: Target mbox file path
+            count: Number of emails
+
+        Returns:
+            Number of messages written
+        """
+        import mailbox
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        box = mailbox.mbox(path)
+        box.lock()
+        try:
+            for email_data in self.generate_batch(count):
+                box.add(self.to_mime(email_data))
+            box.flush()
+        finally:
+            box.unlock()
+            box.close()
+
+        logger.info("Wrote synthetic mbox corpus", path=path, count=count, seed=self.seed)
+        return count
+
+    def feed_orchestrator(self, orchestrator: Any, count: int, rate_per_second: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Deliver generated emails to the orchestrator's in-memory source and poll them
+
+        Emails arrive in the source at the configured rate and are picked up by
+        process_new_emails(), so the measured path is the production one:
+        prioritization, the idempotency check and marking emails as processed.
+
+        Args:
+            orchestrator: SupportAgentOrchestrator built with an InMemoryEmailSource
+            count: Number of emails to feed
+            rate_per_second: Target arrival rate (None = all at once)
+
+        Returns:
+            Run statistics (processed, failed, polls, elapsed seconds, throughput)
+
+        Raises:
+            ValueError: If the orchestrator does not read from an InMemoryEmailSource
+        """
+        from src.email.email_source import InMemoryEmailSource
+
+        source = orchestrator.email_source
+        if not isinstance(source, InMemoryEmailSource):
+            raise ValueError("feed_orchestrator needs an orchestrator built with an InMemoryEmailSource")
+
+        emails = self.generate_batch(count)
+        interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        arrived = 0
+        polls = 0
+        started = time.monotonic()
+
+        while True:
+            elapsed = time.monotonic() - started
+            while arrived < count and arrived * interval <= elapsed:
+                source.add(emails[arrived])
+                arrived += 1
+
+            queued = source.queued_count()
+            if queued:
+                orchestrator.process_new_emails()
+                polls += 1
+                if source.queued_count() >= queued:
+                    logger.warning("Orchestrator did not poll the queued emails (monitoring paused?)", queued=queued)
+                    break
+            elif arrived == count:
+                break
+            else:
+                time.sleep(max(started + arrived * interval - time.monotonic(), 0.0))
+
+        elapsed = time.monotonic() - started
+        processed = sum(1 for email_data in emails if source.is_processed(email_data['id']))
+        stats = {
+            'emails': count,
+            'processed': processed,
+            'failed': count - processed,
+            'polls': polls,
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_per_second': round(count / elapsed, 3) if elapsed > 0 else None,
+        }
+        logger.info("Load generator run complete", **stats)
+        return stats
@@ -8,9 +8,12 @@ import time
 import structlog
 
 from config.settings import settings
-from src.email.gmail_monitor import GmailMonitor
+from src.email.email_source import EmailSource, create_email_source
 from src.api.ticketing_client import TicketingAPIClient, TicketingAPIError
-from src.ai.ai_engine import AIEngine
+from src.ai.ai_engine import get_ai_engine
+from src.ai.prompt_budget import prompt_token_fields
+from src.ai.telemetry import call_telemetry_fields, record_analysis_calls
+from src.ai.conversation_summary import ConversationSummarizer
 from src.dispatcher.action_dispatcher import ActionDispatcher
 from src.utils.supplier_manager import SupplierManager
 from src.utils.text_filter import TextFilter
@@ -29,6 +32,10 @@ from src.database.models import (
 from src.utils.message_service import MessageService
 from src.utils.message_formatter import MessageFormatter
 from src.utils.audit_logger import log_ticket_created
+from src.utils.rate_limiter import rate_limited
+from src.utils.circuit_breaker import CircuitOpenError, circuit_protected, open_circuits
+from src.utils.email_scheduler import EmailPriorityScheduler
+from src.utils.runtime_status import publish_status
 
 logger = structlog.get_logger(__name__)
 
@@ -39,7 +46,11 @@ class SupportAgentOrchestrator:
     Handles the full workflow from email to action
     """
 
-    def __init__(self):
+    def __init__(self, email_source: Optional[EmailSource] = None):
+        """
+        Args:
+            email_source: Source to read emails from (defaults to settings.email_source)
+        """
         logger.info("Initializing AI Support Agent Orchestrator")
 
         # Initialize database
@@ -47,9 +58,13 @@ class SupportAgentOrchestrator:
         self.session = self.SessionMaker()  # Main session for settings checks
 
         # Initialize components
-        self.gmail_monitor = GmailMonitor()
-        self.ticketing_client = TicketingAPIClient()
-        self.ai_engine = AIEngine()
+        self.email_source = email_source or create_email_source()
+        self.gmail_monitor = self.email_source  # Backwards compatible alias
+        self.email_scheduler = EmailPriorityScheduler(self.SessionMaker, self.email_source)
+        # Breaker outside the limiter so an open circuit doesn't consume rate limit tokens
+        self.ticketing_client = circuit_protected(rate_limited(TicketingAPIClient(), 'ticketing'), 'ticketing')
+        self.ai_engine = get_ai_engine()
+        self.conversation_summarizer = ConversationSummarizer(self.SessionMaker, self.ai_engine)
 
         # Initialize error alerting if configured
         self.error_alerting = None
@@ -99,7 +114,7 @@ class SupportAgentOrchestrator:
 
         try:
             # Get unprocessed messages with configured lookback window
-            messages = self.gmail_monitor.get_unprocessed_messages(
+            messages = self.email_source.get_unprocessed_messages(
                 lookback_minutes=settings.gmail_lookback_minutes
             )
 
@@ -110,7 +125,7 @@ class SupportAgentOrchestrator:
             logger.info("Processing new emails", count=len(messages))
 
             processed_count = 0
-            for message in messages:
+            for message in self._prioritize(messages):
                 try:
                     if self._process_single_email(message):
                         processed_count += 1
@@ -129,6 +144,45 @@ class SupportAgentOrchestrator:
             logger.error("Error during email processing", error=str(e))
             return 0
 
+    def _prioritize(self, messages: list):
+        """
+        Yield emails in SLA-aware priority order
+
+        Scores every email in the batch, publishes the queue metrics (including
+        time remaining to SLA breach) and logs each email's score on dequeue.
+        """
+        if not settings.email_priority_scheduling_enabled:
+            yield from messages
+            return
+
+        try:
+            self.email_scheduler.push_many(messages)
+        except Exception as e:
+            logger.warning("Email prioritization failed, using source order", error=str(e))
+            yield from messages
+            return
+
+        metrics = self.email_scheduler.metrics()
+        logger.info(
+            "Email queue prioritized",
+            queued=metrics['queued'],
+            min_sla_remaining_minutes=metrics['min_sla_remaining_minutes'],
+            sla_breached=metrics['sla_breached'],
+            sla_at_risk=metrics['sla_at_risk']
+        )
+        publish_status('email_queue', metrics)
+
+        for item in self.email_scheduler.drain():
+            logger.info(
+                "Dequeued email",
+                gmail_id=item.email_data.get('id'),
+                sender_class=item.sender_class,
+                score=round(item.score, 1),
+                sla_remaining_minutes=round(item.sla_remaining_minutes, 1) if item.sla_remaining_minutes is not None else None,
+                reasons=item.reasons
+            )
+            yield item.email_data
+
     def _is_amazon_return_authorization(self, email_data: Dict[str, Any]) -> tuple[bool, Optional[str]]:
         """
         Detect if this is an Amazon return authorization email
@@ -329,6 +383,10 @@ class SupportAgentOrchestrator:
                     processed_at=existing.processed_at,
                     success=existing.success
                 )
+                # Mark in the source too, so it is not returned on every poll
+                # (failed emails stay unmarked; the retry queue owns them)
+                if existing.success:
+                    self.email_source.mark_as_processed(gmail_message_id)
                 return True  # Already processed, return success
         finally:
             session.close()
@@ -344,7 +402,7 @@ class SupportAgentOrchestrator:
             session = self.SessionMaker()
             try:
                 self._mark_email_processed(session, email_data, None, None, success=True)
-                self.gmail_monitor.mark_as_processed(gmail_message_id)
+                self.email_source.mark_as_processed(gmail_message_id)
                 session.commit()
             except Exception as e:
                 logger.error("Failed to mark empty subject email as processed", error=str(e))
@@ -382,7 +440,7 @@ class SupportAgentOrchestrator:
                     success=True,
                     error_message=f"Ignored: {ignore_reason}"
                 )
-                self.gmail_monitor.mark_as_processed(gmail_message_id)
+                self.email_source.mark_as_processed(gmail_message_id)
                 session.commit()
             except Exception as e:
                 logger.error("Failed to mark ignored email as processed", error=str(e))
@@ -420,10 +478,15 @@ class SupportAgentOrchestrator:
 
             # If existing but not successful, we'll retry (don't return here)
 
+            # Dependencies known to be down: park the email cheaply instead of
+            # running lookups and AI calls that are sure to fail
+            if self._park_if_circuits_open(session, email_data):
+                return False
+
             # NEW WORKFLOW: Extract all identifiers and resolve ticket
             subject_text = email_data.get('subject') or ''
             body_text = email_data.get('body', '')
-            identifiers = self.gmail_monitor.extract_identifiers(subject_text, body_text)
+            identifiers = self.email_source.extract_identifiers(subject_text, body_text)
 
             # Check for manually provided order number (takes priority)
             manual_order = email_data.get('manual_order_number')
@@ -509,7 +572,7 @@ class SupportAgentOrchestrator:
                 session.commit()
                 logger.info("Email saved to ticket history (no AI analysis)", gmail_id=gmail_message_id)
                 # Mark in Gmail as processed
-                self.gmail_monitor.mark_as_processed(gmail_message_id)
+                self.email_source.mark_as_processed(gmail_message_id)
                 return True
 
             ticket_id = ticket_data.get('ticketNumber')
@@ -527,7 +590,8 @@ class SupportAgentOrchestrator:
                 email_data=email_data,
                 ticket_data=ticket_data,
                 ticket_history=ticket_history,
-                supplier_language=supplier_language
+                supplier_language=supplier_language,
+                customer_language=ticket_state.customer_language
             )
 
             logger.info(
@@ -620,10 +684,19 @@ class SupportAgentOrchestrator:
             logger.info("Email processing successful", gmail_id=gmail_message_id)
 
             # Only mark in Gmail after successful database commit
-            self.gmail_monitor.mark_as_processed(gmail_message_id)
+            self.email_source.mark_as_processed(gmail_message_id)
 
             return True
 
+        except CircuitOpenError as e:
+            logger.warning("Dependency unavailable, parking email", circuit=e.name, gmail_id=gmail_message_id)
+            try:
+                session.rollback()
+                self._park_email(session, email_data, e.name, e.retry_after)
+            except Exception as ie:
+                logger.error("Failed to park email", error=str(ie))
+            return False
+
         except Exception as e:
             logger.error("Error processing email", error=str(e), gmail_id=gmail_message_id)
             try:
@@ -656,12 +729,12 @@ class SupportAgentOrchestrator:
         body = email_data.get('body', '')
 
         # Try subject first
-        order_number = self.gmail_monitor.extract_order_number(subject)
+        order_number = self.email_source.extract_order_number(subject)
         if order_number:
             return order_number
 
         # Try body
-        order_number = self.gmail_monitor.extract_order_number(body)
+        order_number = self.email_source.extract_order_number(body)
         return order_number
 
     def _schedule_retry(self, session: Any, email_data: Dict[str, Any], reason: str) -> None:
@@ -692,10 +765,81 @@ class SupportAgentOrchestrator:
         session.commit()
         logger.info("Scheduled retry", gmail_id=gmail_id, reason=reason, next_attempt_at=str(next_at))
 
+    def _ai_dependencies(self) -> list[str]:
+        """Circuit breaker names of the AI providers the ProviderRouter tries (primary and fallbacks)"""
+        providers = getattr(self.ai_engine.provider, 'providers', None) or []
+        names = [getattr(provider, 'dependency', None) for _, provider in providers]
+        return list(dict.fromkeys(name for name in names if name)) or [f"ai_{settings.ai_provider}"]
+
+    def _blocking_circuits(self) -> list:
+        """
+        Open circuits that stop the email workflow
+
+        The ticketing API has no substitute. AI only blocks when every provider
+        the router would try is open; the breaker reopening first is returned then.
+        """
+        blocking = open_circuits(['ticketing'])
+        ai_dependencies = self._ai_dependencies()
+        open_ai = open_circuits(ai_dependencies)
+        if open_ai and len(open_ai) == len(ai_dependencies):
+            blocking.append(min(open_ai, key=lambda b: b.retry_after()))
+        return blocking
+
+    def _park_if_circuits_open(self, session: Any, email_data: Dict[str, Any]) -> bool:
+        """
+        Park an email if a dependency it cannot do without is unavailable
+
+        Returns:
+            True if the email was parked
+        """
+        open_breakers = self._blocking_circuits()
+        if not open_breakers:
+            return False
+
+        breaker = max(open_breakers, key=lambda b: b.retry_after())
+        logger.info(
+            "Dependency circuit open, parking email",
+            gmail_id=email_data.get('id'),
+            circuit=breaker.name,
+            retry_after_seconds=round(breaker.retry_after())
+        )
+        self._park_email(session, email_data, breaker.name, breaker.retry_after())
+        return True
+
+    def _park_email(self, session: Any, email_data: Dict[str, Any], circuit: str, retry_after: float) -> None:
+        """
+        Queue an email for when a circuit closes again
+
+        Unlike _schedule_retry this does not count as an attempt: the email never
+        reached the failing dependency, so it must not run out of retries.
+        """
+        gmail_id = email_data.get('id')
+        next_at = datetime.utcnow() + timedelta(seconds=max(retry_after, 1.0))
+        reason = f"circuit_open:{circuit}"
+        existing = session.query(PendingEmailRetry).filter_by(gmail_message_id=gmail_id).first()
+        if existing:
+            existing.next_attempt_at = next_at
+            existing.last_error = reason
+        else:
+            session.add(PendingEmailRetry(
+                gmail_message_id=gmail_id,
+                gmail_thread_id=email_data.get('thread_id'),
+                subject=email_data.get('subject') or '',
+                from_address=email_data.get('from', ''),
+                message_body=email_data.get('body', ''),
+                attempts=0,
+                next_attempt_at=next_at,
+                last_error=reason
+            ))
+        session.commit()
+
     def process_pending_retries(self) -> int:
         """Process pending email retries that are due."""
         if not settings.retry_enabled:
             return 0
+        if self._blocking_circuits():
+            logger.debug("Dependency circuit open, skipping pending retries")
+            return 0
         session = self.SessionMaker()
         processed = 0
         try:
@@ -705,8 +849,8 @@ class SupportAgentOrchestrator:
             ).all()
             for item in due:
                 try:
-                    # Fetch email details fresh from Gmail
-                    email_data = self.gmail_monitor._get_message_details(item.gmail_message_id)
+                    # Fetch email details fresh from the email source
+                    email_data = self.email_source.get_message(item.gmail_message_id)
                     if not email_data:
                         item.attempts += 1
                         item.next_attempt_at = datetime.utcnow() + timedelta(minutes=settings.retry_delay_minutes)
@@ -749,8 +893,10 @@ class SupportAgentOrchestrator:
                             email_data=email_data,
                             ticket_data=ticket_data,
                             ticket_history=ticket_history,
-                            supplier_language=supplier_language
+                            supplier_language=supplier_language,
+                            customer_language=ticket_state.customer_language
                         )
+                        record_analysis_calls(analysis)
                         dispatcher = ActionDispatcher(self.ticketing_client)
                         dispatcher.dispatch(
                             analysis=analysis,
@@ -768,6 +914,13 @@ class SupportAgentOrchestrator:
                             item.last_error = 'max_attempts_reached'
                         item.next_attempt_at = datetime.utcnow() + timedelta(minutes=settings.retry_delay_minutes)
                         session.commit()
+                except CircuitOpenError as e:
+                    # Dependency went down mid-run: park remaining work without burning attempts
+                    session.rollback()
+                    item.next_attempt_at = datetime.utcnow() + timedelta(seconds=max(e.retry_after, 1.0))
+                    item.last_error = f"circuit_open:{e.name}"
+                    session.commit()
+                    break
                 except Exception as e:
                     logger.error("Failed processing pending retry", gmail_id=item.gmail_message_id, error=str(e))
                     item.attempts += 1
@@ -976,6 +1129,9 @@ class SupportAgentOrchestrator:
         """
         for attempt in range(max_retries):
             if attempt > 0:
+                if open_circuits(['ticketing']):
+                    logger.warning("Ticketing circuit open, stopping ticket search retries")
+                    break
                 delay = retry_delays[attempt - 1] if attempt - 1 < len(retry_delays) else retry_delays[-1]
                 logger.info(
                     "Waiting before retry",
@@ -1148,8 +1304,8 @@ class SupportAgentOrchestrator:
         body = email_data.get('body', '')
 
         # Try ticket number
-        ticket_number = self.gmail_monitor.extract_ticket_number(subject) or \
-                        self.gmail_monitor.extract_ticket_number(body)
+        ticket_number = self.email_source.extract_ticket_number(subject) or \
+                        self.email_source.extract_ticket_number(body)
         if ticket_number:
             try:
                 tickets = self.ticketing_client.get_ticket_by_ticket_number(ticket_number)
@@ -1159,8 +1315,8 @@ class SupportAgentOrchestrator:
                 pass
 
         # Try purchase order number
-        po_number = self.gmail_monitor.extract_purchase_order_number(subject) or \
-                    self.gmail_monitor.extract_purchase_order_number(body)
+        po_number = self.email_source.extract_purchase_order_number(subject) or \
+                    self.email_source.extract_purchase_order_number(body)
         if po_number:
             try:
                 tickets = self.ticketing_client.get_ticket_by_purchase_order_number(po_number)
@@ -1396,85 +1552,10 @@ class SupportAgentOrchestrator:
     def _build_ticket_history(self, ticket_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Build structured ticket history for AI context
-        Returns a clean JSON structure instead of text blobs
+        Returns a clean JSON structure instead of text blobs; long conversations
+        are sent as their rolling summary plus the newest messages
         """
-        import json
-
-        customer_messages = []
-        supplier_messages = []
-        internal_notes = []
-
-        ticket_details = ticket_data.get('ticketDetails', [])
-
-        for detail in ticket_details:
-            comment = detail.get('comment', '')
-            created_at = detail.get('createdDateTime', '')
-            source = detail.get('sourceTicketSideTypeId')
-            target = detail.get('targetTicketSideTypeId')
-
-            if not comment:
-                continue
-
-            # Skip ALL AI Agent messages (case-insensitive)
-            comment_lower = comment.strip().lower()
-            # Check for any AI Agent related message
-            if (comment_lower.startswith('ai agent') or
-                'ai agent proposes' in comment_lower or
-                'ai agent suggests' in comment_lower or
-                comment.strip().startswith('🚨')):  # Escalation emoji
-                continue
-
-            # Parse date to simpler format
-            try:
-                from datetime import datetime
-                dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                timestamp = dt.strftime('%Y-%m-%d %H:%M')
-            except:
-                timestamp = created_at[:16] if len(created_at) >= 16 else created_at
-
-            # Determine message type based on source and target
-            # 1 = System/Operator, 2 = Customer, 3 = Supplier
-            if source == 2 and target == 1:
-                # Customer to us
-                customer_messages.append({
-                    'timestamp': timestamp,
-                    'direction': 'inbound',
-                    'message': comment[:400]  # Slightly longer for context
-                })
-            elif source == 1 and target == 2:
-                # Us to customer
-                customer_messages.append({
-                    'timestamp': timestamp,
-                    'direction': 'outbound',
-                    'message': comment[:400]
-                })
-            elif source == 1 and target == 3:
-                # Us to supplier
-                supplier_messages.append({
-                    'timestamp': timestamp,
-                    'direction': 'outbound',
-                    'message': comment[:400]
-                })
-            elif source == 3 and target == 1:
-                # Supplier to us
-                supplier_messages.append({
-                    'timestamp': timestamp,
-                    'direction': 'inbound',
-                    'message': comment[:400]
-                })
-            elif source == 1 and target == 1:
-                # Internal note
-                internal_notes.append({
-                    'timestamp': timestamp,
-                    'note': comment[:250]
-                })
-
-        # Return structured data (keep last N messages for each thread)
-        return {
-            'customer_thread': customer_messages[-4:],  # Last 4 customer exchanges
-            'supplier_thread': supplier_messages[-4:],  # Last 4 supplier exchanges
-            'internal_notes': internal_notes[-3:]  # Last 3 internal notes
-        }
+        return self.conversation_summarizer.ticket_history(ticket_data)
 
 
     def _resolve_supplier_language(self, ticket_data: dict) -> str:
@@ -2073,10 +2154,13 @@ class SupportAgentOrchestrator:
                 detected_language=analysis.get('language', 'unknown'),
                 detected_intent=analysis.get('intent', 'unknown'),
                 confidence_score=analysis.get('confidence', 0.0),
+                tier=analysis.get('tier'),
                 recommended_action=analysis.get('summary', ''),
                 response_generated=str(analysis.get('customer_response', '')),
                 action_taken='pending_approval',
-                deployment_phase=settings.deployment_phase
+                deployment_phase=settings.deployment_phase,
+                **prompt_token_fields(analysis),
+                **call_telemetry_fields(analysis)
             )
             session.add(decision_log)
             session.flush()
@@ -0,0 +1,367 @@
+"""
+Circuit Breaker
+Stops calling a dependency that is clearly down and probes it before resuming
+
+States:
+- closed: calls pass through; consecutive failures are counted
+- open: calls fail immediately with CircuitOpenError until the recovery timeout passes
+- half_open: a limited number of probe calls are let through; a success closes
+  the circuit, a failure re-opens it with a longer (exponentially backed off) timeout
+
+Breakers live per process. State transitions are published to system_settings
+(see runtime_status) so the web API can show the poller's breakers.
+"""
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import structlog
+
+from config.settings import settings
+from src.utils.rate_limiter import RateLimitExceeded
+
+logger = structlog.get_logger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.0f}s")
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """
+    Decide whether an exception means the dependency is unhealthy
+
+    Client errors (4xx other than 408/429) are caused by the request, not by the
+    dependency, and local limiter/breaker errors never reached it.
+    """
+    if isinstance(error, (CircuitOpenError, RateLimitExceeded)):
+        return False
+
+    for candidate in (error, getattr(error, 'response', None), getattr(error, 'resp', None)):
+        if candidate is None:
+            continue
+        for attr in ('status_code', 'status'):
+            try:
+                status = int(getattr(candidate, attr, None))
+            except (TypeError, ValueError):
+                continue
+            if 400 <= status < 500 and status not in (408, 429):
+                return False
+            return True
+
+    return True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one dependency
+
+    Args:
+        name: Dependency name ('ticketing', 'ai_openai', ...)
+        failure_threshold: Consecutive failures before opening
+        recovery_seconds: Initial open duration before probing
+        max_recovery_seconds: Upper bound for the backed-off open duration
+        half_open_max_calls: Concurrent probe calls allowed while half-open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        recovery_seconds: Optional[float] = None,
+        max_recovery_seconds: Optional[float] = None,
+        half_open_max_calls: Optional[int] = None
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.circuit_breaker_failure_threshold
+        self.recovery_seconds = recovery_seconds or settings.circuit_breaker_recovery_seconds
+        self.max_recovery_seconds = max_recovery_seconds or settings.circuit_breaker_max_recovery_seconds
+        self.half_open_max_calls = half_open_max_calls or settings.circuit_breaker_half_open_max_calls
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0  # Consecutive openings, drives the backoff
+        self.opened_at: Optional[float] = None
+        self.open_until: Optional[float] = None
+        self.half_open_in_flight = 0
+        self.last_error: Optional[str] = None
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    # ------------------------------------------------------------------
+    # State checks
+    # ------------------------------------------------------------------
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit may be probed (0 if closed/half-open)"""
+        with self._lock:
+            if self.state != OPEN or self.open_until is None:
+                return 0.0
+            return max(0.0, self.open_until - time.time())
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected without probing"""
+        with self._lock:
+            return self.state == OPEN and self.open_until is not None and time.time() < self.open_until
+
+    def retry_at(self) -> datetime:
+        """UTC datetime when work parked for this circuit should be retried"""
+        return datetime.utcnow() + timedelta(seconds=self.retry_after())
+
+    def _before_call(self) -> None:
+        """Admit or reject a call, moving open -> half_open when the timeout expired"""
+        transition = None
+        with self._lock:
+            now = time.time()
+            if self.state == OPEN:
+                if now < self.open_until:
+                    self.total_rejected += 1
+                    raise CircuitOpenError(self.name, self.open_until - now)
+                self.state = HALF_OPEN
+                self.half_open_in_flight = 0
+                transition = HALF_OPEN
+
+            if self.state == HALF_OPEN:
+                if self.half_open_in_flight >= self.half_open_max_calls:
+                    self.total_rejected += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self.half_open_in_flight += 1
+
+        if transition:
+            logger.info("Circuit half-open, probing dependency", circuit=self.name)
+            self._publish()
+
+    def _on_success(self) -> None:
+        transition = None
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+                self.state = CLOSED
+                self.open_count = 0
+                self.opened_at = None
+                self.open_until = None
+                transition = CLOSED
+            self.consecutive_failures = 0
+
+        if transition:
+            logger.info("Circuit closed, dependency recovered", circuit=self.name)
+            self._publish()
+
+    def _on_failure(self, error: BaseException) -> None:
+        transition = None
+        with self._lock:
+            self.total_failures += 1
+            self.last_error = f"{type(error).__name__}: {str(error)[:200]}"
+            if self.state == HALF_OPEN:
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+                transition = self._open()
+            else:
+                self.consecutive_failures += 1
+                if self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                    transition = self._open()
+
+        if transition:
+            logger.warning(
+                "Circuit opened",
+                circuit=self.name,
+                open_seconds=round(self.open_until - self.opened_at, 1),
+                last_error=self.last_error
+            )
+            self._publish()
+
+    def _open(self) -> str:
+        """Open the circuit (lock must be held)"""
+        now = time.time()
+        duration = min(self.max_recovery_seconds, self.recovery_seconds * (2 ** self.open_count))
+        self.open_count += 1
+        self.state = OPEN
+        self.opened_at = now
+        self.open_until = now + duration
+        self.consecutive_failures = 0
+        return OPEN
+
+    def _release_probe(self) -> None:
+        """Release a half-open slot for calls that neither succeeded nor failed the dependency"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    # ------------------------------------------------------------------
+    # Calling
+    # ------------------------------------------------------------------
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Invoke func through the breaker
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        if not settings.circuit_breaker_enabled:
+            return func(*args, **kwargs)
+
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._record_exception(e)
+            raise
+        self._on_success()
+        return result
+
+    def _record_exception(self, error: Exception) -> None:
+        """Update state for a call that raised"""
+        if isinstance(error, (CircuitOpenError, RateLimitExceeded)):
+            # Never reached the dependency
+            self._release_probe()
+        elif is_dependency_failure(error):
+            self._on_failure(error)
+        else:
+            # The dependency answered (e.g. 404), which proves it is reachable
+            self._on_success()
+
+    async def acall(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await func() through the breaker
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        async with self.aguard():
+            return await func()
+
+    @asynccontextmanager
+    async def aguard(self):
+        """
+        Async context manager guarding a block (e.g. consuming a response stream)
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        if not settings.circuit_breaker_enabled:
+            yield
+            return
+
+        self._before_call()
+        try:
+            yield
+        except Exception as e:
+            self._record_exception(e)
+            raise
+        except BaseException:
+            # Cancelled or closed early: no verdict on the dependency
+            self._release_probe()
+            raise
+        self._on_success()
+
+    def reset(self) -> None:
+        """Force the circuit closed (manual override)"""
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.open_count = 0
+            self.opened_at = None
+            self.open_until = None
+            self.half_open_in_flight = 0
+        logger.info("Circuit manually reset", circuit=self.name)
+        self._publish()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current breaker state as a dict"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'open_count': self.open_count,
+                'opened_at': datetime.utcfromtimestamp(self.opened_at).isoformat() if self.opened_at else None,
+                'open_until': datetime.utcfromtimestamp(self.open_until).isoformat() if self.open_until else None,
+                'retry_after_seconds': round(max(0.0, self.open_until - time.time()), 1)
+                if self.state == OPEN and self.open_until else 0.0,
+                'last_error': self.last_error,
+                'total_failures': self.total_failures,
+                'total_rejected': self.total_rejected,
+            }
+
+    def _publish(self) -> None:
+        from src.utils.runtime_status import publish_status
+        publish_status(f"circuit_breaker:{self.name}", self.snapshot())
+
+
+class CircuitBreakerClient:
+    """
+    Transparent proxy routing every public method call through a circuit breaker
+
+    Args:
+        target: Wrapped client
+        name: Breaker name
+    """
+
+    def __init__(self, target: Any, name: str):
+        self._target = target
+        self._breaker = get_breaker(name)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        breaker = self._breaker
+
+        def guarded(*args, **kwargs):
+            return breaker.call(attr, *args, **kwargs)
+
+        guarded.__name__ = name
+        guarded.__doc__ = getattr(attr, '__doc__', None)
+        return guarded
+
+
+# ----------------------------------------------------------------------
+# Registry
+# ----------------------------------------------------------------------
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get (or create) the process-wide breaker for a dependency"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name)
+                _breakers[name] = breaker
+    return breaker
+
+
+def circuit_protected(target: Any, name: str) -> Any:
+    """Wrap a client with a circuit breaker (returns target unchanged when disabled)"""
+    if not settings.circuit_breaker_enabled:
+        return target
+    return CircuitBreakerClient(target, name)
+
+
+def open_circuits(names: List[str]) -> List[CircuitBreaker]:
+    """Return the breakers among names that are currently open"""
+    if not settings.circuit_breaker_enabled:
+        return []
+    return [get_breaker(name) for name in names if get_breaker(name).is_open()]
+
+
+def get_breaker_snapshots() -> List[Dict[str, Any]]:
+    """Snapshots of all breakers created in this process"""
+    return [breaker.snapshot() for breaker in _breakers.values()]
@@ -0,0 +1,294 @@
+"""
+Email Priority Scheduler
+Orders inbound emails by urgency instead of the order Gmail returns them
+
+Each queued email gets a score from:
+- sender class: customer > Amazon notification > supplier
+- age relative to the customer SLA (settings.customer_sla_hours, Amazon requires 24h)
+- escalation keywords (legal threats, A-to-z claims, chargebacks, ...)
+- order value (TicketState.order_total >= settings.high_value_order_threshold)
+
+Emails are dequeued highest score first (oldest first on ties). The time
+remaining until SLA breach is attached to every scheduled email and
+summarized in a published 'email_queue' runtime status.
+"""
+import heapq
+import itertools
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+CUSTOMER = 'customer'
+AMAZON = 'amazon'
+SUPPLIER = 'supplier'
+
+# Score contributions
+SENDER_CLASS_SCORES = {
+    CUSTOMER: 40.0,
+    AMAZON: 30.0,
+    SUPPLIER: 10.0,
+}
+SLA_URGENCY_MAX_SCORE = 40.0   # Reached when the SLA deadline is hit
+SLA_BREACHED_BONUS = 20.0      # Extra for already breached emails
+ESCALATION_SCORE = 25.0
+HIGH_VALUE_SCORE = 15.0
+
+# Sender classes bound by the customer response SLA
+SLA_SENDER_CLASSES = (CUSTOMER, AMAZON)
+
+ESCALATION_KEYWORDS = [
+    # German
+    'anwalt', 'rechtsanwalt', 'verbraucherzentrale', 'anzeige', 'betrug', 'dringend', 'sofort',
+    'letzte mahnung', 'frist', 'a-bis-z', 'a-z-garantie', 'rückbuchung',
+    # English
+    'lawyer', 'attorney', 'legal action', 'fraud', 'scam', 'urgent', 'immediately', 'chargeback',
+    'a-to-z', 'a-z guarantee', 'final notice', 'negative feedback',
+    # French
+    'avocat', 'plainte', 'arnaque', 'urgent', 'immédiatement', 'garantie a à z', 'mise en demeure',
+]
+_ESCALATION_PATTERN = re.compile('|'.join(re.escape(k) for k in sorted(set(ESCALATION_KEYWORDS), key=len, reverse=True)))
+
+
+class ScheduledEmail:
+    """An email with its priority score and SLA metrics"""
+
+    def __init__(self, email_data: Dict[str, Any], sender_class: str, score: float,
+                 received_at: datetime, sla_remaining_minutes: Optional[float], reasons: List[str]):
+        self.email_data = email_data
+        self.sender_class = sender_class
+        self.score = score
+        self.received_at = received_at
+        self.sla_remaining_minutes = sla_remaining_minutes
+        self.reasons = reasons
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'gmail_id': self.email_data.get('id'),
+            'sender_class': self.sender_class,
+            'score': round(self.score, 1),
+            'received_at': self.received_at.isoformat(),
+            'sla_remaining_minutes': round(self.sla_remaining_minutes, 1) if self.sla_remaining_minutes is not None else None,
+            'reasons': self.reasons,
+        }
+
+
+class EmailPriorityScheduler:
+    """
+    Priority queue of inbound emails
+
+    Args:
+        session_maker: SQLAlchemy sessionmaker (used for supplier and order value lookups)
+        email_source: EmailSource used for identifier extraction
+        sla_hours: Customer response SLA (defaults to settings.customer_sla_hours)
+    """
+
+    SUPPLIER_CACHE_SECONDS = 300
+
+    def __init__(self, session_maker, email_source, sla_hours: Optional[float] = None):
+        self.SessionMaker = session_maker
+        self.email_source = email_source
+        self.sla_hours = sla_hours or settings.customer_sla_hours
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._supplier_addresses: set = set()
+        self._supplier_domains: set = set()
+        self._supplier_cache_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # ------------------------------------------------------------------
+    # Classification
+    # ------------------------------------------------------------------
+
+    def _refresh_supplier_cache(self, session) -> None:
+        """Load known supplier addresses/domains (cached for a few minutes)"""
+        if time.monotonic() - self._supplier_cache_at < self.SUPPLIER_CACHE_SECONDS:
+            return
+
+        from src.database.models import Supplier, PendingMessage
+
+        addresses = set()
+        for supplier in session.query(Supplier).all():
+            for address in [supplier.default_email, *(supplier.contact_fields or {}).values()]:
+                if address and '@' in str(address):
+                    addresses.add(str(address).strip().lower())
+
+        recipients = session.query(PendingMessage.recipient_email).filter(
+            PendingMessage.message_type == 'supplier',
+            PendingMessage.recipient_email.isnot(None)
+        ).distinct().all()
+        for (recipient,) in recipients:
+            if recipient and '@' in recipient:
+                addresses.add(recipient.strip().lower())
+
+        self._supplier_addresses = addresses
+        self._supplier_domains = {a.split('@')[-1] for a in addresses}
+        self._supplier_cache_at = time.monotonic()
+
+    def classify_sender(self, from_field: str, mentions_purchase_order: bool = False) -> str:
+        """
+        Classify the sender of an email
+
+        Args:
+            from_field: From header value
+            mentions_purchase_order: Whether the email references one of our PO numbers
+
+        Returns:
+            'customer', 'amazon' or 'supplier'
+        """
+        _, address = self.email_source.parse_sender_info(from_field or '')
+        address = address.lower()
+        domain = address.split('@')[-1] if '@' in address else ''
+
+        if 'marketplace.amazon.' in domain:
+            return CUSTOMER
+        if address.startswith('donotreply@amazon') or domain.startswith('amazon.') or '.amazon.' in domain:
+            return AMAZON
+        if address in self._supplier_addresses or domain in self._supplier_domains:
+            return SUPPLIER
+        # Customers never see our PO numbers, so unknown senders quoting one are suppliers
+        if mentions_purchase_order:
+            return SUPPLIER
+        # Other unknown senders are treated as customers so they never miss the SLA
+        return CUSTOMER
+
+    @staticmethod
+    def _received_at(email_data: Dict[str, Any]) -> datetime:
+        date = email_data.get('date')
+        if not isinstance(date, datetime):
+            return datetime.now(timezone.utc)
+        if date.tzinfo is None:
+            # Naive dates come from datetime.now() fallbacks in the sources
+            return date.astimezone(timezone.utc)
+        return date
+
+    def _order_value(self, session, email_data: Dict[str, Any]) -> Optional[float]:
+        """Look up the known order value for the email's ticket/order"""
+        from src.database.models import TicketState
+
+        identifiers = self.email_source.extract_identifiers(email_data.get('subject') or '', email_data.get('body') or '')
+        query = None
+        if identifiers.get('ticket_number'):
+            query = session.query(TicketState.order_total).filter(TicketState.ticket_number == identifiers['ticket_number'])
+        elif identifiers.get('order_number'):
+            query = session.query(TicketState.order_total).filter(TicketState.order_number == identifiers['order_number'])
+        elif identifiers.get('purchase_order_number'):
+            query = session.query(TicketState.order_total).filter(
+                TicketState.purchase_order_number == identifiers['purchase_order_number']
+            )
+        if query is None:
+            return None
+        row = query.first()
+        return row[0] if row and row[0] is not None else None
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def score(self, email_data: Dict[str, Any], session=None, now: Optional[datetime] = None) -> ScheduledEmail:
+        """
+        Score a single email
+
+        Args:
+            email_data: Email data dict
+            session: Optional open database session
+            now: Reference time (defaults to now)
+
+        Returns:
+            ScheduledEmail with score, reasons and SLA metrics
+        """
+        now = now or datetime.now(timezone.utc)
+        subject = email_data.get('subject') or ''
+        body = email_data.get('body') or ''
+        mentions_po = bool(
+            self.email_source.extract_purchase_order_number(subject) or
+            self.email_source.extract_purchase_order_number(body)
+        )
+        sender_class = self.classify_sender(email_data.get('from', ''), mentions_purchase_order=mentions_po)
+        received_at = self._received_at(email_data)
+        reasons = [sender_class]
+        score = SENDER_CLASS_SCORES[sender_class]
+
+        sla_remaining = None
+        if sender_class in SLA_SENDER_CLASSES:
+            age_hours = max(0.0, (now - received_at).total_seconds() / 3600)
+            sla_remaining = (self.sla_hours - age_hours) * 60
+            score += SLA_URGENCY_MAX_SCORE * min(1.0, age_hours / self.sla_hours)
+            if sla_remaining <= 0:
+                score += SLA_BREACHED_BONUS
+                reasons.append('sla_breached')
+            elif sla_remaining <= 0.25 * self.sla_hours * 60:
+                reasons.append('sla_near')
+
+        text = f"{subject}\n{body}".lower()
+        keyword = _ESCALATION_PATTERN.search(text)
+        if keyword:
+            score += ESCALATION_SCORE
+            reasons.append(f"keyword:{keyword.group(0)}")
+
+        if session is not None:
+            try:
+                order_value = self._order_value(session, email_data)
+                if order_value is not None and order_value >= settings.high_value_order_threshold:
+                    score += HIGH_VALUE_SCORE
+                    reasons.append('high_value')
+            except Exception as e:
+                logger.debug("Order value lookup failed", gmail_id=email_data.get('id'), error=str(e))
+
+        return ScheduledEmail(email_data, sender_class, score, received_at, sla_remaining, reasons)
+
+    # ------------------------------------------------------------------
+    # Queue operations
+    # ------------------------------------------------------------------
+
+    def push_many(self, messages: List[Dict[str, Any]]) -> None:
+        """Score and enqueue a batch of emails"""
+        session = self.SessionMaker()
+        try:
+            try:
+                self._refresh_supplier_cache(session)
+            except Exception as e:
+                logger.warning("Failed to load supplier addresses for scheduling", error=str(e))
+            now = datetime.now(timezone.utc)
+            for email_data in messages:
+                self.push(self.score(email_data, session=session, now=now))
+        finally:
+            session.close()
+
+    def push(self, item: ScheduledEmail) -> None:
+        heapq.heappush(self._heap, (-item.score, item.received_at.timestamp(), next(self._counter), item))
+
+    def pop(self) -> Optional[ScheduledEmail]:
+        """Dequeue the highest priority email (None if empty)"""
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[-1]
+
+    def drain(self):
+        """Yield queued emails in priority order"""
+        while self._heap:
+            yield self.pop()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue metrics, including time remaining until the nearest SLA breach"""
+        items = [entry[-1] for entry in self._heap]
+        sla_items = [i.sla_remaining_minutes for i in items if i.sla_remaining_minutes is not None]
+        by_class: Dict[str, int] = {}
+        for item in items:
+            by_class[item.sender_class] = by_class.get(item.sender_class, 0) + 1
+        return {
+            'queued': len(items),
+            'by_sender_class': by_class,
+            'sla_hours': self.sla_hours,
+            'min_sla_remaining_minutes': round(min(sla_items), 1) if sla_items else None,
+            'sla_breached': sum(1 for m in sla_items if m <= 0),
+            'sla_at_risk': sum(1 for m in sla_items if 0 < m <= 0.25 * self.sla_hours * 60),
+            'top': [item.to_dict() for item in sorted(items, key=lambda i: -i.score)[:10]],
+        }
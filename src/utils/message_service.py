@@ -112,32 +112,20 @@ class MessageService:
                 # Add warning to message body so humans can see it
                 body = f"⚠️ WARNING: AI used {detected_lang} instead of {customer_language}\n\n{body}"
 
-            # WATERPROOF LAYER 2: Check for unverified refund claims
-            refund_forbidden_phrases = [
-                'refund has been processed',
-                'refund has been issued',
-                'refund has been approved',
-                'you will receive a refund',
-                'we have refunded',
-                'your refund is on the way',
-                'refund wurde bearbeitet',
-                'rückerstattung wurde bearbeitet',
-                'rückerstattung erfolgt',
-                'sie erhalten eine rückerstattung'
-            ]
-
-            message_lower = message_body.lower()
-            for phrase in refund_forbidden_phrases:
-                if phrase in message_lower:
-                    logger.error(
-                        "🚨 UNVERIFIED REFUND CLAIM DETECTED!",
-                        ticket_number=ticket_state.ticket_number,
-                        forbidden_phrase=phrase,
-                        message_preview=message_body[:300]
-                    )
-                    # Add critical warning to message body
-                    body = f"🚨 CRITICAL WARNING: Message contains unverified refund claim: '{phrase}'\n\n{body}"
-                    break
+            # WATERPROOF LAYER 2: Check for blocked promises (unverified refund claims and
+            # the phrases configured under /api/blocked-phrases)
+            from src.utils.phrase_guard import phrase_guard
+            hits = phrase_guard.scan(message_body, customer_language)
+            if hits:
+                logger.error(
+                    "🚨 BLOCKED PHRASE DETECTED!",
+                    ticket_number=ticket_state.ticket_number,
+                    blocked_phrases=[hit['matched'] for hit in hits],
+                    categories=sorted({hit['category'] or 'uncategorized' for hit in hits}),
+                    message_preview=message_body[:300]
+                )
+                # Add critical warning to message body
+                body = f"{self._blocked_phrase_warning(hits)}\n\n{body}"
 
         elif message_type == "internal":
             subject = f"AI Agent Note - Ticket {ticket_state.ticket_number}"
@@ -187,6 +175,17 @@ class MessageService:
 
         return pending_message
 
+    @staticmethod
+    def _blocked_phrase_warning(hits: List[Dict[str, Any]]) -> str:
+        """Reviewer warning listing blocked phrase hits and what to say instead"""
+        lines = ["🚨 CRITICAL WARNING: Message contains blocked phrases:"]
+        for hit in hits:
+            line = f"- '{hit['matched']}' (position {hit['start']})"
+            if hit['suggested_alternative']:
+                line += f" -> {hit['suggested_alternative']}"
+            lines.append(line)
+        return '\n'.join(lines)
+
     def send_pending_message(
         self,
         pending_message_id: int,
@@ -0,0 +1,263 @@
+"""
+Phrase Guard
+Scans drafts for blocked promise phrases (BlockedPromisePhrase) in one pass
+
+Enabled phrases are compiled per base language ('de' for 'de-DE'): literal
+phrases into one Aho-Corasick automaton, regex phrases into one combined
+regex. Scanning a draft is a single walk over the text plus one regex scan,
+so the cost stays flat as the phrase list grows.
+
+A small built-in list of unverified refund claims is checked on drafts of
+every language, so the guard works before any phrases are configured.
+
+The guard recompiles when the phrase table changes: the blocked-phrase
+endpoints invalidate it directly, other processes notice the changed table
+signature within settings.phrase_guard_refresh_seconds.
+"""
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+# Unverified refund claims (formerly hardcoded in MessageService)
+# Checked on drafts of every language
+BUILTIN_PHRASES = [
+    'refund has been processed',
+    'refund has been issued',
+    'refund has been approved',
+    'you will receive a refund',
+    'we have refunded',
+    'your refund is on the way',
+    'refund wurde bearbeitet',
+    'rückerstattung wurde bearbeitet',
+    'rückerstattung erfolgt',
+    'sie erhalten eine rückerstattung',
+]
+ANY_LANGUAGE = '*'
+BUILTIN_CATEGORY = 'refund_claim'
+BUILTIN_ALTERNATIVE = "Only confirm a refund once it is recorded as processed; say that we are reviewing it instead."
+
+
+def base_language(language: Optional[str]) -> str:
+    return (language or '').split('-')[0].lower()
+
+
+def _lower_same_length(text: str) -> str:
+    """Lowercase text without shifting positions (a few characters lowercase to two)"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over lowercase literal phrases"""
+
+    def __init__(self, phrases: List[Tuple[str, int]]):
+        """
+        Args:
+            phrases: (phrase, payload index) pairs; phrases are matched case-insensitively
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, int]]] = [[]]  # (phrase length, payload index)
+
+        for phrase, payload in phrases:
+            state = 0
+            for ch in phrase:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(phrase), payload))
+
+        # Breadth-first failure links; outputs of the failure state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """All (start, end, payload index) matches in lowercase text, overlapping ones included"""
+        matches = []
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, payload in output[state]:
+                matches.append((position + 1 - length, position + 1, payload))
+        return matches
+
+
+class _CompiledLanguage:
+    """Automaton and combined regex of one base language"""
+
+    def __init__(self, phrases: List[Dict[str, Any]]):
+        self.phrases = phrases
+        literals = [
+            (phrase['phrase'].strip().lower(), index)
+            for index, phrase in enumerate(phrases) if not phrase['is_regex'] and phrase['phrase'].strip()
+        ]
+        self.automaton = AhoCorasick(literals) if literals else None
+
+        parts = []
+        for index, phrase in enumerate(phrases):
+            if not phrase['is_regex']:
+                continue
+            part = f"(?P<p{index}>{phrase['phrase']})"
+            try:
+                re.compile(part)
+            except re.error as e:
+                logger.warning("Skipping invalid blocked phrase regex", phrase_id=phrase['id'], error=str(e))
+                continue
+            parts.append(part)
+        self.regex = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+
+    def scan(self, text: str) -> List[Tuple[int, int, int]]:
+        matches = self.automaton.find_all(_lower_same_length(text)) if self.automaton else []
+        if self.regex:
+            for match in self.regex.finditer(text):
+                if match.end() > match.start():
+                    matches.append((match.start(), match.end(), int(match.lastgroup[1:])))
+        return matches
+
+
+class PhraseGuard:
+    """Compiled blocked phrases of all languages"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._languages: Dict[str, _CompiledLanguage] = {}
+        self._signature: Optional[Tuple[Any, ...]] = None
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        """Recompile on the next scan (call after creating, updating or deleting phrases)"""
+        self._checked_at = 0.0
+        self._signature = None
+
+    def _refresh(self) -> None:
+        if time.monotonic() - self._checked_at < settings.phrase_guard_refresh_seconds:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < settings.phrase_guard_refresh_seconds:
+                return
+            from sqlalchemy import func
+            from src.database.models import BlockedPromisePhrase
+            from src.utils.runtime_status import get_session_maker
+
+            phrases = None
+            db = get_session_maker()()
+            try:
+                signature = tuple(db.query(
+                    func.count(BlockedPromisePhrase.id),
+                    func.max(BlockedPromisePhrase.id),
+                    func.max(BlockedPromisePhrase.updated_at)
+                ).one())
+                if signature != self._signature or not self._languages:
+                    rows = db.query(BlockedPromisePhrase).filter(BlockedPromisePhrase.enabled == True).all()
+                    phrases = [{
+                        'id': row.id,
+                        'language': row.language,
+                        'phrase': row.phrase or '',
+                        'is_regex': bool(row.is_regex),
+                        'category': row.category,
+                        'description': row.description,
+                        'suggested_alternative': row.suggested_alternative,
+                    } for row in rows]
+                    self._signature = signature
+            except Exception as e:
+                logger.warning("Failed to load blocked phrases", error=str(e))
+                if not self._languages:
+                    phrases = []
+            finally:
+                db.close()
+            if phrases is not None:
+                self._compile(phrases)
+            self._checked_at = time.monotonic()
+
+    def _compile(self, phrases: List[Dict[str, Any]]) -> None:
+        started = time.monotonic()
+        by_language: Dict[str, List[Dict[str, Any]]] = {}
+        for phrase in BUILTIN_PHRASES:
+            by_language.setdefault(ANY_LANGUAGE, []).append({
+                'id': None,
+                'language': ANY_LANGUAGE,
+                'phrase': phrase,
+                'is_regex': False,
+                'category': BUILTIN_CATEGORY,
+                'description': 'Unverified refund claim',
+                'suggested_alternative': BUILTIN_ALTERNATIVE,
+            })
+        for phrase in phrases:
+            by_language.setdefault(base_language(phrase['language']), []).append(phrase)
+        self._languages = {language: _CompiledLanguage(items) for language, items in by_language.items()}
+        logger.info(
+            "Compiled blocked phrases",
+            phrases=len(phrases),
+            languages=sorted(self._languages),
+            duration_ms=round((time.monotonic() - started) * 1000, 1)
+        )
+
+    def scan(self, text: str, language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Find blocked phrases in a draft
+
+        Args:
+            text: Draft text
+            language: Draft language code; phrases of its base language and the
+                built-in ones are checked (all languages when unknown)
+
+        Returns:
+            Hits ordered by position, each with phrase_id (None for built-in
+            phrases), phrase, matched text, start, end, category, description
+            and suggested_alternative
+        """
+        self._refresh()
+        if not text:
+            return []
+        if language:
+            compiled = [
+                self._languages[key] for key in (ANY_LANGUAGE, base_language(language)) if key in self._languages
+            ]
+        else:
+            compiled = list(self._languages.values())
+
+        hits = []
+        for language_phrases in compiled:
+            for start, end, index in language_phrases.scan(text):
+                phrase = language_phrases.phrases[index]
+                hits.append({
+                    'phrase_id': phrase['id'],
+                    'phrase': phrase['phrase'],
+                    'matched': text[start:end],
+                    'start': start,
+                    'end': end,
+                    'category': phrase['category'],
+                    'description': phrase['description'],
+                    'suggested_alternative': phrase['suggested_alternative'],
+                })
+        hits.sort(key=lambda hit: (hit['start'], hit['end']))
+        return hits
+
+
+# Shared per process
+phrase_guard = PhraseGuard()
@@ -0,0 +1,573 @@
+"""
+Rate Limiter
+Shared per-dependency token buckets with adaptive backpressure
+
+Every external dependency (Gmail, ticketing API, each AI provider) gets a
+token bucket stored in the rate_limit_buckets table, so the poller and the
+web API processes draw from the same budget. Tokens are taken with a single
+conditional UPDATE, which keeps acquisition atomic across processes.
+
+On top of the shared rate, each process keeps an adaptive concurrency limit
+(AIMD): it grows slowly while calls are fast and healthy, and is halved on
+throttling (HTTP 429) or when latency exceeds the dependency's target. The
+shared refill rate is adapted the same way, so throughput degrades
+gracefully instead of failing in cascades.
+
+Low-priority callers (UI-triggered reprocessing) cannot take the last
+fraction of a bucket (settings.rate_limit_low_priority_reserve), so a
+reprocess storm cannot starve the email poller.
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import structlog
+from sqlalchemy import text
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+# Priority of calls made in the current context ('normal' or 'low')
+rate_limit_priority: ContextVar[str] = ContextVar('rate_limit_priority', default='normal')
+
+# Target latency per dependency; slower calls shrink the adaptive limits
+LATENCY_TARGETS_SECONDS = {
+    'gmail': 2.0,
+    'ticketing': 3.0,
+    'ai': 30.0,
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a token could not be acquired within the maximum wait time"""
+
+    def __init__(self, dependency: str, waited: float):
+        self.dependency = dependency
+        self.waited = waited
+        super().__init__(f"Rate limit for '{dependency}' not available after {waited:.1f}s")
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """
+    Detect quota/throttling errors across client libraries
+
+    Checks common status code attributes (requests, googleapiclient, openai,
+    anthropic) and falls back to the error message.
+    """
+    for candidate in (error, getattr(error, 'response', None), getattr(error, 'resp', None)):
+        if candidate is None:
+            continue
+        for attr in ('status_code', 'status', 'code'):
+            value = getattr(candidate, attr, None)
+            try:
+                if int(value) == 429:
+                    return True
+            except (TypeError, ValueError):
+                continue
+
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'quota' in message or 'too many requests' in message
+
+
+def _base_rate(dependency: str) -> float:
+    """Configured requests per second for a dependency"""
+    if dependency == 'gmail':
+        return settings.rate_limit_gmail_per_second
+    if dependency == 'ticketing':
+        return settings.rate_limit_ticketing_per_second
+    return settings.rate_limit_ai_per_second
+
+
+def _latency_target(dependency: str) -> float:
+    return LATENCY_TARGETS_SECONDS.get(dependency.split('_')[0], LATENCY_TARGETS_SECONDS['ai'])
+
+
+class DependencyLimiter:
+    """
+    Token bucket + adaptive concurrency limit for one dependency
+
+    Args:
+        name: Dependency name ('gmail', 'ticketing', 'ai_openai', ...)
+        session_maker: SQLAlchemy sessionmaker used for the shared bucket
+    """
+
+    # Adaptive tuning
+    MIN_RATE_FRACTION = 0.1      # Never adapt below 10% of the configured rate
+    RATE_INCREASE_FRACTION = 0.05  # Additive increase per healthy adjustment window
+    ADJUST_INTERVAL_SECONDS = 1.0
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, name: str, session_maker):
+        self.name = name
+        self.SessionMaker = session_maker
+        self.base_rate = _base_rate(name)
+        self.capacity = max(1.0, self.base_rate * settings.rate_limit_burst_seconds)
+        self.latency_target = _latency_target(name)
+
+        # Process-local adaptive concurrency
+        self._lock = threading.Condition()
+        self.max_concurrency = settings.rate_limit_max_concurrency
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+
+        # Process-local health metrics
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.throttled = 0
+        self.calls = 0
+        self._last_adjust = 0.0
+        self._pending_rate_factor: Optional[float] = None
+
+        # Fallback bucket if the database is unavailable
+        self._local_tokens = self.capacity
+        self._local_refill = time.time()
+
+        self._ensure_bucket()
+
+    def _ensure_bucket(self) -> None:
+        """Create the shared bucket row if missing and apply config changes"""
+        session = self.SessionMaker()
+        try:
+            session.execute(
+                text("""
+                    INSERT OR IGNORE INTO rate_limit_buckets
+                        (name, tokens, capacity, rate, base_rate, last_refill, throttled_count, updated_at)
+                    VALUES (:name, :capacity, :capacity, :rate, :rate, :now, 0, CURRENT_TIMESTAMP)
+                """),
+                {'name': self.name, 'capacity': self.capacity, 'rate': self.base_rate, 'now': time.time()}
+            )
+            # Configuration may have changed since the row was created
+            session.execute(
+                text("""
+                    UPDATE rate_limit_buckets
+                    SET capacity = :capacity, base_rate = :rate, rate = MIN(rate, :rate)
+                    WHERE name = :name AND (capacity != :capacity OR base_rate != :rate)
+                """),
+                {'name': self.name, 'capacity': self.capacity, 'rate': self.base_rate}
+            )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning("Failed to initialize rate limit bucket", dependency=self.name, error=str(e))
+        finally:
+            session.close()
+
+    # ------------------------------------------------------------------
+    # Token acquisition
+    # ------------------------------------------------------------------
+
+    def _try_take(self, floor: float) -> Optional[float]:
+        """
+        Try to take one token from the shared bucket
+
+        Args:
+            floor: Tokens that must remain after taking (reserve for higher priority)
+
+        Returns:
+            None if a token was taken, otherwise seconds until one is likely available
+        """
+        now = time.time()
+        session = self.SessionMaker()
+        try:
+            result = session.execute(
+                text("""
+                    UPDATE rate_limit_buckets
+                    SET tokens = MIN(capacity, tokens + (:now - last_refill) * rate) - 1,
+                        last_refill = :now
+                    WHERE name = :name
+                      AND MIN(capacity, tokens + (:now - last_refill) * rate) >= :needed
+                """),
+                {'name': self.name, 'now': now, 'needed': floor + 1}
+            )
+            session.commit()
+            if result.rowcount:
+                return None
+
+            row = session.execute(
+                text("SELECT tokens, capacity, rate, last_refill FROM rate_limit_buckets WHERE name = :name"),
+                {'name': self.name}
+            ).fetchone()
+            if not row:
+                self._ensure_bucket()
+                return 0.05
+            tokens, capacity, rate, last_refill = row
+            available = min(capacity, tokens + (now - last_refill) * rate)
+            return max(0.01, (floor + 1 - available) / max(rate, 1e-6))
+        except Exception as e:
+            session.rollback()
+            logger.warning("Shared rate limit unavailable, using local bucket", dependency=self.name, error=str(e))
+            return self._try_take_local(floor)
+        finally:
+            session.close()
+
+    def _try_take_local(self, floor: float) -> Optional[float]:
+        """Process-local fallback bucket"""
+        now = time.time()
+        self._local_tokens = min(self.capacity, self._local_tokens + (now - self._local_refill) * self.base_rate)
+        self._local_refill = now
+        if self._local_tokens >= floor + 1:
+            self._local_tokens -= 1
+            return None
+        return max(0.01, (floor + 1 - self._local_tokens) / self.base_rate)
+
+    def acquire(self, priority: Optional[str] = None, max_wait: Optional[float] = None) -> None:
+        """
+        Block until both a concurrency slot and a rate token are available
+
+        Args:
+            priority: 'normal' or 'low' (defaults to the context priority)
+            max_wait: Maximum seconds to wait (defaults to settings.rate_limit_max_wait_seconds)
+
+        Raises:
+            RateLimitExceeded: If no capacity became available in time
+        """
+        priority = priority or rate_limit_priority.get()
+        max_wait = settings.rate_limit_max_wait_seconds if max_wait is None else max_wait
+        floor = self.capacity * settings.rate_limit_low_priority_reserve if priority == 'low' else 0.0
+        started = time.monotonic()
+        deadline = started + max_wait
+
+        # Concurrency slot
+        with self._lock:
+            while self.in_flight >= int(self.concurrency_limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitExceeded(self.name, time.monotonic() - started)
+                self._lock.wait(timeout=remaining)
+            self.in_flight += 1
+
+        # Rate token
+        try:
+            while True:
+                wait = self._try_take(floor)
+                if wait is None:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitExceeded(self.name, time.monotonic() - started)
+                time.sleep(min(wait, remaining, 1.0))
+        except BaseException:
+            self._release_slot()
+            raise
+
+    async def aacquire(self, priority: Optional[str] = None, max_wait: Optional[float] = None) -> None:
+        """
+        Async variant of acquire() that waits without blocking the event loop
+
+        Raises:
+            RateLimitExceeded: If no capacity became available in time
+        """
+        priority = priority or rate_limit_priority.get()
+        max_wait = settings.rate_limit_max_wait_seconds if max_wait is None else max_wait
+        floor = self.capacity * settings.rate_limit_low_priority_reserve if priority == 'low' else 0.0
+        started = time.monotonic()
+        deadline = started + max_wait
+
+        # Concurrency slot (polled so the event loop is never blocked on the condition)
+        while True:
+            with self._lock:
+                if self.in_flight < int(self.concurrency_limit):
+                    self.in_flight += 1
+                    break
+            if time.monotonic() >= deadline:
+                raise RateLimitExceeded(self.name, time.monotonic() - started)
+            await asyncio.sleep(0.05)
+
+        # Rate token
+        try:
+            while True:
+                wait = self._try_take(floor)
+                if wait is None:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitExceeded(self.name, time.monotonic() - started)
+                await asyncio.sleep(min(wait, remaining, 1.0))
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._lock.notify()
+
+    # ------------------------------------------------------------------
+    # Adaptive feedback
+    # ------------------------------------------------------------------
+
+    def release(self, latency: float, success: bool, throttled: bool = False) -> None:
+        """
+        Release a concurrency slot and feed the observed outcome back
+
+        Args:
+            latency: Call duration in seconds
+            success: Whether the call succeeded
+            throttled: Whether the dependency signalled throttling (e.g. HTTP 429)
+        """
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.calls += 1
+            self.latency_ewma = latency if self.latency_ewma is None else \
+                (1 - self.EWMA_ALPHA) * self.latency_ewma + self.EWMA_ALPHA * latency
+            self.error_ewma = (1 - self.EWMA_ALPHA) * self.error_ewma + self.EWMA_ALPHA * (0.0 if success else 1.0)
+
+            if throttled:
+                self.throttled += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                self._pending_rate_factor = 0.5
+            elif latency > self.latency_target * 2 or self.error_ewma > 0.5:
+                self.concurrency_limit = max(1.0, self.concurrency_limit * 0.75)
+                self._pending_rate_factor = min(self._pending_rate_factor or 1.0, 0.75)
+            elif success and latency <= self.latency_target:
+                self.concurrency_limit = min(float(self.max_concurrency), self.concurrency_limit + 1.0 / self.concurrency_limit)
+                if self._pending_rate_factor is None:
+                    self._pending_rate_factor = 1.0 + self.RATE_INCREASE_FRACTION
+
+            self._lock.notify()
+
+        self._maybe_adjust_shared_rate(force=throttled)
+
+    def _maybe_adjust_shared_rate(self, force: bool = False) -> None:
+        """Apply pending multiplicative/additive rate changes to the shared bucket"""
+        now = time.monotonic()
+        if not force and now - self._last_adjust < self.ADJUST_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            factor = self._pending_rate_factor
+            self._pending_rate_factor = None
+            self._last_adjust = now
+            throttled_delta = 1 if force else 0
+            latency_ms = self.latency_ewma * 1000 if self.latency_ewma is not None else None
+            error_rate = self.error_ewma
+
+        if factor is None and not throttled_delta:
+            return
+
+        session = self.SessionMaker()
+        try:
+            session.execute(
+                text("""
+                    UPDATE rate_limit_buckets
+                    SET rate = MAX(base_rate * :min_fraction, MIN(base_rate, rate * :factor)),
+                        latency_ewma_ms = :latency_ms,
+                        error_rate = :error_rate,
+                        throttled_count = throttled_count + :throttled,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE name = :name
+                """),
+                {
+                    'name': self.name,
+                    'factor': factor or 1.0,
+                    'min_fraction': self.MIN_RATE_FRACTION,
+                    'latency_ms': latency_ms,
+                    'error_rate': error_rate,
+                    'throttled': throttled_delta
+                }
+            )
+            session.commit()
+            if factor is not None and factor < 1.0:
+                logger.warning("Reduced dependency rate", dependency=self.name, factor=factor,
+                               concurrency_limit=round(self.concurrency_limit, 2))
+        except Exception as e:
+            session.rollback()
+            logger.warning("Failed to adjust shared rate", dependency=self.name, error=str(e))
+        finally:
+            session.close()
+
+    @contextmanager
+    def limit(self, priority: Optional[str] = None):
+        """
+        Context manager wrapping a single dependency call
+
+        Usage:
+            with limiter.limit():
+                client.do_call()
+        """
+        self.acquire(priority=priority)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.monotonic() - started, success=False, throttled=is_throttle_error(e))
+            raise
+        else:
+            self.release(time.monotonic() - started, success=True)
+
+    @asynccontextmanager
+    async def alimit(self, priority: Optional[str] = None):
+        """Async context manager wrapping a single dependency call"""
+        await self.aacquire(priority=priority)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.monotonic() - started, success=False, throttled=is_throttle_error(e))
+            raise
+        else:
+            self.release(time.monotonic() - started, success=True)
+
+    def call(self, func: Callable, *args, priority: Optional[str] = None, **kwargs) -> Any:
+        """Invoke func under this limiter"""
+        with self.limit(priority=priority):
+            return func(*args, **kwargs)
+
+    def local_status(self) -> Dict[str, Any]:
+        """Process-local view of this limiter"""
+        return {
+            'in_flight': self.in_flight,
+            'concurrency_limit': round(self.concurrency_limit, 2),
+            'max_concurrency': self.max_concurrency,
+            'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            'error_rate': round(self.error_ewma, 3),
+            'throttled': self.throttled,
+            'calls': self.calls,
+        }
+
+
+class RateLimitedClient:
+    """
+    Transparent proxy applying a dependency limiter to every public method call
+
+    Usage:
+        client = RateLimitedClient(TicketingAPIClient(), 'ticketing')
+        client.get_ticket_by_ticket_number('DE25006528')
+
+    Args:
+        target: Wrapped client
+        dependency: Dependency name for the limiter
+        priority: Fixed priority for this client (defaults to the context priority)
+    """
+
+    def __init__(self, target: Any, dependency: str, priority: Optional[str] = None):
+        self._target = target
+        self._dependency = dependency
+        self._priority = priority
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if name.startswith('_') or not callable(attr) or not settings.rate_limit_enabled:
+            return attr
+
+        limiter = get_limiter(self._dependency)
+        priority = self._priority
+
+        def limited(*args, **kwargs):
+            return limiter.call(attr, *args, priority=priority, **kwargs)
+
+        limited.__name__ = name
+        limited.__doc__ = getattr(attr, '__doc__', None)
+        return limited
+
+
+# ----------------------------------------------------------------------
+# Registry
+# ----------------------------------------------------------------------
+
+_limiters: Dict[str, DependencyLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(dependency: str) -> DependencyLimiter:
+    """
+    Get (or create) the process-wide limiter for a dependency
+
+    Args:
+        dependency: 'gmail', 'ticketing' or 'ai_<provider>'
+
+    Returns:
+        DependencyLimiter instance
+    """
+    limiter = _limiters.get(dependency)
+    if limiter is None:
+        with _registry_lock:
+            limiter = _limiters.get(dependency)
+            if limiter is None:
+                from src.utils.runtime_status import get_session_maker
+                limiter = DependencyLimiter(dependency, get_session_maker())
+                _limiters[dependency] = limiter
+    return limiter
+
+
+def rate_limited(target: Any, dependency: str, priority: Optional[str] = None) -> Any:
+    """
+    Wrap a client so its calls go through the dependency limiter
+
+    Returns the target unchanged when rate limiting is disabled.
+    """
+    if not settings.rate_limit_enabled:
+        return target
+    return RateLimitedClient(target, dependency, priority=priority)
+
+
+@contextmanager
+def limited_call(dependency: str, priority: Optional[str] = None):
+    """Context manager for a single rate limited call (no-op when disabled)"""
+    if not settings.rate_limit_enabled:
+        yield
+        return
+    with get_limiter(dependency).limit(priority=priority):
+        yield
+
+
+@asynccontextmanager
+async def alimited_call(dependency: str, priority: Optional[str] = None):
+    """Async context manager for a single rate limited call (no-op when disabled)"""
+    if not settings.rate_limit_enabled:
+        yield
+        return
+    async with get_limiter(dependency).alimit(priority=priority):
+        yield
+
+
+def set_request_priority(priority: str) -> None:
+    """
+    Set the rate limit priority for the current request/task context
+
+    Web endpoints that trigger bulk work call set_request_priority('low')
+    so they cannot consume the budget reserved for the email poller.
+    """
+    rate_limit_priority.set(priority)
+
+
+def get_rate_limit_status(db_session) -> List[Dict[str, Any]]:
+    """
+    Current budgets for all dependencies
+
+    Args:
+        db_session: Database session
+
+    Returns:
+        List of bucket dicts (shared state + this process's adaptive limits)
+    """
+    rows = db_session.execute(
+        text("""
+            SELECT name, tokens, capacity, rate, base_rate, last_refill,
+                   latency_ewma_ms, error_rate, throttled_count, updated_at
+            FROM rate_limit_buckets ORDER BY name
+        """)
+    ).fetchall()
+
+    now = time.time()
+    status = []
+    for row in rows:
+        name, tokens, capacity, rate, base_rate, last_refill, latency_ms, error_rate, throttled_count, updated_at = row
+        entry = {
+            'dependency': name,
+            'available_tokens': round(min(capacity, tokens + (now - last_refill) * rate), 2),
+            'capacity': capacity,
+            'rate_per_second': round(rate, 3),
+            'configured_rate_per_second': base_rate,
+            'rate_fraction': round(rate / base_rate, 3) if base_rate else None,
+            'latency_ewma_ms': round(latency_ms, 1) if latency_ms is not None else None,
+            'error_rate': round(error_rate, 3) if error_rate is not None else None,
+            'throttled_count': throttled_count,
+            'updated_at': str(updated_at) if updated_at else None,
+        }
+        if name in _limiters:
+            entry['this_process'] = _limiters[name].local_status()
+        status.append(entry)
+    return status
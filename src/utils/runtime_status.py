@@ -0,0 +1,90 @@
+"""
+Runtime Status
+Publish small JSON status snapshots to system_settings so other processes can read them
+
+The email poller and the web API run as separate processes. Components that
+keep in-memory state (circuit breakers, schedulers, ...) publish snapshots
+under a 'runtime:' key prefix, and web endpoints read them back.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+import structlog
+from sqlalchemy import text
+
+logger = structlog.get_logger(__name__)
+
+KEY_PREFIX = 'runtime:'
+
+_session_maker = None
+
+
+def get_session_maker():
+    """Lazily initialized sessionmaker shared by background utilities"""
+    global _session_maker
+    if _session_maker is None:
+        from src.database.models import init_database
+        _session_maker = init_database()
+    return _session_maker
+
+
+def publish_status(key: str, payload: Dict[str, Any]) -> bool:
+    """
+    Store a status snapshot
+
+    Args:
+        key: Status key (stored as 'runtime:<key>')
+        payload: JSON-serializable snapshot
+
+    Returns:
+        True if stored, False otherwise
+    """
+    snapshot = {**payload, 'pid': os.getpid(), 'published_at': datetime.utcnow().isoformat()}
+    session = get_session_maker()()
+    try:
+        session.execute(
+            text("""
+                INSERT OR REPLACE INTO system_settings (key, value, updated_at)
+                VALUES (:key, :value, CURRENT_TIMESTAMP)
+            """),
+            {'key': KEY_PREFIX + key, 'value': json.dumps(snapshot, default=str)}
+        )
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        logger.warning("Failed to publish runtime status", key=key, error=str(e))
+        return False
+    finally:
+        session.close()
+
+
+def read_statuses(db_session, prefix: str = '') -> Dict[str, Dict[str, Any]]:
+    """
+    Read published snapshots
+
+    Args:
+        db_session: Database session
+        prefix: Optional key prefix filter (without 'runtime:')
+
+    Returns:
+        Mapping of key (without 'runtime:') -> snapshot
+    """
+    rows = db_session.execute(
+        text("SELECT key, value FROM system_settings WHERE key LIKE :pattern"),
+        {'pattern': f"{KEY_PREFIX}{prefix}%"}
+    ).fetchall()
+
+    statuses = {}
+    for key, value in rows:
+        try:
+            statuses[key[len(KEY_PREFIX):]] = json.loads(value)
+        except (TypeError, ValueError):
+            continue
+    return statuses
+
+
+def read_status(db_session, key: str) -> Optional[Dict[str, Any]]:
+    """Read a single published snapshot"""
+    return read_statuses(db_session, key).get(key)
@@ -0,0 +1,356 @@
+"""
+Tracking Cache
+Shared carrier tracking status cache with carrier-specific TTLs
+
+Carrier lookups (TrackingChecker) take seconds per parcel. Their results are
+kept in memory and in the tracking_statuses table, so the orchestrator and
+the web API share them and they survive restarts.
+
+- Statuses are reused for a per-carrier TTL (settings.tracking_cache_carrier_ttls),
+  for much longer once a parcel reached a final state and only briefly when
+  the lookup failed (the last known status is kept).
+- Concurrent lookups of the same tracking number share one carrier request.
+- check_parcels() looks up all parcels of an order concurrently and returns
+  within a time budget. Lookups still running then finish in the background
+  and fill the cache; until then the last known (stale) status is returned.
+- Open tickets are refreshed ahead of expiry in the background
+  (see tracking_refresher.py), so lookups usually hit a warm cache.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+
+from config.settings import settings
+
+logger = structlog.get_logger(__name__)
+
+FINAL_STATUSES = ('delivered', 'returned')
+
+# Expired entries are dropped from memory once this many are held
+MAX_MEMORY_ENTRIES = 5000
+
+
+def parse_carrier_values(value: str) -> List[Tuple[str, int]]:
+    """
+    Parse 'carrier:number,carrier:number' (TTLs, rates) into (carrier, number) pairs
+
+    Returns:
+        Pairs with lowercase carrier keys, longest first (so 'dhl express' wins over 'dhl')
+    """
+    pairs = []
+    for part in (value or '').split(','):
+        carrier, _, minutes = part.strip().rpartition(':')
+        try:
+            pairs.append((carrier.strip().lower(), int(minutes)))
+        except ValueError:
+            continue
+    return sorted((pair for pair in pairs if pair[0]), key=lambda pair: len(pair[0]), reverse=True)
+
+
+def cache_ttl(carrier: Optional[str], status: Optional[str], failed: bool = False) -> timedelta:
+    """How long a lookup result is reused"""
+    if failed:
+        return timedelta(minutes=settings.tracking_cache_error_ttl_minutes)
+    if (status or '').lower() in FINAL_STATUSES:
+        return timedelta(hours=settings.tracking_cache_final_ttl_hours)
+    name = (carrier or '').lower()
+    for key, minutes in parse_carrier_values(settings.tracking_cache_carrier_ttls):
+        if key in name:
+            return timedelta(minutes=minutes)
+    return timedelta(minutes=settings.tracking_cache_default_ttl_minutes)
+
+
+def parcels_from_ticket(ticket_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    All parcels with a tracking number across the purchase orders of a ticket
+
+    Args:
+        ticket_data: Ticket data from the ticketing API
+
+    Returns:
+        Parcel dicts (tracking_number, carrier, tracking_url, postal_code, address), one per tracking number
+    """
+    sales_order = ticket_data.get('salesOrder') or {}
+    parcels, seen = [], set()
+    for purchase_order in sales_order.get('purchaseOrders') or []:
+        for delivery in purchase_order.get('deliveries') or []:
+            for parcel in delivery.get('deliveryParcels') or []:
+                tracking_number = (parcel.get('trackNumber') or '').strip()
+                if not tracking_number or tracking_number in seen:
+                    continue
+                seen.add(tracking_number)
+                parcels.append({
+                    'tracking_number': tracking_number,
+                    'carrier': (parcel.get('shipmentMethod') or {}).get('name1', ''),
+                    'tracking_url': (parcel.get('traceUrl') or '').strip(),
+                    # Customer address for gatekeepers (Trans-o-flex)
+                    'postal_code': sales_order.get('customerPostalCode'),
+                    'address': sales_order.get('customerAddress'),
+                })
+    return parcels
+
+
+class TrackingCache:
+    """Process-wide tracking status cache backed by the tracking_statuses table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.tracking_lookup_workers,
+                        thread_name_prefix='tracking'
+                    )
+        return self._executor
+
+    # ------------------------------------------------------------------
+    # Cache entries
+    # ------------------------------------------------------------------
+
+    def get(self, tracking_number: str) -> Optional[Dict[str, Any]]:
+        """Cached entry of a parcel (fresh or expired), None if it was never looked up"""
+        entry = self._entries.get(tracking_number)
+        if entry is None or not self.is_fresh(entry):
+            # Another process (e.g. the background refresher) may have looked it up since
+            stored = self._load(tracking_number)
+            if stored is not None and (entry is None or stored['checked_at'] > entry['checked_at']):
+                with self._lock:
+                    current = self._entries.get(tracking_number)
+                    if current is None or stored['checked_at'] > current['checked_at']:
+                        self._entries[tracking_number] = stored
+                    entry = self._entries[tracking_number]
+        return entry
+
+    @staticmethod
+    def is_fresh(entry: Dict[str, Any]) -> bool:
+        return datetime.utcnow() < entry['expires_at']
+
+    @staticmethod
+    def _from_row(row: Any) -> Dict[str, Any]:
+        return {
+            'tracking_number': row.tracking_number,
+            'carrier': row.carrier,
+            'tracking_url': row.tracking_url,
+            'status': row.status,
+            'result': row.result,
+            'error': row.error_message,
+            'checked_at': row.checked_at,
+            'expires_at': row.expires_at,
+            'status_changed_at': row.status_changed_at,
+        }
+
+    def _load(self, tracking_number: str) -> Optional[Dict[str, Any]]:
+        from src.database.models import TrackingStatus
+        from src.utils.runtime_status import get_session_maker
+
+        db = get_session_maker()()
+        try:
+            row = db.get(TrackingStatus, tracking_number)
+            return self._from_row(row) if row is not None else None
+        except Exception as e:
+            logger.warning("Failed to read cached tracking status", tracking_number=tracking_number, error=str(e))
+            return None
+        finally:
+            db.close()
+
+    def _store(self, parcel: Dict[str, Any], result: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+        """Save a lookup outcome; a failed lookup keeps the last known status"""
+        from src.database.models import TrackingStatus
+        from src.utils.runtime_status import get_session_maker
+
+        tracking_number = parcel['tracking_number']
+        previous = self.get(tracking_number)
+        now = datetime.utcnow()
+        failed = error is not None
+        status = (result or {}).get('status') if not failed else (previous or {}).get('status')
+        carrier = (result or {}).get('carrier') or parcel.get('carrier') or (previous or {}).get('carrier')
+        changed = previous is None or (not failed and status != previous['status'])
+        entry = {
+            'tracking_number': tracking_number,
+            'carrier': carrier,
+            'tracking_url': (result or {}).get('tracking_url') or parcel.get('tracking_url') or (previous or {}).get('tracking_url'),
+            'status': status,
+            'result': result if not failed else (previous or {}).get('result'),
+            'error': error,
+            'checked_at': now,
+            'expires_at': now + cache_ttl(carrier, status, failed),
+            'status_changed_at': now if changed else previous['status_changed_at'],
+        }
+        with self._lock:
+            self._entries[tracking_number] = entry
+            if len(self._entries) > MAX_MEMORY_ENTRIES:
+                self._entries = {key: value for key, value in self._entries.items() if self.is_fresh(value)}
+
+        db = get_session_maker()()
+        try:
+            row = db.get(TrackingStatus, tracking_number)
+            if row is None:
+                row = TrackingStatus(tracking_number=tracking_number)
+                db.add(row)
+            row.carrier = entry['carrier']
+            row.tracking_url = (entry['tracking_url'] or '')[:500] or None
+            row.status = entry['status']
+            row.result = entry['result']
+            row.error_message = error
+            row.checked_at = entry['checked_at']
+            row.expires_at = entry['expires_at']
+            row.status_changed_at = entry['status_changed_at']
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Failed to store tracking status", tracking_number=tracking_number, error=str(e))
+        finally:
+            db.close()
+        return entry
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def _fetch(self, parcel: Dict[str, Any]) -> Dict[str, Any]:
+        """Run in a worker: ask the carrier and store the outcome"""
+        from src.utils.tracking_checker import TrackingChecker, extract_house_number
+
+        checker = getattr(self._local, 'checker', None)
+        if checker is None:
+            checker = self._local.checker = TrackingChecker()
+
+        address = parcel.get('address')
+        try:
+            result = checker.check_tracking(
+                tracking_number=parcel['tracking_number'],
+                carrier_name=parcel.get('carrier'),
+                tracking_url=parcel.get('tracking_url'),
+                postal_code=parcel.get('postal_code'),
+                house_number=extract_house_number(address) if address else None
+            )
+            error = None if result and result.get('status') else (result or {}).get('error') or 'No tracking status'
+        except Exception as e:
+            result, error = None, str(e)
+        if error:
+            logger.warning("Tracking lookup failed", tracking_number=parcel['tracking_number'],
+                           carrier=parcel.get('carrier'), error=error[:200])
+        return self._store(parcel, result, error)
+
+    def submit(self, parcel: Dict[str, Any], refresh: bool = False) -> Optional[Future]:
+        """
+        Start a carrier lookup unless a fresh status is cached
+
+        Args:
+            parcel: Parcel dict (see parcels_from_ticket)
+            refresh: Look up even when the cached status is fresh
+
+        Returns:
+            Future of the cache entry, or None when the cached status is fresh
+        """
+        tracking_number = parcel['tracking_number']
+        if not refresh:
+            entry = self.get(tracking_number)
+            if entry is not None and self.is_fresh(entry):
+                return None
+        executor = self._get_executor()
+        with self._lock:
+            future = self._inflight.get(tracking_number)
+            started = future is None
+            if started:
+                future = executor.submit(self._fetch, parcel)
+                self._inflight[tracking_number] = future
+        if started:
+            # Outside the lock: the callback runs right away when the lookup already finished
+            future.add_done_callback(lambda done, key=tracking_number: self._finished(key, done))
+        return future
+
+    def _finished(self, tracking_number: str, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(tracking_number) is future:
+                del self._inflight[tracking_number]
+
+    def _response(self, entry: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+        """TrackingChecker-style result of a cache entry"""
+        return {
+            **(entry['result'] or {}),
+            'tracking_number': entry['tracking_number'],
+            'carrier': entry['carrier'],
+            'tracking_url': entry['tracking_url'],
+            'status': entry['status'],
+            'error': entry['error'],
+            'checked_at': entry['checked_at'].isoformat(),
+            'status_changed_at': entry['status_changed_at'].isoformat() if entry['status_changed_at'] else None,
+            'cached': cached,
+            'stale': not self.is_fresh(entry),
+        }
+
+    def lookup(self, parcel: Dict[str, Any], refresh: bool = False,
+               timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Status of one parcel, from the cache when fresh
+
+        Args:
+            parcel: Parcel dict (see parcels_from_ticket)
+            refresh: Ask the carrier even when the cached status is fresh
+            timeout: Seconds to wait for the carrier (the lookup continues in the background)
+
+        Returns:
+            Result dict (TrackingChecker fields plus checked_at, cached and stale);
+            the last known status on timeout, None if there is none
+        """
+        future = self.submit(parcel, refresh=refresh)
+        if future is not None:
+            try:
+                return self._response(future.result(timeout=timeout), cached=False)
+            except FutureTimeout:
+                logger.info("Tracking lookup still running, using last known status",
+                            tracking_number=parcel['tracking_number'])
+            except Exception as e:
+                logger.error("Tracking lookup failed", tracking_number=parcel['tracking_number'], error=str(e))
+        entry = self.get(parcel['tracking_number'])
+        return self._response(entry, cached=True) if entry is not None else None
+
+    def check_parcels(self, parcels: List[Dict[str, Any]], budget: float) -> List[Dict[str, Any]]:
+        """
+        Statuses of several parcels, looked up concurrently within a time budget
+
+        Args:
+            parcels: Parcel dicts (see parcels_from_ticket)
+            budget: Seconds to wait for carrier lookups in total
+
+        Returns:
+            Result dicts in parcel order; parcels whose first lookup is still
+            running are left out
+        """
+        futures = {}
+        for parcel in parcels:
+            future = self.submit(parcel)
+            if future is not None:
+                futures[parcel['tracking_number']] = future
+        if futures:
+            wait(list(futures.values()), timeout=budget)
+
+        results, pending = [], 0
+        for parcel in parcels:
+            future = futures.get(parcel['tracking_number'])
+            if future is not None and future.done() and future.exception() is None:
+                results.append(self._response(future.result(), cached=False))
+                continue
+            if future is not None and not future.done():
+                pending += 1
+            entry = self.get(parcel['tracking_number'])
+            if entry is not None:
+                results.append(self._response(entry, cached=True))
+        if pending:
+            logger.info("Tracking lookups exceeded the budget, continuing in background", pending=pending,
+                        budget_seconds=budget)
+        return results
+
+
+# Shared per process
+tracking_cache = TrackingCache()
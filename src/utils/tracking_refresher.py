@@ -0,0 +1,234 @@
+"""
+Tracking Refresher
+Background refresh of the tracking status of open tickets
+
+Tracking used to be looked up only when a customer asked or an operator
+clicked, so the first "where is my parcel" analysis always waited for the
+carrier. The refresher looks up every open ticket with a tracking number
+whose cached status (see tracking_cache.py) expires before the next run, so
+AIEngine._check_live_tracking() and the UI read a warm cache.
+
+- Lookups are staggered per carrier (settings.tracking_refresh_carrier_rates)
+  so a run never bursts into a carrier's rate limit.
+- Parcels that were delivered or returned, or whose status has not changed
+  for settings.tracking_stuck_days, are flagged as TrackingAlert rows. Open
+  alerts are the work list for drafting proactive customer messages in batches.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import wait
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import structlog
+
+from config.settings import settings
+from .tracking_cache import FINAL_STATUSES, parse_carrier_values, tracking_cache
+
+logger = structlog.get_logger(__name__)
+
+# Alerts on a parcel that moved on are closed by the refresher under this name
+SYSTEM_HANDLER = 'tracking_refresher'
+
+
+def carrier_rate(carrier: Optional[str]) -> int:
+    """Background lookups per minute allowed for a carrier"""
+    name = (carrier or '').lower()
+    for key, per_minute in parse_carrier_values(settings.tracking_refresh_carrier_rates):
+        if key in name:
+            return max(per_minute, 1)
+    return settings.tracking_refresh_default_rate_per_minute
+
+
+def parcel_from_ticket_state(ticket: Any) -> Dict[str, Any]:
+    """Parcel dict (see tracking_cache.parcels_from_ticket) of a TicketState"""
+    return {
+        'tracking_number': ticket.tracking_number.strip(),
+        'carrier': ticket.carrier_name or '',
+        'tracking_url': (ticket.tracking_url or '').strip(),
+        'postal_code': ticket.customer_postal_code,
+        'address': ticket.customer_address,
+    }
+
+
+def alert_kind(entry: Dict[str, Any], now: datetime) -> Optional[str]:
+    """
+    Alert a cached tracking status calls for
+
+    Returns:
+        'delivered', 'returned', 'stuck' or None
+    """
+    status = (entry.get('status') or '').lower()
+    if not status:
+        return None
+    if status in FINAL_STATUSES:
+        return status
+    changed_at = entry.get('status_changed_at')
+    if changed_at and now - changed_at >= timedelta(days=settings.tracking_stuck_days):
+        return 'stuck'
+    return None
+
+
+class TrackingRefresher:
+    """
+    Refreshes tracking of open tickets and flags delivered/stuck parcels
+
+    Args:
+        session_maker: SQLAlchemy sessionmaker
+    """
+
+    def __init__(self, session_maker: Any):
+        self.SessionMaker = session_maker
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def stop(self) -> None:
+        """Stop submitting lookups (a running refresh returns early)"""
+        self._stop.set()
+
+    def _open_tickets(self, db: Any) -> List[Any]:
+        from sqlalchemy import or_
+        from src.database.models import CustomStatus, TicketState
+
+        return db.query(TicketState).outerjoin(
+            CustomStatus, TicketState.custom_status_id == CustomStatus.id
+        ).filter(
+            TicketState.tracking_number.isnot(None),
+            TicketState.tracking_number != '',
+            or_(CustomStatus.id.is_(None), CustomStatus.is_closed.isnot(True))
+        ).all()
+
+    def _due(self, parcels: List[Dict[str, Any]], horizon: datetime) -> List[Dict[str, Any]]:
+        """Parcels never looked up or whose status expires before the next run"""
+        due = []
+        for parcel in parcels:
+            entry = tracking_cache.get(parcel['tracking_number'])
+            if entry is None or entry['expires_at'] <= horizon:
+                due.append(parcel)
+        return due
+
+    def _schedule(self, parcels: List[Dict[str, Any]]) -> List[Any]:
+        """(offset seconds, parcel) pairs spacing each carrier's lookups by its rate"""
+        by_carrier: Dict[str, List[Dict[str, Any]]] = {}
+        for parcel in parcels:
+            by_carrier.setdefault((parcel['carrier'] or '').lower(), []).append(parcel)
+        schedule = []
+        for carrier, carrier_parcels in by_carrier.items():
+            spacing = 60.0 / carrier_rate(carrier)
+            schedule.extend((index * spacing, parcel) for index, parcel in enumerate(carrier_parcels))
+        return sorted(schedule, key=lambda item: item[0])
+
+    def _lookup(self, parcels: List[Dict[str, Any]]) -> int:
+        """Submit staggered lookups and wait for them; returns the number submitted"""
+        futures = []
+        started = time.monotonic()
+        for offset, parcel in self._schedule(parcels):
+            delay = started + offset - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            if self._stop.is_set():
+                break
+            future = tracking_cache.submit(parcel, refresh=True)
+            if future is not None:
+                futures.append(future)
+        if futures:
+            # Lookups queue behind the worker pool; allow one timeout per round of workers
+            rounds = math.ceil(len(futures) / settings.tracking_lookup_workers)
+            wait(futures, timeout=settings.tracking_lookup_timeout_seconds * rounds)
+        return len(futures)
+
+    def _flag(self, db: Any, tickets: List[Any], now: datetime) -> int:
+        """Create or reopen alerts for flagged parcels; returns the number of new alerts"""
+        from src.database.models import TrackingAlert
+
+        ticket_ids = [ticket.id for ticket in tickets]
+        alerts = {}
+        for alert in db.query(TrackingAlert).filter(TrackingAlert.ticket_id.in_(ticket_ids)).all():
+            alerts[(alert.ticket_id, alert.tracking_number, alert.kind)] = alert
+
+        flagged = 0
+        for ticket in tickets:
+            tracking_number = ticket.tracking_number.strip()
+            entry = tracking_cache.get(tracking_number)
+            if entry is None:
+                continue
+            kind = alert_kind(entry, now)
+
+            # A stuck parcel that moved on no longer needs a message
+            stuck = alerts.get((ticket.id, tracking_number, 'stuck'))
+            if stuck is not None and stuck.handled_at is None and kind != 'stuck':
+                stuck.handled_at = now
+                stuck.handled_by = SYSTEM_HANDLER
+
+            if kind is None:
+                continue
+            alert = alerts.get((ticket.id, tracking_number, kind))
+            if alert is not None and alert.status_changed_at == entry['status_changed_at']:
+                continue
+            if alert is None:
+                alert = TrackingAlert(ticket_id=ticket.id, tracking_number=tracking_number, kind=kind)
+                db.add(alert)
+            # New alert, or the parcel reached this state again since the last one
+            alert.carrier = entry['carrier']
+            alert.status = entry['status']
+            alert.status_changed_at = entry['status_changed_at']
+            alert.detected_at = now
+            alert.handled_at = None
+            alert.handled_by = None
+            flagged += 1
+            logger.info("Tracking alert", ticket_number=ticket.ticket_number, tracking_number=tracking_number,
+                        kind=kind, status=entry['status'])
+        db.commit()
+        return flagged
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Refresh tracking of all open tickets and flag delivered/stuck parcels
+
+        Returns:
+            Dict with tickets, parcels, looked_up, flagged and seconds
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return {'skipped': True, 'reason': 'A refresh is already running'}
+        started = time.monotonic()
+        db = self.SessionMaker()
+        try:
+            tickets = self._open_tickets(db)
+            parcels = list({
+                parcel['tracking_number']: parcel
+                for parcel in (parcel_from_ticket_state(ticket) for ticket in tickets)
+            }.values())
+            horizon = datetime.utcnow() + timedelta(minutes=settings.tracking_refresh_interval_minutes)
+            looked_up = self._lookup(self._due(parcels, horizon))
+            flagged = self._flag(db, tickets, datetime.utcnow())
+            stats = {
+                'tickets': len(tickets),
+                'parcels': len(parcels),
+                'looked_up': looked_up,
+                'flagged': flagged,
+                'seconds': round(time.monotonic() - started, 1),
+            }
+            logger.info("Tracking refresh finished", **stats)
+            return stats
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            self._run_lock.release()
+
+
+async def run_tracking_refresher(refresher: TrackingRefresher) -> None:
+    """Refresh every settings.tracking_refresh_interval_minutes until cancelled"""
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(refresher.run_once)
+            except Exception as e:
+                logger.error("Tracking refresher error", error=str(e))
+            interval = settings.tracking_refresh_interval_minutes * 60
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+    finally:
+        refresher.stop()